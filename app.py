@@ -112,6 +112,21 @@ def create_app():
     # 初始化擴充套件
     db.init_app(app)
     login_manager.init_app(app)
+    # 啟動學習進度背景寫回執行緒 (關機時自動做最後一次寫回)
+    from core.progress_buffer import PROGRESS_BUFFER
+    PROGRESS_BUFFER.init_app(app)
+    # 啟動技能遙測背景寫回執行緒 (generate / check 延遲直方圖)
+    from core.skill_telemetry import SKILL_TELEMETRY
+    SKILL_TELEMETRY.init_app(app)
+    # 背景任務 (教科書匯入等)：這裡只綁定 app；執行緒在伺服器處理第一個請求時 (或 __main__) 才啟動，
+    # 呼叫 create_app() 的 CLI 腳本不會領取佇列中的任務
+    from core.jobs import JOB_RUNNER
+    JOB_RUNNER.init_app(app)
+
+    @app.before_request
+    def _start_job_workers():
+        if not app.testing:
+            JOB_RUNNER.start()
 
     # 註冊藍圖
     from core.routes import practice_bp # 導入新的 blueprint
@@ -255,9 +270,15 @@ def create_app():
         chapter = request.args.get('chapter')
         
         progress_records = db.session.query(Progress).filter_by(user_id=current_user.id).all()
-        progress_dict = {
-            p.skill_id: (p.skill_id, p.consecutive_correct, p.questions_solved, p.current_level)
+        levels = {p.skill_id: p.current_level for p in progress_records}
+        # 疊加尚未寫回的作答增量，儀表板顯示最新進度
+        latest = PROGRESS_BUFFER.overlay(current_user.id, {
+            p.skill_id: (p.consecutive_correct or 0, p.consecutive_wrong or 0, p.questions_solved or 0, p.last_practiced)
             for p in progress_records
+        })
+        progress_dict = {
+            skill_id: (skill_id, correct, solved, levels.get(skill_id, 1))
+            for skill_id, (correct, wrong, solved, _) in latest.items()
         }
         
         if view_mode == 'curriculum':
@@ -437,5 +458,8 @@ def create_app():
 app = create_app()
 
 if __name__ == '__main__':
+    # 開發伺服器：立即啟動背景任務執行緒 (恢復中斷的任務，不必等第一個請求)
+    from core.jobs import JOB_RUNNER
+    JOB_RUNNER.start()
     # 加入 use_reloader=False 以防止寫入檔案時伺服器自動重啟
     app.run(debug=True, host='0.0.0.0',port=5000, use_reloader=False)
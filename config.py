@@ -118,6 +118,8 @@ class Config:
     
     # --- [Local] Ollama API URL ---
     LOCAL_API_URL = "http://localhost:11434/api/generate"
+    # 與 Ollama 共用的 HTTP 連線池大小 (keep-alive，需 >= 同時生成數)
+    LOCAL_HTTP_POOL_SIZE = 8
     
     # (舊變數保留以防其他檔案引用報錯，但建議盡快遷移)
     AI_PROVIDER = DEFAULT_PROVIDER
@@ -126,4 +128,101 @@ class Config:
     LOCAL_MODEL_NAME = "qwen2.5-coder:7b"
     
     # [V2.5 Data Enhancement] Experiment Batch Tag
-    EXPERIMENT_BATCH = 'Run_V2.5_Elite'
\ No newline at end of file
+    EXPERIMENT_BATCH = 'Run_V2.5_Elite'
+
+    # ==========================================
+    # 5. 練習區效能設定 (Practice Hot Path)
+    # ==========================================
+    # 題目預生成池：每個 (skill_id, 難度) 保留的題數、低水位與背景補題執行緒數
+    QUESTION_POOL_SIZE = 8
+    QUESTION_POOL_LOW_WATERMARK = 3
+    QUESTION_POOL_WORKERS = 2
+    # 補題失敗 (生成逾時或連續出錯) 後，同一 (skill_id, 難度) 暫停補題的秒數
+    QUESTION_POOL_RETRY_SECONDS = 30
+    # 技能靜態資料 (技能資訊/課綱難度/前置技能) 快取秒數，後台編輯會立即失效
+    SKILL_METADATA_TTL = 300
+    # 技能靜態資料快取最多保留的技能數 (LRU)
+    SKILL_METADATA_MAX_ENTRIES = 2000
+    # 學習進度 Write-Behind 寫回間隔 (秒)，期間的作答會合併成單一交易批次寫入
+    PROGRESS_FLUSH_INTERVAL = 0.3
+    # 伺服器端題目內容 LRU 筆數 (Session 只存題目種子，批改時由此取回正確答案)
+    QUESTION_STATE_CACHE_SIZE = 4096
+    # 目前題目狀態的保存位置：cookie (簽章 Cookie) / memory (單機 LRU) / sqlite (多 worker 共用)
+    PRACTICE_STATE_BACKEND = os.environ.get('PRACTICE_STATE_BACKEND', 'cookie')
+    PRACTICE_STATE_MAX_ENTRIES = 10000
+    # 練習狀態閒置多久 (秒) 後過期
+    PRACTICE_STATE_TTL = 6 * 3600
+    # 技能 generate() 單次呼叫的時間預算 (秒)，逾時即中止並計入該技能的慢速生成次數
+    GENERATION_TIME_BUDGET = 2.0
+    # 題目池背景補題不佔請求執行緒，預算可較寬鬆
+    GENERATION_BACKGROUND_BUDGET = 10.0
+    # 連續逾時幾次即隔離該技能，隔離期間 (秒) 只從題目池 / 最近出過的題目出題
+    GENERATION_QUARANTINE_AFTER = 2
+    GENERATION_QUARANTINE_SECONDS = 600
+    # 技能 generate() / check() 遙測 (延遲直方圖、重試、例外類型) 寫回 skill_telemetry 資料表的間隔 (秒)
+    SKILL_TELEMETRY_FLUSH_INTERVAL = 60
+    # /api/questions/batch 單次最多產生的題數 (列印學習單用)
+    QUESTION_BATCH_MAX = 100
+
+    # ==========================================
+    # 6. 批次程式碼生成排程 (Batch Code Generation)
+    # ==========================================
+    # 各 AI 供應商同時生成的技能數上限 (本機 Ollama 受 GPU 限制，雲端可較高)
+    GENERATION_CONCURRENCY = {'local': 1, 'google': 4}
+    # 各供應商每分鐘最多發出的生成請求數 (Token Bucket；None 表示不限)
+    GENERATION_RATE_PER_MINUTE = {'local': None, 'google': 15}
+
+    # ==========================================
+    # 7. LLM 回應快取 (實驗重播用)
+    # ==========================================
+    # off: 不使用 / readwrite: 命中即用並錄製新回應 / replay: 只重播已錄製回應 (未命中直接報錯)
+    LLM_CACHE_MODE = os.environ.get('LLM_CACHE_MODE', 'off')
+    LLM_CACHE_DIR = os.path.join(instance_path, 'llm_cache')
+    # 快取容量上限 (MB)，超過時淘汰最久未使用的回應
+    LLM_CACHE_MAX_MB = 512
+
+    # ==========================================
+    # 8. 沙箱行程池 (生成程式碼的驗證與動態採樣)
+    # ==========================================
+    # 是否在獨立行程中執行 LLM 生成的程式碼 (False 時沿用主行程內 exec，僅供除錯)
+    SANDBOX_ENABLED = True
+    # 預先啟動的沙箱行程數，與每個行程執行幾個工作後回收替換
+    SANDBOX_POOL_SIZE = 2
+    SANDBOX_MAX_JOBS_PER_WORKER = 50
+    # 每個工作的 CPU 時間 / 實際時間 (秒) 與記憶體 RSS (MB) 上限，超過即終止該行程
+    SANDBOX_CPU_SECONDS = 5
+    SANDBOX_WALL_SECONDS = 10
+    SANDBOX_MAX_RSS_MB = 512
+
+    # ==========================================
+    # 9. 背景任務 (教科書匯入等，SQLite jobs 資料表)
+    # ==========================================
+    # 每個 WSGI worker 執行任務的執行緒數與輪詢間隔 (秒)；0 = 本行程只送出 / 追蹤任務，不執行
+    # 執行緒只在伺服器行程啟動 (第一個請求或 python app.py)，CLI 腳本呼叫 create_app() 不會領取任務
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 1))
+    JOB_POLL_INTERVAL = 1.0
+    # 執行中的任務超過此秒數沒有心跳即視為中斷，交由任一 worker 依 checkpoint 續做；最多嘗試次數
+    JOB_STALE_SECONDS = 120
+    JOB_MAX_ATTEMPTS = 3
+
+    # ==========================================
+    # 10. 教科書匯入 (PDF 擷取、OCR 與 AI 分析)
+    # ==========================================
+    # PDF 逐頁擷取的行程數 (None 表示 CPU 核心數 - 1；1 表示在背景任務執行緒內逐頁處理)
+    OCR_WORKERS = None
+    # 文字層非空白字元數達此值即不做整頁 OCR，只對面積比例達門檻的圖片區域 OCR
+    OCR_MIN_TEXT_CHARS = 50
+    OCR_MIN_IMAGE_AREA_RATIO = 0.02
+    # OCR 渲染解析度與辨識語言；預設維持原本 get_pixmap() 的 72 DPI (調高可改善中文小字辨識，但 OCR 較慢，
+    # 且解析度是擷取快取鍵的一部分，變更後既有快取會失效)
+    OCR_DPI = 72
+    OCR_LANG = 'chi_tra'
+    # 擷取快取：以檔案內容雜湊為鍵保存每頁擷取結果，重新匯入未變更的檔案時略過 Pandoc / OCR
+    EXTRACTION_CACHE_ENABLED = True
+    EXTRACTION_CACHE_DIR = os.path.join(instance_path, 'extraction_cache')
+    EXTRACTION_CACHE_MAX_MB = 256
+    # AI 分析分段：每段最多頁數 / 字元數、同時分析的段數 (另受 GENERATION_CONCURRENCY['google'] 限制)、每段重試次數
+    ANALYSIS_CHUNK_PAGES = 20
+    ANALYSIS_CHUNK_CHARS = 40000
+    ANALYSIS_CONCURRENCY = 4
+    ANALYSIS_CHUNK_RETRIES = 2
\ No newline at end of file
@@ -12,7 +12,10 @@
 # ==============================================================================
 
 import os
+import time
+import threading
 import requests
+import requests.adapters
 import json
 import logging
 # [Fix] Migrate from deprecated 'google.generativeai' to 'google.genai'
@@ -24,14 +27,68 @@ except ImportError:
     print("[WARN] Using deprecated 'google.generativeai'. Please upgrade to 'google-genai'.")
 from flask import current_app
 from config import Config
+from core.llm_cache import wrap_with_cache
 
 # 設定 Logger
 logger = logging.getLogger(__name__)
 
+# [效能] 共用連線池：所有 LocalAIClient 共用同一個 requests.Session (HTTP keep-alive)，
+# 避免每次生成都重新建立 TCP 連線
+_LOCAL_SESSION = None
+_LOCAL_SESSION_LOCK = threading.Lock()
+
+def get_local_session():
+    """取得 (或建立) 與 Ollama 通訊用的共用 requests.Session"""
+    global _LOCAL_SESSION
+    with _LOCAL_SESSION_LOCK:
+        if _LOCAL_SESSION is None:
+            pool_size = getattr(Config, 'LOCAL_HTTP_POOL_SIZE', 8)
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _LOCAL_SESSION = session
+        return _LOCAL_SESSION
+
+class LocalAIResponse:
+    """
+    Local AI 回應物件 (模擬 OpenAI / Gemini 風格，帶 usage)
+    額外記錄串流效能指標供 experiment_log 使用：
+    - ttft_seconds      : 送出請求到收到第一個 token 的時間 (Time To First Token)
+    - tokens_per_second : 生成速度 (優先採用 Ollama 回報的 eval_duration)
+    - total_seconds     : 整體請求耗時
+    - truncated         : 串流未收到 done 即結束 (伺服器中止、連線重設)；此時 error=True，
+                          text 為錯誤訊息，已收到的部分輸出放在 partial_text (不可當作完整回應使用或快取)
+    """
+    def __init__(self, text, prompt_tokens=0, completion_tokens=0, ttft_seconds=None,
+                 tokens_per_second=None, total_seconds=None, error=False, truncated=False, partial_text=""):
+        self.text = text
+        self.error = error
+        self.truncated = truncated
+        self.partial_text = partial_text
+        self.usage = type('Usage', (), {})()   # 簡單的 namespace
+        self.usage.prompt_tokens = prompt_tokens
+        self.usage.completion_tokens = completion_tokens
+        self.usage.total_tokens = prompt_tokens + completion_tokens
+        self.ttft_seconds = ttft_seconds
+        self.tokens_per_second = tokens_per_second
+        self.total_seconds = total_seconds
+
+class LocalAIStream:
+    """單次串流請求 (每次呼叫獨立，可安全在多執行緒共用同一個 client)"""
+    def __init__(self, client, prompt):
+        self._client = client
+        self._prompt = prompt
+        self.response = None
+
+    def __iter__(self):
+        return self._client._stream(self._prompt, self)
+
 class LocalAIClient:
     """
     處理 Local Ollama API 的客戶端
     負責與本地運行的 Ollama 服務 (預設 Port 11434) 進行通訊。
+    [效能] 使用共用連線池，並以 Ollama NDJSON 串流接收輸出 (可逐 token 取得並量測 TTFT)。
     """
     def __init__(self, model_name, temperature=0.7, **kwargs):
         # [Config Adaption] 自動讀取 config.py 中的 LOCAL_API_URL，若無則使用預設值
@@ -43,7 +100,7 @@ class LocalAIClient:
         self.max_tokens = kwargs.get('max_tokens', 4096)
         self.extra_options = kwargs.get('extra_body', {})
 
-    def generate_content(self, prompt):
+    def _build_payload(self, prompt):
         # 基礎 options
         options = {
             "temperature": self.temperature,
@@ -56,44 +113,87 @@ class LocalAIClient:
         if self.extra_options:
             options.update(self.extra_options)
 
-        payload = {
+        return {
             "model": self.model,
             "prompt": prompt,
-            "stream": False,
+            "stream": True,
             "options": options
         }
-        
+
+    def generate_content_stream(self, prompt):
+        """
+        串流模式：回傳 LocalAIStream，迭代時逐段取得 Ollama 產生的文字；
+        迭代結束後，完整回應 (含 usage、TTFT、tokens/sec) 存於 stream.response。
+        """
+        return LocalAIStream(self, prompt)
+
+    def _stream(self, prompt, sink):
+        """實際的串流迴圈，結束時把 LocalAIResponse 寫入 sink.response"""
+        chunks = []
+        prompt_tokens, completion_tokens = 0, 0
+        eval_duration_ns = 0
+        ttft = None
+        done = False
+        started = time.perf_counter()
+
         try:
-            response = requests.post(self.api_url, json=payload, timeout=600)
-            response.raise_for_status()
-            result = response.json()
-            
-            # 取出 Ollama 回傳的真正內容與 token 計數
-            generated_text = result.get("response", "")
-            prompt_tokens = result.get("prompt_eval_count", 0)
-            completion_tokens = result.get("eval_count", 0)
-            
-            # 建立一個帶 usage 的 MockResponse（模擬 OpenAI / Gemini 風格）
-            class MockResponse:
-                def __init__(self, text, prompt_t, comp_t):
-                    self.text = text
-                    self.usage = type('Usage', (), {})()   # 簡單的 namespace
-                    self.usage.prompt_tokens = prompt_t
-                    self.usage.completion_tokens = comp_t
-                    self.usage.total_tokens = prompt_t + comp_t
-            
-            return MockResponse(generated_text, prompt_tokens, completion_tokens)
-            
-        except requests.exceptions.RequestException as e:
+            with get_local_session().post(self.api_url, json=self._build_payload(prompt),
+                                          stream=True, timeout=600) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event.get("error"):
+                        raise requests.exceptions.RequestException(event["error"])
+                    token = event.get("response", "")
+                    if token:
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                        chunks.append(token)
+                        yield token
+                    if event.get("done"):
+                        # 最後一筆訊息帶有 token 計數與耗時 (奈秒)
+                        prompt_tokens = event.get("prompt_eval_count", 0)
+                        completion_tokens = event.get("eval_count", 0)
+                        eval_duration_ns = event.get("eval_duration", 0)
+                        done = True
+                        break
+        except (requests.exceptions.RequestException, ValueError) as e:
             error_msg = f"Local AI (Ollama) Error: {str(e)}\n請確認 Ollama 是否正在運行於 {self.api_url}"
             logger.error(error_msg)
-            class MockResponse:
-                def __init__(self, text): 
-                    self.text = error_msg
-                    self.usage = type('Usage', (), {})()
-                    self.usage.prompt_tokens = 0
-                    self.usage.completion_tokens = 0
-            return MockResponse(error_msg)
+            sink.response = LocalAIResponse(error_msg, total_seconds=time.perf_counter() - started, error=True)
+            return
+
+        total = time.perf_counter() - started
+        if not done:
+            error_msg = (f"Local AI (Ollama) Error: 串流在完成前中斷 (未收到 done，已接收 {len(chunks)} 段)\n"
+                         f"請確認 Ollama 是否正在運行於 {self.api_url}")
+            logger.error(error_msg)
+            sink.response = LocalAIResponse(error_msg, ttft_seconds=ttft, total_seconds=total,
+                                            error=True, truncated=True, partial_text="".join(chunks))
+            return
+        if eval_duration_ns:
+            tokens_per_second = completion_tokens / (eval_duration_ns / 1e9)
+        elif ttft is not None and total > ttft:
+            tokens_per_second = completion_tokens / (total - ttft)
+        else:
+            tokens_per_second = None
+        sink.response = LocalAIResponse(
+            "".join(chunks), prompt_tokens, completion_tokens,
+            ttft_seconds=ttft, tokens_per_second=tokens_per_second, total_seconds=total
+        )
+
+    def generate_content(self, prompt, on_token=None):
+        """
+        一次取得完整回應 (內部仍以串流接收以量測 TTFT)。
+        on_token: 選填回呼，每收到一段文字即呼叫一次 (例如推送進度到 SSE 佇列)。
+        """
+        stream = self.generate_content_stream(prompt)
+        for token in stream:
+            if on_token:
+                on_token(token)
+        return stream.response
 
 class GoogleAIClient:
     """
@@ -146,37 +246,86 @@ class GoogleAIClient:
             error_msg = f"Google AI Error: {str(e)}"
             logger.error(error_msg)
             class MockResponse:
+                error = True
                 def __init__(self, text): self.text = f"Error: {text}"
             return MockResponse(error_msg)
 
+# [效能] AI 客戶端快取：以「解析後的角色設定」為鍵，重複使用底層 SDK Client 與 HTTP 連線。
+# 執行期修改 Config.MODEL_ROLES 時，鍵值會自然改變而建立新 Client；舊項目可用 invalidate_ai_clients() 清除。
+_AI_CLIENT_CACHE = {}
+_AI_CLIENT_LOCK = threading.Lock()
+_AI_CLIENT_STATS = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+def _resolve_role_config(role):
+    """讀取角色設定並補上預設值，回傳 (provider, 建構參數 dict)"""
+    role_config = Config.MODEL_ROLES.get(role, Config.MODEL_ROLES.get('default'))
+    
+    provider = role_config.get('provider', 'local').lower()
+    params = {
+        'model_name': role_config.get('model', 'qwen2.5-coder:7b'),
+        'temperature': role_config.get('temperature', 0.7),
+        # [V2.1 Refactor] 提取更多配置參數
+        'max_tokens': role_config.get('max_tokens', 4096),
+        'extra_body': role_config.get('extra_body', {}),
+    }
+    return provider, params
+
+def _client_cache_key(provider, params):
+    # 連線目標 (API Key / URL) 也納入鍵值，變更後不會沿用舊連線
+    if provider in ['google', 'gemini']:
+        target = getattr(Config, 'GEMINI_API_KEY', None) or os.environ.get("GEMINI_API_KEY")
+    else:
+        target = getattr(Config, 'LOCAL_API_URL', None)
+    return json.dumps([provider, target, params], sort_keys=True, default=str)
+
+def _build_ai_client(provider, params):
+    # 2. 智慧派發 (Smart Dispatch)
+    # 同時支援 'google' 和 'gemini' 標籤，增加設定檔的容錯率
+    if provider in ['google', 'gemini']:
+        return GoogleAIClient(params['model_name'], params['temperature'])
+    if provider != 'local':
+        logger.warning(f"⚠️ 未知的 Provider: {provider}，強制切換至 Local 模式")
+    return LocalAIClient(params['model_name'], params['temperature'],
+                         max_tokens=params['max_tokens'], extra_body=params['extra_body'])
+
 def get_ai_client(role='default'):
     """
     [Factory Method] AI 客戶端工廠
-    根據 config.py 中 MODEL_ROLES 的設定，實例化對應的 Client (Local 或 Google)。
+    根據 config.py 中 MODEL_ROLES 的設定，取得對應的 Client (Local 或 Google)。
+    相同設定的角色共用同一個 Client 實例 (執行緒安全)。
     
     Args:
         role (str): 角色名稱 (e.g., 'architect', 'coder', 'vision_analyzer')
     
     Returns:
-        LocalAIClient or GoogleAIClient
+        LocalAIClient or GoogleAIClient (啟用 LLM 回應快取時為 CachedAIClient 包裝)
     """
     # 1. 讀取角色設定
-    role_config = Config.MODEL_ROLES.get(role, Config.MODEL_ROLES.get('default'))
-    
-    provider = role_config.get('provider', 'local').lower()
-    model_name = role_config.get('model', 'qwen2.5-coder:7b')
-    temperature = role_config.get('temperature', 0.7)
-    
-    # [V2.1 Refactor] 提取更多配置參數
-    max_tokens = role_config.get('max_tokens', 4096)
-    extra_body = role_config.get('extra_body', {})
+    provider, params = _resolve_role_config(role)
+    key = _client_cache_key(provider, params)
 
-    # 2. 智慧派發 (Smart Dispatch)
-    # 同時支援 'google' 和 'gemini' 標籤，增加設定檔的容錯率
-    if provider in ['google', 'gemini']:
-        return GoogleAIClient(model_name, temperature)
-    elif provider == 'local':
-        return LocalAIClient(model_name, temperature, max_tokens=max_tokens, extra_body=extra_body)
-    else:
-        logger.warning(f"⚠️ 未知的 Provider: {provider}，強制切換至 Local 模式")
-        return LocalAIClient(model_name, temperature, max_tokens=max_tokens, extra_body=extra_body)
\ No newline at end of file
+    with _AI_CLIENT_LOCK:
+        client = _AI_CLIENT_CACHE.get(key)
+        if client is not None:
+            _AI_CLIENT_STATS['hits'] += 1
+        else:
+            _AI_CLIENT_STATS['misses'] += 1
+            # 建構失敗 (例如缺少 API Key) 時直接拋出，不寫入快取
+            client = _AI_CLIENT_CACHE[key] = _build_ai_client(provider, params)
+
+    # [實驗重播] 啟用 LLM 回應快取時包裝 Client (LLM_CACHE_MODE=readwrite / replay)
+    cache_provider = 'google' if provider in ['google', 'gemini'] else 'local'
+    options = {k: v for k, v in params.items() if k != 'model_name'}
+    return wrap_with_cache(client, cache_provider, params['model_name'], options)
+
+def invalidate_ai_clients():
+    """清除所有快取的 AI Client (執行期修改 MODEL_ROLES 或金鑰後呼叫)"""
+    with _AI_CLIENT_LOCK:
+        _AI_CLIENT_CACHE.clear()
+        _AI_CLIENT_STATS['invalidations'] += 1
+
+def ai_client_stats():
+    with _AI_CLIENT_LOCK:
+        data = dict(_AI_CLIENT_STATS)
+        data['cached_clients'] = len(_AI_CLIENT_CACHE)
+    return data
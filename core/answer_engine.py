@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/answer_engine.py
+功能說明 (Description): 答案比對引擎 (Answer Engine)，將 LaTeX / ASCII 答案一次解析為精確的 Fraction、有序組 (tuple) 或集合，
+                       取代技能 check() 內以 str.replace / re.sub 串接後 eval 成 float 的比對方式。
+                       正確答案的解析結果會快取 (同一題只解析一次)，並支援批次批改。
+執行語法 (Usage): 由系統調用 (from core.answer_engine import grade_answer, grade_batch)
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import math
+import re
+import unicodedata
+from fractions import Fraction
+from functools import lru_cache
+
+# 次方的指數上限 (避免 2^99999 之類的輸入耗盡 CPU)
+MAX_EXPONENT = 64
+# 單次次方結果的位元數上限：巢狀次方 ((2^64)^64)^64 每層指數都在上限內，結果仍會指數成長
+MAX_POWER_BITS = 4096
+
+# 一次完成的前處理：移除 $ 與排版指令、統一運算子
+_REPLACEMENTS = [
+    (re.compile(r'\\left|\\right|\\[,;! ]|\\displaystyle'), ''),
+    (re.compile(r'\\times|\\cdot|×|·'), '*'),
+    (re.compile(r'\\div|÷'), '/'),
+    (re.compile(r'[−–]'), '-'),
+    (re.compile(r'\\\{'), '{'),
+    (re.compile(r'\\\}'), '}'),
+]
+_TOKEN_RE = re.compile(r'\s*(?:(\d+\.\d*|\.\d+|\d+)|(\\[dt]?frac)|([-+*/^(){}\[\],]))')
+
+
+class _ParseError(ValueError):
+    pass
+
+
+def _normalize_text(text):
+    """比對字串時使用的正規化 (與舊版 check 相同：去除空白)"""
+    return str(text).strip().replace(" ", "")
+
+
+def _preprocess(text):
+    s = unicodedata.normalize('NFKC', str(text)).replace('$', '').strip()
+    for pattern, repl in _REPLACEMENTS:
+        s = pattern.sub(repl, s)
+    return s
+
+
+def _tokenize(s):
+    tokens = []
+    pos = 0
+    s = s.rstrip()
+    while pos < len(s):
+        m = _TOKEN_RE.match(s, pos)
+        if not m:
+            raise _ParseError(s[pos:])
+        num, frac, op = m.groups()
+        if num is not None:
+            tokens.append(('num', num))
+        elif frac is not None:
+            tokens.append(('frac', frac))
+        else:
+            tokens.append(('op', op))
+        pos = m.end()
+    return tokens
+
+
+class _Parser:
+    """
+    遞迴下降解析器 (全程使用 Fraction，不經過 float / eval)
+        expr   := term (('+' | '-') term)*
+        term   := unary (('*' | '/') unary | 隱含乘法 '(')*
+        unary  := ('+' | '-') unary | power
+        power  := atom ('^' unary)?
+        atom   := NUM [\\frac{..}{..} 視為帶分數] | \\frac{expr}{expr} | '(' expr ')'
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+        self.inexact = False  # 是否含小數 (與舊版 check 相容的容差比對)
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        tok = self.peek()
+        if tok[0] is None or (value is not None and tok[1] != value):
+            raise _ParseError(f"預期 {value}")
+        self.pos += 1
+        return tok
+
+    def expr(self):
+        value = self.term()
+        while self.peek() in (('op', '+'), ('op', '-')):
+            op = self.take()[1]
+            rhs = self.term()
+            value = value + rhs if op == '+' else value - rhs
+        return value
+
+    def term(self):
+        value = self.unary()
+        while True:
+            tok = self.peek()
+            if tok in (('op', '*'), ('op', '/')):
+                self.take()
+                rhs = self.unary()
+                if tok[1] == '*':
+                    value *= rhs
+                else:
+                    if rhs == 0:
+                        raise _ParseError("除以 0")
+                    value /= rhs
+            elif tok == ('op', '('):
+                # 隱含乘法：3(1/2) -> 3 * (1/2) (與 V47.3 的 check 行為一致)
+                value *= self.unary()
+            else:
+                return value
+
+    def unary(self):
+        tok = self.peek()
+        if tok in (('op', '+'), ('op', '-')):
+            self.take()
+            value = self.unary()
+            return -value if tok[1] == '-' else value
+        return self.power()
+
+    def power(self):
+        base = self.atom()
+        if self.peek() == ('op', '^'):
+            self.take()
+            exp = self.unary()
+            if exp.denominator != 1 or abs(exp) > MAX_EXPONENT or (base == 0 and exp < 0):
+                raise _ParseError("不支援的指數")
+            if max(abs(base.numerator), base.denominator).bit_length() * abs(exp.numerator) > MAX_POWER_BITS:
+                raise _ParseError("次方結果過大")
+            base = base ** int(exp)
+        return base
+
+    def _braced(self):
+        self.take('{')
+        value = self.expr()
+        self.take('}')
+        return value
+
+    def _frac(self):
+        self.take()
+        num, den = self._braced(), self._braced()
+        if den == 0:
+            raise _ParseError("分母為 0")
+        return num / den
+
+    def atom(self):
+        kind, text = self.peek()
+        if kind == 'num':
+            self.take()
+            if '.' in text:
+                self.inexact = True
+            value = Fraction(text)
+            # 帶分數：3\frac{1}{2} = 3 + 1/2 (to_latex 的輸出格式)
+            if self.peek()[0] == 'frac' and value.denominator == 1:
+                return value + self._frac()
+            return value
+        if kind == 'frac':
+            return self._frac()
+        if (kind, text) == ('op', '('):
+            self.take()
+            value = self.expr()
+            self.take(')')
+            return value
+        raise _ParseError(f"無法解析: {text}")
+
+
+def _split_top_level(tokens):
+    """依最外層的逗號切分 token 序列"""
+    parts, current, depth = [], [], 0
+    for tok in tokens:
+        if tok[0] == 'op' and tok[1] in '([{':
+            depth += 1
+        elif tok[0] == 'op' and tok[1] in ')]}':
+            depth -= 1
+        if depth == 0 and tok == ('op', ','):
+            parts.append(current)
+            current = []
+        else:
+            current.append(tok)
+    parts.append(current)
+    return parts
+
+
+def _parse_number(tokens):
+    parser = _Parser(tokens)
+    value = parser.expr()
+    if parser.pos != len(tokens):
+        raise _ParseError("多餘的字元")
+    return value, parser.inexact
+
+
+def parse_answer(text):
+    """
+    將答案解析為可精確比較的表示：
+        ('num', Fraction, inexact)   數值 (整數、小數、分數、帶分數、四則運算式)
+        ('tuple', (Fraction, ...))   有序組，例如 (1, -2) 或 1, 2
+        ('set', frozenset)           集合，例如 \\{1, 2\\}
+        ('text', 正規化字串)          無法解析為數學值時，退回字串比對
+    """
+    if text is None:
+        return ('text', '')
+    try:
+        tokens = _tokenize(_preprocess(text))
+        if not tokens:
+            raise _ParseError("空白答案")
+        first, last = tokens[0], tokens[-1]
+        if first == ('op', '{') and last == ('op', '}'):
+            items = _split_top_level(tokens[1:-1])
+            return ('set', frozenset(_parse_number(item)[0] for item in items))
+        parts = _split_top_level(tokens)
+        if len(parts) == 1 and first == ('op', '(') and last == ('op', ')'):
+            inner = _split_top_level(tokens[1:-1])
+            if len(inner) > 1:
+                parts = inner
+        if len(parts) > 1:
+            return ('tuple', tuple(_parse_number(item)[0] for item in parts))
+        value, inexact = _parse_number(tokens)
+        return ('num', value, inexact)
+    except (_ParseError, ZeroDivisionError, ValueError, OverflowError):
+        return ('text', _normalize_text(text))
+
+
+# 正確答案每題只解析一次 (同一題的正確答案字串相同)
+parse_correct_answer = lru_cache(maxsize=4096)(parse_answer)
+
+
+def answers_match(user, correct):
+    """比較兩個 parse_answer 的結果"""
+    if user[0] == 'num' and correct[0] == 'num':
+        if user[1] == correct[1]:
+            return True
+        # 小數答案保留舊版 check 的相對容差 (例如 0.3333333 與 1/3)
+        if user[2] or correct[2]:
+            return math.isclose(float(user[1]), float(correct[1]), rel_tol=1e-7)
+        return False
+    return user[0] == correct[0] and user[1] == correct[1]
+
+
+def grade_answer(user_answer, correct_answer):
+    """批改單題，回傳與技能 check() 相同格式的 {'correct', 'result'}"""
+    if not user_answer:
+        return {"correct": False, "result": "未作答"}
+    correct = parse_correct_answer(str(correct_answer))
+    if answers_match(parse_answer(user_answer), correct) or \
+            _normalize_text(user_answer) == _normalize_text(correct_answer):
+        return {"correct": True, "result": "正確"}
+    return {"correct": False, "result": f"正確答案: {correct_answer}"}
+
+
+def grade_batch(pairs):
+    """批次批改 [(user_answer, correct_answer), ...]，回傳同順序的結果 list"""
+    return [grade_answer(user, correct) for user, correct in pairs]
+
+
+def uses_standard_check(module):
+    """技能的 check() 是否為共用工具庫的標準版本 (自訂批改邏輯的技能仍使用自己的 check)"""
+    from core import skill_runtime
+
+    check = getattr(module, 'check', None)
+    code = getattr(check, '__code__', None)
+    standard = skill_runtime.check.__code__
+    return code is not None and code.co_code == standard.co_code and code.co_consts == standard.co_consts
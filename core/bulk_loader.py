@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/bulk_loader.py
+功能說明 (Description): 批次寫入引擎 (Bulk Loader)，取代逐列查詢 + session.merge() 的匯入方式：
+                       每個資料表以一次查詢預先載入既有鍵，於記憶體中區分新增與更新，
+                       再以 executemany 分批寫入；所有寫入共用呼叫端的交易，並統計每秒寫入筆數。
+執行語法 (Usage): 由系統調用 (loader = BulkLoader(); loader.upsert(Model.__table__, rows); db.session.commit())
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import time
+
+from sqlalchemy import UniqueConstraint, and_, bindparam, select
+
+from models import db
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def _coerce(column, value):
+    """將鍵值轉為欄位的 Python 型別 (例如 Excel 讀入的 10.0 -> 10、數字 -> 字串)，讓鍵比對與資料庫一致"""
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if isinstance(value, python_type):
+        return value
+    if isinstance(value, float) and value.is_integer() and python_type in (int, str):
+        value = int(value)
+    try:
+        return python_type(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class BulkLoader:
+    """
+    批次寫入引擎
+    - existing_keys(): 每個 (資料表, 鍵欄位) 只查詢一次，之後的新增會同步加入集合。
+    - 每個資料表的耗時包含預先載入鍵值、分類與寫入 (stats() 的 rows_per_second)。
+    - insert(): 只新增鍵不存在的列 (同一批次內重複的鍵只新增第一筆)。
+    - upsert(): 鍵存在則更新該列提供的欄位、不存在則新增 (同一批次內重複的鍵後者覆蓋前者，與逐列 merge 相同)。
+      未指定 key_columns 時：有主鍵值的列以主鍵比對，沒有主鍵值的列以資料表的唯一約束比對，都沒有則直接新增。
+    - 所有寫入使用 db.session.connection()，由呼叫端 commit / rollback (單一交易)。
+    """
+
+    def __init__(self, connection=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.connection = connection if connection is not None else db.session.connection()
+        self.chunk_size = chunk_size
+        self._keys = {}
+        self._stats = {}
+        self._started = time.perf_counter()
+
+    def _table_stats(self, table):
+        return self._stats.setdefault(table.name, {'inserted': 0, 'updated': 0, 'unchanged': 0, 'seconds': 0.0})
+
+    def _key(self, table, key_columns, row):
+        return tuple(_coerce(table.c[c], row.get(c)) for c in key_columns)
+
+    def existing_keys(self, table, key_columns):
+        cache_key = (table.name, tuple(key_columns))
+        keys = self._keys.get(cache_key)
+        if keys is None:
+            keys = self._keys[cache_key] = {
+                tuple(row) for row in self.connection.execute(select(*[table.c[c] for c in key_columns]))
+            }
+        return keys
+
+    def _executemany(self, stmt, rows):
+        """依欄位組合分組 (executemany 需要每列欄位相同)，每 chunk_size 筆執行一次"""
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+        for group in groups.values():
+            for start in range(0, len(group), self.chunk_size):
+                self.connection.execute(stmt, group[start:start + self.chunk_size])
+
+    def insert(self, table, rows, key_columns):
+        """新增鍵不存在的列，回傳實際新增筆數"""
+        started = time.perf_counter()
+        existing = self.existing_keys(table, key_columns)
+        pending = []
+        for row in rows:
+            key = self._key(table, key_columns, row)
+            if key in existing:
+                self._table_stats(table)['unchanged'] += 1
+                continue
+            existing.add(key)
+            pending.append(row)
+        self._executemany(table.insert(), pending)
+        stats = self._table_stats(table)
+        stats['inserted'] += len(pending)
+        stats['seconds'] += time.perf_counter() - started
+        return len(pending)
+
+    def _natural_key(self, table):
+        for constraint in table.constraints:
+            if isinstance(constraint, UniqueConstraint):
+                return [c.name for c in constraint.columns]
+        return None
+
+    @staticmethod
+    def _key_clause(column):
+        param = bindparam(f'k_{column.name}')
+        return column.is_not_distinct_from(param) if column.nullable else column == param
+
+    def upsert(self, table, rows, key_columns=None):
+        """新增或更新，回傳 (新增筆數, 更新筆數)"""
+        started = time.perf_counter()
+        pk_columns = [c.name for c in table.primary_key.columns]
+        natural_key = self._natural_key(table)
+        inserts, updates = {}, {}
+        plain_inserts = []
+        for row in rows:
+            columns = key_columns
+            if columns is None:
+                if all(row.get(c) is not None for c in pk_columns):
+                    columns = pk_columns
+                elif natural_key and all(c in row for c in natural_key):
+                    columns = natural_key
+                    row = {k: v for k, v in row.items() if k not in pk_columns or v is not None}
+                else:
+                    plain_inserts.append({k: v for k, v in row.items() if k not in pk_columns or v is not None})
+                    continue
+            key = (tuple(columns), self._key(table, columns, row))
+            if key in inserts:
+                inserts[key].update(row)
+            elif key[1] in self.existing_keys(table, columns):
+                updates.setdefault(key, {}).update(row)
+            else:
+                inserts[key] = dict(row)
+
+        for (columns, key_values), row in inserts.items():
+            self.existing_keys(table, list(columns)).add(key_values)
+        self._executemany(table.insert(), list(inserts.values()) + plain_inserts)
+
+        # UPDATE ... WHERE 鍵欄位 = :k_<col>，依 (鍵欄位, 更新欄位) 分組後 executemany。
+        # 鍵值綁定比對時用的轉型後數值 (Excel 的 101.0 -> '101')；可為 NULL 的鍵欄位以 IS NOT DISTINCT FROM 比對，
+        # 與記憶體中 None == None 的分類結果一致
+        groups = {}
+        for (columns, key_values), row in updates.items():
+            values = tuple(sorted(c for c in row if c not in columns))
+            if values:
+                groups.setdefault((columns, values), []).append((key_values, row))
+        for (columns, values), group in groups.items():
+            stmt = (table.update()
+                    .where(and_(*[self._key_clause(table.c[c]) for c in columns]))
+                    .values({c: bindparam(f'v_{c}') for c in values}))
+            params = [{**{f'k_{c}': key for c, key in zip(columns, key_values)}, **{f'v_{c}': row[c] for c in values}}
+                      for key_values, row in group]
+            for start in range(0, len(params), self.chunk_size):
+                self.connection.execute(stmt, params[start:start + self.chunk_size])
+
+        stats = self._table_stats(table)
+        inserted = len(inserts) + len(plain_inserts)
+        stats['inserted'] += inserted
+        stats['updated'] += len(updates)
+        stats['seconds'] += time.perf_counter() - started
+        return inserted, len(updates)
+
+    def stats(self):
+        """{table: {inserted, updated, unchanged, seconds, rows_per_second}} 與總計"""
+        tables = {}
+        for name, s in self._stats.items():
+            rows = s['inserted'] + s['updated']
+            tables[name] = dict(s, seconds=round(s['seconds'], 4),
+                                rows_per_second=round(rows / s['seconds'], 1) if s['seconds'] else None)
+        elapsed = time.perf_counter() - self._started
+        total = sum(s['inserted'] + s['updated'] for s in self._stats.values())
+        return {
+            'tables': tables,
+            'rows': total,
+            'seconds': round(elapsed, 4),
+            'rows_per_second': round(total / elapsed, 1) if elapsed else None,
+        }
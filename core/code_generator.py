@@ -39,17 +39,20 @@ import ast
 import random
 import textwrap
 import sqlite3
+import threading
 import psutil
 import math
 import operator
 from fractions import Fraction
 import datetime as _pydt
+from contextlib import contextmanager
 from flask import current_app
 from pyflakes.api import check as pyflakes_check
 from pyflakes.reporter import Reporter
 
 # Local Imports
 from core.ai_wrapper import get_ai_client
+from core.generation_scheduler import release_provider_slot
 from models import db, SkillGenCodePrompt
 from config import Config
 
@@ -166,377 +169,9 @@ COMPILED_PATTERNS = {
 # ==============================================================================
 # 3. 完美工具庫 (Perfect Utils - Standard Edition)
 # ==============================================================================
-PERFECT_UTILS = r'''
-import random
-import math
-from fractions import Fraction
-import re
-import ast
-import operator
-
-# [Research Standard Utils]
-
-def safe_choice(seq):
-    """
-    [Auto-Injected] 安全的 random.choice，避免空序列崩潰
-    """
-    if not seq: return 1
-    return random.choice(seq)
-
-def to_latex(num):
-    """
-    將數字轉換為 LaTeX 格式 (支援分數、整數、小數)
-    [V46.2 Fix]: 強制限制分數的複雜度 (分母 <= 100)，避免出現百萬級大數。
-    """
-    if isinstance(num, int): return str(num)
-    if isinstance(num, float): num = Fraction(str(num)).limit_denominator(100)
-    
-    if isinstance(num, Fraction):
-        # [Critical Fix] 強制整形：如果分母太大，強制找最接近的簡單分數
-        # 這能把 1060591/273522 自動變成合理的 K12 數字 (如 3 7/8)
-        if num.denominator > 100:
-            num = num.limit_denominator(100)
-
-        if num == 0: return "0"
-        if num.denominator == 1: return str(num.numerator)
-        
-        # 統一處理正負號
-        is_neg = num < 0
-        sign_str = "-" if is_neg else ""
-        abs_num = abs(num)
-        
-        # 帶分數處理 (Mixed Number)
-        if abs_num.numerator > abs_num.denominator:
-            whole = abs_num.numerator // abs_num.denominator
-            rem_num = abs_num.numerator % abs_num.denominator
-            if rem_num == 0: 
-                return f"{sign_str}{whole}"
-            # ✅ 修正: 整數部分不加大括號 (V46.5)
-            return f"{sign_str}{whole}\\frac{{{rem_num}}}{{{abs_num.denominator}}}"
-            
-        # 真分數處理 (Proper Fraction)
-        return f"{sign_str}\\frac{{{abs_num.numerator}}}{{{abs_num.denominator}}}"
-        
-    return str(num)
-
-def fmt_num(num, signed=False, op=False):
-    """
-    格式化數字 (標準樣板要求)：
-    - 自動括號：負數會自動被包在括號內 (-5) 或 (-\frac{1}{2})
-    - signed=True: 強制顯示正負號 (+3, -5)
-    """
-    # 1. 取得基礎 LaTeX 字串
-    latex_val = to_latex(num)
-    
-    # 2. 判斷是否為 0
-    if num == 0 and not signed and not op: return "0"
-    
-    # 3. 判斷正負 (依賴數值本身)
-    is_neg = (num < 0)
-    
-    # 為了處理 op=True 或 signed=True，我們需要絕對值的字串
-    if is_neg:
-        # 移除開頭的負號以取得絕對值內容
-        # 注意: to_latex 可能回傳 "-{1}\frac..." 或 "-\frac..."
-        if latex_val.startswith("-"):
-            abs_latex_val = latex_val[1:] 
-        else:
-            abs_latex_val = latex_val # Should not happen but safe fallback
-    else:
-        abs_latex_val = latex_val
-
-    # 4. 組裝回傳值
-    if op: 
-        return f" - {abs_latex_val}" if is_neg else f" + {abs_latex_val}"
-    
-    if signed: 
-        return f"-{abs_latex_val}" if is_neg else f"+{abs_latex_val}"
-    
-    if is_neg: 
-        return f"({latex_val})"
-        
-    return latex_val
-
-# [AST Healer Inject] 安全運算核心
-def safe_eval(expr_str):
-    """
-    [AST Healer 專用] 安全的數學表達式解析器
-    [V46.4 Fix]: Python 3.12+ 兼容性修復，移除 ast.Num 依賴。
-    """
-    # 允許的運算子白名單
-    ops = {
-        ast.Add: operator.add,
-        ast.Sub: operator.sub,
-        ast.Mult: operator.mul,
-        ast.Div: operator.truediv, 
-        ast.USub: operator.neg,
-        ast.UAdd: operator.pos,
-    }
-
-    def _eval(node):
-        # [Python 3.12+ Fix] ast.Num 已被移除，使用 ast.Constant
-        if isinstance(node, ast.Constant):
-            return node.value
-        # [Legacy] 保留 ast.Num 以支持舊版 Python (< 3.8)
-        elif hasattr(ast, 'Num') and isinstance(node, ast.Num):
-            return node.n
-        elif isinstance(node, ast.BinOp):
-            left = _eval(node.left)
-            right = _eval(node.right)
-            # 關鍵：遇到除法，自動轉 Fraction
-            if isinstance(node.op, ast.Div):
-                return Fraction(left, right)
-            return ops[type(node.op)](left, right)
-        elif isinstance(node, ast.UnaryOp):
-            return ops[type(node.op)](_eval(node.operand))
-        elif isinstance(node, ast.Call):
-            if isinstance(node.func, ast.Name) and node.func.id == 'Fraction':
-                args = [_eval(a) for a in node.args]
-                return Fraction(*args)
-        raise TypeError(f"Unsupported type: {node}")
-
-    try:
-        # 預處理：將 LaTeX 運算符轉回 Python
-        clean_expr = str(expr_str).replace('\\times', '*').replace('\\div', '/')
-        # 解析並計算
-        result = _eval(ast.parse(clean_expr, mode='eval').body)
-        
-        # [Clamp] 強制整形：運算結果如果是複雜分數，直接化簡
-        if isinstance(result, Fraction):
-            if result.denominator > 100 or abs(result.numerator) > 10000:
-                result = result.limit_denominator(100)
-                
-        return result
-    except Exception as e:
-        return 0
-
-# [數論工具箱]
-def is_prime(n):
-    if n <= 1: return False
-    if n <= 3: return True
-    if n % 2 == 0 or n % 3 == 0: return False
-    i = 5
-    while i * i <= n:
-        if n % i == 0 or n % (i + 2) == 0: return False
-        i += 6
-    return True
-
-def gcd(a, b): return math.gcd(int(a), int(b))
-def lcm(a, b): return abs(int(a) * int(b)) // math.gcd(int(a), int(b))
-
-def get_factors(n):
-    n = abs(n)
-    factors = set()
-    for i in range(1, int(math.isqrt(n)) + 1):
-        if n % i == 0:
-            factors.add(i)
-            factors.add(n // i)
-    return sorted(list(factors))
-
-def clean_latex_output(q_str):
-    """
-    [V9.2.6 Fix] LaTeX 格式清洗器 - 智能分离中文与数学式
-    问题：中文字不能放在 LaTeX 数学模式 $...$ 内
-    解决：只包裹数学表达式，中文文字保留在外面
-    """
-    if not isinstance(q_str, str): return str(q_str)
-    clean_q = q_str.replace('$', '').strip()
-    import re
-    
-    # 1. 修复运算符：* -> \times, / -> \div
-    clean_q = re.sub(r'(?<![\\a-zA-Z])\s*\*\s*', r' \\times ', clean_q)
-    clean_q = re.sub(r'(?<![\\a-zA-Z])\s*/\s*(?![{}])', r' \\div ', clean_q)
-    
-    # 2. 修复双重括号 ((...)) -> (...)
-    clean_q = re.sub(r'\(\(([^()]+)\)\)', r'(\1)', clean_q)
-    
-    # 3. 移除多余空白
-    clean_q = re.sub(r'\s+', ' ', clean_q).strip()
-    
-    # 4. [V9.2.6 NEW] 智能分离中文与数学式
-    # 检测是否包含中文字符
-    has_chinese = bool(re.search(r'[\u4e00-\u9fff]', clean_q))
-    
-    if has_chinese:
-        # 策略：将字符串分割为"中文部分"和"数学部分"
-        # 数学部分：包含数字、运算符、括号、LaTeX 命令的连续区域
-        # 中文部分：中文字、标点符号
-        
-        # Pattern: 匹配数学表达式（数字、运算符、括号、LaTeX 命令、单字母变量）
-        # 改进：更精确地匹配整个数学表达式块
-        math_pattern = r'(?:[\d\-+*/()（）\[\]【】\\]|\\[a-z]+(?:\{[^}]*\})?|[a-zA-Z])+(?:\s+(?:[\d\-+*/()（）\[\]【】\\]|\\[a-z]+(?:\{[^}]*\})?|[a-zA-Z])+)*'
-        
-        parts = []
-        last_end = 0
-        
-        for match in re.finditer(math_pattern, clean_q):
-            start, end = match.span()
-            
-            # 添加之前的文本（中文部分）
-            if start > last_end:
-                text_part = clean_q[last_end:start].strip()
-                if text_part:
-                    parts.append(text_part)
-            
-            # 添加数学部分（需要包裹 $）
-            math_part = match.group().strip()
-            if math_part:
-                parts.append(f'${math_part}$')
-            
-            last_end = end
-        
-        # 添加剩余的文本
-        if last_end < len(clean_q):
-            text_part = clean_q[last_end:].strip()
-            if text_part:
-                parts.append(text_part)
-        
-        # 合并并清理多余空格
-        result = ' '.join(parts)
-        result = re.sub(r'\s+', ' ', result).strip()
-        
-        # 清理连续的 $ 符号：$...$ $...$ -> $... ...$
-        result = re.sub(r'\$\s+\$', ' ', result)
-        
-        return result
-    else:
-        # 没有中文：直接包裹整个表达式
-        return f"${clean_q}$"
-
-
-def check(user_answer, correct_answer):
-    """
-    [V45.7 Smart Validator]
-    """
-    if not user_answer: return {"correct": False, "result": "未作答"}
-    
-    def parse_value(val_str):
-        s = str(val_str).strip().replace(" ", "").replace("$", "").replace("\\", "")
-        s = s.replace("times", "*").replace("div", "/")
-        try:
-            s = re.sub(r'frac\{(\d+)\}\{(\d+)\}', r'(\1/\2)', s)
-            s = re.sub(r'(?<=\d)\(', r'*(', s)  # NEW [V47.3]: 將 "3(1/2)" 轉為 "3*(1/2)" 避免 eval 視為函式呼叫
-            return float(eval(s))
-        except:
-            return None
-
-    val_u = parse_value(user_answer)
-    val_c = parse_value(correct_answer)
-
-    if val_u is not None and val_c is not None:
-        if math.isclose(val_u, val_c, rel_tol=1e-7):
-            return {"correct": True, "result": "正確"}
-    
-    u_clean = str(user_answer).strip().replace(" ", "")
-    c_clean = str(correct_answer).strip().replace(" ", "")
-    if u_clean == c_clean:
-        return {"correct": True, "result": "正確"}
-
-    return {"correct": False, "result": f"正確答案: {correct_answer}"}
-
-# [V47.4 跨領域工具組]
-
-def clamp_fraction(fr, max_den=1000, max_num=100000):
-    """防止分數爆炸：限制分子分母"""
-    if not isinstance(fr, Fraction):
-        fr = Fraction(fr)
-    if abs(fr.numerator) > max_num or fr.denominator > max_den:
-        fr = fr.limit_denominator(max_den)
-    return fr
-
-def safe_pow(base, exp, max_abs_exp=10):
-    """安全指數運算，避免溢出"""
-    if abs(exp) > max_abs_exp:
-        return Fraction(0)  # 或其他安全默認
-    try:
-        if isinstance(base, Fraction) and exp >= 0:
-            return Fraction(base.numerator ** exp, base.denominator ** exp)
-        elif isinstance(base, Fraction) and exp < 0:
-            return Fraction(base.denominator ** (-exp), base.numerator ** (-exp))
-        else:
-            return Fraction(int(base ** exp), 1)
-    except:
-        return Fraction(0)
-
-def factorial_bounded(n, max_n=1000):
-    """有界階乘"""
-    if not (0 <= n <= max_n):
-        return None
-    result = 1
-    for i in range(2, int(n) + 1):
-        result *= i
-    return result
-
-def nCr(n, r, max_n=5000):
-    """組合數 C(n,r)"""
-    n, r = int(n), int(r)
-    if not (0 <= r <= n <= max_n):
-        return None
-    if r > n - r:
-        r = n - r
-    result = 1
-    for i in range(r):
-        result = result * (n - i) // (i + 1)
-    return result
-
-def nPr(n, r, max_n=5000):
-    """排列數 P(n,r)"""
-    n, r = int(n), int(r)
-    if not (0 <= r <= n <= max_n):
-        return None
-    result = 1
-    for i in range(n, n - r, -1):
-        result *= i
-    return result
-
-def rational_gauss_solve(a, b, p, c, d, q):
-    """2x2 線性系統求解器 (用 Fraction)
-    a*x + b*y = p
-    c*x + d*y = q
-    返回 {'x': Fraction, 'y': Fraction} 或 None
-    """
-    a, b, p, c, d, q = [Fraction(x) for x in [a, b, p, c, d, q]]
-    det = a * d - b * c
-    if det == 0:
-        return None  # 無解或無窮解
-    x = (p * d - b * q) / det
-    y = (a * q - p * c) / det
-    return {'x': x, 'y': y}
-
-def normalize_angle(theta, unit='deg'):
-    """角度正規化到 [0, 360) 或 [0, 2π)"""
-    theta = float(theta)
-    if unit == 'deg':
-        theta = theta % 360
-        if theta < 0:
-            theta += 360
-        return theta
-    else:  # rad
-        theta = theta % (2 * math.pi)
-        if theta < 0:
-            theta += 2 * math.pi
-        return theta
-
-def fmt_set(iterable, braces='{}'):
-    """集合顯示：元素使用 fmt_num（不含外層 $）"""
-    items = [fmt_num(x) for x in iterable]
-    inner = ", ".join(items)
-    return ("\\{" + inner + "\\}") if braces == '\\{\\}' else ("{" + inner + "}")
-
-def fmt_interval(a, b, left_open=False, right_open=False):
-    """區間顯示：(a,b)、[a,b)、(a,b]、[a,b]；端點使用 fmt_num"""
-    l = "(" if left_open else "["
-    r = ")" if right_open else "]"
-    return f"{l}{fmt_num(a)}, {fmt_num(b)}{r}"
-
-def fmt_vec(*coords):
-    """向量顯示：分量使用 fmt_num（不含外層 $）"""
-    inner = ", ".join(fmt_num(x) for x in coords)
-    return "\\langle " + inner + " \\rangle"
-
-# ✅ 預設的 LaTeX 運算子映射（四則）- 全域可用
-op_latex = {'+': '+', '-': '-', '*': '\\times', '/': '\\div'}
-'''
+# [效能] 工具庫原始碼移至 core/skill_runtime.py：技能檔改為 import 共用的執行期模組，
+#        驗證與沙箱仍以 CALCULATION_SKELETON 內嵌同一份原始碼執行
+from core.skill_runtime import PERFECT_UTILS, SKILL_RUNTIME_VERSION, SKILL_RUNTIME_PRELUDE, overridden_runtime_names
 
 # ==============================================================================
 # 3. 骨架與 Prompt 定義
@@ -1871,6 +1506,17 @@ def fix_code_via_ast(code_str):
         return code_str, 0
 
 def validate_python_code(code_str):
+    # [效能] 預設於沙箱行程執行，失控的生成程式碼 (無窮迴圈、巨大 Fraction) 只會終止該行程
+    if getattr(Config, 'SANDBOX_ENABLED', False):
+        from core.sandbox_pool import SANDBOX_POOL
+        result = SANDBOX_POOL.run(code_str)
+        if result['ok']:
+            return True, "Success"
+        error_msg = f"{result['error_class']}: {result['error_msg']}"
+        if "break outside loop" not in error_msg:
+            print(f"❌ [Validation Failed] 執行時錯誤: {error_msg}")
+        return False, error_msg
+
     try:
         # [V46.1 Fix] 修正 Host 端 NameError
         # 我們不需要手動傳入 safe_eval，因為 code_str (生成的代碼)
@@ -1903,12 +1549,7 @@ def validate_python_code(code_str):
              
         return False, error_msg
 
-def log_experiment(skill_id, start_time, prompt_len, code_len, is_valid, error_msg, repaired, model_name, actual_provider=None, **kwargs):
-    """實驗數據記錄"""
-    duration = time.time() - start_time
-    conn = sqlite3.connect(Config.db_path)
-    c = conn.cursor()
-    query = """
+_EXPERIMENT_LOG_SQL = """
     INSERT INTO experiment_log (
         skill_id, start_time, duration_seconds, prompt_len, code_len, 
         is_success, error_msg, repaired, model_name, 
@@ -1917,9 +1558,45 @@ def log_experiment(skill_id, start_time, prompt_len, code_len, is_valid, error_m
         is_executable, ablation_id, missing_imports_fixed, resource_cleanup_flag,
         prompt_tokens, completion_tokens, total_tokens,
         experiment_group, garbage_cleaner_count, eval_eliminator_count,
-        sampling_success_count, sampling_total_count, spec_prompt_id, use_master_spec
-    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        sampling_success_count, sampling_total_count, spec_prompt_id, use_master_spec,
+        ttft_seconds, tokens_per_second
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# [批次生成] 執行緒區域的實驗紀錄暫存區 (由 capture_experiment_logs 啟用)
+_EXPERIMENT_LOG_SINK = threading.local()
+
+@contextmanager
+def capture_experiment_logs():
+    """
+    在目前執行緒內攔截 log_experiment 的寫入，改為收集到 list 中。
+    供並行批次生成使用：各技能完成後由排程器依輸入順序呼叫 write_experiment_logs 寫入，
+    讓 experiment_log 的紀錄順序不受完成先後影響。
     """
+    rows = []
+    previous = getattr(_EXPERIMENT_LOG_SINK, 'rows', None)
+    _EXPERIMENT_LOG_SINK.rows = rows
+    try:
+        yield rows
+    finally:
+        _EXPERIMENT_LOG_SINK.rows = previous
+
+def write_experiment_logs(rows):
+    """將實驗紀錄以單一交易寫入 experiment_log"""
+    if not rows:
+        return
+    conn = sqlite3.connect(Config.db_path)
+    try:
+        conn.executemany(_EXPERIMENT_LOG_SQL, rows)
+        conn.commit()
+    except Exception as e:
+        print(f"❌ Database Log Error: {e}")
+    finally:
+        conn.close()
+
+def log_experiment(skill_id, start_time, prompt_len, code_len, is_valid, error_msg, repaired, model_name, actual_provider=None, **kwargs):
+    """實驗數據記錄"""
+    duration = time.time() - start_time
     params = (
         skill_id, start_time, duration, prompt_len, code_len,
         1 if is_valid else 0, str(error_msg), 1 if repaired else 0, model_name,
@@ -1945,15 +1622,737 @@ def log_experiment(skill_id, start_time, prompt_len, code_len, is_valid, error_m
         kwargs.get('sampling_success_count', 0),
         kwargs.get('sampling_total_count', 0),
         kwargs.get('spec_prompt_id', None),
-        1 if kwargs.get('use_master_spec') else 0
+        1 if kwargs.get('use_master_spec') else 0,
+        # [串流效能] Local AI 首 token 延遲與生成速度 (雲端模型為 None)
+        kwargs.get('ttft_seconds', None),
+        kwargs.get('tokens_per_second', None)
     )
+    sink = getattr(_EXPERIMENT_LOG_SINK, 'rows', None)
+    if sink is not None:
+        sink.append(params)
+        return
+    write_experiment_logs([params])
+
+# ==============================================================================
+# 4.5 Healer 流水線 (可獨立呼叫，供離線重播 benchmark 使用)
+# ==============================================================================
+class _StageRecorder:
+    """記錄 Healer 各階段耗時與修復數 (stage_metrics 為 None 時不記錄)"""
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self._last = time.perf_counter()
+        self._last_fixes = 0
+
+    def mark(self, name, total_fixes):
+        now = time.perf_counter()
+        if self.metrics is not None:
+            self.metrics[name] = {'seconds': now - self._last, 'fixes': total_fixes - self._last_fixes}
+        self._last = now
+        self._last_fixes = total_fixes
+
+def heal_raw_output(raw_output, skill_id, use_regex_healer=True, use_ast_healer=True, ablation_id=3, stage_metrics=None):
+    """
+    將 LLM 原始輸出送入完整 Healer 流水線：
+    Markdown 擷取 -> 基礎清理 -> refine_ai_code -> Regex 修補 -> fix_code_syntax
+    -> 通用修補 -> fix_code_via_ast -> 組合 CALCULATION_SKELETON -> validate_python_code。
+    不呼叫任何模型、不寫檔、不寫資料庫，可直接對已錄製的 raw output 重播。
+    stage_metrics: 傳入 dict 時，寫入各階段 {'seconds', 'fixes'}。
+    回傳 dict：clean_code / final_code / is_valid / error_msg / regex_fixes / ast_fixes /
+              garbage_cleaner_count / eval_eliminator_count / removed_list / healing_duration
+    """
+    stages = _StageRecorder(stage_metrics)
+
+    # 5. 清洗與組裝 (Strict Pipeline Order)
+    regex_fixes = 0
+    ast_fixes = 0
+
+    # [Research Fix] 基礎清理也是 Healer 的一部分
+    # Ab1/Ab2: 完全不做清理，Ab3: 執行完整 Healer（基礎清理 + Regex + AST）
+    if use_regex_healer:
+        # Step A: 移除 Markdown - 提取代碼塊內容
+        match = COMPILED_PATTERNS['markdown_blocks'].search(raw_output)
+        if match:
+            # 提取第一個代碼塊的內容
+            clean_code = match.group(1).strip()
+            regex_fixes += 1
+        else:
+            # 沒有 Markdown 塊，直接使用原始輸出
+            clean_code = raw_output.strip()
+
+        # Step B: 清洗特殊空格 (MUST DO BEFORE IMPORT CLEANING)
+        # [旺宏科學獎] Garbage Cleaner 獨立計數
+        garbage_cleaner_count = 0
+        original_len = len(clean_code)
+        clean_code = clean_code.replace('\xa0', ' ').replace('　', ' ').strip()
+        if len(clean_code) != original_len:
+            garbage_cleaner_count = 1
+            regex_fixes += 1
+
+        # Step C: 移除重複 Import (優化版)
+        clean_code, import_removed, removed_list = clean_redundant_imports(clean_code)
+        regex_fixes += import_removed
+
+        # Step D: 包裹函式與縮排修復
+        if "def generate" not in clean_code:
+            indent_str = '    '  # Standard 4 spaces
+            clean_code = "def generate(level=1, **kwargs):\n" + textwrap.indent(clean_code, indent_str)
+
+            if "return" not in clean_code:
+                clean_code += "\n    return {'question_text': q, 'correct_answer': a, 'answer': a, 'mode': 1}"
+            regex_fixes += 1
+    else:
+        # Ab1/Ab2: 不做任何清理，直接使用 LLM 原始輸出
+        clean_code = raw_output
+        garbage_cleaner_count = 0
+        removed_list = []
+        print(f"⏭️  [{skill_id}] 基礎清理 SKIPPED (ablation_id={ablation_id}, 無 Healer)")
+
+    stages.mark('basic_cleanup', regex_fixes + ast_fixes)
+
+    # Step E: [NEW] 主動邏輯修復 (Healer)
+    # [Research Fix] 僅在 use_regex_healer=True 時執行
+    if use_regex_healer:
+        clean_code, healer_fixes = refine_ai_code(clean_code)
+        regex_fixes += healer_fixes
+    else:
+        print(f"⏭️  [{skill_id}] Regex Healer SKIPPED (ablation_id={ablation_id})")
+
+    stages.mark('refine_ai_code', regex_fixes + ast_fixes)
+
+    # ========================================
+    # Step E.5: [OPTIMIZED V9.2.1] 統一函數移除器
+    # ========================================
+    # [Research Fix] 僅在 use_regex_healer=True 時執行
+    if use_regex_healer:
+        # 合併原本的三處函數清洗邏輯，避免重複掃描
+
+        # 建立完整的禁止函數清單
+        PROTECTED_TOOLS = [
+            'fmt_num', 'to_latex', 'is_prime', 'gcd', 'lcm', 'get_factors', 'check',
+            'clamp_fraction', 'safe_pow', 'factorial_bounded', 'nCr', 'nPr',
+            'rational_gauss_solve', 'normalize_angle',
+            'fmt_set', 'fmt_interval', 'fmt_vec',
+            'format_number_for_latex', 'format_num_latex', 'latex_format',
+            '_format_term_with_parentheses', 'clean_expression'
+        ]
+
+        # ✅ 一次性移除所有禁止的函數定義
+        if 'def generate' in clean_code:
+            gen_start = clean_code.find('def generate')
+            gen_content = clean_code[gen_start:]
+
+            gen_content, shadowing_fixes = remove_forbidden_functions_unified(
+                gen_content, 
+                PROTECTED_TOOLS
+            )
+
+            clean_code = clean_code[:gen_start] + gen_content
+            regex_fixes += shadowing_fixes
+
+    # ========================================
+    # Step E.6: [NEW] 混合數字串修復
+    # ========================================
+    # [Research Fix] 僅在 use_regex_healer=True 時執行
+    if use_regex_healer:
+        mixed_num_fixes = 0
+
+        # Pattern 1: 偵測並修復 f"{A}{fmt_num(frac)}" 模式
+        pattern1 = r'return\s+f"(\{[^}]+\})\{fmt_num\(([^)]+)\)\}"'
+        if re.search(pattern1, clean_code):
+            print(f"🔴 [{skill_id}] CRITICAL: 偵測到混合數字串拼接")
+            # 修復：改為回傳 Fraction 相加
+            clean_code = re.sub(
+                pattern1,
+                r'return Fraction(\1) + \2',
+                clean_code
+            )
+            mixed_num_fixes += 1
+
+        # Pattern 2: 偵測 eval(字串) 用於混合數
+        if re.search(r'elif isinstance\([^,]+, str\):\s+return eval\(', clean_code):
+            print(f"⚠️ [{skill_id}] 偵測到 eval(字串)，可能導致混合數錯誤")
+
+        # Pattern 3: 修復 _generate_mixed_number 的實作
+        mixed_num_pattern = r'(def _generate_mixed_number\(\):.*?)(return f".*?fmt_num.*?")'
+        if re.search(mixed_num_pattern, clean_code, re.DOTALL):
+            print(f"🔧 [{skill_id}] 修復 _generate_mixed_number")
+            clean_code = re.sub(
+                r'(def _generate_mixed_number\(\):.*?frac = [^\n]+\n\s+)return f".*?fmt_num.*?"',
+                r'\1return Fraction(A) + frac',
+                clean_code,
+                flags=re.DOTALL
+            )
+            mixed_num_fixes += 1
+
+        regex_fixes += mixed_num_fixes
+
+    # ========================================
+    # Step E.7: LaTeX 格式修復（混合數專用）
+    # ========================================
+    # [Research Fix] 僅在 use_regex_healer=True 時執行
+    if use_regex_healer:
+        latex_fixes = 0
+
+        # 修復 1：過多的大括號 {{{{num}}}} (使用預編譯 pattern)
+        clean_code, n = COMPILED_PATTERNS['excess_braces'].subn(r'{\1}', clean_code)
+        latex_fixes += n
+
+        # 修復 2：TO_LATEX 內部包含 $ 符號
+        if 'return f"$' in clean_code and 'def TO_LATEX' in clean_code:
+            print(f"⚠️ [{skill_id}] TO_LATEX 內部不應包含 $ 符號")
+            clean_code = re.sub(r'return f"\$([^"]+)\$"', r'return f"\1"', clean_code)
+            latex_fixes += 1
+
+        # 修復 3：整數除法應改為普通除法
+        clean_code, n = re.subn(
+            r'(\w+)\s*=\s*(\w+)\s*//\s*(\w+)(?=.*# Division)',
+            r'\1 = \2 / \3',
+            clean_code
+        )
+        latex_fixes += n
+
+        regex_fixes += latex_fixes
+
+    # ========================================
+    # Step E.9: [V47.0] Return 語句修正
+    # ========================================
+    # [Research Fix] 僅在 use_regex_healer=True 時執行
+    if use_regex_healer:
+        return_fixes = 0
+
+        # Fix 1: 修正 fmt_num(字串變數) 的錯誤用法
+        if "'question_text': fmt_num(" in clean_code:
+            pattern = r"'question_text':\s*fmt_num\(([a-zA-Z_]\w*)\)"
+            matches = list(re.finditer(pattern, clean_code))
+
+            for match in reversed(matches):
+                var_name = match.group(1)
+                # 判斷是否為字串變數
+                if any(kw in var_name.lower() for kw in ['latex', 'question', 'q', 'text', 'str']):
+                    new_str = f"'question_text': clean_latex_output({var_name})"
+                    clean_code = clean_code[:match.start()] + new_str + clean_code[match.end():]
+                    return_fixes += 1
+                    print(f"🔧 [{skill_id}] 修正: fmt_num({var_name}) → clean_latex_output({var_name})")
+
+        regex_fixes += return_fixes
+
+    # ========================================
+    # Step E.8: [NEW] 變數名稱對齊與雙重 $ 修復
+    # ========================================
+    # [Research Fix] 僅在 use_regex_healer=True 時執行
+    if use_regex_healer:
+        var_fixes = 0
+
+        # Fix 1: 如果 AI 用了 'a' 但實際變數叫 'answer'
+        # 檢查：有 'answer =' 但沒有 'a =' 定義
+        has_answer_def = re.search(r'\banswer\s*=', clean_code)
+        has_a_def = re.search(r'\ba\s*=\s*(?!answer)', clean_code)  # a = 但不是 a = answer
+        has_a_usage = 'isinstance(a, str)' in clean_code or "'a'" in clean_code
+
+        if has_answer_def and not has_a_def and has_a_usage:
+            # 替換所有 'a' 引用為 'answer'
+            clean_code = clean_code.replace('isinstance(a, str)', 'isinstance(answer, str)')
+            clean_code = re.sub(r"'='\s+in\s+a\b", "'=' in answer", clean_code)
+            clean_code = re.sub(r'"="\s+in\s+a\b', '"=" in answer', clean_code)
+            clean_code = re.sub(r'\ba\.split\(', 'answer.split(', clean_code)
+            # 同時處理 return 中的 'answer': a
+            clean_code = re.sub(r"'answer':\s*a\b", "'answer': answer", clean_code)
+            clean_code = re.sub(r"'correct_answer':\s*a\b", "'correct_answer': answer", clean_code)
+            var_fixes += 1
+            print(f"🔧 [{skill_id}] 修復變數名稱: a -> answer")
+
+        # Fix 2: 防止 return 中雙重 $ 包裹 (終極版 V46.8)
+        # 當 clean_latex_output() 已經處理過 q，return 中不需要再包 $
+        if "clean_latex_output" in clean_code:
+            old_len = len(clean_code)
+
+            # Pattern 1: 直接在 return 中用 f'${q}$' 的各種形式
+            clean_code = re.sub(
+                r"'question_text':\s*f?['\"]?\$\{q\}\$['\"]?",
+                r"'question_text': q",
+                clean_code
+            )
+
+            # Pattern 2: 在 clean_latex_output 之前就加了 $ 的情況
+            clean_code = re.sub(
+                r'q\s*=\s*f?["\']?\$\{[^}]+\}\$["\']?\s*\n\s*q\s*=\s*clean_latex_output\(q\)',
+                r'q = clean_latex_output(q)',
+                clean_code
+            )
+
+            # Pattern 3: 已經有 clean_latex_output 但 return 仍包 $
+            clean_code = re.sub(
+                r"'question_text':\s*f\['\"]\$\{q\}\$['\"]\b",
+                r"'question_text': q",
+                clean_code
+            )
+
+            # Pattern 4: [V46.8 NEW] 通用 f-string 形式 f'${q}$' → q
+            clean_code = re.sub(
+                r"f['\"]?\$\{q\}\$['\"]?",
+                r"q",
+                clean_code
+            )
+
+            if len(clean_code) != old_len:
+                var_fixes += 1
+                print(f"🔧 [{skill_id}] 移除雙重 $ 包裹 (終極版)")
+
+        regex_fixes += var_fixes
+
+    # ========================================
+    # Step E.9: [V47.4 優化] Return 語句自動 LaTeX 清洗（僅對 q）
+    # ========================================
+    # [Research Fix] 僅在 use_regex_healer=True 時執行
+    if use_regex_healer:
+        return_fixes = 0
+
+        if "'question_text':" in clean_code:
+            # 檢查前面是否已經有 q = clean_latex_output(q)
+            already_clean_q = re.search(r'\bq\s*=\s*clean_latex_output\s*\(\s*q\s*\)', clean_code)
+
+            # 僅對 'q' 自動包裝；若前面已清洗過則維持 'q'
+            if already_clean_q:
+                # 已清洗過，不需要再包裝
+                pass
+            else:
+                # 未清洗，在 return 時包裝
+                old_pattern = r"'question_text':\s*q\b"
+                new_str = "'question_text': clean_latex_output(q)"
+                clean_code, n = re.subn(old_pattern, new_str, clean_code)
+                return_fixes = n
+                if return_fixes > 0:
+                    print(f"🔧 [{skill_id}] 在 return 中包裹 clean_latex_output(q) ({return_fixes} 處)")
+
+        # ❌ 已在前面累加過，此處不重複累加
+        # regex_fixes += return_fixes
+
+    # ========================================
+    # Step F.5: [NEW V46.8] Pre-AST 語法清洗
+    # ========================================
+    # [Research Fix] 僅在 use_regex_healer=True 時執行
+    if use_regex_healer:
+        pre_ast_fixes = 0
+
+        # Fix 1: 修復 eval(calc_string) → safe_eval(calc_string)
+        # [旺宏科學獎] Eval Eliminator 獨立計數
+        eval_eliminator_count = 0
+        clean_code, n = re.subn(
+            r'\beval\s*\(',
+            r'safe_eval(',
+            clean_code
+        )
+        eval_eliminator_count = n
+        pre_ast_fixes += n
+        if n > 0:
+            print(f"🔧 [{skill_id}] 轉換 eval() → safe_eval() ({n} 處)")
+
+        # Fix 2: 修復可能的語法錯誤（多餘的括號、引號）
+        # 檢查是否有未閉合的字串
+        open_quotes = clean_code.count('"') % 2
+        if open_quotes != 0:
+            print(f"⚠️ [{skill_id}] 偵測到未閉合的引號")
+            # 嘗試自動閉合（在最後一個 return 之前）
+            lines = clean_code.split('\n')
+            for i in range(len(lines) - 1, -1, -1):
+                if 'return' in lines[i]:
+                    if not lines[i].rstrip().endswith('"'):
+                        lines[i] = lines[i].rstrip() + '"'
+                        pre_ast_fixes += 1
+                    break
+            clean_code = '\n'.join(lines)
+
+        regex_fixes += pre_ast_fixes
+    else:
+        eval_eliminator_count = 0
+        print(f"⏭️  [{skill_id}] Pre-AST 清洗 SKIPPED (ablation_id={ablation_id})")
+
+    stages.mark('regex_patches', regex_fixes + ast_fixes)
+
+    # Step F: 基礎語法修復
+    # [Research Fix] 僅在 use_regex_healer=True 時執行
+    healing_start = time.time()
+    if use_regex_healer:
+        clean_code, r_fixes = fix_code_syntax(clean_code)
+        regex_fixes += r_fixes
+    else:
+        r_fixes = 0
+        print(f"⏭️  [{skill_id}] 基礎語法修復 SKIPPED (ablation_id={ablation_id})")
+
+    stages.mark('fix_code_syntax', regex_fixes + ast_fixes)
+
+    # ========================================
+    # 6.5. 通用語法修復（適用所有領域）
+    # ========================================
+    qwen_fixes = 0
+
+    # A. 移除自創工具函式（通用 pattern）
+    forbidden_funcs = ['format_number_for_latex', 'format_num', 'latex_format']
+    for func_name in forbidden_funcs:
+        if f'def {func_name}' in clean_code:
+            lines = clean_code.split('\n')
+            cleaned_lines = []
+            skip_mode = False
+            indent_level = 0
+
+            for line in lines:
+                if f'def {func_name}' in line:
+                    skip_mode = True
+                    indent_level = len(line) - len(line.lstrip())
+                    continue
+
+                if skip_mode:
+                    current_indent = len(line) - len(line.lstrip())
+                    if not line.strip() or line.strip().startswith('#'):
+                        continue
+                    if current_indent <= indent_level and line.strip():
+                        skip_mode = False
+                    else:
+                        continue
+
+                cleaned_lines.append(line)
+
+            clean_code = '\n'.join(cleaned_lines)
+            qwen_fixes += 1
+
+    # B. 替換自創函式為標準工具（通用替換）
+    for old_func in forbidden_funcs:
+        clean_code, n = re.subn(f'{old_func}\\(', 'fmt_num(', clean_code)
+        qwen_fixes += n
+
+    # B.1 修復 LaTeX 運算符錯誤 (ex: "\\*" -> "\\times", "\\/" -> "\\div") (使用預編譯 pattern)
+    clean_code, n = COMPILED_PATTERNS['latex_asterisk'].subn(r'\\times', clean_code)
+    qwen_fixes += n
+    clean_code, n = COMPILED_PATTERNS['latex_slash'].subn(r'\\div', clean_code)
+    qwen_fixes += n
+
+    # B.2 偵測危險的 f-string 反斜線插入樣式 (如 f"\\{op}")，無法安全自動修復，但稍後發出警告
+    # (警告會在 warnings 清單建立後加入)
+    b_fstring_issue = re.search(r'f["\'].*\\\{', clean_code)
+    if b_fstring_issue:
+        # 記錄至本地變數，稍後會轉成正式 warnings
+        fstring_problem_detected = True
+    else:
+        fstring_problem_detected = False
+
+    # C. 修復 Python 3 語法錯誤 (使用預編譯 pattern)
+    clean_code, n = COMPILED_PATTERNS['range_concat'].subn(
+        r'list(range(\1)) + list(range(\2))',
+        clean_code
+    )
+    qwen_fixes += n
+
+    # [V47.4 REMOVED] D. 修復整數除法已移除：
+    # 分數四則運算需要有理數除法 (/)，不能變成整數除法 (//)
+    # Fraction(a) / Fraction(b) 正確回傳 Fraction 結果
+
+    # E. 通用警告（無法自動修復）
+    warnings = []
+    if 'eval(' in clean_code:
+        warnings.append("使用了 eval()")
+        if ('\\times' in clean_code) or ('\\div' in clean_code):
+            warnings.append("eval() 與 LaTeX 運算符共同出現，請移除 LaTeX 字符或避免使用 eval()")
+    if 'def generate' in clean_code:
+         if 'import ' in clean_code.split('def generate')[0]:
+            warnings.append("重複 import")
+    elif 'import ' in clean_code:
+         warnings.append("重複 import")
+
+    # [方案 B] 偵測 op_latex[...] 用法但無定義，自動注入 (使用預編譯 pattern)
+    needs_op_map = COMPILED_PATTERNS['op_latex_usage'].search(clean_code) and 'op_latex =' not in clean_code
+    if needs_op_map:
+        clean_code = re.sub(
+            r'(def\s+generate\s*\([^)]*\):\n)',
+            r"\1    op_latex = {'+': '+', '-': '-', '*': '\\\\times', '/': '\\\\div'}\n",
+            clean_code,
+            count=1
+        )
+        qwen_fixes += 1
+        print(f"🔧 [{skill_id}] 自動注入 op_latex 映射表")
+
+    # [V45.2 Fix] 移除函數內部的重複 op_latex 定義
+    # 問題：AI 有時會在 if/for 內部定義 op_latex，這會遮蔽全域定義
+    # 導致其他分支引用時出現 UnboundLocalError
+    # 解決：因為全域 PERFECT_UTILS 已有 op_latex，直接刪除內部定義
+    local_op_latex_pattern = r'^([ \t]+)op_latex\s*=\s*\{[^}]+\}\s*\n'
+    local_op_matches = list(re.finditer(local_op_latex_pattern, clean_code, re.MULTILINE))
+    if local_op_matches:
+        # 只刪除縮排 >= 8 空格的定義（在循環或條件內部）
+        for match in reversed(local_op_matches):
+            indent = len(match.group(1))
+            if indent >= 8:  # 在條件/循環內部（def generate 內的 if/for）
+                clean_code = clean_code[:match.start()] + clean_code[match.end():]
+                qwen_fixes += 1
+                print(f"🔧 [{skill_id}] 移除內部重複 op_latex 定義 (縮排 {indent})")
+
+    # [改良版] 使用正則偵測 op_latex 未定義 (適用 op_latex[...] 形式) (使用預編譯 pattern)
+    if COMPILED_PATTERNS['op_latex_usage'].search(clean_code) and 'op_latex =' not in clean_code:
+        warnings.append("op_latex 未定義")
+    # 檢查早前偵測到的 f-string 反斜線插入問題，並轉入 warnings
     try:
-        c.execute(query, params)
-        conn.commit()
+        if fstring_problem_detected:
+            warnings.append('偵測到 f-string 直接插入反斜線運算符 (如 f"\\{op}")，請改用 op_latex 或 "\\times"/"\\div" 方法')
+    except NameError:
+        pass
+
+    if warnings:
+        print(f"⚠️ [{skill_id}] 偵測到問題: {', '.join(warnings)}")
+
+    # ========================================
+    # F-Zero. [V45.4 Fix] 幻覺函數修復 (Hallucination Healer)
+    # ========================================
+
+    # 1. fmt_neg_paren -> fmt_num (使用預編譯 pattern)
+    clean_code, n = COMPILED_PATTERNS['fmt_neg_paren'].subn('fmt_num(', clean_code)
+    if n > 0:
+        qwen_fixes += n
+        print(f"🔧 [{skill_id}] 幻覺修復: fmt_neg_paren -> fmt_num ({n} 處)")
+
+    # 2. fmt_num(..., type='...') -> fmt_num(...) 移除 type 參數 (使用預編譯 pattern)
+    # 簡單處理: 移除 , type='...' 或 , type="..."
+    clean_code, n = COMPILED_PATTERNS['fmt_num_type_param'].subn('', clean_code)
+    if n > 0:
+        qwen_fixes += n
+        print(f"🔧 [{skill_id}] 幻覺修復: 移除 fmt_num 的 type 參數 ({n} 處)")
+
+    # 3. 注入缺失的 random 工具 (若 AI 堅持使用)
+    hallucination_utils = ""
+
+    if 'random_fraction(' in clean_code and 'def random_fraction' not in clean_code:
+        hallucination_utils += """
+    def random_fraction(min_v, max_v, min_den=2, max_den=10, *args):
+        # [Auto-Injected Helper]
+        num = random.randint(min_v, max_v) # 簡化實作
+        den = random.randint(min_den, max_den)
+        return Fraction(num, den) if den != 0 else Fraction(num, 1)
+"""
+        qwen_fixes += 1
+        print(f"🔧 [{skill_id}] 自動注入 random_fraction 輔助函式")
+
+    if 'random_mixed_number(' in clean_code and 'def random_mixed_number' not in clean_code:
+        hallucination_utils += """
+    def random_mixed_number(min_whole, max_whole, min_num, max_num, min_den, max_den):
+        # [Auto-Injected Helper]
+        w = random.randint(min_whole, max_whole)
+        n = random.randint(min_num, max_num)
+        d = random.randint(min_den, max_den)
+        if d == 0: d = 1
+        return Fraction(w * d + n, d)
+"""
+        qwen_fixes += 1
+        print(f"🔧 [{skill_id}] 自動注入 random_mixed_number 輔助函式")
+
+    # 將輔助函式注入到 generate 函式開頭
+    if hallucination_utils:
+        clean_code = re.sub(
+            r'(def\s+generate\s*\([^)]*\):\n)',
+            r'\1' + hallucination_utils,
+            clean_code,
+            count=1
+        )
+
+    # F. [V47.3 新增] Healer 熱修補：題幹強制使用 fmt_num，修復雙括號與缺 f-string
+    # ========================================
+    # F.1 強制題幹使用 fmt_num：將所有 to_latex(...) 改為 fmt_num(...)
+    clean_code, n = re.subn(r'\bto_latex\s*\(', 'fmt_num(', clean_code)
+    if n > 0:
+        qwen_fixes += n
+        print(f"🔧 [{skill_id}] 題幹格式修復: to_latex(...) → fmt_num(...) ({n} 處)")
+
+    # F.2 修復 f-string 內雙大括號包 op_latex 的情況
+    # 例：f"{{{op_latex[op]}}}" → f"{op_latex[op]}"
+    clean_code, n = re.subn(r'\{\{op_latex\[(.+?)\]\}\}', r'{op_latex[\1]}', clean_code)
+    if n > 0:
+        qwen_fixes += n
+        print(f"🔧 [{skill_id}] f-string 修復: {{{{op_latex[...]}}}} → {{op_latex[...]}} ({n} 處)")
+
+    # F.3 若 q 行包含 {...} 但不是 f-string，補上 f 前綴
+    # 匹配 "q = '...{...}...'" 或 "q += '...{...}...'"
+    clean_code, n = re.subn(
+        r"(q\s*[\+\-]?=\s*)'([^'\n]*?\{[^'\n]*?\}[^'\n]*?)',",  # ✅ 非貪婪
+        r"\1f'\2',",
+        clean_code
+    )
+    if n > 0:
+        qwen_fixes += n
+        print(f"🔧 [{skill_id}] f-string 前綴修復: q = '{{...}}' → q = f'{{...}}' ({n} 處)")
+
+    # F.4 [V47.0 後處理] 修復 fmt_num(clean_latex_output)(X) 這種錯誤串接
+    # 防止替換順序導致的雙重包裹
+    clean_code, n = re.subn(
+        r'fmt_num\s*\(\s*clean_latex_output\s*\)\s*\(\s*([a-zA-Z_]\w*)\s*\)',
+        r'clean_latex_output(\1)',
+        clean_code
+    )
+    if n > 0:
+        qwen_fixes += n
+        print(f"🔧 [{skill_id}] 修復函式串接錯誤: fmt_num(clean_latex_output)(X) → clean_latex_output(X) ({n} 處)")
+
+    # [V47.4 新增通用 Regex 修補]
+    # G.1 修復 to_latex(...) 在全域：轉為 fmt_num(...)
+    clean_code, n = re.subn(r'\bto_latex\s*\(', 'fmt_num(', clean_code)
+    if n > 0:
+        qwen_fixes += n
+        print(f"🔧 [{skill_id}] 全域修復: to_latex(...) → fmt_num(...) ({n} 處)")
+
+    # G.2 修復雙括號 {{}} 包 op_latex (使用預編譯 pattern)
+    clean_code, n = COMPILED_PATTERNS['op_latex_double'].subn(r'{op_latex[\1]}', clean_code)
+    if n > 0:
+        qwen_fixes += n
+        print(f"🔧 [{skill_id}] 雙括號修復: {{{{op_latex[...]}}}} → {{op_latex[...]}} ({n} 處)")
+
+    # G.3 修復 Fraction 除法：Fraction(a, b) / Fraction(c, d) → (a/b) / (c/d) (使用預編譯 pattern)
+    clean_code, n = COMPILED_PATTERNS['fraction_div'].subn(
+        r'(\1 / \2) / (\3 / \4)',
+        clean_code
+    )
+    if n > 0:
+        qwen_fixes += n
+        print(f"🔧 [{skill_id}] Fraction 除法修復: Fraction(a,b)/Fraction(c,d) → 更清晰形式 ({n} 處)")
+
+    # G.4 修復括號模式：若存在 bracket_structure = random.choice(...) 的候選集中有 None 或空值，篩選掉
+    clean_code, n = re.subn(
+        r'(bracket_structure\s*=\s*random\.choice\(\[)([^\]]*None[^\]]*)\](\))',
+        r'\1\2\3',
+        clean_code
+    )
+    if n > 0:
+        qwen_fixes += n
+        print(f"🔧 [{skill_id}] 括號候選篩選: 移除 None 或無效值 ({n} 處)")
+
+    regex_fixes += qwen_fixes
+    healing_duration = time.time() - healing_start
+
+    stages.mark('generic_patches', regex_fixes + ast_fixes)
+
+    # ========================================
+    # Step G: [NEW] AST 深度邏輯手術
+    # ========================================
+    # [Research Fix] AST Healer 條件執行
+    # 只有當程式碼至少是語法正確(Syntax Valid)時，AST 才能運作
+    # 所以先做一次快速檢查，或直接 try-catch
+
+    ast_start = time.time()
+    if use_ast_healer:
+        clean_code, ast_fixes_count = fix_code_via_ast(clean_code)
+        ast_fixes += ast_fixes_count
+        if ast_fixes_count > 0:
+            print(f"🔧 [AST Healer] {ast_fixes_count} structural fixes applied")
+    else:
+        print(f"⏭️  [{skill_id}] AST Healer SKIPPED (ablation_id={ablation_id})")
+        ast_fixes_count = 0
+    # ========================================
+
+    stages.mark('ast_healer', regex_fixes + ast_fixes)
+
+    # ========================================
+    # Step H: [DISABLED V46.9] 強制 LaTeX 清洗
+    # ========================================
+    # ❌ 已禁用原因：
+    #    - 舊邏輯假設變數名稱為 q，但 AI 可能使用 q_latex、question 等
+    #    - 導致 LaTeX 清洗邏輯無法應用（問題代碼中 return 用 q_latex 但檢查 q）
+    # ✅ 新解決方案：使用 Step E.9 Return 語句自動清洗
+    #    - 自動偵測 return 中的實際變數名稱
+    #    - 對所有變數名稱都能正確應用 clean_latex_output()
+    # ========================================
+
+    # 組合
+    final_code = CALCULATION_SKELETON + "\n" + clean_code
+
+    # 7. 驗證
+    is_valid, error_msg = validate_python_code(final_code)
+    stages.mark('validate', regex_fixes + ast_fixes)
+
+    return {
+        'clean_code': clean_code,
+        'final_code': final_code,
+        'is_valid': is_valid,
+        'error_msg': error_msg,
+        'regex_fixes': regex_fixes,
+        'ast_fixes': ast_fixes,
+        'garbage_cleaner_count': garbage_cleaner_count,
+        'eval_eliminator_count': eval_eliminator_count,
+        'removed_list': removed_list,
+        'healing_duration': healing_duration,
+    }
+
+def run_dynamic_sampling(final_code, skill_id):
+    """
+    動態採樣驗證：載入組合後的程式碼並實際呼叫 generate()，最多 3 次、連續 2 次成功即提前通過。
+    Config.SANDBOX_ENABLED 時於沙箱行程池執行 (受 CPU / 時間 / 記憶體上限保護)，並另外回傳 sample_latencies。
+    回傳 dict：ok / success_count / total_count / error_msg (失敗原因，通過時為 None)
+    """
+    dyn_ok = True
+    sampling_success_count = 0
+    sampling_total_count = 0
+    error_msg = None
+
+    if getattr(Config, 'SANDBOX_ENABLED', False):
+        from core.sandbox_pool import SANDBOX_POOL
+        result = SANDBOX_POOL.run(final_code, samples=3, early_pass=2)
+        # 工作行程層級的錯誤 (stage='worker') 可能缺少採樣欄位，一律以 .get 取值
+        if result.get('stage') == 'sample':
+            error_msg = f"Dynamic sampling failed at iteration {result.get('failed_sample')}: {result.get('error_msg')}"
+            print(f"[WARN] {error_msg}")
+        elif not result.get('ok'):
+            error_msg = f"Dynamic sampling error: {result.get('error_class')}: {result.get('error_msg')}"
+            print(f"[WARN] Dynamic sampling error (gating activated): {result.get('error_class')}: {result.get('error_msg')}")
+        elif result.get('success_count', 0) >= 2:
+            print(f"✅ [{skill_id}] Dynamic sampling early pass (2/2 successful)")
+        return {
+            'ok': bool(result.get('ok')),
+            'success_count': result.get('success_count', 0),
+            'total_count': result.get('total_count', 0),
+            'error_msg': error_msg,
+            'sample_latencies': result.get('sample_latencies', []),
+        }
+
+    import importlib.util
+    try:
+        spec = importlib.util.spec_from_loader("temp_skill", loader=None)
+        temp_module = importlib.util.module_from_spec(spec)
+        exec(final_code, temp_module.__dict__)
+
+        # ✅ [Performance Fix V9.2.1] 早期退出機制
+        for sample_idx in range(3):
+            sampling_total_count += 1
+            try:
+                item = temp_module.generate()
+                # 验证返回结构
+                assert isinstance(item, dict), f"generate() must return dict, got {type(item)}"
+                assert 'question_text' in item, "Missing 'question_text' key"
+                assert 'answer' in item, "Missing 'answer' key"
+                # 验证没有函数对象或类型错误
+                question_str = str(item.get('question_text', ''))
+                if 'function' in str(type(item.get('question_text', ''))).lower():
+                    raise TypeError(f"question_text is function object, not string: {type(item['question_text'])}")
+
+                sampling_success_count += 1
+
+                # ✅ 早期退出：如果前 2 次都成功，直接通過
+                if sampling_success_count >= 2:
+                    print(f"✅ [{skill_id}] Dynamic sampling early pass (2/2 successful)")
+                    break
+
+            except Exception as e:
+                error_msg = f"Dynamic sampling failed at iteration {sample_idx+1}: {str(e)}"
+                dyn_ok = False
+                print(f"[WARN] {error_msg}")
+                break
+        else:
+            # 如果跑完 3 次都沒 break，說明至少 2 次成功（因為失敗會 break）
+            if sampling_success_count >= 2:
+                print(f"✅ [{skill_id}] Dynamic sampling passed all {sampling_success_count} iterations")
     except Exception as e:
-        print(f"❌ Database Log Error: {e}")
-    finally:
-        conn.close()
+        dyn_ok = False
+        print(f"[WARN] Dynamic sampling error (gating activated): {str(e)}")
+
+    return {
+        'ok': dyn_ok,
+        'success_count': sampling_success_count,
+        'total_count': sampling_total_count,
+        'error_msg': error_msg,
+    }
 
 # ==============================================================================
 # 5. 核心生成函式 (V44.9 Main Engine - Hybrid-Healing)
@@ -2009,12 +2408,15 @@ def auto_generate_skill_code(skill_id, queue=None, **kwargs):
     
     raw_output = ""
     prompt_tokens, completion_tokens = 0, 0
+    ttft_seconds, tokens_per_second = None, None
 
     try:
         # 3. 呼叫 AI
         client = get_ai_client(role='coder') 
         response = client.generate_content(prompt)
         raw_output = response.text
+        # [效能] 模型呼叫結束即歸還供應商並行名額，後續 Healer / 沙箱驗證與下一個技能的生成重疊進行
+        release_provider_slot()
         
         # 4. Token 統計
         try:
@@ -2025,595 +2427,20 @@ def auto_generate_skill_code(skill_id, queue=None, **kwargs):
                 u = response.usage
                 prompt_tokens = getattr(u, 'prompt_tokens', 0)
                 completion_tokens = getattr(u, 'completion_tokens', 0)
+            ttft_seconds = getattr(response, 'ttft_seconds', None)
+            tokens_per_second = getattr(response, 'tokens_per_second', None)
         except: pass
 
-        # 5. 清洗與組裝 (Strict Pipeline Order)
-        regex_fixes = 0
-        ast_fixes = 0
-        
-        # [Research Fix] 基礎清理也是 Healer 的一部分
-        # Ab1/Ab2: 完全不做清理，Ab3: 執行完整 Healer（基礎清理 + Regex + AST）
-        if use_regex_healer:
-            # Step A: 移除 Markdown - 提取代碼塊內容
-            match = COMPILED_PATTERNS['markdown_blocks'].search(raw_output)
-            if match:
-                # 提取第一個代碼塊的內容
-                clean_code = match.group(1).strip()
-                regex_fixes += 1
-            else:
-                # 沒有 Markdown 塊，直接使用原始輸出
-                clean_code = raw_output.strip()
-
-            # Step B: 清洗特殊空格 (MUST DO BEFORE IMPORT CLEANING)
-            # [旺宏科學獎] Garbage Cleaner 獨立計數
-            garbage_cleaner_count = 0
-            original_len = len(clean_code)
-            clean_code = clean_code.replace('\xa0', ' ').replace('　', ' ').strip()
-            if len(clean_code) != original_len:
-                garbage_cleaner_count = 1
-                regex_fixes += 1
-
-            # Step C: 移除重複 Import (優化版)
-            clean_code, import_removed, removed_list = clean_redundant_imports(clean_code)
-            regex_fixes += import_removed
-            
-            # Step D: 包裹函式與縮排修復
-            if "def generate" not in clean_code:
-                indent_str = '    '  # Standard 4 spaces
-                clean_code = "def generate(level=1, **kwargs):\n" + textwrap.indent(clean_code, indent_str)
-                
-                if "return" not in clean_code:
-                    clean_code += "\n    return {'question_text': q, 'correct_answer': a, 'answer': a, 'mode': 1}"
-                regex_fixes += 1
-        else:
-            # Ab1/Ab2: 不做任何清理，直接使用 LLM 原始輸出
-            clean_code = raw_output
-            garbage_cleaner_count = 0
-            removed_list = []
-            print(f"⏭️  [{skill_id}] 基礎清理 SKIPPED (ablation_id={ablation_id}, 無 Healer)")
-
-        # Step E: [NEW] 主動邏輯修復 (Healer)
-        # [Research Fix] 僅在 use_regex_healer=True 時執行
-        if use_regex_healer:
-            clean_code, healer_fixes = refine_ai_code(clean_code)
-            regex_fixes += healer_fixes
-        else:
-            print(f"⏭️  [{skill_id}] Regex Healer SKIPPED (ablation_id={ablation_id})")
-
-        # ========================================
-        # Step E.5: [OPTIMIZED V9.2.1] 統一函數移除器
-        # ========================================
-        # [Research Fix] 僅在 use_regex_healer=True 時執行
-        if use_regex_healer:
-            # 合併原本的三處函數清洗邏輯，避免重複掃描
-            
-            # 建立完整的禁止函數清單
-            PROTECTED_TOOLS = [
-                'fmt_num', 'to_latex', 'is_prime', 'gcd', 'lcm', 'get_factors', 'check',
-                'clamp_fraction', 'safe_pow', 'factorial_bounded', 'nCr', 'nPr',
-                'rational_gauss_solve', 'normalize_angle',
-                'fmt_set', 'fmt_interval', 'fmt_vec',
-                'format_number_for_latex', 'format_num_latex', 'latex_format',
-                '_format_term_with_parentheses', 'clean_expression'
-            ]
-            
-            # ✅ 一次性移除所有禁止的函數定義
-            if 'def generate' in clean_code:
-                gen_start = clean_code.find('def generate')
-                gen_content = clean_code[gen_start:]
-                
-                gen_content, shadowing_fixes = remove_forbidden_functions_unified(
-                    gen_content, 
-                    PROTECTED_TOOLS
-                )
-                
-                clean_code = clean_code[:gen_start] + gen_content
-                regex_fixes += shadowing_fixes
-
-        # ========================================
-        # Step E.6: [NEW] 混合數字串修復
-        # ========================================
-        # [Research Fix] 僅在 use_regex_healer=True 時執行
-        if use_regex_healer:
-            mixed_num_fixes = 0
-
-            # Pattern 1: 偵測並修復 f"{A}{fmt_num(frac)}" 模式
-            pattern1 = r'return\s+f"(\{[^}]+\})\{fmt_num\(([^)]+)\)\}"'
-            if re.search(pattern1, clean_code):
-                print(f"🔴 [{skill_id}] CRITICAL: 偵測到混合數字串拼接")
-                # 修復：改為回傳 Fraction 相加
-                clean_code = re.sub(
-                    pattern1,
-                    r'return Fraction(\1) + \2',
-                    clean_code
-                )
-                mixed_num_fixes += 1
-
-            # Pattern 2: 偵測 eval(字串) 用於混合數
-            if re.search(r'elif isinstance\([^,]+, str\):\s+return eval\(', clean_code):
-                print(f"⚠️ [{skill_id}] 偵測到 eval(字串)，可能導致混合數錯誤")
-
-            # Pattern 3: 修復 _generate_mixed_number 的實作
-            mixed_num_pattern = r'(def _generate_mixed_number\(\):.*?)(return f".*?fmt_num.*?")'
-            if re.search(mixed_num_pattern, clean_code, re.DOTALL):
-                print(f"🔧 [{skill_id}] 修復 _generate_mixed_number")
-                clean_code = re.sub(
-                    r'(def _generate_mixed_number\(\):.*?frac = [^\n]+\n\s+)return f".*?fmt_num.*?"',
-                    r'\1return Fraction(A) + frac',
-                    clean_code,
-                    flags=re.DOTALL
-                )
-                mixed_num_fixes += 1
-
-            regex_fixes += mixed_num_fixes
-
-        # ========================================
-        # Step E.7: LaTeX 格式修復（混合數專用）
-        # ========================================
-        # [Research Fix] 僅在 use_regex_healer=True 時執行
-        if use_regex_healer:
-            latex_fixes = 0
-
-            # 修復 1：過多的大括號 {{{{num}}}} (使用預編譯 pattern)
-            clean_code, n = COMPILED_PATTERNS['excess_braces'].subn(r'{\1}', clean_code)
-            latex_fixes += n
-
-            # 修復 2：TO_LATEX 內部包含 $ 符號
-            if 'return f"$' in clean_code and 'def TO_LATEX' in clean_code:
-                print(f"⚠️ [{skill_id}] TO_LATEX 內部不應包含 $ 符號")
-                clean_code = re.sub(r'return f"\$([^"]+)\$"', r'return f"\1"', clean_code)
-                latex_fixes += 1
-
-            # 修復 3：整數除法應改為普通除法
-            clean_code, n = re.subn(
-                r'(\w+)\s*=\s*(\w+)\s*//\s*(\w+)(?=.*# Division)',
-                r'\1 = \2 / \3',
-                clean_code
-            )
-            latex_fixes += n
-
-            regex_fixes += latex_fixes
-
-        # ========================================
-        # Step E.9: [V47.0] Return 語句修正
-        # ========================================
-        # [Research Fix] 僅在 use_regex_healer=True 時執行
-        if use_regex_healer:
-            return_fixes = 0
-
-            # Fix 1: 修正 fmt_num(字串變數) 的錯誤用法
-            if "'question_text': fmt_num(" in clean_code:
-                pattern = r"'question_text':\s*fmt_num\(([a-zA-Z_]\w*)\)"
-                matches = list(re.finditer(pattern, clean_code))
-                
-                for match in reversed(matches):
-                    var_name = match.group(1)
-                    # 判斷是否為字串變數
-                    if any(kw in var_name.lower() for kw in ['latex', 'question', 'q', 'text', 'str']):
-                        new_str = f"'question_text': clean_latex_output({var_name})"
-                        clean_code = clean_code[:match.start()] + new_str + clean_code[match.end():]
-                        return_fixes += 1
-                        print(f"🔧 [{skill_id}] 修正: fmt_num({var_name}) → clean_latex_output({var_name})")
-
-            regex_fixes += return_fixes
-
-        # ========================================
-        # Step E.8: [NEW] 變數名稱對齊與雙重 $ 修復
-        # ========================================
-        # [Research Fix] 僅在 use_regex_healer=True 時執行
-        if use_regex_healer:
-            var_fixes = 0
-            
-            # Fix 1: 如果 AI 用了 'a' 但實際變數叫 'answer'
-            # 檢查：有 'answer =' 但沒有 'a =' 定義
-            has_answer_def = re.search(r'\banswer\s*=', clean_code)
-            has_a_def = re.search(r'\ba\s*=\s*(?!answer)', clean_code)  # a = 但不是 a = answer
-            has_a_usage = 'isinstance(a, str)' in clean_code or "'a'" in clean_code
-            
-            if has_answer_def and not has_a_def and has_a_usage:
-                # 替換所有 'a' 引用為 'answer'
-                clean_code = clean_code.replace('isinstance(a, str)', 'isinstance(answer, str)')
-                clean_code = re.sub(r"'='\s+in\s+a\b", "'=' in answer", clean_code)
-                clean_code = re.sub(r'"="\s+in\s+a\b', '"=" in answer', clean_code)
-                clean_code = re.sub(r'\ba\.split\(', 'answer.split(', clean_code)
-                # 同時處理 return 中的 'answer': a
-                clean_code = re.sub(r"'answer':\s*a\b", "'answer': answer", clean_code)
-                clean_code = re.sub(r"'correct_answer':\s*a\b", "'correct_answer': answer", clean_code)
-                var_fixes += 1
-                print(f"🔧 [{skill_id}] 修復變數名稱: a -> answer")
-            
-            # Fix 2: 防止 return 中雙重 $ 包裹 (終極版 V46.8)
-            # 當 clean_latex_output() 已經處理過 q，return 中不需要再包 $
-            if "clean_latex_output" in clean_code:
-                old_len = len(clean_code)
-                
-                # Pattern 1: 直接在 return 中用 f'${q}$' 的各種形式
-                clean_code = re.sub(
-                    r"'question_text':\s*f?['\"]?\$\{q\}\$['\"]?",
-                    r"'question_text': q",
-                    clean_code
-                )
-                
-                # Pattern 2: 在 clean_latex_output 之前就加了 $ 的情況
-                clean_code = re.sub(
-                    r'q\s*=\s*f?["\']?\$\{[^}]+\}\$["\']?\s*\n\s*q\s*=\s*clean_latex_output\(q\)',
-                    r'q = clean_latex_output(q)',
-                    clean_code
-                )
-                
-                # Pattern 3: 已經有 clean_latex_output 但 return 仍包 $
-                clean_code = re.sub(
-                    r"'question_text':\s*f\['\"]\$\{q\}\$['\"]\b",
-                    r"'question_text': q",
-                    clean_code
-                )
-                
-                # Pattern 4: [V46.8 NEW] 通用 f-string 形式 f'${q}$' → q
-                clean_code = re.sub(
-                    r"f['\"]?\$\{q\}\$['\"]?",
-                    r"q",
-                    clean_code
-                )
-                
-                if len(clean_code) != old_len:
-                    var_fixes += 1
-                    print(f"🔧 [{skill_id}] 移除雙重 $ 包裹 (終極版)")
-            
-            regex_fixes += var_fixes
-
-        # ========================================
-        # Step E.9: [V47.4 優化] Return 語句自動 LaTeX 清洗（僅對 q）
-        # ========================================
-        # [Research Fix] 僅在 use_regex_healer=True 時執行
-        if use_regex_healer:
-            return_fixes = 0
-            
-            if "'question_text':" in clean_code:
-                # 檢查前面是否已經有 q = clean_latex_output(q)
-                already_clean_q = re.search(r'\bq\s*=\s*clean_latex_output\s*\(\s*q\s*\)', clean_code)
-                
-                # 僅對 'q' 自動包裝；若前面已清洗過則維持 'q'
-                if already_clean_q:
-                    # 已清洗過，不需要再包裝
-                    pass
-                else:
-                    # 未清洗，在 return 時包裝
-                    old_pattern = r"'question_text':\s*q\b"
-                    new_str = "'question_text': clean_latex_output(q)"
-                    clean_code, n = re.subn(old_pattern, new_str, clean_code)
-                    return_fixes = n
-                    if return_fixes > 0:
-                        print(f"🔧 [{skill_id}] 在 return 中包裹 clean_latex_output(q) ({return_fixes} 處)")
-            
-            # ❌ 已在前面累加過，此處不重複累加
-            # regex_fixes += return_fixes
-
-        # ========================================
-        # Step F.5: [NEW V46.8] Pre-AST 語法清洗
-        # ========================================
-        # [Research Fix] 僅在 use_regex_healer=True 時執行
-        if use_regex_healer:
-            pre_ast_fixes = 0
-
-            # Fix 1: 修復 eval(calc_string) → safe_eval(calc_string)
-            # [旺宏科學獎] Eval Eliminator 獨立計數
-            eval_eliminator_count = 0
-            clean_code, n = re.subn(
-                r'\beval\s*\(',
-                r'safe_eval(',
-                clean_code
-            )
-            eval_eliminator_count = n
-            pre_ast_fixes += n
-            if n > 0:
-                print(f"🔧 [{skill_id}] 轉換 eval() → safe_eval() ({n} 處)")
-
-            # Fix 2: 修復可能的語法錯誤（多餘的括號、引號）
-            # 檢查是否有未閉合的字串
-            open_quotes = clean_code.count('"') % 2
-            if open_quotes != 0:
-                print(f"⚠️ [{skill_id}] 偵測到未閉合的引號")
-                # 嘗試自動閉合（在最後一個 return 之前）
-                lines = clean_code.split('\n')
-                for i in range(len(lines) - 1, -1, -1):
-                    if 'return' in lines[i]:
-                        if not lines[i].rstrip().endswith('"'):
-                            lines[i] = lines[i].rstrip() + '"'
-                            pre_ast_fixes += 1
-                        break
-                clean_code = '\n'.join(lines)
-
-            regex_fixes += pre_ast_fixes
-        else:
-            eval_eliminator_count = 0
-            print(f"⏭️  [{skill_id}] Pre-AST 清洗 SKIPPED (ablation_id={ablation_id})")
-
-        # Step F: 基礎語法修復
-        # [Research Fix] 僅在 use_regex_healer=True 時執行
-        healing_start = time.time()
-        if use_regex_healer:
-            clean_code, r_fixes = fix_code_syntax(clean_code)
-            regex_fixes += r_fixes
-        else:
-            r_fixes = 0
-            print(f"⏭️  [{skill_id}] 基礎語法修復 SKIPPED (ablation_id={ablation_id})")
-
-        # ========================================
-        # 6.5. 通用語法修復（適用所有領域）
-        # ========================================
-        qwen_fixes = 0
-
-        # A. 移除自創工具函式（通用 pattern）
-        forbidden_funcs = ['format_number_for_latex', 'format_num', 'latex_format']
-        for func_name in forbidden_funcs:
-            if f'def {func_name}' in clean_code:
-                lines = clean_code.split('\n')
-                cleaned_lines = []
-                skip_mode = False
-                indent_level = 0
-                
-                for line in lines:
-                    if f'def {func_name}' in line:
-                        skip_mode = True
-                        indent_level = len(line) - len(line.lstrip())
-                        continue
-                    
-                    if skip_mode:
-                        current_indent = len(line) - len(line.lstrip())
-                        if not line.strip() or line.strip().startswith('#'):
-                            continue
-                        if current_indent <= indent_level and line.strip():
-                            skip_mode = False
-                        else:
-                            continue
-                    
-                    cleaned_lines.append(line)
-                
-                clean_code = '\n'.join(cleaned_lines)
-                qwen_fixes += 1
-
-        # B. 替換自創函式為標準工具（通用替換）
-        for old_func in forbidden_funcs:
-            clean_code, n = re.subn(f'{old_func}\\(', 'fmt_num(', clean_code)
-            qwen_fixes += n
-
-        # B.1 修復 LaTeX 運算符錯誤 (ex: "\\*" -> "\\times", "\\/" -> "\\div") (使用預編譯 pattern)
-        clean_code, n = COMPILED_PATTERNS['latex_asterisk'].subn(r'\\times', clean_code)
-        qwen_fixes += n
-        clean_code, n = COMPILED_PATTERNS['latex_slash'].subn(r'\\div', clean_code)
-        qwen_fixes += n
-
-        # B.2 偵測危險的 f-string 反斜線插入樣式 (如 f"\\{op}")，無法安全自動修復，但稍後發出警告
-        # (警告會在 warnings 清單建立後加入)
-        b_fstring_issue = re.search(r'f["\'].*\\\{', clean_code)
-        if b_fstring_issue:
-            # 記錄至本地變數，稍後會轉成正式 warnings
-            fstring_problem_detected = True
-        else:
-            fstring_problem_detected = False
-
-        # C. 修復 Python 3 語法錯誤 (使用預編譯 pattern)
-        clean_code, n = COMPILED_PATTERNS['range_concat'].subn(
-            r'list(range(\1)) + list(range(\2))',
-            clean_code
-        )
-        qwen_fixes += n
-
-        # [V47.4 REMOVED] D. 修復整數除法已移除：
-        # 分數四則運算需要有理數除法 (/)，不能變成整數除法 (//)
-        # Fraction(a) / Fraction(b) 正確回傳 Fraction 結果
-
-        # E. 通用警告（無法自動修復）
-        warnings = []
-        if 'eval(' in clean_code:
-            warnings.append("使用了 eval()")
-            if ('\\times' in clean_code) or ('\\div' in clean_code):
-                warnings.append("eval() 與 LaTeX 運算符共同出現，請移除 LaTeX 字符或避免使用 eval()")
-        if 'def generate' in clean_code:
-             if 'import ' in clean_code.split('def generate')[0]:
-                warnings.append("重複 import")
-        elif 'import ' in clean_code:
-             warnings.append("重複 import")
-        
-        # [方案 B] 偵測 op_latex[...] 用法但無定義，自動注入 (使用預編譯 pattern)
-        needs_op_map = COMPILED_PATTERNS['op_latex_usage'].search(clean_code) and 'op_latex =' not in clean_code
-        if needs_op_map:
-            clean_code = re.sub(
-                r'(def\s+generate\s*\([^)]*\):\n)',
-                r"\1    op_latex = {'+': '+', '-': '-', '*': '\\\\times', '/': '\\\\div'}\n",
-                clean_code,
-                count=1
-            )
-            qwen_fixes += 1
-            print(f"🔧 [{skill_id}] 自動注入 op_latex 映射表")
-        
-        # [V45.2 Fix] 移除函數內部的重複 op_latex 定義
-        # 問題：AI 有時會在 if/for 內部定義 op_latex，這會遮蔽全域定義
-        # 導致其他分支引用時出現 UnboundLocalError
-        # 解決：因為全域 PERFECT_UTILS 已有 op_latex，直接刪除內部定義
-        local_op_latex_pattern = r'^([ \t]+)op_latex\s*=\s*\{[^}]+\}\s*\n'
-        local_op_matches = list(re.finditer(local_op_latex_pattern, clean_code, re.MULTILINE))
-        if local_op_matches:
-            # 只刪除縮排 >= 8 空格的定義（在循環或條件內部）
-            for match in reversed(local_op_matches):
-                indent = len(match.group(1))
-                if indent >= 8:  # 在條件/循環內部（def generate 內的 if/for）
-                    clean_code = clean_code[:match.start()] + clean_code[match.end():]
-                    qwen_fixes += 1
-                    print(f"🔧 [{skill_id}] 移除內部重複 op_latex 定義 (縮排 {indent})")
-        
-        # [改良版] 使用正則偵測 op_latex 未定義 (適用 op_latex[...] 形式) (使用預編譯 pattern)
-        if COMPILED_PATTERNS['op_latex_usage'].search(clean_code) and 'op_latex =' not in clean_code:
-            warnings.append("op_latex 未定義")
-        # 檢查早前偵測到的 f-string 反斜線插入問題，並轉入 warnings
-        try:
-            if fstring_problem_detected:
-                warnings.append('偵測到 f-string 直接插入反斜線運算符 (如 f"\\{op}")，請改用 op_latex 或 "\\times"/"\\div" 方法')
-        except NameError:
-            pass
-
-        if warnings:
-            print(f"⚠️ [{skill_id}] 偵測到問題: {', '.join(warnings)}")
-
-        # ========================================
-        # F-Zero. [V45.4 Fix] 幻覺函數修復 (Hallucination Healer)
-        # ========================================
-        
-        # 1. fmt_neg_paren -> fmt_num (使用預編譯 pattern)
-        clean_code, n = COMPILED_PATTERNS['fmt_neg_paren'].subn('fmt_num(', clean_code)
-        if n > 0:
-            qwen_fixes += n
-            print(f"🔧 [{skill_id}] 幻覺修復: fmt_neg_paren -> fmt_num ({n} 處)")
-
-        # 2. fmt_num(..., type='...') -> fmt_num(...) 移除 type 參數 (使用預編譯 pattern)
-        # 簡單處理: 移除 , type='...' 或 , type="..."
-        clean_code, n = COMPILED_PATTERNS['fmt_num_type_param'].subn('', clean_code)
-        if n > 0:
-            qwen_fixes += n
-            print(f"🔧 [{skill_id}] 幻覺修復: 移除 fmt_num 的 type 參數 ({n} 處)")
-
-        # 3. 注入缺失的 random 工具 (若 AI 堅持使用)
-        hallucination_utils = ""
-        
-        if 'random_fraction(' in clean_code and 'def random_fraction' not in clean_code:
-            hallucination_utils += """
-    def random_fraction(min_v, max_v, min_den=2, max_den=10, *args):
-        # [Auto-Injected Helper]
-        num = random.randint(min_v, max_v) # 簡化實作
-        den = random.randint(min_den, max_den)
-        return Fraction(num, den) if den != 0 else Fraction(num, 1)
-"""
-            qwen_fixes += 1
-            print(f"🔧 [{skill_id}] 自動注入 random_fraction 輔助函式")
-
-        if 'random_mixed_number(' in clean_code and 'def random_mixed_number' not in clean_code:
-            hallucination_utils += """
-    def random_mixed_number(min_whole, max_whole, min_num, max_num, min_den, max_den):
-        # [Auto-Injected Helper]
-        w = random.randint(min_whole, max_whole)
-        n = random.randint(min_num, max_num)
-        d = random.randint(min_den, max_den)
-        if d == 0: d = 1
-        return Fraction(w * d + n, d)
-"""
-            qwen_fixes += 1
-            print(f"🔧 [{skill_id}] 自動注入 random_mixed_number 輔助函式")
-
-        # 將輔助函式注入到 generate 函式開頭
-        if hallucination_utils:
-            clean_code = re.sub(
-                r'(def\s+generate\s*\([^)]*\):\n)',
-                r'\1' + hallucination_utils,
-                clean_code,
-                count=1
-            )
-
-        # F. [V47.3 新增] Healer 熱修補：題幹強制使用 fmt_num，修復雙括號與缺 f-string
-        # ========================================
-        # F.1 強制題幹使用 fmt_num：將所有 to_latex(...) 改為 fmt_num(...)
-        clean_code, n = re.subn(r'\bto_latex\s*\(', 'fmt_num(', clean_code)
-        if n > 0:
-            qwen_fixes += n
-            print(f"🔧 [{skill_id}] 題幹格式修復: to_latex(...) → fmt_num(...) ({n} 處)")
-        
-        # F.2 修復 f-string 內雙大括號包 op_latex 的情況
-        # 例：f"{{{op_latex[op]}}}" → f"{op_latex[op]}"
-        clean_code, n = re.subn(r'\{\{op_latex\[(.+?)\]\}\}', r'{op_latex[\1]}', clean_code)
-        if n > 0:
-            qwen_fixes += n
-            print(f"🔧 [{skill_id}] f-string 修復: {{{{op_latex[...]}}}} → {{op_latex[...]}} ({n} 處)")
-        
-        # F.3 若 q 行包含 {...} 但不是 f-string，補上 f 前綴
-        # 匹配 "q = '...{...}...'" 或 "q += '...{...}...'"
-        clean_code, n = re.subn(
-            r"(q\s*[\+\-]?=\s*)'([^'\n]*?\{[^'\n]*?\}[^'\n]*?)',",  # ✅ 非貪婪
-            r"\1f'\2',",
-            clean_code
-        )
-        if n > 0:
-            qwen_fixes += n
-            print(f"🔧 [{skill_id}] f-string 前綴修復: q = '{{...}}' → q = f'{{...}}' ({n} 處)")
-        
-        # F.4 [V47.0 後處理] 修復 fmt_num(clean_latex_output)(X) 這種錯誤串接
-        # 防止替換順序導致的雙重包裹
-        clean_code, n = re.subn(
-            r'fmt_num\s*\(\s*clean_latex_output\s*\)\s*\(\s*([a-zA-Z_]\w*)\s*\)',
-            r'clean_latex_output(\1)',
-            clean_code
-        )
-        if n > 0:
-            qwen_fixes += n
-            print(f"🔧 [{skill_id}] 修復函式串接錯誤: fmt_num(clean_latex_output)(X) → clean_latex_output(X) ({n} 處)")
-
-        # [V47.4 新增通用 Regex 修補]
-        # G.1 修復 to_latex(...) 在全域：轉為 fmt_num(...)
-        clean_code, n = re.subn(r'\bto_latex\s*\(', 'fmt_num(', clean_code)
-        if n > 0:
-            qwen_fixes += n
-            print(f"🔧 [{skill_id}] 全域修復: to_latex(...) → fmt_num(...) ({n} 處)")
-        
-        # G.2 修復雙括號 {{}} 包 op_latex (使用預編譯 pattern)
-        clean_code, n = COMPILED_PATTERNS['op_latex_double'].subn(r'{op_latex[\1]}', clean_code)
-        if n > 0:
-            qwen_fixes += n
-            print(f"🔧 [{skill_id}] 雙括號修復: {{{{op_latex[...]}}}} → {{op_latex[...]}} ({n} 處)")
-        
-        # G.3 修復 Fraction 除法：Fraction(a, b) / Fraction(c, d) → (a/b) / (c/d) (使用預編譯 pattern)
-        clean_code, n = COMPILED_PATTERNS['fraction_div'].subn(
-            r'(\1 / \2) / (\3 / \4)',
-            clean_code
-        )
-        if n > 0:
-            qwen_fixes += n
-            print(f"🔧 [{skill_id}] Fraction 除法修復: Fraction(a,b)/Fraction(c,d) → 更清晰形式 ({n} 處)")
-        
-        # G.4 修復括號模式：若存在 bracket_structure = random.choice(...) 的候選集中有 None 或空值，篩選掉
-        clean_code, n = re.subn(
-            r'(bracket_structure\s*=\s*random\.choice\(\[)([^\]]*None[^\]]*)\](\))',
-            r'\1\2\3',
-            clean_code
-        )
-        if n > 0:
-            qwen_fixes += n
-            print(f"🔧 [{skill_id}] 括號候選篩選: 移除 None 或無效值 ({n} 處)")
-        
-        regex_fixes += qwen_fixes
-        healing_duration = time.time() - healing_start
-
-        # ========================================
-        # Step G: [NEW] AST 深度邏輯手術
-        # ========================================
-        # [Research Fix] AST Healer 條件執行
-        # 只有當程式碼至少是語法正確(Syntax Valid)時，AST 才能運作
-        # 所以先做一次快速檢查，或直接 try-catch
-        
-        ast_start = time.time()
-        if use_ast_healer:
-            clean_code, ast_fixes_count = fix_code_via_ast(clean_code)
-            ast_fixes += ast_fixes_count
-            if ast_fixes_count > 0:
-                print(f"🔧 [AST Healer] {ast_fixes_count} structural fixes applied")
-        else:
-            print(f"⏭️  [{skill_id}] AST Healer SKIPPED (ablation_id={ablation_id})")
-            ast_fixes_count = 0
-        # ========================================
-
-        # ========================================
-        # Step H: [DISABLED V46.9] 強制 LaTeX 清洗
-        # ========================================
-        # ❌ 已禁用原因：
-        #    - 舊邏輯假設變數名稱為 q，但 AI 可能使用 q_latex、question 等
-        #    - 導致 LaTeX 清洗邏輯無法應用（問題代碼中 return 用 q_latex 但檢查 q）
-        # ✅ 新解決方案：使用 Step E.9 Return 語句自動清洗
-        #    - 自動偵測 return 中的實際變數名稱
-        #    - 對所有變數名稱都能正確應用 clean_latex_output()
-        # ========================================
-
-        # 組合
-        final_code = CALCULATION_SKELETON + "\n" + clean_code
-
-        # 7. 驗證
-        is_valid, error_msg = validate_python_code(final_code)
+        # 5~7. 清洗、修復、組裝與驗證 (Healer Pipeline)
+        healed = heal_raw_output(raw_output, skill_id, use_regex_healer, use_ast_healer, ablation_id)
+        clean_code = healed['clean_code']
+        final_code = healed['final_code']
+        is_valid, error_msg = healed['is_valid'], healed['error_msg']
+        regex_fixes, ast_fixes = healed['regex_fixes'], healed['ast_fixes']
+        garbage_cleaner_count = healed['garbage_cleaner_count']
+        eval_eliminator_count = healed['eval_eliminator_count']
+        removed_list = healed['removed_list']
+        healing_duration = healed['healing_duration']
         
         # 8. 生成完整標頭 (Header)
         duration = time.time() - start_time
@@ -2629,6 +2456,7 @@ def auto_generate_skill_code(skill_id, queue=None, **kwargs):
 # Created At: {created_at}
 # Fix Status: {fix_status_str} | Fixes: Regex={regex_fixes}, AST={ast_fixes}
 # Verification: Internal Logic Check = {verify_status_str}
+# Skill Runtime: {SKILL_RUNTIME_VERSION}
 # ==============================================================================
 """
         # 寫檔
@@ -2640,45 +2468,12 @@ def auto_generate_skill_code(skill_id, queue=None, **kwargs):
         sampling_total_count = 0
         
         if is_valid:
-            import importlib.util
-            try:
-                spec = importlib.util.spec_from_loader("temp_skill", loader=None)
-                temp_module = importlib.util.module_from_spec(spec)
-                exec(final_code, temp_module.__dict__)
-                
-                # ✅ [Performance Fix V9.2.1] 早期退出機制
-                for sample_idx in range(3):
-                    sampling_total_count += 1
-                    try:
-                        item = temp_module.generate()
-                        # 验证返回结构
-                        assert isinstance(item, dict), f"generate() must return dict, got {type(item)}"
-                        assert 'question_text' in item, "Missing 'question_text' key"
-                        assert 'answer' in item, "Missing 'answer' key"
-                        # 验证没有函数对象或类型错误
-                        question_str = str(item.get('question_text', ''))
-                        if 'function' in str(type(item.get('question_text', ''))).lower():
-                            raise TypeError(f"question_text is function object, not string: {type(item['question_text'])}")
-                        
-                        sampling_success_count += 1
-                        
-                        # ✅ 早期退出：如果前 2 次都成功，直接通過
-                        if sampling_success_count >= 2:
-                            print(f"✅ [{skill_id}] Dynamic sampling early pass (2/2 successful)")
-                            break
-                            
-                    except Exception as e:
-                        error_msg = f"Dynamic sampling failed at iteration {sample_idx+1}: {str(e)}"
-                        dyn_ok = False
-                        print(f"[WARN] {error_msg}")
-                        break
-                else:
-                    # 如果跑完 3 次都沒 break，說明至少 2 次成功（因為失敗會 break）
-                    if sampling_success_count >= 2:
-                        print(f"✅ [{skill_id}] Dynamic sampling passed all {sampling_success_count} iterations")
-            except Exception as e:
-                dyn_ok = False
-                print(f"[WARN] Dynamic sampling error (gating activated): {str(e)}")
+            sampling = run_dynamic_sampling(final_code, skill_id)
+            dyn_ok = sampling['ok']
+            sampling_success_count = sampling['success_count']
+            sampling_total_count = sampling['total_count']
+            if sampling['error_msg']:
+                error_msg = sampling['error_msg']
         
         # [V47.4] Gating 控制：只有當 is_valid AND dyn_ok 時，才寫檔
         success_final = bool(is_valid and dyn_ok)
@@ -2689,8 +2484,14 @@ def auto_generate_skill_code(skill_id, queue=None, **kwargs):
             else:
                 out_path = os.path.join(output_dir, f'{skill_id}.py')
             
+            # [效能] 技能檔綁定共用執行期模組，不再內嵌整份工具庫 (驗證時仍使用內嵌版 final_code)；
+            #        重新定義工具庫名稱的技能維持內嵌，讓其他工具函式呼叫到技能的版本 (與驗證時行為一致)
+            overridden = overridden_runtime_names(clean_code)
             with open(out_path, 'w', encoding='utf-8') as f:
-                f.write(header + final_code)
+                if overridden == []:
+                    f.write(header + SKILL_RUNTIME_PRELUDE + "\n" + clean_code)
+                else:
+                    f.write(header + final_code)
             print(f"✅ [{skill_id}] File written: {os.path.abspath(out_path)}")
         else:
             if not is_valid:
@@ -2778,7 +2579,9 @@ def auto_generate_skill_code(skill_id, queue=None, **kwargs):
             sampling_success_count=sampling_success_count,
             sampling_total_count=sampling_total_count,
             spec_prompt_id=kwargs.get('spec_prompt_id', None),
-            use_master_spec=kwargs.get('use_master_spec', False)
+            use_master_spec=kwargs.get('use_master_spec', False),
+            ttft_seconds=ttft_seconds,
+            tokens_per_second=tokens_per_second
         )
 
         return success_final, "V47.4 Generated", {
@@ -15,6 +15,7 @@ import os
 import logging
 import traceback
 from models import db
+from core.bulk_loader import BulkLoader
 from datetime import datetime, timedelta
 import numpy as np
 
@@ -153,6 +154,7 @@ def import_excel_to_db(filepath):
 
         results = []
         results.append(f"ℹ️ 系統動態偵測到 {len(mapping)} 個資料庫模型。")
+        loader = BulkLoader()
         
         # 2. 遍歷每一個 Sheet
         for sheet_name, df in xls.items():
@@ -186,45 +188,47 @@ def import_excel_to_db(filepath):
             # 取得該 Model 的所有欄位名稱
             model_columns = model.__table__.columns.keys()
             
-            imported_count = 0
             skipped_count = 0
-            
-            # 4. 逐列寫入資料庫
-            for index, row in df.iterrows():
+            rows = []
+
+            # 4. 整理每一列 (只保留 Model 有的欄位)，再由 BulkLoader 一次寫入
+            for index, row in enumerate(df.to_dict('records')):
                 try:
                     data = {}
                     # 只讀取 Model 裡有的欄位，忽略 Excel 裡多餘的欄位
                     for col in model_columns:
                         if col in row:
                             val = row[col]
-                            
+
                             # 特殊處理：布林值字串轉換
                             if isinstance(val, str):
                                 if val.lower() == 'true': val = True
                                 elif val.lower() == 'false': val = False
-                            
+
                             data[col] = val
-                    
+
                     if not data:
                         skipped_count += 1
                         continue
 
                     # 🔥 [關鍵修改] 呼叫清洗函式，把 Excel 格式轉為 Python 格式
-                    data = clean_excel_row(data)
+                    rows.append(clean_excel_row(data))
 
-                    # 使用 merge (UPSERT): 有 Primary Key 就更新，沒有就新增
-                    instance = model(**data)
-                    db.session.merge(instance)
-                    imported_count += 1
-                    
                 except Exception as e:
-                    print(f"❌ Error inserting row {index} in {sheet_name}: {e}")
+                    print(f"❌ Error preparing row {index} in {sheet_name}: {e}")
                     continue
-            
-            results.append(f"✅ Table '{table_name}': 成功匯入/更新 {imported_count} 筆。")
 
-        # 5. 提交變更
+            # UPSERT: 有 Primary Key (或唯一約束欄位) 且已存在就更新，否則新增
+            inserted, updated = loader.upsert(model.__table__, rows)
+            table_stats = loader.stats()['tables'].get(table_name, {})
+            rate = f"，{table_stats['rows_per_second']:.0f} 筆/秒" if table_stats.get('rows_per_second') else ""
+            results.append(f"✅ Table '{table_name}': 成功匯入/更新 {inserted + updated} 筆 (新增 {inserted}、更新 {updated}{rate})。")
+
+        # 5. 提交變更 (所有 Sheet 同一個交易)
         db.session.commit()
+        summary = loader.stats()
+        if summary['rows']:
+            results.append(f"⏱️ 共寫入 {summary['rows']} 筆，耗時 {summary['seconds']:.2f} 秒 ({summary['rows_per_second']:.0f} 筆/秒)。")
         return True, "\n".join(results)
 
     except Exception as e:
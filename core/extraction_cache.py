@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/extraction_cache.py
+功能說明 (Description): 教科書擷取快取 (Extraction Cache)，以 (檔案內容雜湊, 頁碼, OCR 語言, 擷取器版本) 為鍵
+                       將每頁擷取結果 (PDF 文字層 + OCR、Word 的 Pandoc 轉換結果) 存於磁碟；
+                       重新匯入未變更的檔案 (僅改課綱標籤、AI 步驟失敗重跑) 時直接略過 Pandoc / OCR。
+執行語法 (Usage): 由系統調用 (from core.extraction_cache import EXTRACTION_CACHE)
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import hashlib
+import json
+import os
+
+from config import Config
+from core.llm_cache import LLMResponseCache
+
+
+def file_hash(file_path, chunk_size=1 << 20):
+    """檔案內容的 SHA-256 (與檔名、上傳時間無關)"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache(LLMResponseCache):
+    """
+    沿用 LLM 回應快取的磁碟格式 (每筆一個 JSON 檔、原子寫入) 與容量上限的 LRU 淘汰。
+    - 每頁一筆紀錄 (Word 檔整份為第 1 頁)，中途失敗的匯入重跑時已完成的頁面仍可命中。
+    - version 需包含會影響輸出的擷取參數 (例如 OCR DPI、門檻)，參數變更即自然失效。
+    - mode: off (不使用) / readwrite (預設)。
+    """
+
+    @staticmethod
+    def make_key(content_hash, page, lang, version):
+        material = json.dumps([content_hash, page, lang, version], sort_keys=True, default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def get_page(self, content_hash, page, lang, version):
+        if not self.enabled:
+            return None
+        entry = self.get(self.make_key(content_hash, page, lang, version))
+        return entry['text'] if entry is not None else None
+
+    def put_page(self, content_hash, page, lang, version, text):
+        if self.enabled:
+            self.put(self.make_key(content_hash, page, lang, version), {'page': page, 'text': text})
+
+
+EXTRACTION_CACHE = ExtractionCache(
+    cache_dir=getattr(Config, 'EXTRACTION_CACHE_DIR', os.path.join(Config.instance_path, 'extraction_cache')),
+    max_bytes=getattr(Config, 'EXTRACTION_CACHE_MAX_MB', 256) * 1024 * 1024,
+    mode='readwrite' if getattr(Config, 'EXTRACTION_CACHE_ENABLED', True) else 'off',
+)
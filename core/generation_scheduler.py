@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/generation_scheduler.py
+功能說明 (Description): 批次程式碼生成排程器 (Generation Scheduler)，以有上限的執行緒池並行呼叫 auto_generate_skill_code，
+                       依 AI 供應商套用全域並行上限與 Token Bucket 速率限制，並依輸入順序回報結果與寫入 experiment_log。
+執行語法 (Usage): 由系統調用 (GenerationScheduler().run(skill_ids, queue=queue))
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from flask import current_app
+
+from config import Config
+
+# 供應商別名 (MODEL_ROLES 中 'gemini' 與 'google' 皆指 Gemini API)
+_PROVIDER_ALIASES = {'gemini': 'google'}
+
+_limits_lock = threading.Lock()
+_PROVIDER_SEMAPHORES = {}
+_PROVIDER_BUCKETS = {}
+# 目前執行緒持有的供應商並行名額 (由 release_provider_slot 提前歸還)
+_SLOT = threading.local()
+
+
+class TokenBucket:
+    """
+    Token Bucket 速率限制器
+    - 每分鐘補充 rate_per_minute 個 token，最多累積 capacity 個 (允許短暫突發)。
+    - acquire() 取得一個 token，不足時阻塞等待。
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1, int(rate_per_minute // 4) or 1)
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def resolve_provider(role='coder'):
+    """依 Config.MODEL_ROLES 取得角色對應的供應商名稱 ('local' / 'google')"""
+    role_config = Config.MODEL_ROLES.get(role, Config.MODEL_ROLES.get('default', {}))
+    provider = str(role_config.get('provider', Config.DEFAULT_PROVIDER)).lower()
+    return _PROVIDER_ALIASES.get(provider, provider)
+
+
+def _provider_limits(provider):
+    """取得 (或建立) 供應商的全域並行號誌與速率限制器，跨排程器實例共用"""
+    with _limits_lock:
+        if provider not in _PROVIDER_SEMAPHORES:
+            concurrency = getattr(Config, 'GENERATION_CONCURRENCY', {}).get(provider, 1)
+            rate = getattr(Config, 'GENERATION_RATE_PER_MINUTE', {}).get(provider)
+            _PROVIDER_SEMAPHORES[provider] = (concurrency, threading.BoundedSemaphore(concurrency))
+            _PROVIDER_BUCKETS[provider] = TokenBucket(rate) if rate else None
+        concurrency, semaphore = _PROVIDER_SEMAPHORES[provider]
+        return concurrency, semaphore, _PROVIDER_BUCKETS[provider]
+
+
+def release_provider_slot():
+    """
+    提前歸還目前執行緒持有的供應商並行名額 (模型回應後呼叫)。
+    之後的 Healer 與沙箱驗證不再佔用名額，下一個技能的 LLM 呼叫可同時開始；不在排程器內呼叫時無作用。
+    """
+    semaphore = getattr(_SLOT, 'semaphore', None)
+    if semaphore is not None:
+        _SLOT.semaphore = None
+        semaphore.release()
+
+
+class GenerationScheduler:
+    """
+    批次程式碼生成排程器
+    - 同一供應商的並行數受 Config.GENERATION_CONCURRENCY 限制 (多個批次同時執行時也共用上限)。
+    - 每次生成前向 Token Bucket 取得 token (Config.GENERATION_RATE_PER_MINUTE)。
+    - 模型回應後 (release_provider_slot) 即歸還名額，驗證階段與後續技能的 LLM 呼叫並行。
+    - 進度依完成順序推送至 queue；結果、on_result 回呼與 experiment_log 寫入則依輸入順序。
+    """
+
+    def __init__(self, app=None, provider=None, generate_fn=None):
+        self.app = app
+        self.provider = provider or resolve_provider('coder')
+        self.generate_fn = generate_fn
+
+    def _generate(self, skill_id, queue, kwargs):
+        from core.code_generator import auto_generate_skill_code, capture_experiment_logs
+
+        generate_fn = self.generate_fn or auto_generate_skill_code
+        _, semaphore, bucket = _provider_limits(self.provider)
+        semaphore.acquire()
+        _SLOT.semaphore = semaphore
+        try:
+            if bucket is not None:
+                bucket.acquire()
+            started = time.time()
+            with self.app.app_context(), capture_experiment_logs() as log_rows:
+                try:
+                    success, message, metrics = generate_fn(skill_id, queue=queue, **kwargs)
+                    error = None
+                except Exception as e:
+                    success, message, metrics, error = False, str(e), {}, e
+        finally:
+            release_provider_slot()
+        return {
+            'skill_id': skill_id,
+            'success': success,
+            'message': message,
+            'metrics': metrics or {},
+            'error': error,
+            'duration': time.time() - started,
+        }, log_rows
+
+    def run(self, skill_ids, queue=None, on_result=None, on_progress=None, **kwargs):
+        """
+        並行生成 skill_ids 的程式碼，回傳與 skill_ids 同順序的結果 list。
+        kwargs 原樣傳給 auto_generate_skill_code (ablation_id, model_size_class ...)。
+        on_result(result)       : 依輸入順序呼叫 (於呼叫端執行緒)
+        on_progress(result, n)  : 依完成順序呼叫，n 為已完成數
+        """
+        from core.code_generator import write_experiment_logs
+
+        skill_ids = list(skill_ids)
+        if not skill_ids:
+            return []
+        if self.app is None:
+            self.app = current_app._get_current_object()
+
+        concurrency, _, _ = _provider_limits(self.provider)
+        # 模型回應後即歸還名額，額外的執行緒讓 Healer / 沙箱驗證與下一批 LLM 呼叫重疊
+        workers = concurrency + (getattr(Config, 'SANDBOX_POOL_SIZE', 0) if getattr(Config, 'SANDBOX_ENABLED', False) else 0)
+        total = len(skill_ids)
+        finished = [None] * total
+        results = []
+        done = 0
+        with ThreadPoolExecutor(max_workers=min(workers, total), thread_name_prefix='codegen') as executor:
+            futures = {executor.submit(self._generate, skill_id, queue, kwargs): idx
+                       for idx, skill_id in enumerate(skill_ids)}
+            for future in as_completed(futures):
+                idx = futures[future]
+                result, log_rows = future.result()
+                finished[idx] = (result, log_rows)
+                done += 1
+
+                if queue:
+                    status = "生成成功" if result['success'] else f"生成失敗 ({result['message']})"
+                    level = "INFO" if result['success'] else ("ERROR" if result['error'] else "WARN")
+                    queue.put(f"{level}: [{done}/{total}] {result['skill_id']} {status}")
+                if on_progress:
+                    on_progress(result, done)
+
+                # 依輸入順序寫入實驗紀錄並回呼 (前面的技能完成前先暫存)
+                while len(results) < total and finished[len(results)] is not None:
+                    ready, rows = finished[len(results)]
+                    write_experiment_logs(rows)
+                    results.append(ready)
+                    if on_result:
+                        on_result(ready)
+        return results
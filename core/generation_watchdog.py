@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/generation_watchdog.py
+功能說明 (Description): 題目生成看門狗 (Generation Watchdog)，讓技能的 generate() 在有時間預算的執行緒中執行，
+                       逾時即以非同步例外中止 (避免無窮拒絕取樣迴圈佔住請求執行緒)，
+                       並依技能統計慢速次數；連續逾時的技能自動隔離一段時間，期間改由題目池 / 最近題目出題。
+                       無法中止的執行緒 (卡在 C 函式內) 仍存活時，該技能拒絕任何新的執行，避免執行緒持續累積。
+執行語法 (Usage): 由系統調用 (from core.generation_watchdog import GENERATION_WATCHDOG)
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import ctypes
+import logging
+import threading
+import time
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationTimeout(Exception):
+    """generate() 超過時間預算 (亦作為注入被中止執行緒的例外)"""
+
+
+class SkillQuarantined(Exception):
+    """技能隔離中，暫停即時生成"""
+
+
+def _interrupt(thread):
+    """在目標執行緒注入 GenerationTimeout (CPython：下一個 bytecode 邊界生效，C 函式內的阻塞無法中斷)"""
+    ret = ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread.ident), ctypes.py_object(GenerationTimeout))
+    if ret > 1:
+        ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread.ident), None)
+        return False
+    return ret == 1
+
+
+class _SkillStats:
+    __slots__ = ('calls', 'slow', 'consecutive_slow', 'max_seconds', 'total_seconds', 'quarantined_until', 'quarantines')
+
+    def __init__(self):
+        self.calls = 0
+        self.slow = 0
+        self.consecutive_slow = 0
+        self.max_seconds = 0.0
+        self.total_seconds = 0.0
+        self.quarantined_until = 0.0
+        self.quarantines = 0
+
+
+class GenerationWatchdog:
+    """
+    技能生成看門狗
+    - run(): 於獨立的 daemon 執行緒呼叫 fn，自 fn 開始執行起等待 budget 秒；逾時注入 GenerationTimeout 中止並拋出同名例外。
+      出題 (generate_question) 不持有任何行程層級的鎖，慢速技能不會讓其他技能排隊而被誤判逾時。
+    - 連續逾時 quarantine_after 次的技能隔離 quarantine_seconds 秒，enforce=True 的呼叫直接拋出 SkillQuarantined。
+    - 逾時後注入例外仍無法中止的執行緒記為卡住；卡住的執行緒存活期間，該技能的所有呼叫 (不論 enforce)
+      都拋出 SkillQuarantined，無法中止的執行緒不會隨後續呼叫持續累積。
+    - 成功生成會重置連續逾時計數；技能重新生成後以 release() 解除隔離 (卡住的執行緒須自行結束)。
+    """
+
+    def __init__(self, budget=2.0, quarantine_after=2, quarantine_seconds=600):
+        self.budget = budget
+        self.quarantine_after = quarantine_after
+        self.quarantine_seconds = quarantine_seconds
+        self._skills = {}
+        self._stuck = {}  # skill_id -> 無法中止的執行緒
+        self._lock = threading.Lock()
+        self._counters = {'calls': 0, 'timeouts': 0, 'rejected': 0, 'stuck': 0}
+
+    def _stats(self, skill_id):
+        stats = self._skills.get(skill_id)
+        if stats is None:
+            stats = self._skills[skill_id] = _SkillStats()
+        return stats
+
+    def _stuck_thread(self, skill_id):
+        """仍存活的卡住執行緒 (已結束者一併清除)。呼叫端需持有 _lock"""
+        thread = self._stuck.get(skill_id)
+        if thread is not None and not thread.is_alive():
+            del self._stuck[skill_id]
+            thread = None
+        return thread
+
+    def is_quarantined(self, skill_id):
+        """隔離中，或仍有卡住的生成執行緒"""
+        with self._lock:
+            stats = self._skills.get(skill_id)
+            if stats is not None and stats.quarantined_until > time.monotonic():
+                return True
+            return self._stuck_thread(skill_id) is not None
+
+    def release(self, skill_id):
+        """解除隔離並重置連續逾時計數 (例如技能程式碼已重新生成)"""
+        with self._lock:
+            stats = self._skills.get(skill_id)
+            if stats is not None:
+                stats.quarantined_until = 0.0
+                stats.consecutive_slow = 0
+
+    def run(self, skill_id, fn, *args, budget=None, enforce=True):
+        """在時間預算內執行 fn(*args) 並回傳結果；fn 拋出的例外原樣拋出"""
+        with self._lock:
+            if self._stuck_thread(skill_id) is not None:
+                self._counters['rejected'] += 1
+                raise SkillQuarantined(f"{skill_id} 仍有無法中止的生成執行緒")
+        if enforce and self.is_quarantined(skill_id):
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise SkillQuarantined(skill_id)
+
+        budget = self.budget if budget is None else budget
+        outcome = {}
+        running = threading.Event()
+
+        def target():
+            outcome['started'] = time.monotonic()
+            running.set()
+            try:
+                outcome['value'] = fn(*args)
+            except GenerationTimeout:
+                pass
+            except BaseException as e:
+                outcome['error'] = e
+
+        worker = threading.Thread(target=target, name=f'generate-{skill_id}', daemon=True)
+        worker.start()
+        # 預算從 fn 實際開始執行才起算 (執行緒排程的等待不算在技能頭上)
+        running.wait()
+        worker.join(max(0.0, outcome['started'] + budget - time.monotonic()))
+        elapsed = time.monotonic() - outcome['started']
+        timed_out = worker.is_alive()
+        if timed_out:
+            _interrupt(worker)
+            worker.join(0.5)
+        self._record(skill_id, elapsed, timed_out, stuck=worker if timed_out and worker.is_alive() else None)
+
+        if timed_out:
+            raise GenerationTimeout(f"{skill_id} 生成超過 {budget:g} 秒")
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome.get('value')
+
+    def _record(self, skill_id, elapsed, timed_out, stuck):
+        """stuck 為無法中止的執行緒 (沒有則為 None)"""
+        with self._lock:
+            self._counters['calls'] += 1
+            stats = self._stats(skill_id)
+            stats.calls += 1
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            if not timed_out:
+                stats.consecutive_slow = 0
+                return
+            self._counters['timeouts'] += 1
+            if stuck is not None:
+                self._counters['stuck'] += 1
+                self._stuck[skill_id] = stuck
+                logger.warning(f"技能 {skill_id} 的生成執行緒無法中止，該執行緒結束前拒絕新的生成")
+            stats.slow += 1
+            stats.consecutive_slow += 1
+            if stats.consecutive_slow >= self.quarantine_after and stats.quarantined_until <= time.monotonic():
+                stats.quarantined_until = time.monotonic() + self.quarantine_seconds
+                stats.quarantines += 1
+                logger.warning(f"技能 {skill_id} 連續 {stats.consecutive_slow} 次生成逾時，隔離 {self.quarantine_seconds} 秒")
+
+    def skill_stats(self):
+        """{skill_id: 慢速生成統計}，供後台技能頁顯示"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                skill_id: {
+                    'calls': s.calls,
+                    'slow': s.slow,
+                    'slow_rate': round(s.slow / s.calls, 4) if s.calls else 0.0,
+                    'avg_ms': round(s.total_seconds / s.calls * 1000, 1) if s.calls else 0.0,
+                    'max_ms': round(s.max_seconds * 1000, 1),
+                    'quarantines': s.quarantines,
+                    'quarantined': s.quarantined_until > now or self._stuck_thread(skill_id) is not None,
+                    'stuck': self._stuck_thread(skill_id) is not None,
+                    'quarantine_remaining': max(0, round(s.quarantined_until - now)),
+                }
+                for skill_id, s in self._skills.items()
+            }
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+        skills = self.skill_stats()
+        data['budget'] = self.budget
+        data['quarantined'] = sorted(k for k, v in skills.items() if v['quarantined'])
+        data['skills'] = skills
+        return data
+
+
+GENERATION_WATCHDOG = GenerationWatchdog(
+    budget=getattr(Config, 'GENERATION_TIME_BUDGET', 2.0),
+    quarantine_after=getattr(Config, 'GENERATION_QUARANTINE_AFTER', 2),
+    quarantine_seconds=getattr(Config, 'GENERATION_QUARANTINE_SECONDS', 600),
+)
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/jobs.py
+功能說明 (Description): 背景任務子系統 (Job Subsystem)，取代 core/globals.TASK_QUEUES 的行程內 queue.Queue。
+                       任務與進度訊息存放在 SQLite (jobs 資料表 + 只追加的 job_logs 日誌)，
+                       每個 WSGI worker 各自啟動可設定數量的執行緒搶任務 (原子性領取)，
+                       任一 worker 都能以 SSE 追蹤任何任務的日誌；worker 重啟後未完成的任務會自動恢復 (依 checkpoint 續做)。
+執行語法 (Usage): 由系統調用 (from core.jobs import JOB_RUNNER)
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import atexit
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+TERMINAL = (SUCCEEDED, FAILED)
+
+# 串流結束標記 (與 importer_status.html 相容)
+END_OF_STREAM = 'END_OF_STREAM'
+
+_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL,
+        status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,
+        worker TEXT, checkpoint TEXT, error TEXT,
+        created_at REAL NOT NULL, started_at REAL, heartbeat_at REAL, finished_at REAL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)',
+    '''
+    CREATE TABLE IF NOT EXISTS job_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL,
+        created_at REAL NOT NULL, message TEXT NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_job_logs_job ON job_logs (job_id, id)',
+]
+
+
+class JobStore:
+    """jobs / job_logs 資料表存取 (每次操作開新連線，可跨執行緒與行程使用)"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        if not self._ready:
+            conn.execute('PRAGMA journal_mode=WAL')
+            for sql in _SCHEMA:
+                conn.execute(sql)
+            conn.commit()
+            self._ready = True
+        return conn
+
+    def _run(self, fn):
+        conn = self._connect()
+        try:
+            with conn:
+                return fn(conn)
+        finally:
+            conn.close()
+
+    def enqueue(self, kind, payload):
+        job_id = str(uuid.uuid4())
+        self._run(lambda conn: conn.execute(
+            'INSERT INTO jobs (id, kind, payload, status, created_at) VALUES (?, ?, ?, ?, ?)',
+            (job_id, kind, json.dumps(payload, ensure_ascii=False), QUEUED, time.time())))
+        return job_id
+
+    def claim(self, worker_id, kinds):
+        """原子性領取最舊的待執行任務 (BEGIN IMMEDIATE 取得寫入鎖，多行程不會領到同一個)"""
+        if not kinds:
+            return None
+        conn = self._connect()
+        try:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            marks = ','.join('?' * len(kinds))
+            row = conn.execute(f'SELECT * FROM jobs WHERE status = ? AND kind IN ({marks}) '
+                               f'ORDER BY created_at LIMIT 1', (QUEUED, *kinds)).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            now = time.time()
+            conn.execute('UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, '
+                         'started_at = COALESCE(started_at, ?), heartbeat_at = ? WHERE id = ?',
+                         (RUNNING, worker_id, now, now, row['id']))
+            conn.execute('COMMIT')
+            job = dict(row)
+            job['attempts'] += 1
+            return job
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def get(self, job_id):
+        row = self._run(lambda conn: conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+        return dict(row) if row is not None else None
+
+    def append_log(self, job_id, message):
+        self._run(lambda conn: conn.execute(
+            'INSERT INTO job_logs (job_id, created_at, message) VALUES (?, ?, ?)', (job_id, time.time(), str(message))))
+
+    def tail(self, job_id, after_id=0, limit=500):
+        """回傳 after_id 之後的日誌 [(log_id, message), ...]"""
+        rows = self._run(lambda conn: conn.execute(
+            'SELECT id, message FROM job_logs WHERE job_id = ? AND id > ? ORDER BY id LIMIT ?',
+            (job_id, after_id, limit)).fetchall())
+        return [(row['id'], row['message']) for row in rows]
+
+    def heartbeat(self, job_ids):
+        if job_ids:
+            now = time.time()
+            self._run(lambda conn: conn.executemany(
+                'UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ?', [(now, j, RUNNING) for j in job_ids]))
+
+    def save_checkpoint(self, job_id, checkpoint):
+        self._run(lambda conn: conn.execute('UPDATE jobs SET checkpoint = ? WHERE id = ?',
+                                            (json.dumps(checkpoint, ensure_ascii=False), job_id)))
+
+    def finish(self, job_id, status, error=None):
+        self._run(lambda conn: conn.execute('UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?',
+                                            (status, error, time.time(), job_id)))
+
+    def requeue_stale(self, stale_seconds, max_attempts):
+        """
+        心跳逾時的 running 任務 (所屬 worker 已重啟或當機)：
+        未達嘗試上限者改回 queued 由任一 worker 續做，否則標記失敗。回傳 (恢復數, 失敗數)
+        """
+        cutoff = time.time() - stale_seconds
+
+        def fn(conn):
+            rows = conn.execute('SELECT id, attempts FROM jobs WHERE status = ? AND heartbeat_at < ?',
+                                (RUNNING, cutoff)).fetchall()
+            resumed, failed = [], []
+            for row in rows:
+                (resumed if row['attempts'] < max_attempts else failed).append(row['id'])
+            conn.executemany('UPDATE jobs SET status = ?, worker = NULL WHERE id = ? AND status = ?',
+                             [(QUEUED, j, RUNNING) for j in resumed])
+            now = time.time()
+            conn.executemany('UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND status = ?',
+                             [(FAILED, '超過重試次數', now, j, RUNNING) for j in failed])
+            conn.executemany('INSERT INTO job_logs (job_id, created_at, message) VALUES (?, ?, ?)',
+                             [(j, now, 'WARN: 任務執行中斷，將從上次進度恢復...') for j in resumed] +
+                             [(j, now, 'ERROR: 任務多次中斷，已放棄') for j in failed] +
+                             [(j, now, END_OF_STREAM) for j in failed])
+            return len(resumed), len(failed)
+        return self._run(fn)
+
+    def counts(self):
+        rows = self._run(lambda conn: conn.execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status').fetchall())
+        return {row['status']: row['n'] for row in rows}
+
+
+class JobContext:
+    """
+    傳給任務處理函式的進度物件
+    - put(msg): 寫入日誌 (與原本的 queue.Queue.put 介面相容，textbook_processor 等可直接沿用)
+    - checkpoint / save_checkpoint(): 讀寫續做進度 (任務恢復時從這裡接續)
+    """
+
+    def __init__(self, store, job):
+        self.store = store
+        self.job = job
+        self.job_id = job['id']
+        self.payload = json.loads(job['payload'])
+        self.checkpoint = json.loads(job['checkpoint']) if job.get('checkpoint') else {}
+        self.resumed = job['attempts'] > 1
+
+    def put(self, message):
+        self.store.append_log(self.job_id, message)
+
+    def save_checkpoint(self, **values):
+        self.checkpoint.update(values)
+        self.store.save_checkpoint(self.job_id, self.checkpoint)
+
+
+class JobRunner:
+    """
+    任務執行器 (每個 WSGI worker 一個)
+    - register(kind, fn): 註冊處理函式 fn(ctx)；fn 正常結束視為成功，拋出例外視為失敗。
+    - init_app(app): 綁定 Flask app。
+    - start(): 恢復逾時任務並啟動 workers 個輪詢執行緒與一個心跳執行緒 (由伺服器行程呼叫，CLI 腳本不呼叫)。
+    - submit(kind, payload): 寫入 jobs 資料表，由任一 worker 的執行緒領取。
+    - stream(job_id, after_id): 產生 (log_id, message)，直到任務結束且日誌讀完 (最後送出 END_OF_STREAM)。
+    """
+
+    def __init__(self, store, workers=1, poll_interval=1.0, stale_seconds=120, max_attempts=3):
+        self.store = store
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers = {}
+        self._active = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._started = False
+        self._app = None
+        self._counters = {'claimed': 0, 'succeeded': 0, 'failed': 0, 'resumed': 0}
+
+    def register(self, kind, fn):
+        self._handlers[kind] = fn
+        return fn
+
+    def init_app(self, app):
+        """綁定 Flask app (處理函式在其 app context 內執行)；不啟動執行緒，CLI 腳本呼叫 create_app() 不會領取任務"""
+        self._app = app
+
+    def start(self):
+        """恢復逾時任務並啟動執行緒 (只在實際提供服務的行程呼叫；workers <= 0 或重複呼叫時不做事)"""
+        with self._lock:
+            if self._started or self.workers <= 0:
+                return
+            self._started = True  # 並行的首批請求只會有一個啟動執行緒
+        resumed, _ = self.store.requeue_stale(self.stale_seconds, self.max_attempts)
+        self._counters['resumed'] += resumed
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        atexit.register(self.shutdown)
+
+    def submit(self, kind, payload):
+        if kind not in self._handlers:
+            raise ValueError(f"未註冊的任務類型: {kind}")
+        return self.store.enqueue(kind, payload)
+
+    def run_one(self):
+        """領取並執行一個任務；沒有任務時回傳 None"""
+        job = self.store.claim(self.worker_id, list(self._handlers))
+        if job is None:
+            return None
+        with self._lock:
+            self._active.add(job['id'])
+            self._counters['claimed'] += 1
+        ctx = JobContext(self.store, job)
+        try:
+            handler = self._handlers[job['kind']]
+            if self._app is not None:
+                with self._app.app_context():
+                    handler(ctx)
+            else:
+                handler(ctx)
+            status, error = SUCCEEDED, None
+        except Exception as e:
+            logger.exception(f"背景任務失敗: {job['id']}")
+            ctx.put(f"ERROR: 任務執行發生例外: {e}")
+            status, error = FAILED, str(e)
+        finally:
+            with self._lock:
+                self._active.discard(job['id'])
+        self.store.finish(job['id'], status, error)
+        ctx.put(END_OF_STREAM)
+        with self._lock:
+            self._counters[status] += 1
+        return job['id']
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                if self.run_one() is None:
+                    self._stop.wait(self.poll_interval)
+            except sqlite3.Error as e:
+                logger.warning(f"領取背景任務失敗: {e}")
+                self._stop.wait(self.poll_interval)
+
+    def _heartbeat(self):
+        interval = max(1.0, self.stale_seconds / 4)
+        while not self._stop.wait(interval):
+            try:
+                with self._lock:
+                    active = list(self._active)
+                self.store.heartbeat(active)
+                resumed, _ = self.store.requeue_stale(self.stale_seconds, self.max_attempts)
+                with self._lock:
+                    self._counters['resumed'] += resumed
+            except sqlite3.Error as e:
+                logger.warning(f"背景任務心跳失敗: {e}")
+
+    def stream(self, job_id, after_id=0, poll_interval=0.5, keepalive=15):
+        """
+        追蹤任務日誌 (任何 worker 皆可)：產生 (log_id, message)；長時間沒有新訊息時產生 (None, None) 作為保活。
+        任務結束且日誌讀完後結束。
+        """
+        idle = 0.0
+        while True:
+            rows = self.store.tail(job_id, after_id)
+            for log_id, message in rows:
+                after_id = log_id
+                yield log_id, message
+                if message == END_OF_STREAM:
+                    return
+            if rows:
+                idle = 0.0
+                continue
+            job = self.store.get(job_id)
+            if job is None:
+                yield None, END_OF_STREAM
+                return
+            if job['status'] in TERMINAL and not self.store.tail(job_id, after_id):
+                yield None, END_OF_STREAM
+                return
+            time.sleep(poll_interval)
+            idle += poll_interval
+            if idle >= keepalive:
+                idle = 0.0
+                yield None, None
+
+    def shutdown(self):
+        """停止領取新任務 (執行中的任務由其他 worker 在心跳逾時後恢復)"""
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+            data['active'] = len(self._active)
+        data['worker_id'] = self.worker_id
+        data['jobs'] = self.store.counts()
+        return data
+
+
+JOB_RUNNER = JobRunner(
+    JobStore(Config.db_path),
+    workers=getattr(Config, 'JOB_WORKERS', 1),
+    poll_interval=getattr(Config, 'JOB_POLL_INTERVAL', 1.0),
+    stale_seconds=getattr(Config, 'JOB_STALE_SECONDS', 120),
+    max_attempts=getattr(Config, 'JOB_MAX_ATTEMPTS', 3),
+)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/llm_cache.py
+功能說明 (Description): LLM 回應快取 (Content-Addressed Response Cache)，以 (provider, model, options, prompt) 的雜湊為鍵
+                       將模型原始輸出存於磁碟，支援容量上限的 LRU 淘汰與「僅重播 (replay)」模式，
+                       讓消融實驗可重複評估 Healer 而不必重新呼叫 GPU / 雲端模型。
+執行語法 (Usage): 設定環境變數 LLM_CACHE_MODE=readwrite|replay 後執行實驗腳本 (預設 off)
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ('off', 'readwrite', 'replay')
+
+
+class LLMCacheMiss(RuntimeError):
+    """replay 模式下找不到已錄製的回應"""
+
+
+class CachedResponse:
+    """從快取重建的回應物件 (與 LocalAIResponse 相同的 text / usage 介面)"""
+    from_cache = True
+
+    def __init__(self, text, prompt_tokens=0, completion_tokens=0):
+        self.text = text
+        self.usage = type('Usage', (), {})()
+        self.usage.prompt_tokens = prompt_tokens
+        self.usage.completion_tokens = completion_tokens
+        self.usage.total_tokens = prompt_tokens + completion_tokens
+        self.ttft_seconds = None
+        self.tokens_per_second = None
+
+
+def _extract_usage(response):
+    """同時支援 Gemini (usage_metadata) 與 Local/OpenAI 風格 (usage) 的 token 計數"""
+    meta = getattr(response, 'usage_metadata', None)
+    if meta is not None:
+        return (getattr(meta, 'prompt_token_count', 0) or 0,
+                getattr(meta, 'candidates_token_count', 0) or 0)
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        return getattr(usage, 'prompt_tokens', 0) or 0, getattr(usage, 'completion_tokens', 0) or 0
+    return 0, 0
+
+
+class LLMResponseCache:
+    """
+    磁碟 LLM 回應快取
+    - 每筆回應一個 JSON 檔：<cache_dir>/<key[:2]>/<key>.json，寫入採暫存檔 + os.replace (原子操作)。
+    - 命中時更新檔案 mtime，總容量超過 max_bytes 時依 mtime 淘汰最久未使用的紀錄 (LRU)。
+    - mode: off (不使用) / readwrite (命中即用，未命中呼叫模型並錄製) / replay (只讀，未命中拋出 LLMCacheMiss)。
+    """
+
+    def __init__(self, cache_dir, max_bytes, mode='off'):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"未知的 LLM 快取模式: {mode} (可用: {', '.join(CACHE_MODES)})")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        self._counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    @staticmethod
+    def make_key(provider, model, options, prompt):
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        material = json.dumps([provider, model, options, prompt_hash], sort_keys=True, default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _iter_entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, st.st_size, st.st_mtime
+
+    def get(self, key):
+        """取得快取回應 (dict)，未命中回傳 None"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path, None)  # LRU：標記為最近使用
+        except (OSError, ValueError):
+            with self._lock:
+                self._counters['misses'] += 1
+            return None
+        with self._lock:
+            self._counters['hits'] += 1
+        return entry
+
+    def put(self, key, entry):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        with self._lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._counters['stores'] += 1
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._iter_entries())
+            else:
+                self._total_bytes += len(data) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """刪除最久未使用的紀錄，直到容量降到上限的 90%。呼叫端需持有 _lock"""
+        target = self.max_bytes * 0.9
+        for path, size, _ in sorted(self._iter_entries(), key=lambda e: e[2]):
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._total_bytes -= size
+            self._counters['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in list(self._iter_entries()):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+            data['mode'] = self.mode
+            data['total_bytes'] = self._total_bytes
+        lookups = data['hits'] + data['misses']
+        data['hit_rate'] = round(data['hits'] / lookups, 4) if lookups else 0.0
+        return data
+
+
+class CachedAIClient:
+    """
+    包裝 LocalAIClient / GoogleAIClient，於 generate_content 前後查詢與錄製快取。
+    其餘屬性 (model、temperature ...) 直接轉給原本的 Client。
+    """
+
+    def __init__(self, client, cache, provider, model, options):
+        self._client = client
+        self._cache = cache
+        self._provider = provider
+        self._model = model
+        self._options = options
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def generate_content(self, prompt, **kwargs):
+        key = LLMResponseCache.make_key(self._provider, self._model, self._options, prompt)
+        entry = self._cache.get(key)
+        if entry is not None:
+            return CachedResponse(entry['text'], entry.get('prompt_tokens', 0), entry.get('completion_tokens', 0))
+        if self._cache.mode == 'replay':
+            raise LLMCacheMiss(f"replay 模式找不到已錄製的回應 ({self._provider}/{self._model}, key={key[:12]})")
+
+        response = self._client.generate_content(prompt, **kwargs)
+        # 錯誤回應 (連線失敗、API 例外、串流中斷的不完整輸出) 不錄製
+        if getattr(response, 'error', False) or getattr(response, 'truncated', False):
+            return response
+        try:
+            text = response.text
+        except Exception:
+            return response
+        prompt_tokens, completion_tokens = _extract_usage(response)
+        try:
+            self._cache.put(key, {
+                'provider': self._provider,
+                'model': self._model,
+                'options': self._options,
+                'text': text,
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'created_at': time.time(),
+            })
+        except OSError as e:
+            logger.warning(f"LLM 快取寫入失敗: {e}")
+        return response
+
+
+LLM_CACHE = LLMResponseCache(
+    cache_dir=getattr(Config, 'LLM_CACHE_DIR', os.path.join(Config.instance_path, 'llm_cache')),
+    max_bytes=getattr(Config, 'LLM_CACHE_MAX_MB', 512) * 1024 * 1024,
+    mode=getattr(Config, 'LLM_CACHE_MODE', 'off'),
+)
+
+
+def set_llm_cache_mode(mode):
+    """於執行期切換快取模式 (例如實驗腳本的 --replay 參數)"""
+    if mode not in CACHE_MODES:
+        raise ValueError(f"未知的 LLM 快取模式: {mode} (可用: {', '.join(CACHE_MODES)})")
+    LLM_CACHE.mode = mode
+
+
+def wrap_with_cache(client, provider, model, options):
+    """依目前快取模式回傳包裝後的 Client (off 時原樣回傳)"""
+    if LLM_CACHE.mode == 'off':
+        return client
+    return CachedAIClient(client, LLM_CACHE, provider, model, options)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/page_extractor.py
+功能說明 (Description): PDF 逐頁平行擷取 (Page Extractor)，以行程池同時處理多頁：
+                       文字層足夠的頁面不做 OCR；有文字層但含圖片的頁面只對圖片區域 OCR；
+                       沒有文字層的掃描頁才整頁 OCR。結果依頁碼順序回傳，並統計每秒處理頁數。
+                       本模組不依賴 Flask，可在 spawn 的子行程中匯入。
+執行語法 (Usage): 由系統調用 (from core.page_extractor import extract_pdf_pages)
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# 擷取邏輯變更 (影響輸出文字) 時遞增，讓擷取快取自然失效
+EXTRACTOR_VERSION = 2
+
+# 頁數少於此值時直接在本行程處理 (行程池啟動成本大於收益)
+MIN_PAGES_FOR_POOL = 4
+
+DEFAULT_OPTIONS = {
+    'min_text_chars': 50,          # 文字層非空白字元數達此值視為「文字層足夠」
+    'min_image_area_ratio': 0.02,  # 小於頁面面積 2% 的圖片 (圖示、裝飾) 不做 OCR
+    'ocr_dpi': 72,                 # OCR 時的渲染解析度 (與原本 get_pixmap() 預設相同)
+    'ocr_lang': 'chi_tra',
+    'large_font_threshold': 20,
+    'tesseract_cmd': None,
+}
+
+
+class TextBlock:
+    """頁面上的一個文字區塊：外框、各行文字與每行第一個 span 的字型大小"""
+    __slots__ = ('bbox', 'lines', 'sizes')
+
+    def __init__(self, bbox, lines, sizes):
+        self.bbox = bbox
+        self.lines = lines
+        self.sizes = sizes
+
+    @property
+    def text(self):
+        return "\n".join(self.lines)
+
+    @property
+    def font_size(self):
+        """區塊字型大小 (以第一行第一個 span 為準)"""
+        return self.sizes[0] if self.sizes else 0.0
+
+
+class PageModel:
+    """
+    單次 get_text("dict") 建立的頁面結構，取代逐區塊以 clip 重新排版查詢字型大小。
+    blocks 維持 PyMuPDF 的內容順序 (與 get_text("text") 相同)；reading_order() 依座標由上而下、由左而右排序。
+    """
+    __slots__ = ('blocks',)
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+
+    @classmethod
+    def from_page(cls, page):
+        blocks = []
+        for b in page.get_text("dict")['blocks']:
+            if b.get('type') != 0:  # 圖片區塊
+                continue
+            lines, sizes = [], []
+            for line in b['lines']:
+                spans = line['spans']
+                lines.append("".join(span['text'] for span in spans))
+                sizes.append(spans[0]['size'] if spans else 0.0)
+            blocks.append(TextBlock(tuple(b['bbox']), lines, sizes))
+        return cls(blocks)
+
+    @property
+    def text(self):
+        """與 page.get_text("text") 相同的純文字 (每行以換行結尾)"""
+        return "".join(line + "\n" for block in self.blocks for line in block.lines)
+
+    def reading_order(self):
+        return sorted(self.blocks, key=lambda block: (round(block.bbox[1]), block.bbox[0]))
+
+    def large_font_texts(self, threshold, reading_order=False):
+        """字型大小超過門檻的區塊文字 (大字體標題)"""
+        blocks = self.reading_order() if reading_order else self.blocks
+        return [block.text.strip() for block in blocks if block.font_size > threshold]
+
+
+def _image_regions(page, min_area_ratio):
+    """頁面上需要 OCR 的圖片區域 (過小的圖片略過)"""
+    page_area = abs(page.rect) or 1
+    regions = []
+    for info in page.get_image_info():
+        rect = page.rect & info['bbox']
+        if not rect.is_empty and abs(rect) / page_area >= min_area_ratio:
+            regions.append(rect)
+    return regions
+
+
+def _ocr(page, options, clip=None):
+    import pytesseract
+    from PIL import Image
+
+    if options.get('tesseract_cmd'):
+        pytesseract.pytesseract.tesseract_cmd = options['tesseract_cmd']
+    pix = page.get_pixmap(dpi=options['ocr_dpi'], clip=clip)
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    return pytesseract.image_to_string(img, lang=options['ocr_lang']).strip()
+
+
+def extract_page(file_path, page_index, options=None, doc=None):
+    """
+    擷取單一頁面；doc 為同一次擷取中已開啟的文件 (None 時自行開啟並於結束時關閉)。回傳 dict：
+        page         頁碼 (從 1 開始)
+        text         文字層 (+ 大字體標題 + OCR 結果，格式與舊版相同："\\nOCR Extracted: ...")
+        headings     大字體標題 (依閱讀順序)
+        ocr          'skipped' (文字層足夠) / 'regions' (只 OCR 圖片區域) / 'full' (整頁 OCR)
+        ocr_error    None / 'import' (缺 pytesseract、Pillow) / 'tesseract' (找不到引擎) / 其他錯誤訊息
+        seconds      本頁耗時
+    """
+    if doc is None:
+        import fitz  # PyMuPDF
+
+        with fitz.open(file_path) as doc:
+            return extract_page(file_path, page_index, options, doc)
+
+    opts = dict(DEFAULT_OPTIONS, **(options or {}))
+    started = time.perf_counter()
+    page = doc[page_index]
+
+    model = PageModel.from_page(page)
+    page_text = model.text
+    for large_text in model.large_font_texts(opts['large_font_threshold']):
+        if large_text and large_text not in page_text:
+            page_text = large_text + "\n" + page_text
+
+    text_chars = sum(1 for ch in page_text if not ch.isspace())
+    if text_chars >= opts['min_text_chars']:
+        regions = _image_regions(page, opts['min_image_area_ratio'])
+        mode = 'regions' if regions else 'skipped'
+    else:
+        regions = [None]  # 掃描頁：整頁 OCR
+        mode = 'full'
+
+    ocr_error = None
+    if regions:
+        try:
+            from pytesseract import TesseractNotFoundError
+            try:
+                ocr_texts = [_ocr(page, opts, clip) for clip in regions]
+                page_text += "\nOCR Extracted: " + "\n".join(t for t in ocr_texts if t)
+            except TesseractNotFoundError:
+                ocr_error = 'tesseract'
+        except ImportError:
+            ocr_error = 'import'
+        except Exception as e:
+            ocr_error = str(e)
+
+    return {
+        'page': page_index + 1,
+        'text': page_text,
+        'headings': model.large_font_texts(opts['large_font_threshold'], reading_order=True),
+        'ocr': mode,
+        'ocr_error': ocr_error,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def _extract_pages(file_path, page_indexes, options):
+    """行程池工作：整段頁面共用一次開檔，結束即關閉 (不在行程內快取文件，避免同路徑的新檔讀到舊內容)"""
+    import fitz  # PyMuPDF
+
+    with fitz.open(file_path) as doc:
+        return [extract_page(file_path, i, options, doc) for i in page_indexes]
+
+
+def extract_pdf_pages(file_path, workers=None, options=None, chunk_size=4, page_indexes=None):
+    """
+    依頁碼順序產生 extract_page 的結果 (generator)；page_indexes 指定只處理部分頁面 (從 0 開始，預設全部)。
+    workers > 1 且頁數夠多時以 spawn 行程池平行處理，每個工作處理 chunk_size 頁；
+    依提交順序取回結果，確保輸出順序與頁碼一致。
+    """
+    import fitz  # PyMuPDF
+
+    if page_indexes is None:
+        with fitz.open(file_path) as doc:
+            page_indexes = range(doc.page_count)
+    page_indexes = sorted(page_indexes)
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+
+    if workers <= 1 or len(page_indexes) < MIN_PAGES_FOR_POOL:
+        with fitz.open(file_path) as doc:
+            for i in page_indexes:
+                yield extract_page(file_path, i, options, doc)
+        return
+
+    chunks = [page_indexes[start:start + chunk_size] for start in range(0, len(page_indexes), chunk_size)]
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=context) as pool:
+        futures = [pool.submit(_extract_pages, file_path, chunk, options) for chunk in chunks]
+        # 前面的區塊完成才輸出，後面的區塊在背景持續處理
+        for future in futures:
+            for result in future.result():
+                yield result
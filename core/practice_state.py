@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/practice_state.py
+功能說明 (Description): 練習狀態伺服器端儲存 (Practice State Store)，以不透明的 Session Token 為鍵保存目前題目狀態，
+                       取代將題目資料放在簽章 Cookie 中。提供單機用的記憶體 LRU (含 TTL) 與多 worker 共用的 SQLite 兩種後端，
+                       並統計命中、未命中與淘汰次數。
+執行語法 (Usage): 由系統調用 (Config.PRACTICE_STATE_BACKEND = 'cookie' | 'memory' | 'sqlite')
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('cookie', 'memory', 'sqlite')
+
+
+class MemoryStateStore:
+    """
+    單機記憶體後端
+    - OrderedDict 實作 LRU，超過 max_entries 時淘汰最久未使用的狀態 (evicted_capacity)。
+    - 每筆狀態 ttl_seconds 未被讀寫即過期，於讀取時或寫入時順便清除 (evicted_expired)。
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=6 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'writes': 0, 'evicted_capacity': 0, 'evicted_expired': 0}
+
+    def get(self, token):
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(token)
+            if item is not None and now - item[0] > self.ttl_seconds:
+                del self._items[token]
+                self._counters['evicted_expired'] += 1
+                item = None
+            if item is None:
+                self._counters['misses'] += 1
+                return None
+            self._items[token] = (now, item[1])
+            self._items.move_to_end(token)
+            self._counters['hits'] += 1
+            return item[1]
+
+    def put(self, token, state):
+        now = time.monotonic()
+        with self._lock:
+            self._items[token] = (now, state)
+            self._items.move_to_end(token)
+            self._counters['writes'] += 1
+            # 最舊的項目在前端：先清掉過期的，仍超量再依 LRU 淘汰
+            while self._items:
+                oldest_token, (touched, _) = next(iter(self._items.items()))
+                if now - touched > self.ttl_seconds:
+                    self._counters['evicted_expired'] += 1
+                elif len(self._items) > self.max_entries:
+                    self._counters['evicted_capacity'] += 1
+                else:
+                    break
+                del self._items[oldest_token]
+
+    def delete(self, token):
+        with self._lock:
+            self._items.pop(token, None)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+            data['entries'] = len(self._items)
+        data['backend'] = 'memory'
+        lookups = data['hits'] + data['misses']
+        data['hit_rate'] = round(data['hits'] / lookups, 4) if lookups else 0.0
+        return data
+
+
+class SQLiteStateStore:
+    """
+    多 worker 共用的 SQLite 後端 (practice_state 資料表，與主資料庫同檔)
+    - 狀態以 JSON 存放，所有 gunicorn worker 讀寫同一份資料，check_answer 不再因換 worker 而 state_lost。
+    - 每 purge_every 次寫入刪除一次超過 ttl_seconds 未更新的列 (evicted_expired)。
+    """
+
+    def __init__(self, db_path, ttl_seconds=6 * 3600, purge_every=200):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.purge_every = purge_every
+        self._lock = threading.Lock()
+        self._ready = False
+        self._counters = {'hits': 0, 'misses': 0, 'writes': 0, 'evicted_expired': 0, 'errors': 0}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        if not self._ready:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS practice_state (
+                    token TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_practice_state_updated ON practice_state (updated_at)')
+            conn.commit()
+            self._ready = True
+        return conn
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def get(self, token):
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute('SELECT data, updated_at FROM practice_state WHERE token = ?', (token,)).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"讀取練習狀態失敗: {e}")
+            self._count('errors')
+            return None
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return json.loads(row[0])
+
+    def put(self, token, state):
+        now = time.time()
+        with self._lock:
+            self._counters['writes'] += 1
+            purge = self._counters['writes'] % self.purge_every == 0
+        try:
+            conn = self._connect()
+            try:
+                conn.execute('''
+                    INSERT INTO practice_state (token, data, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(token) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+                ''', (token, json.dumps(state, ensure_ascii=False, default=str), now))
+                if purge:
+                    cur = conn.execute('DELETE FROM practice_state WHERE updated_at < ?', (now - self.ttl_seconds,))
+                    self._count('evicted_expired', cur.rowcount)
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"寫入練習狀態失敗: {e}")
+            self._count('errors')
+
+    def delete(self, token):
+        try:
+            conn = self._connect()
+            try:
+                conn.execute('DELETE FROM practice_state WHERE token = ?', (token,))
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"刪除練習狀態失敗: {e}")
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+        try:
+            conn = self._connect()
+            try:
+                data['entries'] = conn.execute('SELECT COUNT(*) FROM practice_state').fetchone()[0]
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            data['entries'] = None
+        data['backend'] = 'sqlite'
+        lookups = data['hits'] + data['misses']
+        data['hit_rate'] = round(data['hits'] / lookups, 4) if lookups else 0.0
+        return data
+
+
+def create_state_store(backend):
+    """依設定建立後端；'cookie' 回傳 None (沿用 Flask 簽章 Cookie 保存狀態)"""
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的練習狀態後端: {backend} (可用: {', '.join(BACKENDS)})")
+    ttl = getattr(Config, 'PRACTICE_STATE_TTL', 6 * 3600)
+    if backend == 'memory':
+        return MemoryStateStore(getattr(Config, 'PRACTICE_STATE_MAX_ENTRIES', 10000), ttl)
+    if backend == 'sqlite':
+        return SQLiteStateStore(Config.db_path, ttl)
+    return None
+
+
+PRACTICE_STATE_STORE = create_state_store(getattr(Config, 'PRACTICE_STATE_BACKEND', 'cookie'))
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/progress_buffer.py
+功能說明 (Description): 學習進度寫回緩衝區 (Write-Behind Progress Buffer)，在記憶體中合併每位學生、每個技能的作答增量，
+                       由背景執行緒每隔數百毫秒以單一交易批次寫入 progress 表，關機時保證最後一次寫回。
+執行語法 (Usage): 由系統調用 (PROGRESS_BUFFER.init_app(app) 於 create_app 內啟動)
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import text
+
+from config import Config
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# SQLite UPSERT：既有紀錄依增量更新連續答對/答錯，新紀錄直接插入
+_UPSERT_SQL = text("""
+    INSERT INTO progress (user_id, skill_id, consecutive_correct, consecutive_wrong,
+                          questions_solved, current_level, last_practiced)
+    VALUES (:user_id, :skill_id, :new_correct, :new_wrong, :solved, 1, :last_practiced)
+    ON CONFLICT(user_id, skill_id) DO UPDATE SET
+        questions_solved = questions_solved + :solved,
+        consecutive_correct = CASE WHEN :last_correct
+            THEN (CASE WHEN :uniform THEN consecutive_correct + :run ELSE :run END)
+            ELSE 0 END,
+        consecutive_wrong = CASE WHEN :last_correct
+            THEN 0
+            ELSE (CASE WHEN :uniform THEN consecutive_wrong + :run ELSE :run END) END,
+        last_practiced = :last_practiced
+""")
+
+
+class _PendingProgress:
+    """
+    尚未寫回的作答增量 (可結合的摘要，不需先讀取資料庫)：
+    - solved      : 作答題數
+    - last_correct: 最後一題是否答對
+    - run         : 結尾連續同結果的題數
+    - uniform     : 全部作答結果是否與最後一題相同 (決定是否接續資料庫中的連續數)
+    """
+    __slots__ = ('solved', 'last_correct', 'run', 'uniform', 'last_practiced')
+
+    def __init__(self, is_correct, when):
+        self.solved = 1
+        self.last_correct = is_correct
+        self.run = 1
+        self.uniform = True
+        self.last_practiced = when
+
+    def add(self, is_correct, when):
+        self.solved += 1
+        if is_correct == self.last_correct:
+            self.run += 1
+        else:
+            self.last_correct = is_correct
+            self.run = 1
+            self.uniform = False
+        self.last_practiced = when
+
+    def merge_after(self, earlier):
+        """將較早的增量 earlier 合併到自己之前 (寫回失敗時放回緩衝區用)"""
+        if self.uniform and earlier.last_correct == self.last_correct:
+            self.run += earlier.run
+            self.uniform = earlier.uniform
+        else:
+            self.uniform = False
+        self.solved += earlier.solved
+
+    def apply(self, consecutive_correct, consecutive_wrong, questions_solved):
+        """將增量套用到資料庫中的值，回傳 (連續答對, 連續答錯, 作答總數)"""
+        if self.last_correct:
+            correct = consecutive_correct + self.run if self.uniform else self.run
+            wrong = 0
+        else:
+            wrong = consecutive_wrong + self.run if self.uniform else self.run
+            correct = 0
+        return correct, wrong, questions_solved + self.solved
+
+    def to_params(self, user_id, skill_id):
+        return {
+            'user_id': user_id,
+            'skill_id': skill_id,
+            'new_correct': self.run if self.last_correct else 0,
+            'new_wrong': 0 if self.last_correct else self.run,
+            'solved': self.solved,
+            'last_correct': 1 if self.last_correct else 0,
+            'uniform': 1 if self.uniform else 0,
+            'run': self.run,
+            'last_practiced': self.last_practiced.strftime('%Y-%m-%d %H:%M:%S.%f'),
+        }
+
+
+class ProgressBuffer:
+    """
+    Write-Behind 進度緩衝區
+    - record(): 只在記憶體合併增量，不碰資料庫。
+    - 背景執行緒每 flush_interval 秒把所有增量以一個交易寫回。
+    - overlay(): 讓讀取端把尚未寫回 (含寫回中) 的增量疊加到資料庫值上，讀到最新狀態。
+    - 未呼叫 init_app() (例如離線腳本) 時，record() 直接同步寫入。
+    """
+
+    def __init__(self, flush_interval=0.3):
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._app = None
+        self._thread = None
+        self._counters = {'recorded': 0, 'flushes': 0, 'rows_written': 0, 'flush_errors': 0}
+
+    def init_app(self, app):
+        """綁定 Flask app 並啟動背景寫回執行緒 (重複呼叫無副作用)"""
+        self._app = app
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='progress-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def record(self, user_id, skill_id, is_correct):
+        """記錄一次作答結果"""
+        key = (user_id, skill_id)
+        now = datetime.now()
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = _PendingProgress(bool(is_correct), now)
+            else:
+                entry.add(bool(is_correct), now)
+            self._counters['recorded'] += 1
+        if self._thread is None:
+            self.flush()
+
+    def overlay(self, user_id, values):
+        """
+        將某位學生尚未寫回的增量疊加到資料庫值上。
+        values: {skill_id: (連續答對, 連續答錯, 作答總數, last_practiced)}，
+        回傳同格式的新 dict (只在緩衝區出現的技能也會包含在內)。
+        寫回中的批次若已反映在資料庫 (last_practiced 已追上) 則不重複疊加。
+        """
+        result = dict(values)
+        with self._lock:
+            for source in (self._inflight, self._pending):
+                for (uid, skill_id), entry in source.items():
+                    if uid != user_id:
+                        continue
+                    correct, wrong, solved, last = result.get(skill_id, (0, 0, 0, None))
+                    if source is self._inflight and last is not None and last >= entry.last_practiced:
+                        continue
+                    result[skill_id] = entry.apply(correct, wrong, solved) + (entry.last_practiced,)
+        return result
+
+    def flush(self):
+        """把目前所有增量以單一交易寫回資料庫"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+            params = [entry.to_params(uid, sid) for (uid, sid), entry in batch.items()]
+            try:
+                if self._app is not None:
+                    with self._app.app_context():
+                        self._write(params)
+                else:
+                    self._write(params)
+            except Exception as e:
+                logger.error(f"進度寫回失敗，將於下次重試: {e}")
+                with self._lock:
+                    self._inflight = {}
+                    self._counters['flush_errors'] += 1
+                    for key, earlier in batch.items():
+                        later = self._pending.get(key)
+                        if later is None:
+                            self._pending[key] = earlier
+                        else:
+                            later.merge_after(earlier)
+                return 0
+            with self._lock:
+                self._inflight = {}
+                self._counters['flushes'] += 1
+                self._counters['rows_written'] += len(params)
+            return len(params)
+
+    @staticmethod
+    def _write(params):
+        with db.engine.begin() as conn:
+            conn.execute(_UPSERT_SQL, params)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def shutdown(self):
+        """停止背景執行緒並做最後一次寫回"""
+        self._stop.set()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+            data['pending_keys'] = len(self._pending)
+        return data
+
+
+PROGRESS_BUFFER = ProgressBuffer(flush_interval=getattr(Config, 'PROGRESS_FLUSH_INTERVAL', 0.3))
+
+
+def read_progress(user_id, skill_id):
+    """
+    讀取學生在某技能的最新進度 (資料庫值 + 尚未寫回的增量)。
+    回傳 dict：consecutive_correct / consecutive_wrong / questions_solved / current_level
+    """
+    from models import Progress
+    row = db.session.query(Progress).filter_by(user_id=user_id, skill_id=skill_id).first()
+    base = {}
+    if row:
+        base[skill_id] = (row.consecutive_correct or 0, row.consecutive_wrong or 0,
+                          row.questions_solved or 0, row.last_practiced)
+    correct, wrong, solved, _ = PROGRESS_BUFFER.overlay(user_id, base).get(skill_id, (0, 0, 0, None))
+    level = row.current_level if row else 1
+    return {
+        'consecutive_correct': correct,
+        'consecutive_wrong': wrong,
+        'questions_solved': solved,
+        'current_level': level,
+    }
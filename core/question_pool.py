@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/question_pool.py
+功能說明 (Description): 題目預生成池 (Question Pool)，依 (skill_id, difficulty_level) 保留 N 道已驗證的題目，
+                       低於水位時於背景執行緒非同步補題，讓 /get_next_question 以 O(1) 取題，未命中才即時生成。
+執行語法 (Usage): 由系統調用 (from core.question_pool import QUESTION_POOL)
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import contextvars
+import logging
+import random
+import secrets
+import sys
+import threading
+import time
+import types
+import weakref
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from core.generation_watchdog import GENERATION_WATCHDOG, GenerationTimeout, SkillQuarantined
+from core import skill_runtime
+from core.skill_registry import SKILL_REGISTRY
+from core.skill_runtime import has_native_batch, run_generate_batch
+from core.skill_telemetry import SKILL_TELEMETRY
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question_data(data):
+    """
+    [核心修正] 欄位雙重自動校正 (對齊金標準)
+    回傳校正後的 dict；若缺少 question_text / correct_answer 則回傳 None。
+    """
+    if not isinstance(data, dict):
+        return None
+    if "question" in data and "question_text" not in data:
+        data["question_text"] = data["question"]
+    if "answer" in data and "correct_answer" not in data:
+        data["correct_answer"] = data["answer"]  # 確保批改時找得到答案
+    if "question_text" in data and "correct_answer" in data:
+        return data
+    return None
+
+
+# ==============================================================================
+# 每次出題獨立的亂數來源 (不鎖全域亂數狀態，出題可完全並行)
+# 技能命名空間中的 random / numpy (np) / numpy.random 以及 `from random import randint` 這類名稱，
+# 在首次出題時改綁為替身物件：出題期間轉給本次呼叫的 random.Random(seed) 與
+# numpy.random.RandomState(seed)，其餘時間轉給原本的全域模組。
+# 兩者與原本 random.seed(seed) / numpy.random.seed(seed) 後的序列相同，既有種子產生的題目不變。
+# ==============================================================================
+_CURRENT_RNG = contextvars.ContextVar('question_rng', default=None)
+
+
+class _QuestionRng:
+    """單次出題的亂數來源 (numpy 的 RandomState 延後到第一次使用才建立)"""
+    __slots__ = ('random', 'seed', '_numpy')
+
+    def __init__(self, seed):
+        self.seed = seed
+        self.random = random.Random(seed)
+        self._numpy = None
+
+    @property
+    def numpy(self):
+        if self._numpy is None:
+            import numpy
+            self._numpy = numpy.random.RandomState(self.seed % (2 ** 32))
+        return self._numpy
+
+
+class _SeededRandomModule:
+    """random 模組替身"""
+
+    def __getattr__(self, name):
+        rng = _CURRENT_RNG.get()
+        if rng is not None and not name.startswith('_') and hasattr(rng.random, name):
+            return getattr(rng.random, name)
+        return getattr(random, name)
+
+
+class _SeededNumpyRandom:
+    """numpy.random 模組替身 (np.random.randint 等舊式全域函式)"""
+
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        rng = _CURRENT_RNG.get()
+        if rng is not None and not name.startswith('_') and hasattr(rng.numpy, name):
+            return getattr(rng.numpy, name)
+        return getattr(self._module, name)
+
+
+class _SeededNumpy:
+    """numpy 模組替身：只攔截 .random，其餘屬性直接取自 numpy"""
+
+    def __init__(self, module):
+        self._module = module
+        self.random = _SeededNumpyRandom(module.random)
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+
+def _seeded_random_function(name):
+    def call(*args, **kwargs):
+        rng = _CURRENT_RNG.get()
+        return getattr(rng.random if rng is not None else random, name)(*args, **kwargs)
+    call.__name__ = name
+    return call
+
+
+_SEEDED_RANDOM = _SeededRandomModule()
+_bound = weakref.WeakSet()
+_bind_lock = threading.Lock()
+
+
+def bind_seeded_random(module):
+    """
+    將技能 generate() 所在命名空間內的亂數來源改綁為替身。
+    每個 generate 函式只做一次 (技能被熱替換後的新模組會重新綁定)；替身在出題以外的時間行為與原模組相同。
+    """
+    generate = getattr(module, 'generate', None)
+    generate = getattr(generate, '__func__', generate)
+    key = generate if isinstance(generate, types.FunctionType) else module
+    if not isinstance(key, (types.FunctionType, types.ModuleType)) or key in _bound:
+        return
+    namespaces = []
+    if isinstance(module, types.ModuleType):
+        namespaces.append(module.__dict__)
+    if isinstance(generate, types.FunctionType) and generate.__globals__ not in namespaces:
+        namespaces.append(generate.__globals__)
+    numpy = sys.modules.get('numpy')
+    with _bind_lock:
+        for namespace in namespaces:
+            for name, value in list(namespace.items()):
+                if value is random:
+                    replacement = _SEEDED_RANDOM
+                elif numpy is not None and value is numpy:
+                    replacement = _SeededNumpy(numpy)
+                elif numpy is not None and value is numpy.random:
+                    replacement = _SeededNumpyRandom(numpy.random)
+                elif getattr(value, '__self__', None) is random._inst:
+                    replacement = _seeded_random_function(value.__name__)
+                else:
+                    continue
+                namespace[name] = replacement
+        _bound.add(key)
+
+
+def new_seed():
+    """產生新的題目種子 (48 bits，存入 Session 仍很精簡)"""
+    return secrets.randbits(48)
+
+
+def generate_question(module, level, seed):
+    """
+    以指定種子呼叫技能的 generate()：同一 (技能版本, level, seed) 必得相同題目，
+    批改時可由種子重新推導正確答案。每次呼叫使用自己的亂數來源，不碰全域亂數狀態，也不需要鎖，
+    請求執行緒、背景補題與重新推導可同時出題。
+    回傳 normalize_question_data 的結果 (缺少必要欄位時為 None)。
+    """
+    bind_seeded_random(module)
+    token = _CURRENT_RNG.set(_QuestionRng(seed))
+    try:
+        return normalize_question_data(module.generate(level=level))
+    finally:
+        _CURRENT_RNG.reset(token)
+
+
+# 技能執行期的共用工具函式 (safe_choice 等) 查詢的是 core.skill_runtime 的 random
+bind_seeded_random(skill_runtime)
+
+
+class _PoolSlot:
+    """單一 (skill_id, level) 的題目佇列與其對應的模組版本"""
+    __slots__ = ('items', 'module', 'refilling', 'retry_after')
+
+    def __init__(self, module):
+        self.items = deque()
+        self.module = module
+        self.refilling = False
+        self.retry_after = 0.0  # 補題失敗後的退避期限 (time.monotonic())
+
+
+class QuestionPool:
+    """
+    題目預生成池
+    - pop(): O(1) 取出一題 (連同產生它的種子)；池內題目由舊版模組產生時 (技能被熱替換) 自動丟棄。
+    - 低於 low_watermark 時排入背景補題，每個 key 同時最多一個補題工作。
+    - 補題時每題最多重試 max_attempts 次，連續失敗則放棄本輪，避免壞掉的技能佔滿執行緒；
+      放棄 (含逾時) 後該 key 退避 retry_seconds 秒才再補題。
+    - 補題經由 GENERATION_WATCHDOG 以背景時間預算執行，逾時即放棄本輪；技能隔離中 (或仍有卡住的生成執行緒) 時不補題，
+      避免每次取題都再排入一個必定逾時的補題工作。
+    - 技能實作 generate_batch 時一次補足缺額 (整批題目沒有個別種子，出題時改存整份資料)。
+    """
+
+    def __init__(self, target_size=8, low_watermark=3, max_workers=2, max_keys=500, max_attempts=5, retry_seconds=30):
+        self.target_size = target_size
+        self.low_watermark = low_watermark
+        self.max_keys = max_keys
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self._slots = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='question-pool')
+        self._counters = {'hits': 0, 'misses': 0, 'generated': 0, 'failures': 0, 'discarded': 0, 'skipped_refills': 0}
+
+    def _slot(self, key, module):
+        """取得 (或建立) key 對應的 slot；模組版本不同時清空舊題。呼叫端需持有 _lock"""
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _PoolSlot(module)
+            while len(self._slots) > self.max_keys:
+                self._slots.popitem(last=False)
+        else:
+            self._slots.move_to_end(key)
+            if slot.module is not module:
+                self._counters['discarded'] += len(slot.items)
+                slot.items.clear()
+                slot.module = module
+                slot.retry_after = 0.0
+        return slot
+
+    def _claim_refill(self, slot, quarantined):
+        """池內題數低於水位且可補題時標記補題中並回傳 True。呼叫端需持有 _lock"""
+        if slot.refilling or len(slot.items) >= self.low_watermark:
+            return False
+        if quarantined or slot.retry_after > time.monotonic():
+            self._counters['skipped_refills'] += 1
+            return False
+        slot.refilling = True
+        return True
+
+    def pop(self, skill_id, level, module):
+        """
+        取出一題 (命中回傳 (seed, data)，未命中回傳 None)，並視水位排入補題。
+        module 為目前的技能模組，用來判斷池內題目是否過期。
+        """
+        key = (skill_id, level)
+        quarantined = GENERATION_WATCHDOG.is_quarantined(skill_id)
+        with self._lock:
+            slot = self._slot(key, module)
+            item = slot.items.popleft() if slot.items else None
+            self._counters['hits' if item is not None else 'misses'] += 1
+            need_refill = self._claim_refill(slot, quarantined)
+        if need_refill:
+            self._executor.submit(self._refill, skill_id, level, module)
+        return item
+
+    def _generate_one(self, skill_id, module, level):
+        budget = getattr(Config, 'GENERATION_BACKGROUND_BUDGET', 10.0)
+        for attempt in range(self.max_attempts):
+            seed = new_seed()
+            try:
+                with SKILL_TELEMETRY.measure(skill_id, 'generate', retries=1 if attempt else 0):
+                    data = GENERATION_WATCHDOG.run(skill_id, generate_question, module, level, seed,
+                                                   budget=budget, enforce=False)
+                if data is not None:
+                    return seed, data
+            except (GenerationTimeout, SkillQuarantined):
+                return None
+            except Exception:
+                pass
+        return None
+
+    def _generate_many(self, skill_id, module, level, need):
+        if not has_native_batch(module):
+            item = self._generate_one(skill_id, module, level)
+            return [item] if item is not None else []
+        try:
+            with SKILL_TELEMETRY.measure(skill_id, 'generate_batch'):
+                return GENERATION_WATCHDOG.run(skill_id, run_generate_batch, module, level, need, None,
+                                               budget=getattr(Config, 'GENERATION_BACKGROUND_BUDGET', 10.0),
+                                               enforce=False)
+        except Exception:
+            return []
+
+    def _refill(self, skill_id, level, module):
+        key = (skill_id, level)
+        try:
+            while True:
+                with self._lock:
+                    slot = self._slots.get(key)
+                    if slot is None or slot.module is not module or len(slot.items) >= self.target_size:
+                        return
+                    need = self.target_size - len(slot.items)
+                items = self._generate_many(skill_id, module, level, need)
+                with self._lock:
+                    if not items:
+                        self._counters['failures'] += 1
+                        slot = self._slots.get(key)
+                        if slot is not None and slot.module is module:
+                            slot.retry_after = time.monotonic() + self.retry_seconds
+                        logger.warning(f"題目池補題失敗: {skill_id} (level={level})，{self.retry_seconds} 秒內不再補題")
+                        return
+                    self._counters['generated'] += len(items)
+                    slot = self._slots.get(key)
+                    if slot is None or slot.module is not module:
+                        return
+                    slot.items.extend(items)
+        finally:
+            with self._lock:
+                slot = self._slots.get(key)
+                if slot is not None:
+                    slot.refilling = False
+
+    def warm(self, skill_id, level):
+        """預熱指定技能的題目池 (例如學生進入練習頁時)"""
+        module = SKILL_REGISTRY.get(skill_id)
+        quarantined = GENERATION_WATCHDOG.is_quarantined(skill_id)
+        with self._lock:
+            if not self._claim_refill(self._slot((skill_id, level), module), quarantined):
+                return
+        self._executor.submit(self._refill, skill_id, level, module)
+
+    def invalidate(self, skill_id=None):
+        """清空指定技能 (或全部) 的池內題目"""
+        with self._lock:
+            for key in [k for k in self._slots if skill_id is None or k[0] == skill_id]:
+                self._counters['discarded'] += len(self._slots[key].items)
+                self._slots[key].items.clear()
+                self._slots[key].retry_after = 0.0
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+            data['pooled_keys'] = len(self._slots)
+            data['pooled_questions'] = sum(len(s.items) for s in self._slots.values())
+        lookups = data['hits'] + data['misses']
+        data['hit_rate'] = round(data['hits'] / lookups, 4) if lookups else 0.0
+        return data
+
+
+QUESTION_POOL = QuestionPool(
+    target_size=getattr(Config, 'QUESTION_POOL_SIZE', 8),
+    low_watermark=getattr(Config, 'QUESTION_POOL_LOW_WATERMARK', 3),
+    max_workers=getattr(Config, 'QUESTION_POOL_WORKERS', 2),
+    retry_seconds=getattr(Config, 'QUESTION_POOL_RETRY_SECONDS', 30),
+)
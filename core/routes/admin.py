@@ -18,9 +18,6 @@ from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 from markupsafe import Markup
 import os
-import uuid
-import queue
-import threading
 import traceback
 import pandas as pd
 import io
@@ -28,9 +25,17 @@ import re
 import importlib
 
 from . import core_bp
-from core.globals import TASK_QUEUES
+from core.jobs import JOB_RUNNER
 from core import textbook_processor
 from core.utils import handle_curriculum_filters
+from core.skill_registry import SKILL_REGISTRY
+from core.question_pool import QUESTION_POOL
+from core.skill_cache import SKILL_METADATA_CACHE
+from core.ai_wrapper import invalidate_ai_clients, ai_client_stats
+from core import practice_state
+from core.session import QUESTION_CACHE
+from core.generation_watchdog import GENERATION_WATCHDOG
+from core.skill_telemetry import SKILL_TELEMETRY, OPS as TELEMETRY_OPS
 
 # [Fix] 只引用確定存在的函式，避免 ImportError
 from core.data_importer import import_excel_to_db
@@ -43,38 +48,49 @@ from models import db, SkillInfo, SkillCurriculum, User, TextbookExample, Progre
 # Background Tasks (背景任務)
 # ==========================================
 
-def background_processing(file_paths, task_queue, app_context, curriculum_info, skip_code_gen):
-    """背景處理教科書分析任務"""
-    with app_context:
-        try:
-            total_files = len(file_paths)
-            task_queue.put(f"INFO: 開始處理任務，共 {total_files} 個檔案...")
+def background_processing(ctx):
+    """
+    背景處理教科書分析任務 (由 JOB_RUNNER 執行，ctx.put 寫入任務日誌)
+    每完成一個檔案就記錄 checkpoint，worker 重啟後恢復時略過已完成的檔案。
+    """
+    file_paths = ctx.payload['file_paths']
+    curriculum_info = ctx.payload['curriculum_info']
+    skip_code_gen = ctx.payload['skip_code_gen']
+    done = set(ctx.checkpoint.get('done', []))
+
+    total_files = len(file_paths)
+    if ctx.resumed:
+        ctx.put(f"INFO: 從中斷處恢復任務，已完成 {len(done)}/{total_files} 個檔案")
+    else:
+        ctx.put(f"INFO: 開始處理任務，共 {total_files} 個檔案...")
 
-            for idx, file_path in enumerate(file_paths, 1):
-                filename = os.path.basename(file_path)
-                if filename.startswith('~$') or filename.startswith('.'):
-                    continue
+    for idx, file_path in enumerate(file_paths, 1):
+        filename = os.path.basename(file_path)
+        if file_path in done or filename.startswith('~$') or filename.startswith('.'):
+            continue
 
-                task_queue.put(f"INFO: [{idx}/{total_files}] 正在分析: {filename} ...")
-                try:
-                    textbook_processor.process_textbook_file(
-                        file_path, 
-                        curriculum_info=curriculum_info, 
-                        queue=task_queue, 
-                        skip_code_gen=skip_code_gen
-                    )
-                except Exception as e:
-                    task_queue.put(f"ERROR: 檔案 {filename} 處理失敗: {e}")
-                
-                if 'uploads' in file_path and os.path.exists(file_path):
-                    try: os.remove(file_path)
-                    except: pass
-
-            task_queue.put("SUCCESS: 所有作業完成！")
+        ctx.put(f"INFO: [{idx}/{total_files}] 正在分析: {filename} ...")
+        try:
+            textbook_processor.process_textbook_file(
+                file_path, 
+                curriculum_info=curriculum_info, 
+                queue=ctx, 
+                skip_code_gen=skip_code_gen
+            )
         except Exception as e:
-            task_queue.put(f"ERROR: 任務執行發生例外: {str(e)}")
-        finally:
-            task_queue.put("END_OF_STREAM")
+            ctx.put(f"ERROR: 檔案 {filename} 處理失敗: {e}")
+
+        # 先記錄 checkpoint 再刪除上傳檔：兩者之間中斷時，恢復的任務會略過此檔，而不是處理已刪除的檔案
+        done.add(file_path)
+        ctx.save_checkpoint(done=sorted(done))
+        if 'uploads' in file_path and os.path.exists(file_path):
+            try: os.remove(file_path)
+            except: pass
+
+    ctx.put("SUCCESS: 所有作業完成！")
+
+
+JOB_RUNNER.register('textbook_import', background_processing)
 
 # ==========================================
 # Textbook Importer (教科書匯入器)
@@ -107,10 +123,6 @@ def admin_textbook_importer():
                     target_files.append(path)
 
         if target_files:
-            task_id = str(uuid.uuid4())
-            q = queue.Queue()
-            TASK_QUEUES[task_id] = q
-
             curriculum_info = {
                 'curriculum': request.form.get('curriculum'),
                 'publisher': request.form.get('publisher'),
@@ -119,11 +131,12 @@ def admin_textbook_importer():
             }
             skip_code = request.form.get('skip_code_gen') == 'on'
 
-            app = current_app._get_current_object()
-            threading.Thread(
-                target=background_processing,
-                args=(target_files, q, app.app_context(), curriculum_info, skip_code)
-            ).start()
+            # 寫入任務資料表，由任一 worker 的任務執行緒領取 (重啟後可續做)
+            task_id = JOB_RUNNER.submit('textbook_import', {
+                'file_paths': target_files,
+                'curriculum_info': curriculum_info,
+                'skip_code_gen': skip_code,
+            })
 
             return redirect(url_for('core.importer_status', task_id=task_id))
         else:
@@ -134,7 +147,7 @@ def admin_textbook_importer():
 @core_bp.route('/importer/status/<task_id>')
 @login_required
 def importer_status(task_id):
-    if task_id not in TASK_QUEUES:
+    if JOB_RUNNER.store.get(task_id) is None:
         flash('任務已過期或不存在', 'warning')
         return redirect(url_for('core.admin_textbook_importer'))
     return render_template('importer_status.html', task_id=task_id)
@@ -142,17 +155,16 @@ def importer_status(task_id):
 @core_bp.route('/importer/stream/<task_id>')
 @login_required
 def importer_stream(task_id):
+    # 從資料庫日誌追蹤 (任何 worker 皆可)；瀏覽器重新連線時由 Last-Event-ID 接續
+    after_id = request.headers.get('Last-Event-ID', 0, type=int)
+
     def event_stream():
-        q = TASK_QUEUES.get(task_id)
-        if not q:
-            yield "data: END_OF_STREAM\n\n"
-            return
-        while True:
-            msg = q.get()
-            yield f"data: {msg}\n\n"
-            if msg == "END_OF_STREAM":
-                TASK_QUEUES.pop(task_id, None)
-                break
+        for log_id, msg in JOB_RUNNER.stream(task_id, after_id):
+            if msg is None:
+                yield ": keepalive\n\n"
+                continue
+            event_id = f"id: {log_id}\n" if log_id else ""
+            yield f"{event_id}data: {msg}\n\n"
     return Response(stream_with_context(event_stream()), mimetype="text/event-stream")
 
 # ==========================================
@@ -229,6 +241,7 @@ def db_maintenance():
                  db.session.rollback()
                  flash(f'錯誤: {e}', 'danger')
 
+        SKILL_METADATA_CACHE.invalidate()
         return redirect(url_for('core.db_maintenance'))
 
     inspector = db.inspect(db.engine)
@@ -258,6 +271,7 @@ def upload_db():
         
         try:
             success, message = import_excel_to_db(filepath)
+            SKILL_METADATA_CACHE.invalidate()
             if success:
                 flash(Markup(message.replace('\n', '<br>')), 'success')
             else:
@@ -292,6 +306,7 @@ def import_textbook_examples():
             filepath = os.path.join(upload_dir, filename)
             file.save(filepath)
             success, message = import_excel_to_db(filepath)
+            SKILL_METADATA_CACHE.invalidate()
             if os.path.exists(filepath): os.remove(filepath)
             
             if success: flash(Markup(message.replace('\n', '<br>')), 'success')
@@ -326,6 +341,7 @@ def admin_curriculum():
             )
             db.session.add(new_curr)
             db.session.commit()
+            SKILL_METADATA_CACHE.invalidate(new_curr.skill_id)
             flash('新增成功', 'success')
         except Exception as e:
             db.session.rollback()
@@ -381,6 +397,7 @@ def admin_edit_curriculum(id):
         curr.display_order = request.form.get('display_order')
         curr.difficulty_level = request.form.get('difficulty_level')
         db.session.commit()
+        SKILL_METADATA_CACHE.invalidate()
         flash('更新成功', 'success')
     except Exception as e:
         db.session.rollback()
@@ -396,6 +413,7 @@ def admin_delete_curriculum(id):
         curr = SkillCurriculum.query.get_or_404(id)
         db.session.delete(curr)
         db.session.commit()
+        SKILL_METADATA_CACHE.invalidate(curr.skill_id)
         return jsonify({'success': True})
     except:
         return jsonify({'success': False}), 500
@@ -432,6 +450,7 @@ def admin_skills():
 
     return render_template('admin_skills.html', 
                            skills=skills,
+                           generation_stats=GENERATION_WATCHDOG.skill_stats(),
                            filters=filters_data,
                            selected_filters=selected,
                            grade_map={str(g):str(g) for g in filters_data['grades']},
@@ -460,6 +479,7 @@ def admin_add_skill():
         )
         db.session.add(new_skill)
         db.session.commit()
+        SKILL_METADATA_CACHE.invalidate()
         flash('新增成功', 'success')
     except Exception as e:
         flash(f'錯誤: {e}', 'danger')
@@ -483,6 +503,7 @@ def admin_edit_skill(skill_id):
         skill.suggested_prompt_2 = data.get('suggested_prompt_2', '')
         skill.suggested_prompt_3 = data.get('suggested_prompt_3', '')
         db.session.commit()
+        SKILL_METADATA_CACHE.invalidate()
         flash('更新成功', 'success')
     except Exception as e:
         flash(f'錯誤: {e}', 'danger')
@@ -495,6 +516,7 @@ def admin_delete_skill(skill_id):
     try:
         db.session.delete(skill)
         db.session.commit()
+        SKILL_METADATA_CACHE.invalidate()
         flash('刪除成功', 'success')
     except Exception as e:
         db.session.rollback()
@@ -508,6 +530,7 @@ def admin_toggle_skill(skill_id):
     skill = db.get_or_404(SkillInfo, skill_id)
     skill.is_active = not skill.is_active
     db.session.commit()
+    SKILL_METADATA_CACHE.invalidate()
     flash(f'技能已{"啟用" if skill.is_active else "停用"}', 'success')
     return redirect(url_for('core.admin_skills'))
 
@@ -518,10 +541,96 @@ def admin_regenerate_skill_code(skill_id):
         from core.code_generator import auto_generate_skill_code
         result = auto_generate_skill_code(skill_id, queue=None)
         success = result[0] if isinstance(result, tuple) else result
+        if success:
+            # 新程式碼已寫檔，讓練習區下一次出題載入新版模組
+            SKILL_REGISTRY.invalidate(skill_id)
+            QUESTION_POOL.invalidate(skill_id)
+            GENERATION_WATCHDOG.release(skill_id)
         return jsonify({"success": success, "message": "生成成功" if success else "失敗"})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
+@core_bp.route('/api/skill_registry/stats', methods=['GET'])
+@login_required
+def api_skill_registry_stats():
+    """技能模組快取統計 (hit/miss/reload 計數)"""
+    if not (current_user.is_admin or current_user.role == 'teacher'):
+        return jsonify({'success': False}), 403
+    return jsonify({'success': True, 'data': SKILL_REGISTRY.stats()})
+
+@core_bp.route('/api/skill_registry/invalidate', methods=['POST'])
+@login_required
+def api_skill_registry_invalidate():
+    """手動讓技能模組快取失效 (可指定 skill_id，未指定則全部)"""
+    if not (current_user.is_admin or current_user.role == 'teacher'):
+        return jsonify({'success': False}), 403
+    skill_id = (request.get_json(silent=True) or {}).get('skill_id')
+    SKILL_REGISTRY.invalidate(skill_id)
+    return jsonify({'success': True, 'data': SKILL_REGISTRY.stats()})
+
+@core_bp.route('/api/question_pool/stats', methods=['GET'])
+@login_required
+def api_question_pool_stats():
+    """題目預生成池統計 (命中率、補題數、失敗數)"""
+    if not (current_user.is_admin or current_user.role == 'teacher'):
+        return jsonify({'success': False}), 403
+    return jsonify({'success': True, 'data': QUESTION_POOL.stats()})
+
+@core_bp.route('/api/generation_watchdog/stats', methods=['GET'])
+@login_required
+def api_generation_watchdog_stats():
+    """題目生成看門狗統計 (逾時次數、隔離中的技能、各技能慢速生成次數)"""
+    if not (current_user.is_admin or current_user.role == 'teacher'):
+        return jsonify({'success': False}), 403
+    return jsonify({'success': True, 'data': GENERATION_WATCHDOG.stats()})
+
+@core_bp.route('/api/skill_telemetry/ranking', methods=['GET'])
+@login_required
+def api_skill_telemetry_ranking():
+    """技能遙測排名：?op=generate|check&sort=p95|retry_rate&limit=50 (正式環境的延遲與重試率)"""
+    if not (current_user.is_admin or current_user.role == 'teacher'):
+        return jsonify({'success': False}), 403
+    op = request.args.get('op', 'generate')
+    sort = request.args.get('sort', 'p95')
+    if op not in TELEMETRY_OPS or sort not in ('p95', 'retry_rate'):
+        return jsonify({'success': False, 'message': '參數錯誤'}), 400
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({'success': True, 'data': {
+        'op': op,
+        'sort': sort,
+        'skills': SKILL_TELEMETRY.ranking(op=op, sort=sort, limit=limit),
+        'collector': SKILL_TELEMETRY.stats(),
+    }})
+
+@core_bp.route('/api/jobs/stats', methods=['GET'])
+@login_required
+def api_jobs_stats():
+    """背景任務統計 (各狀態任務數、本 worker 領取 / 恢復次數)"""
+    if not (current_user.is_admin or current_user.role == 'teacher'):
+        return jsonify({'success': False}), 403
+    return jsonify({'success': True, 'data': JOB_RUNNER.stats()})
+
+@core_bp.route('/api/practice_state/stats', methods=['GET'])
+@login_required
+def api_practice_state_stats():
+    """練習狀態儲存統計 (後端、筆數、命中與淘汰次數) 與伺服器端題目 LRU 統計"""
+    if not (current_user.is_admin or current_user.role == 'teacher'):
+        return jsonify({'success': False}), 403
+    store = practice_state.PRACTICE_STATE_STORE
+    return jsonify({'success': True, 'data': {
+        'store': store.stats() if store is not None else {'backend': 'cookie'},
+        'question_cache': QUESTION_CACHE.stats(),
+    }})
+
+@core_bp.route('/api/ai_clients/invalidate', methods=['POST'])
+@login_required
+def api_ai_clients_invalidate():
+    """清除 AI Client 快取 (修改模型角色設定或 API Key 後使用)"""
+    if not current_user.is_admin:
+        return jsonify({'success': False}), 403
+    invalidate_ai_clients()
+    return jsonify({'success': True, 'data': ai_client_stats()})
+
 @core_bp.route('/skills/<skill_id>/details', methods=['GET'])
 @login_required
 def admin_get_skill_details(skill_id):
@@ -787,6 +896,7 @@ def api_add_prerequisite(skill_id):
         if prereq not in target.prerequisites:
             target.prerequisites.append(prereq)
             db.session.commit()
+            SKILL_METADATA_CACHE.invalidate(skill_id)
         return jsonify({"success": True})
     except Exception as e:
         db.session.rollback()
@@ -803,6 +913,7 @@ def api_remove_prerequisite(skill_id, prereq_id):
         if target and prereq and prereq in target.prerequisites:
             target.prerequisites.remove(prereq)
             db.session.commit()
+            SKILL_METADATA_CACHE.invalidate(skill_id)
         return jsonify({"success": True})
     except Exception as e:
         db.session.rollback()
@@ -831,6 +942,7 @@ def init_db_route():
     try:
         # 使用 models 內的 init_db
         init_db(db.engine)
+        SKILL_METADATA_CACHE.invalidate()
         flash('資料庫初始化成功', 'success')
     except Exception as e:
         flash(f'初始化失敗: {e}', 'error')
@@ -843,6 +955,7 @@ def import_skills():
     try:
         from core.data_importer import import_skills_from_json
         count = import_skills_from_json()
+        SKILL_METADATA_CACHE.invalidate()
         return jsonify({"success": True, "message": f"成功匯入 {count} 個技能"})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
@@ -854,6 +967,7 @@ def import_curriculum():
     try:
         from core.data_importer import import_curriculum_from_json
         count = import_curriculum_from_json()
+        SKILL_METADATA_CACHE.invalidate()
         return jsonify({"success": True, "message": f"成功匯入 {count} 個課綱"})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
@@ -12,8 +12,7 @@
 
 from flask import Blueprint, request, jsonify, current_app, render_template, session, url_for
 from flask_login import login_required, current_user
-import importlib
-import sys # [修正 2] 導入 sys 以便檢查模組狀態
+from sqlalchemy.exc import IntegrityError
 import numpy as np
 import matplotlib
 # [CRITICAL] 設定 Matplotlib 為非互動模式，避免 Server 端 GUI 錯誤
@@ -22,57 +21,41 @@ import matplotlib.pyplot as plt
 import re
 import uuid
 import os
-from datetime import datetime
 
 # 引用 Blueprint
 from . import practice_bp
 
 # 資料庫模型
-from models import db, SkillInfo, SkillPrerequisites, SkillCurriculum, Progress, MistakeNotebookEntry
-from core.utils import get_skill_info
-from core.session import get_current, set_current
+from models import db, SkillInfo, MistakeNotebookEntry, make_question_fingerprint
+from core.skill_cache import SKILL_METADATA_CACHE, get_cached_skill_info, get_cached_difficulty, get_cached_prerequisites
+from core.session import QUESTION_CACHE, get_current, set_current
+from core.skill_registry import SKILL_REGISTRY
+from core.question_pool import QUESTION_POOL, generate_question, new_seed
+from core.progress_buffer import PROGRESS_BUFFER, read_progress
+from core.answer_engine import grade_answer, uses_standard_check
+from core.generation_watchdog import GENERATION_WATCHDOG, GenerationTimeout, SkillQuarantined
+from core.skill_telemetry import SKILL_TELEMETRY
+from core.skill_runtime import has_native_batch, run_generate_batch
+from config import Config
 
 # ==========================================
 # Helper Functions (輔助函式)
 # ==========================================
 
 def get_skill(skill_id):
-    """動態載入技能模組 (skills/xxx.py)"""
+    """動態載入技能模組 (skills/xxx.py)，經由 SKILL_REGISTRY 快取"""
     try:
-        return importlib.import_module(f"skills.{skill_id}")
-    except:
+        return SKILL_REGISTRY.get(skill_id)
+    except Exception:
         return None
 
 def update_progress(user_id, skill_id, is_correct):
     """
     更新用戶進度 (Progress)
     V2.0 更新：不再動態調整等級，僅記錄連續答對/錯次數與練習時間
+    [效能] 改為寫入 Write-Behind 緩衝區，由背景執行緒批次 UPSERT，批改請求不再等待資料庫提交
     """
-    progress = db.session.query(Progress).filter_by(user_id=user_id, skill_id=skill_id).first()
-    now_time = datetime.now()
-
-    if not progress:
-        progress = Progress(
-            user_id=user_id,
-            skill_id=skill_id,
-            consecutive_correct=1 if is_correct else 0,
-            consecutive_wrong=0 if is_correct else 1,
-            questions_solved=1,
-            current_level=1,
-            last_practiced=now_time
-        )
-        db.session.add(progress)
-    else:
-        progress.questions_solved += 1
-        progress.last_practiced = now_time
-        if is_correct:
-            progress.consecutive_correct += 1
-            progress.consecutive_wrong = 0
-        else:
-            progress.consecutive_correct = 0
-            progress.consecutive_wrong += 1
-    
-    db.session.commit()
+    PROGRESS_BUFFER.record(user_id, skill_id, is_correct)
 
 # ==========================================
 # Routes (路由)
@@ -81,18 +64,12 @@ def update_progress(user_id, skill_id, is_correct):
 @practice_bp.route('/practice/<skill_id>')
 def practice(skill_id):
     """進入特定技能的練習頁面"""
-    skill_info = db.session.get(SkillInfo, skill_id)
-    skill_ch_name = skill_info.skill_ch_name if skill_info else "未知技能"
+    metadata = SKILL_METADATA_CACHE.get(skill_id)
+    skill_info = metadata['skill']
+    skill_ch_name = skill_info['skill_ch_name'] if skill_info else "未知技能"
 
-    # 查詢前置技能
-    prerequisites = db.session.query(SkillInfo).join(
-        SkillPrerequisites, SkillInfo.skill_id == SkillPrerequisites.prerequisite_id
-    ).filter(
-        SkillPrerequisites.skill_id == skill_id,
-        SkillInfo.is_active.is_(True)
-    ).order_by(SkillInfo.skill_ch_name).all()
-
-    prereq_skills = [{'skill_id': p.skill_id, 'skill_ch_name': p.skill_ch_name} for p in prerequisites]
+    # 前置技能 (快取)
+    prereq_skills = metadata['prerequisites']
 
     return render_template('index.html', 
                            skill_id=skill_id,
@@ -106,65 +83,59 @@ def next_question():
     skill_id = request.args.get('skill', 'remainder')
     requested_level = request.args.get('level', type=int) 
     
-    skill_info = get_skill_info(skill_id)
+    skill_info = get_cached_skill_info(skill_id)
     if not skill_info:
         return jsonify({"error": f"技能 {skill_id} 不存在或未啟用"}), 404
     
     try:
-        # [修正 2] 強制重新載入模組，解決「改了沒反應」的問題
-        module_path = f"skills.{skill_id}"
-        if module_path in sys.modules:
-            mod = importlib.reload(sys.modules[module_path])
-        else:
-            mod = importlib.import_module(module_path)
+        # [修正 2] 由註冊表依檔案 mtime/雜湊決定是否熱替換，避免每次 reload
+        mod = SKILL_REGISTRY.get(skill_id)
         
-        # 決定難度等級
+        # 決定難度等級 (課綱難度走快取)
         current_curriculum_context = session.get('current_curriculum', 'general')
-        curriculum_entry = db.session.query(SkillCurriculum).filter_by(
-            skill_id=skill_id,
-            curriculum=current_curriculum_context
-        ).first()
+        curriculum_difficulty = get_cached_difficulty(skill_id, current_curriculum_context)
 
         if requested_level: 
             difficulty_level = requested_level
-        elif curriculum_entry and curriculum_entry.difficulty_level: 
-            difficulty_level = curriculum_entry.difficulty_level
+        elif curriculum_difficulty: 
+            difficulty_level = curriculum_difficulty
         else:
             difficulty_level = 1 
 
-        progress = db.session.query(Progress).filter_by(user_id=current_user.id, skill_id=skill_id).first()
-        consecutive = progress.consecutive_correct if progress else 0
+        # 讀取進度時疊加尚未寫回的作答增量，確保連續答對數為最新
+        consecutive = read_progress(current_user.id, skill_id)['consecutive_correct']
 
-        # 準備前置技能資訊供 AI 使用
-        prereq_query = db.session.query(SkillInfo).join(
-            SkillPrerequisites, SkillInfo.skill_id == SkillPrerequisites.prerequisite_id
-        ).filter(
-            SkillPrerequisites.skill_id == skill_id,
-            SkillInfo.is_active.is_(True)
-        ).order_by(SkillInfo.skill_ch_name).all()
-        
-        prereq_info_for_ai = [{'id': p.skill_id, 'name': p.skill_ch_name} for p in prereq_query]
+        # 準備前置技能資訊供 AI 使用 (快取)
+        prereq_info_for_ai = [{'id': p['skill_id'], 'name': p['skill_ch_name']} for p in get_cached_prerequisites(skill_id)]
+
+        # 優先從預生成題目池取題 (O(1))，未命中才即時生成；每題都由種子產生，可由種子重現
+        pooled = QUESTION_POOL.pop(skill_id, difficulty_level, mod)
+        seed, data = pooled if pooled is not None else (None, None)
 
         # [Safety] 自動重試機制 (解決偶發的 AI 生成錯誤)
-        max_retries = 5
-        data = None
-        
-        for attempt in range(max_retries):
-            try:
-                # [修正 3] 強化自動修復與欄位檢查
-                data = mod.generate(level=difficulty_level)
-                
-                # [核心修正] 欄位雙重自動校正 (對齊金標準)
-                if "question" in data and "question_text" not in data:
-                    data["question_text"] = data["question"]
-                if "answer" in data and "correct_answer" not in data:
-                    data["correct_answer"] = data["answer"] # 確保批改時找得到答案
-
-                if data and "question_text" in data and "correct_answer" in data:
+        if data is None:
+            max_retries = 5
+            for attempt in range(max_retries):
+                try:
+                    # [修正 3] 強化自動修復與欄位檢查；generate() 在看門狗的時間預算內執行
+                    seed = new_seed()
+                    with SKILL_TELEMETRY.measure(skill_id, 'generate', retries=1 if attempt else 0, ignore=SkillQuarantined):
+                        data = GENERATION_WATCHDOG.run(skill_id, generate_question, mod, difficulty_level, seed)
+                    if data is not None:
+                        break
+                except (GenerationTimeout, SkillQuarantined) as e:
+                    # 逾時或隔離中不再重試 (題目池已在背景補題)，改出最近出過的同難度題目
+                    current_app.logger.warning(f"題目生成逾時或技能隔離中: {e}")
+                    recent = QUESTION_CACHE.recent(skill_id, difficulty_level)
+                    if recent is None:
+                        return jsonify({"error": "此技能題目準備中，請稍後再試"}), 503
+                    seed, data = recent[0][2], dict(recent[1])
                     break
-            except Exception as e:
-                current_app.logger.warning(f"題目生成重試 ({attempt+1}/{max_retries}): {e}")
-                if attempt == max_retries - 1: raise e
+                except Exception as e:
+                    current_app.logger.warning(f"題目生成重試 ({attempt+1}/{max_retries}): {e}")
+                    if attempt == max_retries - 1: raise e
+            if data is None:
+                raise ValueError("題目生成結果缺少 question_text / correct_answer")
         
         # 準備 Session 資料
         data['context_string'] = data.get('context_string', data.get('inequality_string', ''))
@@ -176,7 +147,8 @@ def next_question():
         for k in ['image', 'fig', 'figure', 'image_base64', 'visuals']:
             if k in session_data: del session_data[k]
         
-        set_current(skill_id, session_data)
+        # Session 只保存 (skill, level, seed, version)，題目內容留在伺服器端
+        set_current(skill_id, session_data, level=difficulty_level, seed=seed)
         
         return jsonify({
             "new_question_text": data["question_text"],
@@ -191,6 +163,57 @@ def next_question():
     except Exception as e:
         return jsonify({"error": f"生成題目失敗: {str(e)}"}), 500
 
+@practice_bp.route('/api/questions/batch', methods=['GET', 'POST'])
+@login_required
+def questions_batch():
+    """API: 批次產生題目 (列印學習單)，參數 skill / level / n / seed / answers (教師可附解答)"""
+    params = request.get_json(silent=True) or request.args
+    skill_id = params.get('skill')
+    if not skill_id or not get_cached_skill_info(skill_id):
+        return jsonify({"error": f"技能 {skill_id} 不存在或未啟用"}), 404
+    try:
+        level = int(params.get('level') or 1)
+        n = int(params.get('n') or 20)
+        seed = int(params['seed']) if params.get('seed') not in (None, '') else new_seed()
+    except (TypeError, ValueError):
+        return jsonify({"error": "level / n / seed 必須為整數"}), 400
+    n = max(1, min(n, getattr(Config, 'QUESTION_BATCH_MAX', 100)))
+    include_answers = str(params.get('answers', '')).lower() in ('1', 'true', 'yes') and \
+        (current_user.is_admin or current_user.role == 'teacher')
+
+    try:
+        mod = SKILL_REGISTRY.get(skill_id)
+        # 同一 (skill, level, n, seed) 產生同一份學習單，可重印或對答案
+        with SKILL_TELEMETRY.measure(skill_id, 'generate_batch', ignore=SkillQuarantined):
+            items = GENERATION_WATCHDOG.run(skill_id, run_generate_batch, mod, level, n, seed,
+                                            budget=getattr(Config, 'GENERATION_BACKGROUND_BUDGET', 10.0))
+    except (GenerationTimeout, SkillQuarantined) as e:
+        current_app.logger.warning(f"批次出題逾時或技能隔離中: {e}")
+        return jsonify({"error": "此技能題目生成較慢，請減少題數或稍後再試"}), 503
+    except Exception as e:
+        return jsonify({"error": f"批次出題失敗: {str(e)}"}), 500
+
+    questions = []
+    for index, (question_seed, data) in enumerate(items, 1):
+        item = {
+            "index": index,
+            "seed": question_seed,
+            "question_text": data["question_text"],
+            "context_string": data.get("context_string", data.get("inequality_string", "")),
+            "image_base64": data.get("image_base64", ""),
+        }
+        if include_answers:
+            item["correct_answer"] = data["correct_answer"]
+        questions.append(item)
+
+    return jsonify({
+        "skill": skill_id,
+        "level": level,
+        "seed": seed,
+        "native_batch": has_native_batch(mod),
+        "questions": questions,
+    })
+
 @practice_bp.route('/check_answer', methods=['POST'])
 def check_answer():
     """API: 檢查答案"""
@@ -218,8 +241,12 @@ def check_answer():
             "next_question": False
         })
 
-    # 執行批改
-    result = mod.check(user_ans, current['answer'])
+    # 執行批改：標準 check() 改用精確比對引擎 (正確答案解析結果快取)，自訂 check() 的技能仍呼叫自己的版本
+    with SKILL_TELEMETRY.measure(skill, 'check'):
+        if uses_standard_check(mod):
+            result = grade_answer(user_ans, current['answer'])
+        else:
+            result = mod.check(user_ans, current['answer'])
     
     # [V10.1 Repair] 強制轉型：若模組回傳 bool，自動封裝為 dict
     if isinstance(result, bool):
@@ -237,20 +264,26 @@ def check_answer():
     if not is_correct:
         try:
             q_text = current.get('question_text')
-            existing_entry = db.session.query(MistakeNotebookEntry).filter_by(
+            fingerprint = make_question_fingerprint(skill, q_text)
+            # 以 (student_id, question_fingerprint) 唯一索引查重
+            existing_entry = fingerprint and db.session.query(MistakeNotebookEntry.id).filter_by(
                 student_id=current_user.id,
-                skill_id=skill
-            ).filter(MistakeNotebookEntry.question_data.contains(q_text)).first()
+                question_fingerprint=fingerprint
+            ).first()
 
             if not existing_entry and q_text:
                 new_entry = MistakeNotebookEntry(
                     student_id=current_user.id,
                     skill_id=skill,
                     question_data={'type': 'system_question', 'text': q_text},
-                    notes='系統練習題自動記錄'
+                    notes='系統練習題自動記錄',
+                    question_fingerprint=fingerprint
                 )
                 db.session.add(new_entry)
                 db.session.commit()
+        except IntegrityError:
+            # 同一題被並行的請求搶先寫入，視為已記錄
+            db.session.rollback()
         except Exception as e:
             current_app.logger.error(f"自動記錄錯題失敗: {e}")
             db.session.rollback()
@@ -379,12 +412,12 @@ def generate_similar_questions():
     generated_questions = []
     for skill_id in skill_ids:
         try:
-            mod = importlib.import_module(f"skills.{skill_id}")
+            mod = SKILL_REGISTRY.get(skill_id)
             if hasattr(mod, 'generate'):
                 new_question = mod.generate(level=1)
-                skill_info = get_skill_info(skill_id)
+                skill_info = get_cached_skill_info(skill_id)
                 new_question['skill_id'] = skill_id
-                new_question['skill_ch_name'] = skill_info.skill_ch_name if skill_info else "未知"
+                new_question['skill_ch_name'] = skill_info['skill_ch_name'] if skill_info else "未知"
                 generated_questions.append(new_question)
         except: pass
 
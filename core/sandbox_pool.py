@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/sandbox_pool.py
+功能說明 (Description): 沙箱行程池 (Sandbox Pool)，預先啟動數個獨立的 Python 工作行程執行 LLM 生成的程式碼
+                       (validate_python_code 與 Dynamic Sampling)，依工作強制 CPU 時間、實際時間與記憶體 (RSS) 上限，
+                       超限即終止並替換行程，每個行程執行 K 個工作後自動回收，避免無窮迴圈或失控運算拖垮生成主程式。
+執行語法 (Usage): 由系統調用 (SANDBOX_POOL.run(code, samples=3))
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox_worker.py')
+
+# 監控行程資源的輪詢間隔 (秒)
+_POLL_INTERVAL = 0.05
+
+
+class _SandboxWorker:
+    """單一沙箱行程：透過 stdin/stdout 逐行交換 JSON，另以讀取執行緒把結果放入佇列以便逾時等待"""
+
+    def __init__(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, '-I', WORKER_SCRIPT],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            encoding='utf-8', bufsize=1,
+        )
+        self.jobs = 0
+        self._lines = queue.Queue()
+        self._ready = False
+        threading.Thread(target=self._read_loop, daemon=True, name=f'sandbox-reader-{self.proc.pid}').start()
+        try:
+            self._ps = psutil.Process(self.proc.pid)
+        except psutil.Error:
+            self._ps = None
+
+    def _read_loop(self):
+        for line in self.proc.stdout:
+            self._lines.put(line)
+        self._lines.put(None)  # 行程已結束
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def _usage(self):
+        """回傳 (累計 CPU 秒數, RSS bytes)；行程已結束時回傳 None"""
+        if self._ps is None:
+            return None
+        try:
+            cpu = self._ps.cpu_times()
+            return cpu.user + cpu.system, self._ps.memory_info().rss
+        except psutil.Error:
+            return None
+
+    def _wait_ready(self, timeout):
+        if self._ready:
+            return True
+        try:
+            line = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        self._ready = line is not None and 'ready' in json.loads(line)
+        return self._ready
+
+    def execute(self, job, cpu_seconds, wall_seconds, max_rss_bytes):
+        """
+        執行一個工作並監控資源。回傳 (result dict, 是否需要替換行程)。
+        超限時直接終止行程，result 的 error_class 為 WallTimeExceeded / CPUTimeExceeded / MemoryLimitExceeded。
+        """
+        if not self._wait_ready(timeout=30):
+            return _failure('WorkerStartupError', '沙箱行程啟動失敗'), True
+
+        base = self._usage()
+        base_cpu = base[0] if base else 0.0
+        peak_rss = base[1] if base else 0
+        started = time.perf_counter()
+        self.jobs += 1
+        try:
+            self.proc.stdin.write(json.dumps(job) + '\n')
+            self.proc.stdin.flush()
+        except OSError as e:
+            return _failure('WorkerCrashed', f'無法傳送工作至沙箱行程: {e}'), True
+
+        exceeded = None
+        while True:
+            try:
+                line = self._lines.get(timeout=_POLL_INTERVAL)
+                break
+            except queue.Empty:
+                pass
+            elapsed = time.perf_counter() - started
+            usage = self._usage()
+            if usage:
+                peak_rss = max(peak_rss, usage[1])
+            if elapsed > wall_seconds:
+                exceeded = ('WallTimeExceeded', f'超過實際時間上限 {wall_seconds}s')
+            elif usage and usage[0] - base_cpu > cpu_seconds:
+                exceeded = ('CPUTimeExceeded', f'超過 CPU 時間上限 {cpu_seconds}s')
+            elif usage and usage[1] > max_rss_bytes:
+                exceeded = ('MemoryLimitExceeded', f'記憶體 {usage[1] // (1024 * 1024)}MB 超過上限 '
+                                                   f'{max_rss_bytes // (1024 * 1024)}MB')
+            elif not self.alive() and self._lines.empty():
+                exceeded = ('WorkerCrashed', f'沙箱行程異常結束 (exit code {self.proc.returncode})')
+            if exceeded:
+                self.kill()
+                line = None
+                break
+
+        wall = time.perf_counter() - started
+        usage = self._usage()
+        if line is None:
+            result = _failure(*(exceeded or ('WorkerCrashed', '沙箱行程異常結束')))
+        else:
+            result = json.loads(line)
+        result['wall_seconds'] = wall
+        result['cpu_seconds'] = (usage[0] - base_cpu) if usage else None
+        result['peak_rss_mb'] = round(max(peak_rss, usage[1] if usage else 0) / (1024 * 1024), 1)
+        result['worker_pid'] = self.proc.pid
+        return result, line is None
+
+    def kill(self):
+        try:
+            self.proc.kill()
+            self.proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+    def close(self):
+        if self.alive():
+            try:
+                self.proc.stdin.write(json.dumps({'shutdown': True}) + '\n')
+                self.proc.stdin.flush()
+                self.proc.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self.kill()
+
+
+def _failure(error_class, error_msg):
+    return {
+        'ok': False, 'error_class': error_class, 'error_msg': error_msg, 'stage': 'limit',
+        'failed_sample': None, 'exec_seconds': None, 'sample_latencies': [], 'success_count': 0, 'total_count': 0,
+    }
+
+
+class SandboxPool:
+    """
+    沙箱行程池
+    - start() 預先啟動 size 個行程；run() 取得閒置行程執行工作，全部忙碌時阻塞等待。
+    - 每個工作受 cpu_seconds / wall_seconds / max_rss_mb 限制，超限的行程直接終止並補上新行程。
+    - 行程累計執行 max_jobs_per_worker 個工作後回收替換 (避免生成程式碼污染模組狀態或記憶體碎片累積)。
+    - 執行緒安全：多個生成執行緒可同時送出工作，驗證與下一個技能的 LLM 呼叫可並行進行。
+    """
+
+    def __init__(self, size, max_jobs_per_worker, cpu_seconds, wall_seconds, max_rss_mb):
+        self.size = size
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.cpu_seconds = cpu_seconds
+        self.wall_seconds = wall_seconds
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._executor = None
+        self._workers = set()
+        self._counters = {'jobs': 0, 'failed': 0, 'killed': 0, 'recycled': 0}
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for _ in range(self.size):
+                self._spawn()
+        atexit.register(self.shutdown)
+
+    def _spawn(self):
+        worker = _SandboxWorker()
+        self._workers.add(worker)
+        self._idle.put(worker)
+
+    def run(self, code, samples=0, early_pass=None):
+        """
+        同步執行：exec(code) 後呼叫 generate() 最多 samples 次 (samples=0 時僅驗證可執行)。
+        回傳結構化結果 dict (見 sandbox_worker.run_job，另含 wall_seconds / cpu_seconds / peak_rss_mb / worker_pid)。
+        """
+        if not self._started:
+            self.start()
+        job = {'code': code, 'samples': samples, 'early_pass': early_pass}
+        worker = self._idle.get()
+        replace = True
+        try:
+            result, replace = worker.execute(job, self.cpu_seconds, self.wall_seconds, self.max_rss_bytes)
+        finally:
+            with self._lock:
+                self._counters['jobs'] += 1
+                if replace:
+                    self._counters['killed'] += 1
+                elif worker.jobs >= self.max_jobs_per_worker:
+                    self._counters['recycled'] += 1
+                    worker.close()
+                    replace = True
+                if replace:
+                    self._workers.discard(worker)
+                    worker.kill()
+                    if self._started:
+                        self._spawn()
+                else:
+                    self._idle.put(worker)
+        if not result.get('ok'):
+            with self._lock:
+                self._counters['failed'] += 1
+        return result
+
+    def submit(self, code, samples=0, early_pass=None):
+        """非同步執行，回傳 concurrent.futures.Future"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='sandbox')
+        return self._executor.submit(self.run, code, samples, early_pass)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+            data['workers'] = len(self._workers)
+            data['idle'] = self._idle.qsize()
+        return data
+
+    def shutdown(self):
+        with self._lock:
+            self._started = False
+            workers = list(self._workers)
+            self._workers.clear()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+        for worker in workers:
+            worker.close()
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+
+SANDBOX_POOL = SandboxPool(
+    size=getattr(Config, 'SANDBOX_POOL_SIZE', 2),
+    max_jobs_per_worker=getattr(Config, 'SANDBOX_MAX_JOBS_PER_WORKER', 50),
+    cpu_seconds=getattr(Config, 'SANDBOX_CPU_SECONDS', 5),
+    wall_seconds=getattr(Config, 'SANDBOX_WALL_SECONDS', 10),
+    max_rss_mb=getattr(Config, 'SANDBOX_MAX_RSS_MB', 512),
+)
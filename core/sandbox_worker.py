@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/sandbox_worker.py
+功能說明 (Description): 沙箱工作行程 (Sandbox Worker) 的進入點，由 core/sandbox_pool.py 以獨立 Python 行程啟動。
+                       從 stdin 逐行讀取 JSON 工作 (程式碼 + 採樣次數)，執行後將結構化結果逐行寫回。
+                       本檔只依賴標準函式庫，且以 python -I 執行，不會載入 Flask / 資料庫等主程式模組。
+執行語法 (Usage): 由系統調用 (python -I core/sandbox_worker.py)
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import ast
+import builtins
+import json
+import math
+import operator
+import os
+import random
+import re
+import sys
+import time
+import traceback
+from fractions import Fraction
+
+
+def _validate_namespace():
+    # 與 validate_python_code 原本的 exec 環境一致
+    return {'Fraction': Fraction, 'random': random, 'math': math, 're': re, 'ast': ast, 'operator': operator}
+
+
+def _module_namespace():
+    # 與 Dynamic Sampling 原本的 module_from_spec 環境一致
+    return {'__name__': 'temp_skill', '__builtins__': builtins}
+
+
+def _check_item(item):
+    """檢查 generate() 回傳值結構 (與 run_dynamic_sampling 相同的規則)"""
+    assert isinstance(item, dict), f"generate() must return dict, got {type(item)}"
+    assert 'question_text' in item, "Missing 'question_text' key"
+    assert 'answer' in item, "Missing 'answer' key"
+    if 'function' in str(type(item.get('question_text', ''))).lower():
+        raise TypeError(f"question_text is function object, not string: {type(item['question_text'])}")
+
+
+def _new_result(**fields):
+    result = {
+        'ok': True, 'error_class': None, 'error_msg': None, 'stage': None, 'failed_sample': None,
+        'exec_seconds': 0.0, 'sample_latencies': [], 'success_count': 0, 'total_count': 0,
+    }
+    result.update(fields)
+    return result
+
+
+def run_job(job):
+    """
+    執行單一工作：exec 程式碼後呼叫 generate() 最多 samples 次 (連續 early_pass 次成功即提前通過)。
+    回傳 dict：ok / error_class / error_msg / stage ('exec' 或 'sample') / failed_sample /
+              exec_seconds / sample_latencies / success_count / total_count
+    """
+    samples = job.get('samples', 0)
+    early_pass = job.get('early_pass') or samples
+    result = _new_result()
+    namespace = _module_namespace() if samples else _validate_namespace()
+
+    started = time.perf_counter()
+    try:
+        exec(job['code'], namespace)
+    except BaseException as e:
+        result.update(ok=False, stage='exec', error_class=type(e).__name__, error_msg=str(e))
+        return result
+    finally:
+        result['exec_seconds'] = time.perf_counter() - started
+
+    for idx in range(samples):
+        result['total_count'] += 1
+        started = time.perf_counter()
+        try:
+            _check_item(namespace['generate']())
+        except BaseException as e:
+            result['sample_latencies'].append(time.perf_counter() - started)
+            result.update(ok=False, stage='sample', failed_sample=idx + 1,
+                          error_class=type(e).__name__, error_msg=str(e))
+            break
+        result['sample_latencies'].append(time.perf_counter() - started)
+        result['success_count'] += 1
+        if result['success_count'] >= early_pass:
+            break
+    return result
+
+
+def main():
+    # 保留原本的 stdin/stdout 作為通訊管道，工作程式碼的 print/input 一律導向 devnull
+    proto_in = os.fdopen(os.dup(sys.stdin.fileno()), 'r', encoding='utf-8')
+    proto_out = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding='utf-8')
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, sys.stdin.fileno())
+    os.dup2(devnull, sys.stdout.fileno())
+    sys.stdin = open(os.devnull, 'r')
+    sys.stdout = open(os.devnull, 'w')
+    sys.setrecursionlimit(5000)
+
+    proto_out.write(json.dumps({'ready': os.getpid()}) + '\n')
+    proto_out.flush()
+    for line in proto_in:
+        job = json.loads(line)
+        if job.get('shutdown'):
+            break
+        try:
+            result = run_job(job)
+        except BaseException as e:  # 防禦：工作本身不應讓行程結束
+            result = _new_result(ok=False, error_class=type(e).__name__, error_msg=str(e),
+                                 stage='worker', traceback=traceback.format_exc())
+        proto_out.write(json.dumps(result, default=str) + '\n')
+        proto_out.flush()
+
+
+if __name__ == '__main__':
+    main()
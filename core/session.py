@@ -11,34 +11,215 @@
 """
 """此模組負責管理使用者在練習過程中的 Session 資料，提供安全存取、設定與清除當前題目、答案及相關技能資訊的函式。"""
 # core/session.py
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+
 from flask import session
 
-def set_current(skill, data):
+from config import Config
+from core import practice_state
+
+
+class _QuestionCache:
     """
-    安全儲存當前題目資料，將所有資料整合到一個字典中
+    伺服器端題目內容 LRU：(skill, level, seed, version) -> 題目資料。
+    Session 只存題目位址，批改時優先從這裡取回；被淘汰或伺服器重啟後再以種子重新推導。
     """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'rederived': 0, 'fallbacks': 0}
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self._counters['misses'] += 1
+                return None
+            self._items.move_to_end(key)
+            self._counters['hits'] += 1
+            return data
+
+    def put(self, key, data, rederived=False):
+        with self._lock:
+            if rederived:
+                self._counters['rederived'] += 1
+            self._items[key] = data
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def recent(self, skill, level):
+        """最近出過的同技能、同難度題目 ((key, data))，供技能隔離且題目池已空時備援"""
+        with self._lock:
+            for key in reversed(self._items):
+                if key[0] == skill and key[1] == level:
+                    self._counters['fallbacks'] += 1
+                    return key, self._items[key]
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+            data['size'] = len(self._items)
+        return data
+
+
+QUESTION_CACHE = _QuestionCache(getattr(Config, 'QUESTION_STATE_CACHE_SIZE', 4096))
+
+# (skill_id, version) -> 以相同種子重新生成是否得到相同題目 (技能每次重新生成都會產生新版本，故同樣限制大小)
+_REPRODUCIBLE = _QuestionCache(getattr(Config, 'QUESTION_STATE_CACHE_SIZE', 4096))
+
+_DIGEST_KEYS = ('question_text', 'answer', 'correct_answer')
+
+
+def question_version(skill_id):
+    """題目版本 = 技能檔內容雜湊 + 共用執行期版本；技能重新生成後舊種子不再對應同一題"""
+    from core.skill_registry import SKILL_REGISTRY
+    from core.skill_runtime import SKILL_RUNTIME_VERSION
+
+    digest = SKILL_REGISTRY.digest(skill_id)
+    return f"{digest[:12]}-{SKILL_RUNTIME_VERSION}" if digest else None
+
+
+def _with_aliases(skill, data):
+    """整合題目資料與技能 ID，並補上舊版代碼預期的鍵"""
     # 建立副本以確保不影響原始資料
     saved_data = data.copy()
-    
+
     # 確保寫入 skill_id
     saved_data['skill'] = skill
-    
+
     # 兼容性處理：舊版代碼可能預期 'question' 鍵
     if 'question_text' in saved_data:
         saved_data['question'] = saved_data['question_text']
-        
+
     # 兼容性處理：舊版代碼可能預期 'inequality' 鍵
     if 'inequality_string' in saved_data:
         saved_data['inequality'] = saved_data['inequality_string']
+    return saved_data
+
+
+def _digest(data):
+    """題目與答案的短摘要，存在狀態中供重新推導時確認得到的是同一題"""
+    text = '\x1f'.join(str(data.get(k)) for k in _DIGEST_KEYS)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def _is_reproducible(skill, level, seed, version, data):
+    """每個技能版本檢查一次：以相同種子再生成一次，題目與答案一致才改存種子"""
+    key = (skill, version)
+    reproducible = _REPRODUCIBLE.get(key)
+    if reproducible is None:
+        from core.generation_watchdog import GENERATION_WATCHDOG, GenerationTimeout, SkillQuarantined
+        from core.question_pool import generate_question
+        from core.skill_registry import SKILL_REGISTRY
+        try:
+            again = GENERATION_WATCHDOG.run(skill, generate_question, SKILL_REGISTRY.get(skill), level, seed,
+                                            enforce=False)
+        except (GenerationTimeout, SkillQuarantined):
+            return False  # 逾時 (或仍有卡住的生成執行緒) 不代表無法重現，下次再檢查
+        except Exception:
+            again = None
+        reproducible = bool(again) and _digest(again) == _digest(data)
+        _REPRODUCIBLE.put(key, reproducible)
+    return reproducible
+
+
+def _save_state(state):
+    """保存目前題目狀態：有伺服器端後端時 Cookie 只留不透明 Token"""
+    store = practice_state.PRACTICE_STATE_STORE
+    if store is None:
+        session['current_data'] = state
+        return
+    token = session.get('practice_token')
+    if not token:
+        token = session['practice_token'] = secrets.token_urlsafe(16)
+    session.pop('current_data', None)
+    store.put(token, state)
+
+
+def _load_state():
+    store = practice_state.PRACTICE_STATE_STORE
+    if store is None:
+        return session.get('current_data', {})
+    token = session.get('practice_token')
+    return (store.get(token) if token else None) or {}
+
+
+def set_current(skill, data, level=None, seed=None):
+    """
+    安全儲存當前題目資料。
+    提供 seed 時狀態只存 (skill, level, seed, version) 與題目摘要，完整題目放在伺服器端 LRU；
+    狀態本身存於 Cookie 或 PRACTICE_STATE_STORE (見 core/practice_state.py)；
+    技能的 generate() 無法由種子重現 (例如使用 time / SystemRandom) 時退回存整份資料。
+    """
+    saved_data = _with_aliases(skill, data)
+    version = question_version(skill) if seed is not None else None
+    if version is None or not _is_reproducible(skill, level, seed, version, data):
+        # 將整個字典存入 Session (注意：routes.py 已經先過濾掉圖片了)
+        _save_state(saved_data)
+        return
+
+    QUESTION_CACHE.put((skill, level, seed, version), saved_data)
+    _save_state({'skill': skill, 'level': level, 'seed': seed, 'version': version, 'digest': _digest(data)})
+
+
+def _rederive(skill, level, seed, version, digest):
+    """
+    LRU 未命中時以種子重新生成題目；技能已更新 (版本不同)，或重新生成的題目與出題時的摘要不符
+    (generate() 依賴種子以外的狀態) 時回傳 None，視為狀態遺失而不以另一題批改
+    """
+    from core.generation_watchdog import GENERATION_WATCHDOG, GenerationTimeout, SkillQuarantined
+    from core.question_pool import generate_question
+    from core.skill_cache import get_cached_prerequisites
+    from core.skill_registry import SKILL_REGISTRY
+
+    try:
+        module = SKILL_REGISTRY.get(skill)
+    except Exception:
+        return None
+    if question_version(skill) != version:
+        return None
+    try:
+        # 隔離中的技能仍需重新推導才能批改，不受隔離限制，但同樣有時間預算 (仍有卡住的執行緒時拒絕)
+        data = GENERATION_WATCHDOG.run(skill, generate_question, module, level, seed, enforce=False)
+    except (GenerationTimeout, SkillQuarantined):
+        return None
+    if data is None or _digest(data) != digest:
+        return None
+    data['context_string'] = data.get('context_string', data.get('inequality_string', ''))
+    data['prereq_skills'] = [{'id': p['skill_id'], 'name': p['skill_ch_name']} for p in get_cached_prerequisites(skill)]
+    for k in ['image', 'fig', 'figure', 'image_base64', 'visuals']:
+        data.pop(k, None)
+    return _with_aliases(skill, data)
 
-    # 將整個字典存入 Session (注意：routes.py 已經先過濾掉圖片了)
-    session['current_data'] = saved_data
 
 def get_current():
     """
     安全取得當前題目資料，直接回傳整合的字典
+    (Session 只存種子時，從伺服器端 LRU 取回或重新推導；無法取得時回傳空字典)
     """
-    return session.get('current_data', {})
+    current = _load_state()
+    if 'seed' not in current:
+        return current
+
+    key = (current['skill'], current['level'], current['seed'], current['version'])
+    data = QUESTION_CACHE.get(key)
+    if data is None:
+        data = _rederive(*key, current.get('digest'))
+        if data is None:
+            return {}
+        QUESTION_CACHE.put(key, data, rederived=True)
+    return data
 
 def clear():
     """
@@ -47,4 +228,8 @@ def clear():
     keys = ['current_skill', 'current_question', 'current_answer', 'current_prereq_skills',
             'current_inequality', 'current_correct_answer']
     for k in keys:
-        session.pop(k, None)
\ No newline at end of file
+        session.pop(k, None)
+    token = session.get('practice_token')
+    if token and practice_state.PRACTICE_STATE_STORE is not None:
+        practice_state.PRACTICE_STATE_STORE.delete(token)
+
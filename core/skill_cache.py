@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/skill_cache.py
+功能說明 (Description): 技能靜態資料快取 (Skill Metadata Cache)，以 skill_id 為鍵快取技能資訊、各課綱難度與啟用中的前置技能清單，
+                       具 TTL 與後台編輯失效機制，讓練習區熱路徑只需查詢 Progress。
+執行語法 (Usage): 由系統調用 (from core.skill_cache import SKILL_METADATA_CACHE)
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import time
+import threading
+from collections import OrderedDict
+
+from config import Config
+from models import db, SkillInfo, SkillCurriculum, SkillPrerequisites
+
+
+class SkillMetadataCache:
+    """
+    技能靜態資料快取
+    - 每個 skill_id 一筆紀錄：skill (dict 或 None)、difficulty (課綱 -> 難度)、prerequisites (list)。
+    - 未命中時以 3 個查詢一次載入，之後在 TTL 內不再碰資料庫。
+    - 只存放純 Python 資料 (非 ORM 物件)，可安全跨 request / thread 共用。
+    - TTL 確保多 worker 部署時，其他 worker 的後台編輯最晚在 TTL 後生效。
+    - 載入在鎖外進行；載入期間若發生 invalidate() (世代號改變)，該次結果只回傳不寫入快取，避免覆蓋成舊資料。
+    - 不存在的 skill_id (例如網址任意輸入) 不寫入快取；最多保留 max_entries 筆，超過時淘汰最久未使用者 (LRU)。
+    """
+
+    def __init__(self, ttl_seconds=300, max_entries=2000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def _load(self, skill_id):
+        skill = db.session.get(SkillInfo, skill_id)
+        rows = db.session.query(SkillCurriculum.curriculum, SkillCurriculum.difficulty_level)\
+                         .filter(SkillCurriculum.skill_id == skill_id).all()
+        difficulty = {}
+        for curriculum, level in rows:
+            # 同一課綱有多筆時保留第一筆，與原本 .first() 行為一致
+            difficulty.setdefault(curriculum, level)
+
+        prerequisites = db.session.query(SkillInfo.skill_id, SkillInfo.skill_ch_name).join(
+            SkillPrerequisites, SkillInfo.skill_id == SkillPrerequisites.prerequisite_id
+        ).filter(
+            SkillPrerequisites.skill_id == skill_id,
+            SkillInfo.is_active.is_(True)
+        ).order_by(SkillInfo.skill_ch_name).all()
+
+        return {
+            'skill': skill.to_dict() if skill else None,
+            'difficulty': difficulty,
+            'prerequisites': [{'skill_id': sid, 'skill_ch_name': name} for sid, name in prerequisites],
+        }
+
+    def get(self, skill_id):
+        """取得 skill_id 的完整快取紀錄 (必要時載入)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(skill_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(skill_id)
+                self._counters['hits'] += 1
+                return entry[1]
+            self._counters['misses'] += 1
+            generation = self._generation
+        data = self._load(skill_id)
+        with self._lock:
+            if self._generation == generation and data['skill'] is not None:
+                self._entries[skill_id] = (now + self.ttl_seconds, data)
+                self._entries.move_to_end(skill_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return data
+
+    def invalidate(self, skill_id=None):
+        """後台編輯後呼叫；skill_id 為 None 時清空全部"""
+        with self._lock:
+            if skill_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(skill_id, None)
+            self._generation += 1
+            self._counters['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+            data['cached_skills'] = len(self._entries)
+        lookups = data['hits'] + data['misses']
+        data['hit_rate'] = round(data['hits'] / lookups, 4) if lookups else 0.0
+        return data
+
+
+SKILL_METADATA_CACHE = SkillMetadataCache(ttl_seconds=getattr(Config, 'SKILL_METADATA_TTL', 300),
+                                          max_entries=getattr(Config, 'SKILL_METADATA_MAX_ENTRIES', 2000))
+
+
+def get_cached_skill_info(skill_id):
+    """與 core.utils.get_skill_info 相同語意 (僅回傳啟用中的技能)，但走快取"""
+    skill = SKILL_METADATA_CACHE.get(skill_id)['skill']
+    if not skill or not skill.get('is_active'):
+        return None
+    return skill
+
+
+def get_cached_difficulty(skill_id, curriculum):
+    """取得技能在指定課綱下的難度 (無紀錄時回傳 None)"""
+    return SKILL_METADATA_CACHE.get(skill_id)['difficulty'].get(curriculum)
+
+
+def get_cached_prerequisites(skill_id):
+    """取得啟用中的前置技能清單 [{'skill_id', 'skill_ch_name'}, ...]"""
+    return SKILL_METADATA_CACHE.get(skill_id)['prerequisites']
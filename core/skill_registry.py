@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/skill_registry.py
+功能說明 (Description): 技能模組註冊表 (Skill Module Registry)，負責快取已載入的 skills/*.py 模組，
+                       以檔案 mtime / 內容雜湊判斷是否需要熱替換，取代每次出題都 importlib.reload 的做法。
+執行語法 (Usage): 由系統調用 (from core.skill_registry import SKILL_REGISTRY)
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import os
+import sys
+import hashlib
+import threading
+import importlib.util
+
+# 專案根目錄 (core/ 的上一層)
+_BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SKILLS_DIR = os.path.join(_BASE_DIR, 'skills')
+SKILLS_PACKAGE = 'skills'
+
+
+def _file_digest(path):
+    """計算檔案內容的 SHA-1 雜湊 (用於 mtime 變動但內容未變的情況)"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class _SkillEntry:
+    """單一技能模組的快取紀錄"""
+    __slots__ = ('module', 'mtime_ns', 'size', 'digest')
+
+    def __init__(self, module, mtime_ns, size, digest):
+        self.module = module
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.digest = digest
+
+
+class SkillModuleRegistry:
+    """
+    技能模組註冊表
+    - 每個 skills/<skill_id>.py 只載入一次，之後直接回傳快取模組 (hit)。
+    - 每次取用只做一次 os.stat；mtime/size 改變時才計算內容雜湊，
+      雜湊也改變才真正重新執行模組 (miss / reload)。
+    - 新模組先完整執行完畢，再原子性地替換 sys.modules 與快取，
+      正在使用舊模組出題的請求不會讀到半初始化的模組。
+    """
+
+    def __init__(self, skills_dir=SKILLS_DIR, package=SKILLS_PACKAGE):
+        self.skills_dir = skills_dir
+        self.package = package
+        self._entries = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'reloads': 0, 'invalidations': 0, 'errors': 0}
+
+    def _path_for(self, skill_id):
+        return os.path.join(self.skills_dir, f"{skill_id}.py")
+
+    def _key_lock(self, skill_id):
+        with self._lock:
+            lock = self._key_locks.get(skill_id)
+            if lock is None:
+                lock = self._key_locks[skill_id] = threading.Lock()
+            return lock
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _exec_module(self, skill_id, path):
+        """從檔案建立全新的模組物件並執行，成功後才寫入 sys.modules"""
+        module_name = f"{self.package}.{skill_id}"
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        if spec is None or spec.loader is None:
+            raise ImportError(f"無法建立技能模組規格: {path}")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[module_name] = module
+        return module
+
+    def get(self, skill_id):
+        """
+        取得技能模組 (必要時載入或熱替換)。
+        檔案不存在或執行失敗時拋出例外，由呼叫端決定如何處理。
+        """
+        path = self._path_for(skill_id)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._count('errors')
+            raise ModuleNotFoundError(f"找不到技能模組: {self.package}.{skill_id}")
+
+        entry = self._entries.get(skill_id)
+        if entry is not None and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+            self._count('hits')
+            return entry.module
+
+        with self._key_lock(skill_id):
+            # 等待鎖期間可能已被其他執行緒載入
+            entry = self._entries.get(skill_id)
+            if entry is not None and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+                self._count('hits')
+                return entry.module
+
+            digest = _file_digest(path)
+            if entry is not None and entry.digest == digest:
+                # 檔案被 touch 但內容未變：只更新 stat 資訊
+                entry.mtime_ns, entry.size = st.st_mtime_ns, st.st_size
+                self._count('hits')
+                return entry.module
+
+            self._count('misses')
+            try:
+                module = self._exec_module(skill_id, path)
+            except Exception:
+                self._count('errors')
+                raise
+            if entry is not None:
+                self._count('reloads')
+            self._entries[skill_id] = _SkillEntry(module, st.st_mtime_ns, st.st_size, digest)
+            return module
+
+    def digest(self, skill_id):
+        """目前快取中技能模組的檔案內容雜湊 (尚未載入時回傳 None)，用來標記題目由哪個版本產生"""
+        entry = self._entries.get(skill_id)
+        return entry.digest if entry is not None else None
+
+    def invalidate(self, skill_id=None):
+        """
+        讓快取失效 (admin 重新生成程式碼後呼叫)。
+        skill_id 為 None 時清空全部快取。
+        """
+        with self._lock:
+            if skill_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(skill_id, None)
+            self._counters['invalidations'] += 1
+
+    def stats(self):
+        """回傳快取統計 (hit/miss 計數與命中率)"""
+        with self._lock:
+            data = dict(self._counters)
+            data['cached_modules'] = len(self._entries)
+        lookups = data['hits'] + data['misses']
+        data['hit_rate'] = round(data['hits'] / lookups, 4) if lookups else 0.0
+        return data
+
+
+# 全域單例 (行程內快取，每個 worker 各自一份)
+SKILL_REGISTRY = SkillModuleRegistry()
+
+
+def get_skill_module(skill_id):
+    """便捷函式：從全域註冊表取得技能模組"""
+    return SKILL_REGISTRY.get(skill_id)
@@ -0,0 +1,520 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/skill_runtime.py
+功能說明 (Description): 技能共用執行期模組 (Skill Runtime)，收錄所有生成技能共用的工具函式
+                       (to_latex / fmt_num / safe_eval / check / nCr / fmt_vec ...)。
+                       生成的技能檔以 `from core.skill_runtime import *` 綁定本模組，整個行程只編譯、配置一次，
+                       不再於每個技能檔內嵌約 380 行的 CALCULATION_SKELETON。
+執行語法 (Usage): 由技能檔調用 (from core.skill_runtime import *)
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import hashlib as _hashlib
+
+# ==============================================================================
+# 工具庫原始碼 (Perfect Utils - Standard Edition)
+# 同一份原始碼同時用於：本模組的執行期定義、驗證/沙箱時內嵌的 CALCULATION_SKELETON
+# ==============================================================================
+PERFECT_UTILS = r'''
+import random
+import math
+from fractions import Fraction
+import re
+import ast
+import operator
+
+# [Research Standard Utils]
+
+def safe_choice(seq):
+    """
+    [Auto-Injected] 安全的 random.choice，避免空序列崩潰
+    """
+    if not seq: return 1
+    return random.choice(seq)
+
+def to_latex(num):
+    """
+    將數字轉換為 LaTeX 格式 (支援分數、整數、小數)
+    [V46.2 Fix]: 強制限制分數的複雜度 (分母 <= 100)，避免出現百萬級大數。
+    """
+    if isinstance(num, int): return str(num)
+    if isinstance(num, float): num = Fraction(str(num)).limit_denominator(100)
+    
+    if isinstance(num, Fraction):
+        # [Critical Fix] 強制整形：如果分母太大，強制找最接近的簡單分數
+        # 這能把 1060591/273522 自動變成合理的 K12 數字 (如 3 7/8)
+        if num.denominator > 100:
+            num = num.limit_denominator(100)
+
+        if num == 0: return "0"
+        if num.denominator == 1: return str(num.numerator)
+        
+        # 統一處理正負號
+        is_neg = num < 0
+        sign_str = "-" if is_neg else ""
+        abs_num = abs(num)
+        
+        # 帶分數處理 (Mixed Number)
+        if abs_num.numerator > abs_num.denominator:
+            whole = abs_num.numerator // abs_num.denominator
+            rem_num = abs_num.numerator % abs_num.denominator
+            if rem_num == 0: 
+                return f"{sign_str}{whole}"
+            # ✅ 修正: 整數部分不加大括號 (V46.5)
+            return f"{sign_str}{whole}\\frac{{{rem_num}}}{{{abs_num.denominator}}}"
+            
+        # 真分數處理 (Proper Fraction)
+        return f"{sign_str}\\frac{{{abs_num.numerator}}}{{{abs_num.denominator}}}"
+        
+    return str(num)
+
+def fmt_num(num, signed=False, op=False):
+    """
+    格式化數字 (標準樣板要求)：
+    - 自動括號：負數會自動被包在括號內 (-5) 或 (-\frac{1}{2})
+    - signed=True: 強制顯示正負號 (+3, -5)
+    """
+    # 1. 取得基礎 LaTeX 字串
+    latex_val = to_latex(num)
+    
+    # 2. 判斷是否為 0
+    if num == 0 and not signed and not op: return "0"
+    
+    # 3. 判斷正負 (依賴數值本身)
+    is_neg = (num < 0)
+    
+    # 為了處理 op=True 或 signed=True，我們需要絕對值的字串
+    if is_neg:
+        # 移除開頭的負號以取得絕對值內容
+        # 注意: to_latex 可能回傳 "-{1}\frac..." 或 "-\frac..."
+        if latex_val.startswith("-"):
+            abs_latex_val = latex_val[1:] 
+        else:
+            abs_latex_val = latex_val # Should not happen but safe fallback
+    else:
+        abs_latex_val = latex_val
+
+    # 4. 組裝回傳值
+    if op: 
+        return f" - {abs_latex_val}" if is_neg else f" + {abs_latex_val}"
+    
+    if signed: 
+        return f"-{abs_latex_val}" if is_neg else f"+{abs_latex_val}"
+    
+    if is_neg: 
+        return f"({latex_val})"
+        
+    return latex_val
+
+# [AST Healer Inject] 安全運算核心
+def safe_eval(expr_str):
+    """
+    [AST Healer 專用] 安全的數學表達式解析器
+    [V46.4 Fix]: Python 3.12+ 兼容性修復，移除 ast.Num 依賴。
+    """
+    # 允許的運算子白名單
+    ops = {
+        ast.Add: operator.add,
+        ast.Sub: operator.sub,
+        ast.Mult: operator.mul,
+        ast.Div: operator.truediv, 
+        ast.USub: operator.neg,
+        ast.UAdd: operator.pos,
+    }
+
+    def _eval(node):
+        # [Python 3.12+ Fix] ast.Num 已被移除，使用 ast.Constant
+        if isinstance(node, ast.Constant):
+            return node.value
+        # [Legacy] 保留 ast.Num 以支持舊版 Python (< 3.8)
+        elif hasattr(ast, 'Num') and isinstance(node, ast.Num):
+            return node.n
+        elif isinstance(node, ast.BinOp):
+            left = _eval(node.left)
+            right = _eval(node.right)
+            # 關鍵：遇到除法，自動轉 Fraction
+            if isinstance(node.op, ast.Div):
+                return Fraction(left, right)
+            return ops[type(node.op)](left, right)
+        elif isinstance(node, ast.UnaryOp):
+            return ops[type(node.op)](_eval(node.operand))
+        elif isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Name) and node.func.id == 'Fraction':
+                args = [_eval(a) for a in node.args]
+                return Fraction(*args)
+        raise TypeError(f"Unsupported type: {node}")
+
+    try:
+        # 預處理：將 LaTeX 運算符轉回 Python
+        clean_expr = str(expr_str).replace('\\times', '*').replace('\\div', '/')
+        # 解析並計算
+        result = _eval(ast.parse(clean_expr, mode='eval').body)
+        
+        # [Clamp] 強制整形：運算結果如果是複雜分數，直接化簡
+        if isinstance(result, Fraction):
+            if result.denominator > 100 or abs(result.numerator) > 10000:
+                result = result.limit_denominator(100)
+                
+        return result
+    except Exception as e:
+        return 0
+
+# [數論工具箱]
+def is_prime(n):
+    if n <= 1: return False
+    if n <= 3: return True
+    if n % 2 == 0 or n % 3 == 0: return False
+    i = 5
+    while i * i <= n:
+        if n % i == 0 or n % (i + 2) == 0: return False
+        i += 6
+    return True
+
+def gcd(a, b): return math.gcd(int(a), int(b))
+def lcm(a, b): return abs(int(a) * int(b)) // math.gcd(int(a), int(b))
+
+def get_factors(n):
+    n = abs(n)
+    factors = set()
+    for i in range(1, int(math.isqrt(n)) + 1):
+        if n % i == 0:
+            factors.add(i)
+            factors.add(n // i)
+    return sorted(list(factors))
+
+def clean_latex_output(q_str):
+    """
+    [V9.2.6 Fix] LaTeX 格式清洗器 - 智能分离中文与数学式
+    问题：中文字不能放在 LaTeX 数学模式 $...$ 内
+    解决：只包裹数学表达式，中文文字保留在外面
+    """
+    if not isinstance(q_str, str): return str(q_str)
+    clean_q = q_str.replace('$', '').strip()
+    import re
+    
+    # 1. 修复运算符：* -> \times, / -> \div
+    clean_q = re.sub(r'(?<![\\a-zA-Z])\s*\*\s*', r' \\times ', clean_q)
+    clean_q = re.sub(r'(?<![\\a-zA-Z])\s*/\s*(?![{}])', r' \\div ', clean_q)
+    
+    # 2. 修复双重括号 ((...)) -> (...)
+    clean_q = re.sub(r'\(\(([^()]+)\)\)', r'(\1)', clean_q)
+    
+    # 3. 移除多余空白
+    clean_q = re.sub(r'\s+', ' ', clean_q).strip()
+    
+    # 4. [V9.2.6 NEW] 智能分离中文与数学式
+    # 检测是否包含中文字符
+    has_chinese = bool(re.search(r'[\u4e00-\u9fff]', clean_q))
+    
+    if has_chinese:
+        # 策略：将字符串分割为"中文部分"和"数学部分"
+        # 数学部分：包含数字、运算符、括号、LaTeX 命令的连续区域
+        # 中文部分：中文字、标点符号
+        
+        # Pattern: 匹配数学表达式（数字、运算符、括号、LaTeX 命令、单字母变量）
+        # 改进：更精确地匹配整个数学表达式块
+        math_pattern = r'(?:[\d\-+*/()（）\[\]【】\\]|\\[a-z]+(?:\{[^}]*\})?|[a-zA-Z])+(?:\s+(?:[\d\-+*/()（）\[\]【】\\]|\\[a-z]+(?:\{[^}]*\})?|[a-zA-Z])+)*'
+        
+        parts = []
+        last_end = 0
+        
+        for match in re.finditer(math_pattern, clean_q):
+            start, end = match.span()
+            
+            # 添加之前的文本（中文部分）
+            if start > last_end:
+                text_part = clean_q[last_end:start].strip()
+                if text_part:
+                    parts.append(text_part)
+            
+            # 添加数学部分（需要包裹 $）
+            math_part = match.group().strip()
+            if math_part:
+                parts.append(f'${math_part}$')
+            
+            last_end = end
+        
+        # 添加剩余的文本
+        if last_end < len(clean_q):
+            text_part = clean_q[last_end:].strip()
+            if text_part:
+                parts.append(text_part)
+        
+        # 合并并清理多余空格
+        result = ' '.join(parts)
+        result = re.sub(r'\s+', ' ', result).strip()
+        
+        # 清理连续的 $ 符号：$...$ $...$ -> $... ...$
+        result = re.sub(r'\$\s+\$', ' ', result)
+        
+        return result
+    else:
+        # 没有中文：直接包裹整个表达式
+        return f"${clean_q}$"
+
+
+def check(user_answer, correct_answer):
+    """
+    [V45.7 Smart Validator]
+    """
+    if not user_answer: return {"correct": False, "result": "未作答"}
+    
+    def parse_value(val_str):
+        s = str(val_str).strip().replace(" ", "").replace("$", "").replace("\\", "")
+        s = s.replace("times", "*").replace("div", "/")
+        try:
+            s = re.sub(r'frac\{(\d+)\}\{(\d+)\}', r'(\1/\2)', s)
+            s = re.sub(r'(?<=\d)\(', r'*(', s)  # NEW [V47.3]: 將 "3(1/2)" 轉為 "3*(1/2)" 避免 eval 視為函式呼叫
+            return float(eval(s))
+        except:
+            return None
+
+    val_u = parse_value(user_answer)
+    val_c = parse_value(correct_answer)
+
+    if val_u is not None and val_c is not None:
+        if math.isclose(val_u, val_c, rel_tol=1e-7):
+            return {"correct": True, "result": "正確"}
+    
+    u_clean = str(user_answer).strip().replace(" ", "")
+    c_clean = str(correct_answer).strip().replace(" ", "")
+    if u_clean == c_clean:
+        return {"correct": True, "result": "正確"}
+
+    return {"correct": False, "result": f"正確答案: {correct_answer}"}
+
+# [V47.4 跨領域工具組]
+
+def clamp_fraction(fr, max_den=1000, max_num=100000):
+    """防止分數爆炸：限制分子分母"""
+    if not isinstance(fr, Fraction):
+        fr = Fraction(fr)
+    if abs(fr.numerator) > max_num or fr.denominator > max_den:
+        fr = fr.limit_denominator(max_den)
+    return fr
+
+def safe_pow(base, exp, max_abs_exp=10):
+    """安全指數運算，避免溢出"""
+    if abs(exp) > max_abs_exp:
+        return Fraction(0)  # 或其他安全默認
+    try:
+        if isinstance(base, Fraction) and exp >= 0:
+            return Fraction(base.numerator ** exp, base.denominator ** exp)
+        elif isinstance(base, Fraction) and exp < 0:
+            return Fraction(base.denominator ** (-exp), base.numerator ** (-exp))
+        else:
+            return Fraction(int(base ** exp), 1)
+    except:
+        return Fraction(0)
+
+def factorial_bounded(n, max_n=1000):
+    """有界階乘"""
+    if not (0 <= n <= max_n):
+        return None
+    result = 1
+    for i in range(2, int(n) + 1):
+        result *= i
+    return result
+
+def nCr(n, r, max_n=5000):
+    """組合數 C(n,r)"""
+    n, r = int(n), int(r)
+    if not (0 <= r <= n <= max_n):
+        return None
+    if r > n - r:
+        r = n - r
+    result = 1
+    for i in range(r):
+        result = result * (n - i) // (i + 1)
+    return result
+
+def nPr(n, r, max_n=5000):
+    """排列數 P(n,r)"""
+    n, r = int(n), int(r)
+    if not (0 <= r <= n <= max_n):
+        return None
+    result = 1
+    for i in range(n, n - r, -1):
+        result *= i
+    return result
+
+def rational_gauss_solve(a, b, p, c, d, q):
+    """2x2 線性系統求解器 (用 Fraction)
+    a*x + b*y = p
+    c*x + d*y = q
+    返回 {'x': Fraction, 'y': Fraction} 或 None
+    """
+    a, b, p, c, d, q = [Fraction(x) for x in [a, b, p, c, d, q]]
+    det = a * d - b * c
+    if det == 0:
+        return None  # 無解或無窮解
+    x = (p * d - b * q) / det
+    y = (a * q - p * c) / det
+    return {'x': x, 'y': y}
+
+def normalize_angle(theta, unit='deg'):
+    """角度正規化到 [0, 360) 或 [0, 2π)"""
+    theta = float(theta)
+    if unit == 'deg':
+        theta = theta % 360
+        if theta < 0:
+            theta += 360
+        return theta
+    else:  # rad
+        theta = theta % (2 * math.pi)
+        if theta < 0:
+            theta += 2 * math.pi
+        return theta
+
+def fmt_set(iterable, braces='{}'):
+    """集合顯示：元素使用 fmt_num（不含外層 $）"""
+    items = [fmt_num(x) for x in iterable]
+    inner = ", ".join(items)
+    return ("\\{" + inner + "\\}") if braces == '\\{\\}' else ("{" + inner + "}")
+
+def fmt_interval(a, b, left_open=False, right_open=False):
+    """區間顯示：(a,b)、[a,b)、(a,b]、[a,b]；端點使用 fmt_num"""
+    l = "(" if left_open else "["
+    r = ")" if right_open else "]"
+    return f"{l}{fmt_num(a)}, {fmt_num(b)}{r}"
+
+def fmt_vec(*coords):
+    """向量顯示：分量使用 fmt_num（不含外層 $）"""
+    inner = ", ".join(fmt_num(x) for x in coords)
+    return "\\langle " + inner + " \\rangle"
+
+# ✅ 預設的 LaTeX 運算子映射（四則）- 全域可用
+op_latex = {'+': '+', '-': '-', '*': '\\times', '/': '\\div'}
+'''
+
+# 版本 = 工具庫原始碼雜湊：工具庫一有修改，新生成的技能標頭即記錄不同版本
+SKILL_RUNTIME_VERSION = _hashlib.sha1(PERFECT_UTILS.encode('utf-8')).hexdigest()[:10]
+
+# 寫入技能檔的綁定程式碼 (取代內嵌的 CALCULATION_SKELETON)
+SKILL_RUNTIME_PRELUDE = f"""
+# [SKILL RUNTIME] {SKILL_RUNTIME_VERSION}
+from core.skill_runtime import *  # noqa: F401,F403
+
+# [AI GENERATED CODE]
+# ---------------------------------------------------------
+"""
+
+_RUNTIME_TAG = '# [SKILL RUNTIME] '
+
+
+def runtime_version_of(source):
+    """回傳技能檔原始碼綁定的執行期版本；內嵌舊式骨架 (或未綁定) 時回傳 None"""
+    idx = source.find(_RUNTIME_TAG)
+    if idx < 0:
+        return None
+    return source[idx + len(_RUNTIME_TAG):].split('\n', 1)[0].strip()
+
+
+# 在本模組命名空間中定義工具函式 (只編譯一次)，並只匯出工具庫定義的名稱。
+# 注意：工具函式之間的呼叫 (例如 fmt_num 內呼叫 to_latex) 查詢的是本模組的全域名稱，而非技能模組；
+# 技能若自行重新定義 to_latex，只影響技能自己的呼叫，不會改變 fmt_num 的行為 (內嵌骨架時則會)。
+# 因此重新定義工具庫名稱的技能必須維持內嵌骨架，見 overridden_runtime_names()。
+_exported_before = set(globals())
+exec(compile(PERFECT_UTILS, f"<skill_runtime {SKILL_RUNTIME_VERSION}>", 'exec'), globals())
+__all__ = sorted(name for name in set(globals()) - _exported_before if not name.startswith('_'))
+del _exported_before
+
+
+def _same_import(name, imported, module):
+    """技能重新匯入工具庫本身已匯入的同一物件 (import random / from fractions import Fraction) 不算覆寫"""
+    current = globals().get(name)
+    if module is None:
+        return getattr(current, '__name__', None) == imported
+    return getattr(current, '__module__', None) == module and getattr(current, '__name__', None) == imported
+
+
+def overridden_runtime_names(code):
+    """
+    回傳技能程式碼在模組層級重新定義的工具庫名稱 (def / class / 指派 / import / 函式內 global)。
+    非空時該技能不可改綁執行期模組：內嵌骨架中其他工具函式會呼叫到技能的版本，綁定後則不會。
+    無法解析的程式碼回傳 None (呼叫端應視為不可轉換)。
+    """
+    import ast as _ast
+
+    try:
+        tree = _ast.parse(code)
+    except SyntaxError:
+        return None
+
+    names = set()
+    pending = list(tree.body)
+    while pending:
+        node = pending.pop()
+        if isinstance(node, (_ast.FunctionDef, _ast.AsyncFunctionDef, _ast.ClassDef)):
+            names.add(node.name)
+            # 函式內以 global 宣告後指派，同樣改寫模組層級名稱
+            names.update(n for sub in _ast.walk(node) if isinstance(sub, _ast.Global) for n in sub.names)
+        elif isinstance(node, (_ast.Import, _ast.ImportFrom)):
+            for alias in node.names:
+                name = (alias.asname or alias.name).split('.')[0]
+                if not _same_import(name, alias.name, getattr(node, 'module', None)):
+                    names.add(name)
+        else:
+            # 模組層級的 if / try / for / with 區塊內的定義也算；運算式內的名稱不算
+            for child in _ast.iter_child_nodes(node):
+                if isinstance(child, _ast.stmt):
+                    pending.append(child)
+                elif isinstance(child, _ast.excepthandler):
+                    pending.extend(child.body)
+                    if child.name:
+                        names.add(child.name)
+            for target in getattr(node, 'targets', None) or [getattr(node, 'target', None)]:
+                if target is not None:
+                    names.update(n.id for n in _ast.walk(target) if isinstance(n, _ast.Name))
+            if isinstance(node, (_ast.With, _ast.AsyncWith)):
+                for item in node.items:
+                    if item.optional_vars is not None:
+                        names.update(n.id for n in _ast.walk(item.optional_vars) if isinstance(n, _ast.Name))
+    return sorted(names & set(__all__))
+
+
+# ==============================================================================
+# 批次出題合約 (不匯出到技能檔)
+# 技能可選擇實作 generate_batch(level=1, n=10, seed=None) -> list[dict]：
+#   以 random.Random(seed) / numpy.random.default_rng(seed) 一次抽出 n 題的亂數，
+#   共用排版工作 (例如同一難度的題幹樣板)，同一 (level, n, seed) 必須得到相同的整批題目。
+# 未實作的技能由 run_generate_batch 退回逐題呼叫 generate()。
+# ==============================================================================
+
+def has_native_batch(module):
+    """技能模組本身是否定義了 generate_batch (而非只有 generate)"""
+    fn = getattr(module, 'generate_batch', None)
+    return callable(fn) and getattr(fn, '__module__', None) == getattr(module, '__name__', None)
+
+
+def run_generate_batch(module, level=1, n=10, seed=None):
+    """
+    一次產生 n 題，回傳 [(seed, data), ...] (data 已經過欄位校正，無效的題目會被略過)。
+    - 原生 generate_batch：整批以 seed 重現，個別題目的 seed 為 None。
+    - 退回路徑：由 seed 衍生每題的種子，逐題以 generate_question 產生，每題都可單獨由種子重現。
+    """
+    import random as _random
+    from core.question_pool import generate_question, new_seed, normalize_question_data
+
+    seed = new_seed() if seed is None else seed
+    if has_native_batch(module):
+        items = module.generate_batch(level=level, n=n, seed=seed) or []
+        return [(None, data) for data in (normalize_question_data(item) for item in items[:n]) if data is not None]
+
+    rng = _random.Random(seed)
+    results, error = [], None
+    for _ in range(n):
+        question_seed = rng.getrandbits(48)
+        try:
+            data = generate_question(module, level, question_seed)
+        except Exception as e:
+            error = e  # 單題失敗不中斷整批
+            continue
+        if data is not None:
+            results.append((question_seed, data))
+    if not results and error is not None:
+        raise error
+    return results
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/skill_telemetry.py
+功能說明 (Description): 技能執行遙測 (Skill Telemetry)，在正式環境常駐記錄每個技能 generate() / check() 的延遲直方圖、
+                       重試次數與例外類型。記錄時只寫入執行緒私有的計數器 (不需加鎖)，
+                       背景執行緒定期把增量合併寫入 skill_telemetry 資料表，供後台依 p95 延遲與重試率排名。
+執行語法 (Usage): 由系統調用 (from core.skill_telemetry import SKILL_TELEMETRY)
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import atexit
+import bisect
+import json
+import logging
+import threading
+import time
+
+from sqlalchemy import text
+
+from config import Config
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# 直方圖桶上界 (毫秒)，最後再加一個溢位桶
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+OPS = ('generate', 'generate_batch', 'check')
+
+_CREATE_SQL = text('''
+    CREATE TABLE IF NOT EXISTS skill_telemetry (
+        skill_id TEXT NOT NULL, op TEXT NOT NULL,
+        calls INTEGER NOT NULL DEFAULT 0, errors INTEGER NOT NULL DEFAULT 0, retries INTEGER NOT NULL DEFAULT 0,
+        total_ms REAL NOT NULL DEFAULT 0, buckets TEXT, error_types TEXT, updated_at REAL,
+        PRIMARY KEY (skill_id, op)
+    )
+''')
+_SELECT_SQL = text('SELECT calls, errors, retries, total_ms, buckets, error_types FROM skill_telemetry '
+                   'WHERE skill_id = :skill_id AND op = :op')
+_UPSERT_SQL = text('''
+    INSERT INTO skill_telemetry (skill_id, op, calls, errors, retries, total_ms, buckets, error_types, updated_at)
+    VALUES (:skill_id, :op, :calls, :errors, :retries, :total_ms, :buckets, :error_types, :updated_at)
+    ON CONFLICT(skill_id, op) DO UPDATE SET
+        calls = excluded.calls, errors = excluded.errors, retries = excluded.retries,
+        total_ms = excluded.total_ms, buckets = excluded.buckets,
+        error_types = excluded.error_types, updated_at = excluded.updated_at
+''')
+
+
+class _Series:
+    """單一 (skill_id, op) 的累計計數 (只由擁有它的執行緒寫入)"""
+    __slots__ = ('calls', 'errors', 'retries', 'total_ms', 'buckets', 'error_types')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.error_types = {}
+
+    def add(self, other, sign=1):
+        self.calls += sign * other.calls
+        self.errors += sign * other.errors
+        self.retries += sign * other.retries
+        self.total_ms += sign * other.total_ms
+        for i, n in enumerate(other.buckets):
+            self.buckets[i] += sign * n
+        for name, n in list(other.error_types.items()):
+            self.error_types[name] = self.error_types.get(name, 0) + sign * n
+
+    def copy(self):
+        series = _Series()
+        series.add(self)
+        return series
+
+
+def percentile_ms(buckets, q):
+    """由直方圖估計百分位數 (回傳該桶的上界，溢位桶回傳 None 表示超過最大桶)"""
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for i, n in enumerate(buckets):
+        seen += n
+        if seen >= rank:
+            return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else None
+    return None
+
+
+class SkillTelemetry:
+    """
+    技能遙測收集器
+    - record(): 寫入目前執行緒自己的 shard (dict of _Series)，熱路徑不取鎖。
+    - flush(): 讀取所有 shard 的累計值，與上次寫回的快照相減得到增量，合併到資料表；
+      已結束的執行緒的 shard 併入 _retired 後移除，避免每請求一執行緒時 shard 無限增長。
+    - 未呼叫 init_app() (例如離線腳本) 時只累計在記憶體，不寫資料庫。
+    """
+
+    def __init__(self, flush_interval=60):
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._shards = []  # [(thread, {key: _Series})]
+        self._shards_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._retired = {}
+        self._flushed = {}
+        self._stop = threading.Event()
+        self._app = None
+        self._thread = None
+        self._ready = False
+        self._counters = {'flushes': 0, 'rows_written': 0, 'flush_errors': 0}
+
+    def init_app(self, app):
+        """綁定 Flask app 並啟動背景寫回執行緒 (重複呼叫無副作用)"""
+        self._app = app
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='telemetry-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def record(self, skill_id, op, seconds, error=None, retries=0):
+        """記錄一次 generate / check 呼叫 (error 為例外物件或類型名稱，retries=1 表示本次是失敗後的重試，
+        每次重試只計一次，retry_rate 即重試呼叫佔全部呼叫的比例)"""
+        key = (skill_id, op)
+        shard = self._shard()
+        series = shard.get(key)
+        if series is None:
+            series = shard[key] = _Series()
+        ms = seconds * 1000
+        series.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        series.calls += 1
+        series.total_ms += ms
+        series.retries += retries
+        if error is not None:
+            name = error if isinstance(error, str) else type(error).__name__
+            series.errors += 1
+            series.error_types[name] = series.error_types.get(name, 0) + 1
+
+    def measure(self, skill_id, op, retries=0, ignore=()):
+        """
+        with SKILL_TELEMETRY.measure(skill_id, 'check'): ... 記錄區塊耗時與例外 (例外原樣拋出)；
+        ignore 內的例外類型代表根本沒有執行 (例如技能隔離中)，不列入統計
+        """
+        return _Measure(self, skill_id, op, retries, ignore)
+
+    def snapshot(self):
+        """所有執行緒 (含已結束者) 的累計值 {(skill_id, op): _Series}"""
+        with self._shards_lock:
+            shards = list(self._shards)
+            alive = []
+            for thread, shard in shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    _merge(self._retired, shard)
+            self._shards = alive
+            total = {key: series.copy() for key, series in self._retired.items()}
+        for _, shard in alive:
+            # list() 於 GIL 下一次複製完成，擁有者執行緒同時新增鍵也不會中斷迭代
+            _merge(total, dict(list(shard.items())))
+        return total
+
+    def flush(self):
+        """把上次寫回後的增量合併寫入 skill_telemetry 資料表"""
+        if self._app is None:
+            return 0
+        with self._flush_lock:
+            current = self.snapshot()
+            deltas = {}
+            for key, series in current.items():
+                delta = series.copy()
+                previous = self._flushed.get(key)
+                if previous is not None:
+                    delta.add(previous, sign=-1)
+                if delta.calls:
+                    deltas[key] = delta
+            if not deltas:
+                return 0
+            try:
+                with self._app.app_context():
+                    self._write(deltas)
+            except Exception as e:
+                logger.error(f"技能遙測寫回失敗，將於下次重試: {e}")
+                self._counters['flush_errors'] += 1
+                return 0
+            self._flushed = current
+            self._counters['flushes'] += 1
+            self._counters['rows_written'] += len(deltas)
+            return len(deltas)
+
+    def _write(self, deltas):
+        now = time.time()
+        with db.engine.begin() as conn:
+            if not self._ready:
+                conn.execute(_CREATE_SQL)
+                self._ready = True
+            for (skill_id, op), delta in deltas.items():
+                row = conn.execute(_SELECT_SQL, {'skill_id': skill_id, 'op': op}).fetchone()
+                if row is not None:
+                    stored = _Series()
+                    stored.calls, stored.errors, stored.retries, stored.total_ms = row[0], row[1], row[2], row[3]
+                    stored.buckets = _pad(json.loads(row[4] or '[]'))
+                    stored.error_types = json.loads(row[5] or '{}')
+                    delta.add(stored)
+                conn.execute(_UPSERT_SQL, {
+                    'skill_id': skill_id, 'op': op, 'calls': delta.calls, 'errors': delta.errors,
+                    'retries': delta.retries, 'total_ms': round(delta.total_ms, 3),
+                    'buckets': json.dumps(delta.buckets), 'error_types': json.dumps(delta.error_types),
+                    'updated_at': now,
+                })
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def shutdown(self):
+        """停止背景執行緒並做最後一次寫回"""
+        self._stop.set()
+        self.flush()
+
+    def ranking(self, op='generate', sort='p95', limit=50):
+        """
+        依 p95 延遲 (sort='p95') 或重試率 (sort='retry_rate') 排名技能。
+        資料來源為資料表 (所有 worker 的累計) + 本行程尚未寫回的增量。
+        """
+        self.flush()
+        merged = {}
+        if self._app is not None:
+            with self._app.app_context(), db.engine.begin() as conn:
+                if not self._ready:
+                    conn.execute(_CREATE_SQL)
+                    self._ready = True
+                rows = conn.execute(text(
+                    'SELECT skill_id, calls, errors, retries, total_ms, buckets, error_types '
+                    'FROM skill_telemetry WHERE op = :op'), {'op': op}).fetchall()
+            for row in rows:
+                series = merged[row[0]] = _Series()
+                series.calls, series.errors, series.retries, series.total_ms = row[1], row[2], row[3], row[4]
+                series.buckets = _pad(json.loads(row[5] or '[]'))
+                series.error_types = json.loads(row[6] or '{}')
+        else:
+            merged = {key[0]: series for key, series in self.snapshot().items() if key[1] == op}
+
+        items = []
+        for skill_id, s in merged.items():
+            if not s.calls:
+                continue
+            p95 = percentile_ms(s.buckets, 0.95)
+            items.append({
+                'skill_id': skill_id,
+                'calls': s.calls,
+                'p50_ms': percentile_ms(s.buckets, 0.5),
+                'p95_ms': p95,
+                'avg_ms': round(s.total_ms / s.calls, 2),
+                'retry_rate': round(s.retries / s.calls, 4),
+                'error_rate': round(s.errors / s.calls, 4),
+                'error_types': s.error_types,
+            })
+        if sort == 'retry_rate':
+            items.sort(key=lambda x: (x['retry_rate'], x['error_rate']), reverse=True)
+        else:
+            # 溢位桶 (None) 表示超過最大桶上界，排最前面
+            items.sort(key=lambda x: float('inf') if x['p95_ms'] is None else x['p95_ms'], reverse=True)
+        return items[:limit]
+
+    def stats(self):
+        data = dict(self._counters)
+        with self._shards_lock:
+            data['shards'] = len(self._shards)
+        data['series'] = len(self.snapshot())
+        return data
+
+
+class _Measure:
+    __slots__ = ('telemetry', 'skill_id', 'op', 'retries', 'ignore', 'started')
+
+    def __init__(self, telemetry, skill_id, op, retries, ignore):
+        self.telemetry = telemetry
+        self.skill_id = skill_id
+        self.op = op
+        self.retries = retries
+        self.ignore = ignore
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and issubclass(exc_type, self.ignore):
+            return False
+        self.telemetry.record(self.skill_id, self.op, time.perf_counter() - self.started,
+                              error=exc_type.__name__ if exc_type else None, retries=self.retries)
+        return False
+
+
+def _merge(target, shard):
+    for key, series in shard.items():
+        existing = target.get(key)
+        if existing is None:
+            target[key] = series.copy()
+        else:
+            existing.add(series)
+
+
+def _pad(buckets):
+    """資料表中的直方圖長度與目前 BUCKETS_MS 不同時補零 / 截斷到溢位桶"""
+    size = len(BUCKETS_MS) + 1
+    if len(buckets) > size:
+        buckets = buckets[:size - 1] + [sum(buckets[size - 1:])]
+    return list(buckets) + [0] * (size - len(buckets))
+
+
+SKILL_TELEMETRY = SkillTelemetry(flush_interval=getattr(Config, 'SKILL_TELEMETRY_FLUSH_INTERVAL', 60))
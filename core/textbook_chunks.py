@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+=============================================================================
+模組名稱 (Module Name): core/textbook_chunks.py
+功能說明 (Description): 教科書 AI 分析的分段與合併 (Textbook Chunking & Merge)。
+                       chunk_pages() 依頁面視窗切段 (優先在新章節開頭切開，超長頁面依行拆分)，
+                       merge_analyses() 依分段順序將各段回傳的 章節 / 小節 / 觀念 / 例題 合併為 save_to_database 所需的結構，
+                       結果與各段完成順序無關。
+執行語法 (Usage): 由系統調用 (from core.textbook_chunks import chunk_pages, merge_analyses)
+版本資訊 (Version): V2.0
+更新日期 (Date): 2026-01-13
+維護團隊 (Maintainer): Math AI Project Team
+=============================================================================
+"""
+import re
+
+# 章節標題行 (Chapter 1 / 第一章 / 單元1)，作為優先切段位置與分段提示
+CHAPTER_PATTERN = re.compile(r'^\s*(?:Chapter\s*\d+|第\s*[一二三四五六七八九十\d]+\s*章|單元\s*[一二三四五六七八九十\d]+).*$',
+                             re.MULTILINE | re.IGNORECASE)
+
+
+class Chunk:
+    """一段送交 AI 分析的內容：parts 為 [(頁面標籤, 文字)]，hint 為本段之前最後出現的章節標題行"""
+    __slots__ = ('parts', 'hint')
+
+    def __init__(self, parts, hint=None):
+        self.parts = parts
+        self.hint = hint
+
+    @property
+    def size(self):
+        return sum(len(text) for _, text in self.parts)
+
+    @property
+    def label(self):
+        first, last = self.parts[0][0], self.parts[-1][0]
+        return str(first) if first == last else f"{first}–{last}"
+
+    def render(self):
+        return "\n".join(f"--- Page {label} ---\n{text}" for label, text in self.parts)
+
+    def split(self):
+        """對半拆成兩段 (AI 分析失敗時縮小範圍重試)；只有一頁時回傳 None"""
+        if len(self.parts) < 2:
+            return None
+        mid = len(self.parts) // 2
+        head = Chunk(self.parts[:mid], self.hint)
+        tail = Chunk(self.parts[mid:], _last_chapter(head.parts) or self.hint)
+        return head, tail
+
+
+def _last_chapter(parts):
+    found = None
+    for _, text in parts:
+        for match in CHAPTER_PATTERN.finditer(text):
+            found = match.group(0).strip()
+    return found
+
+
+def _split_long_text(label, text, max_chars):
+    """超過 max_chars 的單頁 (例如整份 Word 檔) 依行拆分，優先在章節標題行切開"""
+    if len(text) <= max_chars:
+        return [(label, text)]
+    pieces, current, size = [], [], 0
+    for line in text.splitlines(keepends=True):
+        if current and (size + len(line) > max_chars or (CHAPTER_PATTERN.match(line) and size >= max_chars // 2)):
+            pieces.append("".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+    if current:
+        pieces.append("".join(current))
+    return [(f"{label} ({i}/{len(pieces)})", piece) for i, piece in enumerate(pieces, start=1)]
+
+
+def chunk_pages(content_by_page, max_chars=40000, max_pages=20):
+    """
+    將 {頁碼: 文字} 依頁碼順序切成 Chunk list。
+    每段最多 max_pages 頁、max_chars 字元；段落已過半時遇到新章節開頭即提前切開，讓同一章盡量落在同一段。
+    """
+    parts = []
+    for page in sorted(content_by_page):
+        parts.extend(_split_long_text(page, content_by_page[page] or "", max_chars))
+
+    chunks, current, size, hint, last_chapter = [], [], 0, None, None
+    for label, text in parts:
+        starts_chapter = CHAPTER_PATTERN.search(text[:500]) is not None
+        full = len(current) >= max_pages or size + len(text) > max_chars
+        half = len(current) >= max_pages / 2 or size >= max_chars / 2
+        if current and (full or (starts_chapter and half)):
+            chunks.append(Chunk(current, hint))
+            current, size, hint = [], 0, last_chapter
+        current.append((label, text))
+        size += len(text)
+        last_chapter = _last_chapter([(label, text)]) or last_chapter
+    if current:
+        chunks.append(Chunk(current, hint))
+    return chunks
+
+
+# 章節編號：第N章 / Chapter N / 單元N 後的數字 (中文數字亦可)，或標題開頭的數字 (「1 整數」)
+_CHAPTER_NUMBER = re.compile(r'第\s*([一二三四五六七八九十\d]+)\s*章|Chapter\s*(\d+)|單元\s*([一二三四五六七八九十\d]+)|^\s*(\d+)(?![\d上下.\-])',
+                             re.IGNORECASE)
+_CHINESE_DIGITS = {c: i for i, c in enumerate('一二三四五六七八九', start=1)}
+
+
+def _chapter_number(text):
+    """'12' / '十二' / '二十一' -> int"""
+    if text.isdigit():
+        return int(text)
+    if '十' not in text:
+        return _CHINESE_DIGITS.get(text)
+    tens, _, ones = text.partition('十')
+    return (_CHINESE_DIGITS.get(tens, 1) if tens else 1) * 10 + (_CHINESE_DIGITS.get(ones, 0) if ones else 0)
+
+
+def _chapter_key(title):
+    """
+    章節合併鍵：優先採用「第N章 / Chapter N / 單元N」的編號 (「7上 第1章」與「7上 第2章」不可合併)，
+    其次為標題開頭的獨立數字，都沒有時以去除空白的標題比對。
+    """
+    match = _CHAPTER_NUMBER.search(title)
+    if match:
+        number = _chapter_number(next(g for g in match.groups() if g))
+        if number is not None:
+            return ('num', number)
+    return ('title', re.sub(r'\s+', '', title))
+
+
+def _concept_key(concept):
+    en_id = re.sub(r'[^a-zA-Z0-9]', '', str(concept.get('concept_en_id') or ''))
+    return en_id or re.sub(r'\s+', '', str(concept.get('concept_name') or ''))
+
+
+def _fill_missing(target, source):
+    """target 中缺少或為空的欄位以 source 補上 (先出現的分段優先)"""
+    for key, value in source.items():
+        if value not in (None, '', [], {}) and target.get(key) in (None, '', [], {}):
+            target[key] = value
+
+
+def merge_analyses(analyses):
+    """
+    依分段順序合併各段 AI 回傳的 {"chapters": [...]}。
+    - 章節：章節編號 (第N章 / Chapter N / 單元N / 開頭數字) 相同，或無編號時標題相同，視為同一章，保留第一次出現的標題。
+    - 小節：同一章內 section_title 相同 (忽略空白) 視為同一節。
+    - 觀念：concept_en_id (與 save_to_database 的技能 ID 規則相同) 相同視為同一觀念，其餘欄位先出現者優先。
+    - 例題：(source_description, problem_text) 相同者去重。
+    """
+    chapters = {}
+    for analysis in analyses:
+        for chapter in (analysis or {}).get('chapters', []) or []:
+            title = str(chapter.get('chapter_title') or '未命名章節').strip()
+            merged_chapter = chapters.setdefault(_chapter_key(title), {'chapter_title': title, 'sections': {}})
+            for section in chapter.get('sections', []) or []:
+                section_title = str(section.get('section_title') or '').strip()
+                merged_section = merged_chapter['sections'].setdefault(
+                    re.sub(r'\s+', '', section_title), {'section_title': section_title, 'concepts': {}})
+                for concept in section.get('concepts', []) or []:
+                    key = _concept_key(concept)
+                    merged = merged_section['concepts'].get(key)
+                    if merged is None:
+                        merged = merged_section['concepts'][key] = dict(concept, examples=[])
+                        merged['_seen'] = set()
+                    else:
+                        _fill_missing(merged, {k: v for k, v in concept.items() if k != 'examples'})
+                    for example in concept.get('examples', []) or []:
+                        example_key = (str(example.get('source_description') or ''),
+                                       re.sub(r'\s+', '', str(example.get('problem_text') or '')))
+                        if example_key not in merged['_seen']:
+                            merged['_seen'].add(example_key)
+                            merged['examples'].append(example)
+
+    result = []
+    for chapter in chapters.values():
+        sections = []
+        for section in chapter['sections'].values():
+            concepts = []
+            for concept in section['concepts'].values():
+                concept.pop('_seen', None)
+                concepts.append(concept)
+            sections.append({'section_title': section['section_title'], 'concepts': concepts})
+        result.append({'chapter_title': chapter['chapter_title'], 'sections': sections})
+    return {'chapters': result}
@@ -27,6 +27,7 @@ import os
 # import fitz  # PyMuPDF -> Moved to inside function
 import time
 import io
+import threading
 # import pypandoc -> Moved to inside function
 # from pypandoc.pandoc_download import download_pandoc
 from google.api_core.exceptions import ResourceExhausted
@@ -34,10 +35,15 @@ from models import db, SkillInfo, SkillCurriculum, TextbookExample
 from core.ai_analyzer import get_model
 from flask import current_app
 import traceback
-from core.code_generator import auto_generate_skill_code
+from core.generation_scheduler import GenerationScheduler, _provider_limits
+from core.textbook_chunks import chunk_pages, merge_analyses
+from concurrent.futures import ThreadPoolExecutor
 
 # (初始化檢查已移除)
 
+# Word 擷取流程 (Pandoc 參數、clean_pandoc_output、圖片 OCR) 變更時遞增，讓擷取快取自然失效
+DOCX_EXTRACTOR_VERSION = 1
+
 # ==============================================================================
 # [保留] 您原本的 LaTeX 通用修復函式
 # ==============================================================================
@@ -191,19 +197,11 @@ def process_textbook_file(file_path, curriculum_info, queue, skip_code_gen=False
             queue.put(f"INFO: {message}")
         elif processed_skill_ids:
             queue.put(f"INFO: 開始自動生成 {len(processed_skill_ids)} 個技能的出題程式...")
-            for idx, skill_id in enumerate(processed_skill_ids):
-                queue.put(f"INFO: [{idx+1}/{len(processed_skill_ids)}] 正在生成 {skill_id}.py ...")
-                try:
-                    success, msg, _ = auto_generate_skill_code(skill_id, queue)
-                    if success:
-                        queue.put(f"INFO: {skill_id} 生成成功！")
-                    else:
-                        queue.put(f"WARN: {skill_id} 生成失敗，跳過。")
-                except Exception as e:
-                    queue.put(f"ERROR: 生成 {skill_id} 時發生未預期錯誤: {e}")
-                    current_app.logger.error(f"Generate Error {skill_id}: {e}")
-                
-                time.sleep(2) # Rate Limit
+            # [效能] 並行生成：依供應商限制並行數與速率 (取代逐一生成 + 固定 sleep)，進度由排程器推送
+            results = GenerationScheduler().run(processed_skill_ids, queue=queue)
+            for result in results:
+                if result['error'] is not None:
+                    current_app.logger.error(f"Generate Error {result['skill_id']}: {result['error']}")
             code_gen_status = f"{len(processed_skill_ids)} 個"
 
         return {
@@ -249,61 +247,75 @@ def extract_content_from_file(file_path, queue):
             WandImage = None
 
         file_extension = os.path.splitext(file_path)[1].lower()
+        ocr_lang = current_app.config.get('OCR_LANG', 'chi_tra')
+
+        # 擷取快取：內容相同的檔案重新匯入時沿用上次的擷取結果 (略過 Pandoc / OCR)
+        from core.extraction_cache import EXTRACTION_CACHE, file_hash
+        content_hash = file_hash(file_path) if EXTRACTION_CACHE.enabled else None
 
         if file_extension == '.pdf':
-            # --- PDF 處理邏輯 (維持原樣) ---
+            # --- PDF 處理邏輯：逐頁平行擷取，文字層足夠的頁面略過 OCR ---
+            from core.page_extractor import EXTRACTOR_VERSION, extract_pdf_pages
+
+            options = {
+                'min_text_chars': current_app.config.get('OCR_MIN_TEXT_CHARS', 50),
+                'min_image_area_ratio': current_app.config.get('OCR_MIN_IMAGE_AREA_RATIO', 0.02),
+                'ocr_dpi': current_app.config.get('OCR_DPI', 72),
+                'ocr_lang': ocr_lang,
+            }
+            cache_version = ['pdf', EXTRACTOR_VERSION, dict(options)]
+            with fitz.open(file_path) as doc:
+                total_pages = doc.page_count
+
+            missing = []
+            for i in range(total_pages):
+                cached = EXTRACTION_CACHE.get_page(content_hash, i + 1, ocr_lang, cache_version) if content_hash else None
+                if cached is None:
+                    missing.append(i)
+                else:
+                    content_by_page[i + 1] = cached
+            if content_by_page:
+                queue.put(f"INFO: 擷取快取命中 {len(content_by_page)}/{total_pages} 頁，略過重新擷取。")
+
             ocr_import_error_logged = False
             tesseract_not_found_error_logged = False
-            doc = fitz.open(file_path)
-            for i, page in enumerate(doc.pages()):
-                page_text = page.get_text("text")
-
-                # 偵測大字體標題
-                blocks = page.get_text("blocks")
-                large_font_texts = []
-                large_font_threshold = 20
-                for b in blocks:
-                    try:
-                        text = b[4]
-                        first_line = page.get_text("dict", clip=b[:4])['blocks'][0]['lines'][0]
-                        font_size = first_line['spans'][0]['size']
-                        if font_size > large_font_threshold:
-                            large_font_texts.append(text.strip())
-                    except (IndexError, KeyError):
-                        continue
-                for large_text in large_font_texts:
-                    if large_text and large_text not in page_text:
-                        page_text = large_text + "\n" + page_text
-
-                # OCR 處理
-                try:
-                    from pytesseract import TesseractNotFoundError
-
-                    tesseract_path = current_app.config.get('TESSERACT_CMD')
-                    if tesseract_path:
-                        pytesseract.pytesseract.tesseract_cmd = tesseract_path
-
-                    pix = page.get_pixmap()
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    ocr_text = pytesseract.image_to_string(img, lang='chi_tra')
-                    page_text += "\nOCR Extracted: " + ocr_text.strip()
-                except ImportError:
+            ocr_modes = {'skipped': 0, 'regions': 0, 'full': 0}
+            started = time.perf_counter()
+
+            options['tesseract_cmd'] = current_app.config.get('TESSERACT_CMD')
+            for result in extract_pdf_pages(file_path, workers=current_app.config.get('OCR_WORKERS'),
+                                            options=options, page_indexes=missing):
+                page_no = result['page']
+                content_by_page[page_no] = result['text']
+                # OCR 失敗 (例如尚未安裝 Tesseract) 的頁面不寫入快取，環境修好後重新匯入會再做 OCR
+                if content_hash and not result['ocr_error']:
+                    EXTRACTION_CACHE.put_page(content_hash, page_no, ocr_lang, cache_version, result['text'])
+                ocr_modes[result['ocr']] += 1
+                titles = " / ".join(h.replace("\n", " ") for h in result['headings'])
+                headings = f" 標題: {titles}" if titles else ""
+                queue.put(f"INFO: [頁 {page_no}/{total_pages}] OCR: {result['ocr']} ({result['seconds']:.2f}s){headings}")
+
+                if result['ocr_error'] == 'import':
                     if not ocr_import_error_logged:
                         message = "無法執行 OCR，缺少 'pytesseract' 或 'Pillow' 套件。"
                         current_app.logger.warning(message)
                         queue.put(f"WARN: {message}")
                         ocr_import_error_logged = True
-                except TesseractNotFoundError:
+                elif result['ocr_error'] == 'tesseract':
                     if not tesseract_not_found_error_logged:
                         message = "無法找到 Tesseract-OCR 引擎，請確保已正確安裝。"
                         current_app.logger.error(message)
                         queue.put(f"ERROR: {message}")
                         tesseract_not_found_error_logged = True
-                except Exception as ocr_e:
-                    current_app.logger.warning(f"頁 {i+1} OCR 處理時發生錯誤: {ocr_e}")
+                elif result['ocr_error']:
+                    current_app.logger.warning(f"頁 {page_no} OCR 處理時發生錯誤: {result['ocr_error']}")
 
-                content_by_page[i + 1] = page_text
-            doc.close()
+            if missing:
+                elapsed = time.perf_counter() - started
+                message = (f"PDF 擷取完成：{len(missing)} 頁，耗時 {elapsed:.1f} 秒 ({len(missing) / max(elapsed, 1e-6):.2f} 頁/秒)；"
+                           f"略過 OCR {ocr_modes['skipped']} 頁、區域 OCR {ocr_modes['regions']} 頁、整頁 OCR {ocr_modes['full']} 頁")
+                current_app.logger.info(message)
+                queue.put(f"INFO: {message}")
 
         elif file_extension in ['.docx', '.doc']:
             # --- Word (.docx) 處理邏輯 (使用 Pandoc) ---
@@ -311,6 +323,13 @@ def extract_content_from_file(file_path, queue):
             current_app.logger.info(message)
             queue.put(f"INFO: {message}")
 
+            cache_version = ['docx', DOCX_EXTRACTOR_VERSION]
+            cached = EXTRACTION_CACHE.get_page(content_hash, 1, ocr_lang, cache_version) if content_hash else None
+            if cached is not None:
+                queue.put("INFO: 擷取快取命中，略過 Pandoc 轉換與圖片 OCR。")
+                return {1: cached}
+
+            ocr_failures = []
             try:
                 # 建立一個暫存資料夾來存放從 Word 中提取的圖片
                 temp_media_dir = os.path.join(os.path.dirname(file_path), "media")
@@ -343,6 +362,7 @@ def extract_content_from_file(file_path, queue):
                             # 在 OCR 前先轉換 WMF/EMF 檔案
                             if full_image_path.lower().endswith(('.wmf', '.emf')):
                                 if WandImage is None:
+                                    ocr_failures.append(image_path_in_md)
                                     queue.put(f"WARN: 略過 WMF/EMF 圖片轉換 ({image_path_in_md})，因為系統未安裝 Wand/ImageMagick。")
                                     return match.group(0) # 保持原樣
 
@@ -353,6 +373,7 @@ def extract_content_from_file(file_path, queue):
                                         img.save(filename=png_path)
                                     image_to_ocr_path = png_path
                                 except Exception as wand_e:
+                                    ocr_failures.append(image_path_in_md)
                                     queue.put(f"WARN: 轉換圖片 {image_path_in_md} 失敗: {wand_e}")
                                     return match.group(0)
 
@@ -361,9 +382,10 @@ def extract_content_from_file(file_path, queue):
                                 pytesseract.pytesseract.tesseract_cmd = tesseract_path
                             
                             img = Image.open(image_to_ocr_path)
-                            ocr_text = pytesseract.image_to_string(img, lang='chi_tra')
+                            ocr_text = pytesseract.image_to_string(img, lang=ocr_lang)
                             return f" {ocr_text.strip()} "
                         except Exception as ocr_e:
+                            ocr_failures.append(image_path_in_md)
                             queue.put(f"WARN: OCR 辨識圖片 '{image_path_in_md}' 失敗: {ocr_e}")
                     
                     return match.group(0)
@@ -371,6 +393,8 @@ def extract_content_from_file(file_path, queue):
                 # 使用 Regex 替換 Markdown 圖片標記
                 final_output = re.sub(r'!\[.*?\]\((.*?)\)', ocr_image_and_replace, markdown_output)
                 content_by_page[1] = final_output
+                if content_hash and not ocr_failures:
+                    EXTRACTION_CACHE.put_page(content_hash, 1, ocr_lang, cache_version, final_output)
 
             except (OSError, RuntimeError) as e:
                 error_str = str(e)
@@ -651,12 +675,7 @@ def call_gemini_for_analysis(content_by_page, curriculum_info, queue):
         base_prompt = prompt_generic
         queue.put("INFO: 未找到專用分析模型，使用通用模型。")
 
-    model = get_model()
-    full_content = "\n".join([f"--- Page {k} ---\n{v}" for k, v in content_by_page.items()])
-    
-    analysis_prompt = f"""
-{base_prompt}
-
+    instructions = f"""
 【重要提示】
 1. 輸出必須是**完整、有效的 JSON**。
 2. 反斜線需轉義 (例如 `\\\\sqrt`)。
@@ -696,22 +715,112 @@ JSON 結構範例 (注意 section_title 為空字串的情況)：
   ]
 }}
 
-課本內容：
-{full_content}
 """
 
-    try:
-        ai_response = _call_gemini_with_retry(
-            model, 
-            analysis_prompt, 
-            queue, 
-            context_message="提取課本結構時，",
-            parse_json=True
-        )
-        return ai_response
-    except Exception as e:
-        queue.put(f"ERROR: AI 分析失敗: {e}")
+    chunks = chunk_pages(
+        content_by_page,
+        max_chars=current_app.config.get('ANALYSIS_CHUNK_CHARS', 40000),
+        max_pages=current_app.config.get('ANALYSIS_CHUNK_PAGES', 20),
+    )
+    total = len(chunks)
+    if total > 1:
+        queue.put(f"INFO: 內容共 {len(content_by_page)} 頁，分為 {total} 段並行分析。")
+
+    def build_prompt(chunk, index):
+        note = ""
+        if total > 1:
+            note = f"【分段資訊】本段為全書第 {index}/{total} 段 (第 {chunk.label} 頁)，只需分析本段內容。"
+            if chunk.hint:
+                note += f"若本段開頭不是新的章節，請沿用前段的章節「{chunk.hint}」作為 chapter_title。"
+            note += "\n"
+        return f"{base_prompt}\n{instructions}{note}\n課本內容：\n{chunk.render()}\n"
+
+    results = _analyze_chunks(chunks, build_prompt, queue)
+    analyses = [r for r in results if r is not None]
+    failed = len(results) - len(analyses)
+    if not analyses:
+        queue.put("ERROR: AI 分析失敗：所有分段皆無法取得有效結果。")
         return ""
+    if failed:
+        queue.put(f"WARN: {failed}/{len(results)} 段 AI 分析失敗，已略過該段內容。")
+    return merge_analyses(analyses)
+
+
+def _analyze_chunk(model, chunk, prompt, queue, context_message, bucket=None, abort=None):
+    """
+    分析單一分段：回傳內容無法解析 (ValueError / 缺少 chapters) 時最多重試 ANALYSIS_CHUNK_RETRIES 次，
+    仍失敗則對半拆分後分別重試。頻率限制、認證、網路等錯誤已由 _call_gemini_with_retry 重試過，
+    拆分只會放大請求數，因此直接拋出 (整次分析失敗)。
+    """
+    attempts = current_app.config.get('ANALYSIS_CHUNK_RETRIES', 2) + 1
+    last_error = None
+    for attempt in range(attempts):
+        if abort is not None and abort.is_set():
+            return [None]
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            parsed = _call_gemini_with_retry(model, prompt(chunk), queue, context_message=context_message, parse_json=True)
+            if isinstance(parsed, list):
+                parsed = {'chapters': parsed}
+            if not isinstance(parsed, dict) or 'chapters' not in parsed:
+                raise ValueError("回傳 JSON 缺少 chapters")
+            return [parsed]
+        except ValueError as e:
+            last_error = e
+            queue.put(f"WARN: {context_message}第 {attempt + 1}/{attempts} 次分析失敗: {e}")
+
+    halves = chunk.split()
+    if halves is None:
+        queue.put(f"ERROR: {context_message}分析失敗: {last_error}")
+        return [None]
+    queue.put(f"INFO: {context_message}拆成第 {halves[0].label} 頁與第 {halves[1].label} 頁重新分析。")
+    return [result for half in halves
+            for result in _analyze_chunk(model, half, prompt, queue, f"分析第 {half.label} 頁時，", bucket, abort)]
+
+
+def _analyze_chunks(chunks, build_prompt, queue):
+    """
+    以有上限的執行緒池並行分析各段，回傳依分段順序排列的結果 (解析失敗的段落為 None)。
+    與程式碼生成共用 Gemini 的並行名額與 Token Bucket (core.generation_scheduler)。
+    任一段遇到非解析錯誤 (配額用盡、認證、網路) 時取消尚未開始的段落並拋出該錯誤。
+    """
+    app = current_app._get_current_object()
+    model = get_model()
+    _, semaphore, bucket = _provider_limits('google')
+    total = len(chunks)
+    abort = threading.Event()
+
+    def run(index, chunk):
+        def prompt(part):
+            return build_prompt(part, index)
+
+        with app.app_context():
+            with semaphore:
+                if abort.is_set():
+                    return [None]
+                context_message = f"分析第 {index}/{total} 段 (第 {chunk.label} 頁) 時，" if total > 1 else "提取課本結構時，"
+                try:
+                    return _analyze_chunk(model, chunk, prompt, queue, context_message, bucket, abort)
+                except Exception:
+                    abort.set()
+                    raise
+
+    workers = min(total, current_app.config.get('ANALYSIS_CONCURRENCY', 4))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='textbook-ai') as executor:
+        futures = [executor.submit(run, index, chunk) for index, chunk in enumerate(chunks, start=1)]
+        results = []
+        try:
+            for done, future in enumerate(futures, start=1):
+                results.extend(future.result())
+                if total > 1:
+                    queue.put(f"INFO: [AI 分析 {done}/{total}] 第 {chunks[done - 1].label} 頁完成。")
+        except Exception:
+            abort.set()
+            for future in futures:
+                future.cancel()
+            raise
+    return results
 
 def parse_ai_response(ai_data_or_string, queue):
     """解析 AI 回傳的資料 (JSON 字串或已解析的 dict)，並進行基本驗證。"""
@@ -784,7 +893,10 @@ def clean_skill_en_name(raw_en_name, queue=None):
 def save_to_database(parsed_data, curriculum_info, queue):
     """
     將 AI 分析完的目錄資料寫入資料庫。
+    既有的技能 / 課綱 / 例題鍵值每個資料表只查詢一次，新資料於記憶體中整理後以 BulkLoader 批次寫入 (單一交易)。
     """
+    from core.bulk_loader import BulkLoader
+
     message = "正在將目錄結構寫入資料庫..."
     current_app.logger.info(message)
     queue.put(f"INFO: {message}")
@@ -804,7 +916,16 @@ def save_to_database(parsed_data, curriculum_info, queue):
         current_app.logger.info(" -> 開始寫入資料庫...")
         queue.put("INFO: -> 開始寫入資料庫...")
         chapters = parsed_data.get('chapters', [])
-        
+
+        loader = BulkLoader()
+        skill_table, curr_table, example_table = SkillInfo.__table__, SkillCurriculum.__table__, TextbookExample.__table__
+        curr_key, example_key = ['skill_id', 'chapter', 'section'], ['skill_id', 'source_description']
+        existing_skills = loader.existing_keys(skill_table, ['skill_id'])
+        existing_currs = loader.existing_keys(curr_table, curr_key)
+        existing_examples = loader.existing_keys(example_table, example_key)
+        skill_rows, curr_rows, example_rows = [], [], []
+        added_currs, added_examples = set(), set()
+
         for chapter_data in chapters:
             raw_chapter = chapter_data.get('chapter_title', '未命名章節').strip()
             
@@ -826,16 +947,24 @@ def save_to_database(parsed_data, curriculum_info, queue):
                 chapter_title = chapter_title.replace('\n', ' ').strip()
                 chapter_title = re.sub(r'^(?:Chapter|Unit|第)\s*(\d+)(?:\s*章)?\s*', r'\1 ', chapter_title).strip()
                 if chapter_title.isdigit():
-                    try:
-                        existing_chapter = SkillCurriculum.query.filter_by(
-                            curriculum=curriculum_info['curriculum'],
-                            grade=int(curriculum_info['grade']),
-                            volume=curriculum_info['volume']
-                        ).filter(SkillCurriculum.chapter.like(f"{chapter_title} %")).first()
-                        if existing_chapter:
-                            chapter_title = existing_chapter.chapter
-                    except Exception:
-                        pass
+                    # 先找本次匯入中已整理的章節 (尚未寫入資料庫)，再查資料庫
+                    existing_chapter = next((r['chapter'] for r in curr_rows
+                                             if r['curriculum'] == curriculum_info['curriculum']
+                                             and r['grade'] == int(curriculum_info['grade'])
+                                             and r['volume'] == str(curriculum_info['volume'])
+                                             and r['chapter'].startswith(f"{chapter_title} ")), None)
+                    if existing_chapter is None:
+                        try:
+                            row = SkillCurriculum.query.filter_by(
+                                curriculum=curriculum_info['curriculum'],
+                                grade=int(curriculum_info['grade']),
+                                volume=curriculum_info['volume']
+                            ).filter(SkillCurriculum.chapter.like(f"{chapter_title} %")).first()
+                            existing_chapter = row.chapter if row else None
+                        except Exception:
+                            pass
+                    if existing_chapter:
+                        chapter_title = existing_chapter
             
             for section_data in sections:
                 section_title = section_data.get('section_title', '') or ''  # 龍騰版很多是空字串,允許
@@ -849,10 +978,9 @@ def save_to_database(parsed_data, curriculum_info, queue):
                     clean_en_id = re.sub(r'[^a-zA-Z0-9]', '', concept_en_id)
                     final_skill_id = f"{prefix}{clean_en_id}"
                     
-                    # === SkillInfo 新增/更新 (維持原邏輯) ===
-                    existing_skill = SkillInfo.query.get(final_skill_id)
-                    if not existing_skill:
-                        new_skill = SkillInfo(
+                    # === SkillInfo 新增 (已存在則不更新，維持原邏輯) ===
+                    if (final_skill_id,) not in existing_skills and final_skill_id not in processed_skill_ids:
+                        skill_rows.append(dict(
                             skill_id=final_skill_id,
                             skill_en_name=clean_en_id,
                             skill_ch_name=concept_name,
@@ -861,20 +989,15 @@ def save_to_database(parsed_data, curriculum_info, queue):
                             input_type='text',
                             gemini_prompt=f"Generate math problems about {concept_name}.",
                             is_active=True
-                        )
-                        db.session.add(new_skill)
+                        ))
                         skills_processed += 1
                         processed_skill_ids.append(final_skill_id)
                     
                     # === SkillCurriculum 新增 (關鍵：加入正確的 display_order) ===
-                    existing_curr = SkillCurriculum.query.filter_by(
-                        skill_id=final_skill_id,
-                        chapter=chapter_title,
-                        section=section_title
-                    ).first()
-                    
-                    if not existing_curr:
-                        new_curr = SkillCurriculum(
+                    key = (final_skill_id, chapter_title, section_title)
+                    if key not in existing_currs and key not in added_currs:
+                        added_currs.add(key)
+                        curr_rows.append(dict(
                             skill_id=final_skill_id,
                             curriculum=curriculum_info.get('curriculum'),
                             grade=int(curriculum_info.get('grade', 10)),
@@ -883,8 +1006,7 @@ def save_to_database(parsed_data, curriculum_info, queue):
                             section=section_title,
                             paragraph=concept_paragraph,
                             display_order=chapter_num * 10000 + skills_processed  # 10000 倍數確保單元間不會互相干擾
-                        )
-                        db.session.add(new_curr)
+                        ))
                         curriculums_added += 1
 
                     # === 例題處理 (維持原邏輯) ===
@@ -892,13 +1014,10 @@ def save_to_database(parsed_data, curriculum_info, queue):
                         problem_text = ex.get('problem_text')
                         if not problem_text: continue
                         
-                        existing_ex = TextbookExample.query.filter_by(
-                            skill_id=final_skill_id,
-                            source_description=ex.get('source_description', '例題')
-                        ).first()
-
-                        if not existing_ex:
-                            new_ex = TextbookExample(
+                        key = (final_skill_id, ex.get('source_description', '例題'))
+                        if key not in existing_examples and key not in added_examples:
+                            added_examples.add(key)
+                            example_rows.append(dict(
                                 skill_id=final_skill_id,
                                 source_curriculum=curriculum_info.get('curriculum'),
                                 source_volume=str(curriculum_info.get('volume')),
@@ -911,11 +1030,19 @@ def save_to_database(parsed_data, curriculum_info, queue):
                                 correct_answer=ex.get('correct_answer', ''),
                                 detailed_solution=ex.get('detailed_solution', ''),
                                 difficulty_level=int(ex.get('difficulty_level', 1))
-                            )
-                            db.session.add(new_ex)
+                            ))
                             examples_added += 1
 
+        # 依外鍵順序批次寫入 (技能 -> 課綱 -> 例題)
+        loader.insert(skill_table, skill_rows, ['skill_id'])
+        loader.insert(curr_table, curr_rows, curr_key)
+        loader.insert(example_table, example_rows, example_key)
         db.session.commit()
+
+        summary = loader.stats()
+        message = f"資料庫寫入完成：{summary['rows']} 筆，耗時 {summary['seconds']:.2f} 秒 ({summary['rows_per_second'] or 0:.0f} 筆/秒)。"
+        current_app.logger.info(message)
+        queue.put(f"INFO: {message}")
         return {
             'skills_processed': skills_processed, 
             'curriculums_added': curriculums_added,
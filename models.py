@@ -12,6 +12,9 @@
 # ==============================================================================
 import sqlite3
 import json
+import hashlib
+import re
+import unicodedata
 import secrets
 import string
 from flask_sqlalchemy import SQLAlchemy
@@ -149,6 +152,7 @@ def init_db(engine):
             question_data TEXT,
             notes TEXT,
             skill_id TEXT,
+            question_fingerprint TEXT,
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (student_id) REFERENCES users (id),
             FOREIGN KEY (skill_id) REFERENCES skills_info (skill_id)
@@ -322,7 +326,9 @@ def init_db(engine):
         ('sampling_success_count', 'INTEGER DEFAULT 0'),  # Dynamic Sampling 成功次數
         ('sampling_total_count', 'INTEGER DEFAULT 0'),  # Dynamic Sampling 總次數
         ('spec_prompt_id', 'INTEGER'),  # 關聯到 skill_gencode_prompt.id
-        ('use_master_spec', 'BOOLEAN DEFAULT 0')  # 是否使用 MASTER_SPEC
+        ('use_master_spec', 'BOOLEAN DEFAULT 0'),  # 是否使用 MASTER_SPEC
+        # [串流效能] Local AI 首 token 延遲 (秒) 與生成速度 (tokens/sec)
+        ('ttft_seconds', 'REAL'), ('tokens_per_second', 'REAL')
     ]
     for col, definition in new_log_cols:
         add_column_if_not_exists('experiment_log', col, definition)
@@ -332,6 +338,52 @@ def init_db(engine):
     add_column_if_not_exists('skill_gencode_prompt', 'experiment_group', 'TEXT')
     add_column_if_not_exists('skill_gencode_prompt', 'generation_duration', 'REAL')
 
+    # [效能] 錯題本題目指紋：自動記錄錯題時以索引查重，取代 JSON 欄位的 LIKE 掃描
+    # (舊資料的指紋回填請執行 upgrade_db.py)
+    add_column_if_not_exists('mistake_notebook_entries', 'question_fingerprint', 'TEXT')
+    try:
+        c.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_mistake_student_fingerprint
+            ON mistake_notebook_entries (student_id, question_fingerprint)
+        ''')
+    except sqlite3.OperationalError: pass
+
+    # [效能] 練習狀態伺服器端儲存 (Config.PRACTICE_STATE_BACKEND = 'sqlite' 時使用，多 worker 共用)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS practice_state (
+            token TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_practice_state_updated ON practice_state (updated_at)')
+
+    # [效能] 技能 generate() / check() 遙測累計 (core/skill_telemetry.py 定期合併寫入)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS skill_telemetry (
+            skill_id TEXT NOT NULL, op TEXT NOT NULL,
+            calls INTEGER NOT NULL DEFAULT 0, errors INTEGER NOT NULL DEFAULT 0, retries INTEGER NOT NULL DEFAULT 0,
+            total_ms REAL NOT NULL DEFAULT 0, buckets TEXT, error_types TEXT, updated_at REAL,
+            PRIMARY KEY (skill_id, op)
+        )
+    ''')
+
+    # 背景任務 (core/jobs.py)：任務表 + 只追加的進度日誌，多 worker 共用
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL,
+            status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,
+            worker TEXT, checkpoint TEXT, error TEXT,
+            created_at REAL NOT NULL, started_at REAL, heartbeat_at REAL, finished_at REAL
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS job_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL,
+            created_at REAL NOT NULL, message TEXT NOT NULL
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_job_logs_job ON job_logs (job_id, id)')
+
     conn.commit()
     conn.close()
     print("資料庫結構初始化與檢查完成 (v9.0)！")
@@ -542,14 +594,28 @@ class ClassStudent(db.Model):
     student_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     joined_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+def make_question_fingerprint(skill_id, question_text):
+    """
+    計算錯題指紋：sha1(skill_id + 正規化後的題目文字)。
+    正規化：Unicode NFKC、移除 LaTeX 數學模式符號 $、壓縮空白，讓排版差異不影響查重。
+    """
+    if not question_text:
+        return None
+    text = unicodedata.normalize('NFKC', str(question_text)).replace('$', '')
+    text = re.sub(r'\s+', ' ', text).strip()
+    return hashlib.sha1(f"{skill_id or ''}\n{text}".encode('utf-8')).hexdigest()
+
 class MistakeNotebookEntry(db.Model):
     __tablename__ = 'mistake_notebook_entries'
+    # 同一學生的同一題只記錄一次 (指紋為 NULL 的手動/考卷錯題不受限制)
+    __table_args__ = (db.Index('uq_mistake_student_fingerprint', 'student_id', 'question_fingerprint', unique=True),)
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     exam_image_path = db.Column(db.String(255), nullable=True)
     question_data = db.Column(db.JSON, nullable=True)
     notes = db.Column(db.Text, nullable=True)
     skill_id = db.Column(db.String(50), db.ForeignKey('skills_info.skill_id'), nullable=True)
+    question_fingerprint = db.Column(db.String(40), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     student = db.relationship('User', backref=db.backref('mistake_entries', lazy=True))
@@ -726,6 +792,10 @@ class ExperimentLog(db.Model):
     total_tokens = db.Column(db.Integer, default=0)
     code_complexity = db.Column(db.Integer, default=0)
 
+    # 串流效能指標 (Local AI)
+    ttft_seconds = db.Column(db.Float)
+    tokens_per_second = db.Column(db.Float)
+
     def __repr__(self):
         return f"<ExperimentLog {self.model_name}: {self.duration_seconds}s>"
 
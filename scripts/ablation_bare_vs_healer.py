@@ -29,6 +29,8 @@
 
 【執行範例】
     python scripts/ablation_bare_vs_healer.py
+    python scripts/ablation_bare_vs_healer.py --cache-mode readwrite   # 錄製 LLM 回應
+    python scripts/ablation_bare_vs_healer.py --replay                 # 只用已錄製的回應重跑 (未命中即失敗)
     
     預期輸出：
     ======================================================================
@@ -55,6 +57,7 @@
 ===============================================================================
 """
 
+import argparse
 import sys
 import os
 from datetime import datetime
@@ -71,6 +74,7 @@ if project_root not in sys.path:
 from app import create_app
 from models import db, SkillGenCodePrompt
 from core.code_generator import auto_generate_skill_code
+from core.llm_cache import CACHE_MODES, set_llm_cache_mode
 from core.prompt_architect import generate_v15_spec
 import importlib.util
 
@@ -404,6 +408,14 @@ def run_ablation_study():
     return all_results
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Healer 價值驗證實驗 (Bare vs Full-Healing)')
+    parser.add_argument('--cache-mode', choices=CACHE_MODES, default=None,
+                        help='LLM 回應快取模式 (預設依 Config.LLM_CACHE_MODE)')
+    parser.add_argument('--replay', action='store_true', help='等同 --cache-mode replay')
+    args = parser.parse_args()
+    if args.replay or args.cache_mode:
+        set_llm_cache_mode('replay' if args.replay else args.cache_mode)
+
     app = create_app()
     with app.app_context():
         results = run_ablation_study()
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+===============================================================================
+程式名稱: answer_check_benchmark.py - 答案比對引擎微基準測試
+===============================================================================
+
+【程式用途】
+    比較技能內建 check()（字串替換 + eval 成 float）與 core/answer_engine.py
+    精確比對引擎的批改速度與判定結果，確認換用引擎後不會誤判學生答案。
+
+【研究背景】
+    專案：旺宏科學獎 - 複合式 AI 架構降低數學題庫生成成本之研究
+    核心論點：Local 14B AI + Active Healer ≈ Cloud Pro（成本降低 98%）
+
+    相關問題：
+        - 每次批改都對學生答案與正確答案各做一次正規化與 eval
+        - float 比對無法處理帶分數、集合、有序組等答案格式
+
+    解決方案：
+        - 以真實的 mistake_logs 作答紀錄（或技能產生的答案與其等價寫法）為語料
+        - 同一份語料分別以舊 check() 與新引擎批改，統計耗時與判定差異
+
+【技術說明】
+    參數配置：
+        --source   db / skills / auto（預設 auto：資料庫有紀錄就用資料庫）
+        --samples  每個技能產生幾題（skills 語料，預設 20）
+        --repeat   重複批改次數（預設 5）
+        --output   JSON 報告路徑
+
+    輸入/輸出：
+        - 輸入：Config.db_path 的 mistake_logs，或 skills/*.py 的 generate()
+        - 輸出：終端機摘要 + JSON 報告（reports/answer_check_YYYYMMDD_HHMMSS.json）
+
+【版本資訊】
+    版本：v1.0
+    建立日期：2026-01-13
+    作者：MathProject_AST_Research Team
+    相關文件：
+        - core/answer_engine.py（精確比對引擎）
+        - core/skill_runtime.py（舊版 check()）
+
+    變更記錄：
+        v1.0 (2026-01-13): 初始版本
+
+【執行範例】
+    # 使用資料庫中的作答紀錄
+    python scripts/answer_check_benchmark.py --source db
+
+    # 使用技能產生的答案與等價寫法
+    python scripts/answer_check_benchmark.py --source skills --samples 50
+
+===============================================================================
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+# 路徑設定
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path: sys.path.insert(0, project_root)
+
+from config import Config
+from core import answer_engine
+from core.skill_registry import SkillModuleRegistry
+from core.skill_runtime import check as legacy_check
+
+REPORT_DIR = os.path.join(project_root, 'reports')
+
+
+def load_db_corpus(db_path):
+    if not os.path.exists(db_path):
+        return []
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT user_answer, correct_answer FROM mistake_logs").fetchall()
+    except sqlite3.Error:
+        rows = []
+    finally:
+        conn.close()
+    return [(str(u), str(c)) for u, c in rows if u is not None and c is not None]
+
+
+def _variants(answer):
+    """由正確答案產生學生可能的寫法：原樣、加空白與 $、等價數值、錯誤數值"""
+    yield answer
+    yield f" ${answer}$ "
+    parsed = answer_engine.parse_answer(answer)
+    if parsed[0] == 'num':
+        value = parsed[1]
+        yield f"{value.numerator}/{value.denominator}" if value.denominator != 1 else str(value.numerator)
+        if 10 ** 6 % value.denominator == 0:
+            yield str(float(value))
+        yield str(value + 1)
+
+
+def load_skill_corpus(samples):
+    registry = SkillModuleRegistry(package='benchmark_skills')
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(registry.skills_dir, '*.py'))):
+        skill_id = os.path.splitext(os.path.basename(path))[0]
+        try:
+            with redirect_stdout(io.StringIO()):
+                module = registry.get(skill_id)
+        except Exception:
+            continue
+        if not hasattr(module, 'generate'):
+            continue
+        for _ in range(samples):
+            try:
+                with redirect_stdout(io.StringIO()):
+                    data = module.generate()
+            except Exception:
+                continue
+            answer = data.get('correct_answer', data.get('answer')) if isinstance(data, dict) else None
+            if answer is None:
+                continue
+            corpus.extend((variant, str(answer)) for variant in _variants(str(answer)))
+    return corpus
+
+
+def _time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(corpus, repeat):
+    legacy = [legacy_check(u, c) for u, c in corpus]
+    engine = answer_engine.grade_batch(corpus)
+    disagreements = [
+        {'user_answer': u, 'correct_answer': c, 'legacy': l['correct'], 'engine': e['correct']}
+        for (u, c), l, e in zip(corpus, legacy, engine) if l['correct'] != e['correct']
+    ]
+
+    def cold():
+        answer_engine.parse_correct_answer.cache_clear()
+        answer_engine.grade_batch(corpus)
+
+    legacy_s = _time(lambda: [legacy_check(u, c) for u, c in corpus], repeat)
+    cold_s = _time(cold, repeat)
+    warm_s = _time(lambda: answer_engine.grade_batch(corpus), repeat)
+    n = len(corpus)
+    return {
+        'pairs': n,
+        'legacy_us_per_pair': round(legacy_s / n * 1e6, 2),
+        'engine_cold_us_per_pair': round(cold_s / n * 1e6, 2),
+        'engine_warm_us_per_pair': round(warm_s / n * 1e6, 2),
+        'speedup_warm': round(legacy_s / warm_s, 2) if warm_s else None,
+        'legacy_correct': sum(1 for r in legacy if r['correct']),
+        'engine_correct': sum(1 for r in engine if r['correct']),
+        'disagreements': len(disagreements),
+    }, disagreements
+
+
+def main():
+    parser = argparse.ArgumentParser(description='答案比對引擎微基準測試')
+    parser.add_argument('--source', choices=['auto', 'db', 'skills'], default='auto')
+    parser.add_argument('--samples', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    random.seed(0)
+    corpus = load_db_corpus(Config.db_path) if args.source in ('auto', 'db') else []
+    source = 'db'
+    if not corpus and args.source != 'db':
+        corpus, source = load_skill_corpus(args.samples), 'skills'
+    if not corpus:
+        print("⚠️  找不到可用的作答語料")
+        return 1
+
+    print(f"🚀 批改 {len(corpus)} 組作答 (來源: {source})...")
+    summary, disagreements = run(corpus, args.repeat)
+    print("=" * 70)
+    print(f"舊版 check():        {summary['legacy_us_per_pair']:>10.2f} µs/題  (判定正確 {summary['legacy_correct']})")
+    print(f"引擎 (冷快取):       {summary['engine_cold_us_per_pair']:>10.2f} µs/題")
+    print(f"引擎 (正確答案已快取): {summary['engine_warm_us_per_pair']:>10.2f} µs/題  (判定正確 {summary['engine_correct']})")
+    print(f"判定不同: {summary['disagreements']} 組")
+    for item in disagreements[:10]:
+        print(f"   {item['user_answer']!r} vs {item['correct_answer']!r}: 舊={item['legacy']} 新={item['engine']}")
+
+    output = args.output or os.path.join(
+        REPORT_DIR, f"answer_check_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'source': source, 'summary': summary, 'disagreements': disagreements},
+                  f, ensure_ascii=False, indent=2, default=str)
+    print(f"💾 報告已輸出: {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
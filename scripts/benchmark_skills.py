@@ -1,10 +1,18 @@
 # -*- coding: utf-8 -*-
 # ==============================================================================
 # Script: benchmark_skills.py
-# Version: v2.1 (CSV Export Support)
-# Description: 
-#   基於 ISO/IEC 25010 標準進行評測，並自動將結果輸出為 CSV 檔案。
+# Version: v2.2 (Parallel + Baseline Comparison)
+# Description:
+#   基於 ISO/IEC 25010 標準進行評測，並自動將結果輸出為 CSV 與 JSON 檔案。
 #   方便匯入 Excel 製作科展圖表。
+#   v2.2: 技能分散到多個行程平行評測 (perf_counter_ns 計時)，
+#         每個技能回報 p50/p95/p99 延遲與吞吐量 (題/秒)，
+#         並與儲存的基準執行結果比對，標出 Healer / 骨架修改後變慢或變不穩定的技能。
+#
+# Usage:
+#   python scripts/benchmark_skills.py                       # 平行評測並與基準比較
+#   python scripts/benchmark_skills.py --save-baseline       # 將本次結果存為新基準
+#   python scripts/benchmark_skills.py --workers 8 --iterations 100 --fail-on-regression
 # ==============================================================================
 
 import sys
@@ -15,6 +23,11 @@ import glob
 import statistics
 import traceback
 import csv
+import json
+import argparse
+import platform
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from tqdm import tqdm
 
@@ -23,8 +36,6 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
 if project_root not in sys.path: sys.path.insert(0, project_root)
 
-from app import create_app
-
 # ==============================================================================
 # 理論權重設定
 # ==============================================================================
@@ -35,10 +46,30 @@ WEIGHTS = {
     'performance': 0.10
 }
 
-TEST_ITERATIONS = 50 
+TEST_ITERATIONS = 50
+
+REPORT_DIR = os.path.join(project_root, 'reports')
+DEFAULT_BASELINE = os.path.join(REPORT_DIR, 'benchmark_baseline.json')
+EXCLUDED_FILES = ["__init__.py", "base_skill.py", "Example_Program.py"]
+
+# 基準比較門檻：p95 變慢超過 SLOWDOWN_RATIO 倍且至少多 SLOWDOWN_MIN_MS 毫秒；
+# 成功率 / 合規率下降超過 ROBUSTNESS_DROP 個百分點
+SLOWDOWN_RATIO = 1.5
+SLOWDOWN_MIN_MS = 1.0
+ROBUSTNESS_DROP = 5.0
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank 百分位數 (sorted_values 需已排序)"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-int(q * 100) * len(sorted_values) // 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
 
 class BenchmarkEngine:
-    def __init__(self):
+    def __init__(self, iterations=TEST_ITERATIONS):
+        self.iterations = iterations
         self.results = []
 
     def check_latex_balance(self, text):
@@ -50,17 +81,19 @@ class BenchmarkEngine:
             'success_count': 0,
             'compliance_count': 0,
             'syntax_pass_count': 0,
-            'latencies': []
+            'latencies_ns': []
         }
         errors = set()
 
-        for _ in range(TEST_ITERATIONS):
-            start_t = time.time()
+        for _ in range(self.iterations):
+            start_t = time.perf_counter_ns()
             try:
                 # 1. Robustness
                 result = module.generate()
+                # 4. Performance (只計 generate() 本身)
+                metrics['latencies_ns'].append(time.perf_counter_ns() - start_t)
                 metrics['success_count'] += 1
-                
+
                 # 2. Compliance
                 is_compliant = False
                 if isinstance(result, dict):
@@ -79,10 +112,6 @@ class BenchmarkEngine:
                         metrics['syntax_pass_count'] += 1
                     else:
                         errors.add("LaTeX Braces Mismatch")
-                
-                # 4. Performance
-                duration = time.time() - start_t
-                metrics['latencies'].append(duration)
 
             except Exception as e:
                 error_msg = traceback.format_exc().strip().split('\n')[-1]
@@ -91,8 +120,8 @@ class BenchmarkEngine:
         return self.calculate_score(metrics, errors)
 
     def calculate_score(self, metrics, errors):
-        s_robust = (metrics['success_count'] / TEST_ITERATIONS) * 100
-        
+        s_robust = (metrics['success_count'] / self.iterations) * 100
+
         if metrics['success_count'] > 0:
             s_compliance = (metrics['compliance_count'] / metrics['success_count']) * 100
             s_syntax = (metrics['syntax_pass_count'] / metrics['success_count']) * 100
@@ -100,7 +129,8 @@ class BenchmarkEngine:
             s_compliance = 0
             s_syntax = 0
 
-        avg_latency = statistics.mean(metrics['latencies']) if metrics['latencies'] else 10.0
+        latencies_ms = sorted(ns / 1e6 for ns in metrics['latencies_ns'])
+        avg_latency = statistics.mean(latencies_ms) / 1000 if latencies_ms else 10.0
         if avg_latency <= 0.05: s_perf = 100
         elif avg_latency >= 1.0: s_perf = 0
         else: s_perf = 100 - ((avg_latency - 0.05) / (1.0 - 0.05) * 100)
@@ -111,6 +141,10 @@ class BenchmarkEngine:
             s_syntax * WEIGHTS['syntax'] +
             s_perf * WEIGHTS['performance']
         )
+        busy_s = sum(latencies_ms) / 1000
+
+        def _ms(value):
+            return round(value, 3) if value is not None else None
 
         return {
             'score': round(final_score, 1),
@@ -119,28 +153,88 @@ class BenchmarkEngine:
             'syntax': round(s_syntax, 1),
             'performance': round(s_perf, 1),
             'avg_latency': round(avg_latency * 1000, 2), # ms
-            'errors': "; ".join(list(errors))
+            'p50_ms': _ms(percentile(latencies_ms, 0.50)),
+            'p95_ms': _ms(percentile(latencies_ms, 0.95)),
+            'p99_ms': _ms(percentile(latencies_ms, 0.99)),
+            'throughput_qps': round(metrics['success_count'] / busy_s, 1) if busy_s else None,
+            'errors': "; ".join(sorted(errors))
         }
 
+
+def _benchmark_worker(skill_id, iterations):
+    """行程池工作：載入單一技能並評測 (每個行程各自 import，互不干擾)"""
+    if project_root not in sys.path: sys.path.insert(0, project_root)
+    module_name = f"skills.{skill_id}"
+    try:
+        start_t = time.perf_counter_ns()
+        if module_name in sys.modules:
+            module = importlib.reload(sys.modules[module_name])
+        else:
+            module = importlib.import_module(module_name)
+        import_ms = (time.perf_counter_ns() - start_t) / 1e6
+        result = BenchmarkEngine(iterations).evaluate_skill(skill_id, module)
+        result['import_ms'] = round(import_ms, 2)
+    except Exception as e:
+        result = {'load_error': f"{type(e).__name__}: {e}"}
+    result['id'] = skill_id
+    return result
+
+
+def compare_to_baseline(results, baseline):
+    """
+    與基準執行結果比較，回傳 regressions list：
+    p95 變慢 (slower)、成功率 / 合規率下降 (less_robust)、基準可載入但本次載入失敗 (load_error)。
+    """
+    regressions = []
+    base_skills = baseline.get('skills', {})
+    for r in results:
+        base = base_skills.get(r['id'])
+        if base is None or 'load_error' in base:
+            continue
+        if 'load_error' in r:
+            regressions.append({'id': r['id'], 'kind': 'load_error', 'detail': r['load_error']})
+            continue
+        old_p95, new_p95 = base.get('p95_ms'), r.get('p95_ms')
+        if old_p95 is not None and new_p95 is not None and \
+                new_p95 > old_p95 * SLOWDOWN_RATIO and new_p95 - old_p95 >= SLOWDOWN_MIN_MS:
+            regressions.append({'id': r['id'], 'kind': 'slower', 'baseline': old_p95, 'current': new_p95,
+                                'detail': f"p95 {old_p95}ms -> {new_p95}ms"})
+        for metric in ('robustness', 'compliance'):
+            old, new = base.get(metric), r.get(metric)
+            if old is not None and new is not None and old - new > ROBUSTNESS_DROP:
+                regressions.append({'id': r['id'], 'kind': 'less_robust', 'metric': metric,
+                                    'baseline': old, 'current': new, 'detail': f"{metric} {old}% -> {new}%"})
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=project_root,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
 def save_report_to_csv(results, avg_score):
     """將結果儲存為 CSV"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"benchmark_report_{timestamp}.csv"
-    filepath = os.path.join(project_root, 'reports')
-    
+    filepath = REPORT_DIR
+
     if not os.path.exists(filepath):
         os.makedirs(filepath)
-        
+
     full_path = os.path.join(filepath, filename)
-    
+
     # CSV Headers
-    headers = ['Skill ID', 'Total Score', 'Robustness', 'Compliance', 'Syntax', 'Performance', 'Latency (ms)', 'Errors']
-    
+    headers = ['Skill ID', 'Total Score', 'Robustness', 'Compliance', 'Syntax', 'Performance', 'Latency (ms)',
+               'P50 (ms)', 'P95 (ms)', 'P99 (ms)', 'Throughput (q/s)', 'Errors']
+
     try:
         with open(full_path, 'w', newline='', encoding='utf-8-sig') as f:
             writer = csv.DictWriter(f, fieldnames=headers)
             writer.writeheader()
-            
+
             for r in results:
                 row = {
                     'Skill ID': r['id'],
@@ -150,63 +244,125 @@ def save_report_to_csv(results, avg_score):
                     'Syntax': r['syntax'],
                     'Performance': r['performance'],
                     'Latency (ms)': r['avg_latency'],
+                    'P50 (ms)': r['p50_ms'],
+                    'P95 (ms)': r['p95_ms'],
+                    'P99 (ms)': r['p99_ms'],
+                    'Throughput (q/s)': r['throughput_qps'],
                     'Errors': r['errors']
                 }
                 writer.writerow(row)
-                
+
         print(f"\n💾 報告已儲存: \033[1;32m{full_path}\033[0m")
         return full_path
     except Exception as e:
         print(f"❌ 儲存失敗: {e}")
         return None
 
-def run_benchmark():
-    app = create_app()
-    engine = BenchmarkEngine()
-    
+
+def save_report_to_json(report, path=None):
+    """將完整結果 (含 meta / summary / regressions) 儲存為 JSON，可作為下次比較的基準"""
+    if path is None:
+        path = os.path.join(REPORT_DIR, f"benchmark_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def run_benchmark(iterations=TEST_ITERATIONS, workers=None, baseline_path=DEFAULT_BASELINE,
+                  save_baseline=False, pattern='*'):
     skills_dir = os.path.join(project_root, 'skills')
-    files = glob.glob(os.path.join(skills_dir, "*.py"))
-    skill_files = [f for f in files if os.path.basename(f) not in ["__init__.py", "base_skill.py", "Example_Program.py"]]
-    
-    print(f"\n🔬 [Science Fair Benchmark v2.1] Starting Analysis...")
+    files = glob.glob(os.path.join(skills_dir, f"{pattern}.py"))
+    skill_files = sorted(f for f in files if os.path.basename(f) not in EXCLUDED_FILES)
+    workers = workers or os.cpu_count() or 1
+
+    print(f"\n🔬 [Science Fair Benchmark v2.2] Starting Analysis...")
     print(f"   Target: {len(skill_files)} skill units")
-    print(f"   Sample Size: {TEST_ITERATIONS} iterations per unit")
+    print(f"   Sample Size: {iterations} iterations per unit | Workers: {workers}")
     print("="*90)
-    print(f"{'Skill ID':<45} | {'Score':<6} | {'Status':<10} | {'Latency':<10}")
+    print(f"{'Skill ID':<45} | {'Score':<6} | {'Status':<10} | {'P95':<10}")
     print("-" * 90)
 
     results_data = []
-
-    for py_file in tqdm(skill_files, desc="Analyzing", ncols=100):
-        skill_id = os.path.basename(py_file).replace(".py", "")
-        module_name = f"skills.{skill_id}"
-        
-        try:
-            if module_name in sys.modules:
-                module = importlib.reload(sys.modules[module_name])
-            else:
-                module = importlib.import_module(module_name)
-            
-            result = engine.evaluate_skill(skill_id, module)
-            result['id'] = skill_id
+    suite_start = time.perf_counter_ns()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_benchmark_worker, os.path.basename(f)[:-3], iterations) for f in skill_files]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Analyzing", ncols=100):
+            result = future.result()
+            if 'load_error' in result:
+                tqdm.write(f"❌ Critical Error loading {result['id']}: {result['load_error']}")
+                results_data.append(result)
+                continue
             results_data.append(result)
-            
             status = "✅ PASS" if result['score'] >= 80 else "⚠️ WEAK" if result['score'] >= 60 else "❌ FAIL"
-            tqdm.write(f"{skill_id:<45} | {result['score']:<6} | {status:<10} | {result['avg_latency']}ms")
-
-        except Exception as e:
-            tqdm.write(f"❌ Critical Error loading {skill_id}: {e}")
+            tqdm.write(f"{result['id']:<45} | {result['score']:<6} | {status:<10} | {result['p95_ms']}ms")
+    suite_s = (time.perf_counter_ns() - suite_start) / 1e9
+    results_data.sort(key=lambda r: r['id'])
+    scored = [r for r in results_data if 'load_error' not in r]
 
     # --- 統計與存檔 ---
     print("\n" + "="*90)
-    scores = [r['score'] for r in results_data]
+    scores = [r['score'] for r in scored]
     avg_score = statistics.mean(scores) if scores else 0
-    
+    total_questions = sum(round(r['robustness'] / 100 * iterations) for r in scored)
+
     print(f"📊 綜合品質評分 (Mean Quality Score): {avg_score:.2f} / 100")
-    
-    # 儲存 CSV
-    save_report_to_csv(results_data, avg_score)
+    print(f"⚡ 整體吞吐量: {total_questions / suite_s:.1f} 題/秒 ({total_questions} 題, {suite_s:.2f} 秒)")
+
+    baseline = None
+    regressions = []
+    if baseline_path and os.path.exists(baseline_path) and not save_baseline:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results_data, baseline)
+        print(f"📐 與基準比較 ({baseline.get('meta', {}).get('git_commit') or baseline_path}): "
+              f"{len(regressions)} 項退步")
+        for item in regressions:
+            print(f"   ⚠️  {item['id']:<45} [{item['kind']}] {item['detail']}")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'iterations': iterations,
+            'workers': workers,
+            'baseline': baseline.get('meta') if baseline else None,
+        },
+        'summary': {
+            'skills': len(results_data),
+            'load_errors': len(results_data) - len(scored),
+            'mean_score': round(avg_score, 2),
+            'total_questions': total_questions,
+            'elapsed_s': round(suite_s, 3),
+            'throughput_qps': round(total_questions / suite_s, 1) if suite_s else None,
+            'regressions': len(regressions),
+        },
+        'skills': {r['id']: {k: v for k, v in r.items() if k != 'id'} for r in results_data},
+        'regressions': regressions,
+    }
+
+    # 儲存 CSV / JSON
+    save_report_to_csv(scored, avg_score)
+    json_path = save_report_to_json(report, baseline_path if save_baseline else None)
+    print(f"💾 JSON 報告: {json_path}" + (" (已設為基準)" if save_baseline else ""))
     print("="*90)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='技能庫平行基準測試 (含基準比較)')
+    parser.add_argument('--iterations', type=int, default=TEST_ITERATIONS)
+    parser.add_argument('--workers', type=int, default=None, help='行程數 (預設 CPU 核心數)')
+    parser.add_argument('--skills', default='*', help='技能檔名 glob (預設全部)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基準 JSON 路徑')
+    parser.add_argument('--save-baseline', action='store_true', help='將本次結果存為基準')
+    parser.add_argument('--fail-on-regression', action='store_true', help='有退步時以代碼 1 結束 (CI 用)')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.iterations, args.workers, args.baseline, args.save_baseline, args.skills)
+    return 1 if args.fail_on_regression and report['summary']['regressions'] else 0
+
 
 if __name__ == "__main__":
-    run_benchmark()
\ No newline at end of file
+    sys.exit(main())
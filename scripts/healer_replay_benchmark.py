@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+===============================================================================
+程式名稱: healer_replay_benchmark.py - Healer 離線重播效能基準測試
+===============================================================================
+
+【程式用途】
+    將已錄製的模型原始輸出 (skills_shadow/*.raw.txt 與 experiment_log.raw_response)
+    逐筆送入 Healer 流水線，量測各階段耗時、修復數與通過率。
+    修改 Healer 後不需呼叫任何 AI 模型，即可比較效能與正確性的變化。
+
+【研究背景】
+    專案：旺宏科學獎 - 複合式 AI 架構降低數學題庫生成成本之研究
+    核心論點：Local 14B AI + Active Healer ≈ Cloud Pro（成本降低 98%）
+
+    相關問題：
+        - Healer 只能透過 auto_generate_skill_code() 觸發，每次評估都要重新呼叫模型
+        - 模型輸出具隨機性，前後兩次量測的輸入不同，無法公平比較
+
+    解決方案：
+        - 以 core.code_generator.heal_raw_output() 對固定的原始輸出重播
+        - 以 stage_metrics 收集每個階段的耗時與修復數
+
+【主要功能】
+    1. 原始輸出收集
+       - skills_shadow/*.raw.txt（檔名去除 _FAILED_YYYYMMDD_HHMMSS.raw.txt 即為 skill_id）
+       - experiment_log.raw_response（非空的紀錄）
+
+    2. 流水線重播
+       - 依 ablation / Healer 開關重播每一筆原始輸出
+       - 可選擇是否執行 Dynamic Sampling（實際呼叫 generate()）
+
+    3. 統計報告
+       - 各階段總耗時 / 平均 / P95 與修復數
+       - 語法通過率、採樣通過率與吞吐量（筆/秒）
+       - 結果輸出為 JSON（reports/healer_replay_YYYYMMDD_HHMMSS.json）
+
+【使用場景】
+    ✅ 必須使用的時機：
+       - 修改 core/code_generator.py 的 Healer 邏輯後，比較前後效能與通過率
+
+    ⚠️  建議使用的時機：
+       - 執行 regression_test.py 之前，先以離線資料快速篩檢
+
+    🚫 不需要使用的時機：
+       - 需要評估模型本身輸出品質時（請使用 competition_benchmark.py）
+
+【技術說明】
+    核心技術：
+        - heal_raw_output(raw_output, skill_id, ..., stage_metrics={}) 回傳修復結果與各階段計時
+        - run_dynamic_sampling(final_code, skill_id) 執行動態採樣
+        - Healer 內部的 print 輸出以 redirect_stdout 隱藏
+
+    參數配置：
+        --source     shadow / db / all（預設 all）
+        --limit      最多重播幾筆（預設不限）
+        --ablation   Ablation ID（預設 3，Full-Healing）
+        --no-regex / --no-ast  關閉 Regex / AST Healer
+        --no-sampling          不執行 Dynamic Sampling
+        --output     JSON 報告路徑
+
+    輸入/輸出：
+        - 輸入：skills_shadow/ 與 Config.db_path 的 experiment_log
+        - 輸出：終端機摘要 + JSON 報告
+
+【版本資訊】
+    版本：v1.0
+    建立日期：2026-01-13
+    作者：MathProject_AST_Research Team
+    相關文件：
+        - scripts/regression_test.py（需呼叫模型的回歸測試）
+        - core/code_generator.py（heal_raw_output / run_dynamic_sampling）
+
+    變更記錄：
+        v1.0 (2026-01-13): 初始版本
+
+【執行範例】
+    # 重播所有已錄製的原始輸出
+    python scripts/healer_replay_benchmark.py
+
+    # 只重播 skills_shadow，關閉 AST Healer，不執行採樣
+    python scripts/healer_replay_benchmark.py --source shadow --no-ast --no-sampling
+
+===============================================================================
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import re
+import sqlite3
+import statistics
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+# 路徑設定
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path: sys.path.insert(0, project_root)
+
+from config import Config
+from core.code_generator import heal_raw_output, run_dynamic_sampling
+
+SHADOW_DIR = os.path.join(project_root, 'skills_shadow')
+REPORT_DIR = os.path.join(project_root, 'reports')
+_SHADOW_SUFFIX = re.compile(r'_FAILED_\d{8}_\d{6}\.raw\.txt$')
+
+
+def load_shadow_samples():
+    samples = []
+    for path in sorted(glob.glob(os.path.join(SHADOW_DIR, '*.raw.txt'))):
+        name = os.path.basename(path)
+        skill_id = _SHADOW_SUFFIX.sub('', name)
+        if skill_id == name:
+            skill_id = name[:-len('.raw.txt')]
+        with open(path, 'r', encoding='utf-8') as f:
+            samples.append({'source': f'shadow:{name}', 'skill_id': skill_id, 'raw_output': f.read()})
+    return samples
+
+
+def load_db_samples(db_path):
+    if not os.path.exists(db_path):
+        return []
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT id, skill_id, raw_response FROM experiment_log "
+            "WHERE raw_response IS NOT NULL AND raw_response != '' ORDER BY id"
+        ).fetchall()
+    except sqlite3.Error:
+        rows = []
+    finally:
+        conn.close()
+    return [{'source': f'experiment_log:{row_id}', 'skill_id': skill_id, 'raw_output': raw}
+            for row_id, skill_id, raw in rows]
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[idx]
+
+
+def replay(samples, ablation_id=3, use_regex_healer=True, use_ast_healer=True, sampling=True):
+    """重播所有樣本，回傳 (逐筆結果 list, 摘要 dict)"""
+    results = []
+    stage_times, stage_fixes = {}, {}
+    started = time.perf_counter()
+    for sample in samples:
+        metrics = {}
+        t0 = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            try:
+                healed = heal_raw_output(sample['raw_output'], sample['skill_id'], use_regex_healer,
+                                         use_ast_healer, ablation_id, stage_metrics=metrics)
+                error = None
+            except Exception as e:
+                healed, error = None, f"{type(e).__name__}: {e}"
+            dyn = None
+            if healed and healed['is_valid'] and sampling:
+                dyn = run_dynamic_sampling(healed['final_code'], sample['skill_id'])
+        elapsed = time.perf_counter() - t0
+
+        for stage, data in metrics.items():
+            stage_times.setdefault(stage, []).append(data['seconds'])
+            stage_fixes[stage] = stage_fixes.get(stage, 0) + data['fixes']
+        results.append({
+            'source': sample['source'],
+            'skill_id': sample['skill_id'],
+            'is_valid': bool(healed and healed['is_valid']),
+            'dyn_ok': (dyn['ok'] if dyn else None),
+            'regex_fixes': healed['regex_fixes'] if healed else 0,
+            'ast_fixes': healed['ast_fixes'] if healed else 0,
+            'error_msg': error or (healed['error_msg'] if healed and not healed['is_valid'] else
+                                   (dyn['error_msg'] if dyn else None)),
+            'seconds': round(elapsed, 4),
+        })
+    total_seconds = time.perf_counter() - started
+
+    total = len(results)
+    valid = sum(1 for r in results if r['is_valid'])
+    passed = sum(1 for r in results if r['is_valid'] and r['dyn_ok'] is not False)
+    summary = {
+        'samples': total,
+        'syntax_pass': valid,
+        'syntax_pass_rate': round(valid / total, 4) if total else 0.0,
+        'pass': passed,
+        'pass_rate': round(passed / total, 4) if total else 0.0,
+        'sampling': sampling,
+        'total_seconds': round(total_seconds, 4),
+        'throughput_per_second': round(total / total_seconds, 2) if total_seconds else 0.0,
+        'stages': {
+            stage: {
+                'total_seconds': round(sum(times), 4),
+                'mean_ms': round(statistics.mean(times) * 1000, 3),
+                'p95_ms': round(_percentile(times, 95) * 1000, 3),
+                'fixes': stage_fixes.get(stage, 0),
+            }
+            for stage, times in stage_times.items()
+        },
+    }
+    return results, summary
+
+
+def print_summary(summary):
+    print("=" * 70)
+    print("📊 Healer 離線重播結果")
+    print("=" * 70)
+    print(f"{'Stage':<18}{'Total(s)':>10}{'Mean(ms)':>12}{'P95(ms)':>12}{'Fixes':>8}")
+    for stage, data in summary['stages'].items():
+        print(f"{stage:<18}{data['total_seconds']:>10.3f}{data['mean_ms']:>12.2f}"
+              f"{data['p95_ms']:>12.2f}{data['fixes']:>8}")
+    print("-" * 70)
+    print(f"樣本數: {summary['samples']}  語法通過: {summary['syntax_pass']} ({summary['syntax_pass_rate']:.1%})"
+          f"  整體通過: {summary['pass']} ({summary['pass_rate']:.1%})")
+    print(f"總耗時: {summary['total_seconds']:.2f}s  吞吐量: {summary['throughput_per_second']} 筆/秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Healer 離線重播效能基準測試')
+    parser.add_argument('--source', choices=['shadow', 'db', 'all'], default='all')
+    parser.add_argument('--limit', type=int, default=None)
+    parser.add_argument('--ablation', type=int, default=3)
+    parser.add_argument('--no-regex', action='store_true', help='關閉 Regex Healer')
+    parser.add_argument('--no-ast', action='store_true', help='關閉 AST Healer')
+    parser.add_argument('--no-sampling', action='store_true', help='不執行 Dynamic Sampling')
+    parser.add_argument('--output', default=None, help='JSON 報告路徑')
+    args = parser.parse_args()
+
+    samples = []
+    if args.source in ('shadow', 'all'):
+        samples.extend(load_shadow_samples())
+    if args.source in ('db', 'all'):
+        samples.extend(load_db_samples(Config.db_path))
+    if args.limit:
+        samples = samples[:args.limit]
+    if not samples:
+        print("⚠️  找不到任何已錄製的原始輸出")
+        return 1
+
+    print(f"🚀 重播 {len(samples)} 筆原始輸出 (Ablation {args.ablation})...")
+    results, summary = replay(samples, ablation_id=args.ablation, use_regex_healer=not args.no_regex,
+                              use_ast_healer=not args.no_ast, sampling=not args.no_sampling)
+    print_summary(summary)
+
+    output = args.output or os.path.join(
+        REPORT_DIR, f"healer_replay_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'config': vars(args), 'summary': summary, 'results': results}, f, ensure_ascii=False, indent=2)
+    print(f"💾 報告已輸出: {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
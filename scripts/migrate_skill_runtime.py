@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+===============================================================================
+程式名稱: migrate_skill_runtime.py - 既有技能檔改綁共用執行期模組
+===============================================================================
+
+【程式用途】
+    將 skills/ 內仍內嵌 CALCULATION_SKELETON 的技能檔，改寫為
+    `from core.skill_runtime import *` 綁定共用的執行期模組。
+    每個技能檔少掉約 380 行重複的工具函式，大量載入技能時只需編譯一次工具庫。
+
+【研究背景】
+    專案：旺宏科學獎 - 複合式 AI 架構降低數學題庫生成成本之研究
+    核心論點：Local 14B AI + Active Healer ≈ Cloud Pro（成本降低 98%）
+
+    相關問題：
+        - 每個生成檔都內嵌整份工具庫，上千個技能檔大多是重複內容
+        - 每載入一個技能就重新編譯、配置一次同樣的函式
+
+    解決方案：
+        - 只改寫「內嵌內容與目前工具庫完全相同」的檔案，行為保證不變
+        - 舊版工具庫的檔案保持原樣（不同版本的函式行為可能不同）
+        - 在模組層級重新定義工具庫名稱（例如自訂 to_latex、op_latex）的檔案保持內嵌：
+          綁定後工具函式之間的呼叫查詢的是 core.skill_runtime 的名稱，
+          技能覆寫的 to_latex 不再影響 fmt_num 等其他工具函式，行為會改變
+
+【技術說明】
+    參數配置：
+        --dir             技能目錄（預設 skills/，不含子資料夾）
+        --include-backups 一併處理子資料夾（backup_* 等）
+        --dry-run         只統計不寫檔
+
+    輸入/輸出：
+        - 輸入：技能 .py 檔
+        - 輸出：原地改寫，並於標頭後記錄 # [SKILL RUNTIME] <版本>
+
+【版本資訊】
+    版本：v1.1
+    建立日期：2026-01-13
+    作者：MathProject_AST_Research Team
+    相關文件：
+        - core/skill_runtime.py（共用執行期模組）
+        - core/code_generator.py（CALCULATION_SKELETON）
+
+    變更記錄：
+        v1.0 (2026-01-13): 初始版本
+        v1.1 (2026-01-13): 重新定義工具庫名稱的技能保持內嵌，並列出覆寫的名稱
+
+【執行範例】
+    # 先統計可轉換的檔案
+    python scripts/migrate_skill_runtime.py --dry-run
+
+    # 轉換 skills/ 與所有備份資料夾
+    python scripts/migrate_skill_runtime.py --include-backups
+
+===============================================================================
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+# 路徑設定
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path: sys.path.insert(0, project_root)
+
+from core.code_generator import CALCULATION_SKELETON
+from core.skill_runtime import SKILL_RUNTIME_PRELUDE, overridden_runtime_names, runtime_version_of
+
+
+def runtime_conflicts(source):
+    """技能本體 (骨架以外) 重新定義的工具庫名稱；無法解析時回傳 None"""
+    return overridden_runtime_names(source.replace(CALCULATION_SKELETON, ''))
+
+
+def convert_source(source):
+    """內嵌目前版本工具庫的技能原始碼 -> 綁定執行期模組的原始碼；無法安全轉換時回傳 None"""
+    if runtime_version_of(source) is not None or source.count(CALCULATION_SKELETON) != 1:
+        return None
+    if runtime_conflicts(source) != []:
+        return None
+    return source.replace(CALCULATION_SKELETON, SKILL_RUNTIME_PRELUDE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='既有技能檔改綁共用執行期模組')
+    parser.add_argument('--dir', default=os.path.join(project_root, 'skills'))
+    parser.add_argument('--include-backups', action='store_true')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    pattern = os.path.join(args.dir, '**', '*.py') if args.include_backups else os.path.join(args.dir, '*.py')
+    converted, bound, skipped, saved = 0, 0, 0, 0
+    conflicts = []
+    for path in sorted(glob.glob(pattern, recursive=True)):
+        with open(path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        if runtime_version_of(source) is not None:
+            bound += 1
+            continue
+        new_source = convert_source(source)
+        if new_source is None:
+            if source.count(CALCULATION_SKELETON) == 1:
+                conflicts.append((path, runtime_conflicts(source)))
+            else:
+                skipped += 1
+            continue
+        converted += 1
+        saved += len(source.encode('utf-8')) - len(new_source.encode('utf-8'))
+        if not args.dry_run:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(new_source)
+
+    action = '可轉換' if args.dry_run else '已轉換'
+    print(f"✅ {action}: {converted} 個檔案 (節省 {saved / 1024:.1f} KB)")
+    print(f"   已綁定執行期: {bound} 個 | 舊版工具庫或非生成檔 (保持原樣): {skipped} 個")
+    if conflicts:
+        print(f"⚠️ 重新定義工具庫名稱 (保持內嵌): {len(conflicts)} 個")
+        for path, names in conflicts:
+            detail = ', '.join(names) if names else '無法解析'
+            print(f"   - {os.path.relpath(path, project_root)}: {detail}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+===============================================================================
+程式名稱: pdf_extraction_benchmark.py - PDF 文字擷取 (字型大小分析) 微基準測試
+===============================================================================
+
+【程式用途】
+    比較舊版逐區塊 get_text("dict", clip=...) 查詢字型大小的擷取方式與
+    core/page_extractor.py 單次 get_text("dict") 建立 PageModel 的每頁耗時，
+    並逐頁確認兩者輸出的文字與大字體標題完全相同。
+
+【研究背景】
+    專案：旺宏科學獎 - 複合式 AI 架構降低數學題庫生成成本之研究
+    核心論點：Local 14B AI + Active Healer ≈ Cloud Pro（成本降低 98%）
+
+    相關問題：
+        - 舊版每頁先取 get_text("text") 與 get_text("blocks")，
+          再對每個區塊以 clip 重新排版一次，只為讀取第一個 span 的字型大小
+        - 區塊越多的頁面 (習題頁、表格) 成本越高
+
+    解決方案：
+        - 每頁只做一次 get_text("dict")，從同一份結構取得文字、區塊與字型大小
+
+【技術說明】
+    參數配置：
+        pdf        要測試的教科書 PDF (省略時自動產生含標題與多段落的測試 PDF)
+        --pages    最多測試幾頁 (預設全部)
+        --repeat   重複次數，取最佳值 (預設 3)
+        --output   JSON 報告路徑
+
+    輸入/輸出：
+        - 輸入：教科書 PDF
+        - 輸出：終端機摘要 + JSON 報告（reports/pdf_extraction_YYYYMMDD_HHMMSS.json）
+
+【版本資訊】
+    版本：v1.0
+    建立日期：2026-01-13
+    作者：MathProject_AST_Research Team
+    相關文件：
+        - core/page_extractor.py（PageModel）
+        - core/textbook_processor.py（教科書匯入流程）
+
+    變更記錄：
+        v1.0 (2026-01-13): 初始版本
+
+【執行範例】
+    # 使用實際的教科書 PDF
+    python scripts/pdf_extraction_benchmark.py uploads/textbook.pdf --pages 50
+
+    # 使用自動產生的測試 PDF
+    python scripts/pdf_extraction_benchmark.py
+
+===============================================================================
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import fitz  # PyMuPDF
+
+# 路徑設定
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path: sys.path.insert(0, project_root)
+
+from core.page_extractor import DEFAULT_OPTIONS, PageModel
+
+REPORT_DIR = os.path.join(project_root, 'reports')
+THRESHOLD = DEFAULT_OPTIONS['large_font_threshold']
+
+
+def legacy_page_text(page):
+    """舊版 extract_content_from_file 的文字擷取 (不含 OCR)"""
+    page_text = page.get_text("text")
+    large_font_texts = []
+    for b in page.get_text("blocks"):
+        try:
+            text = b[4]
+            first_line = page.get_text("dict", clip=b[:4])['blocks'][0]['lines'][0]
+            if first_line['spans'][0]['size'] > THRESHOLD:
+                large_font_texts.append(text.strip())
+        except (IndexError, KeyError):
+            continue
+    for large_text in large_font_texts:
+        if large_text and large_text not in page_text:
+            page_text = large_text + "\n" + page_text
+    return page_text, large_font_texts
+
+
+def model_page_text(page):
+    model = PageModel.from_page(page)
+    page_text = model.text
+    large_font_texts = model.large_font_texts(THRESHOLD)
+    for large_text in large_font_texts:
+        if large_text and large_text not in page_text:
+            page_text = large_text + "\n" + page_text
+    return page_text, large_font_texts
+
+
+def make_sample_pdf(path, pages=30):
+    """產生類似教科書版面的 PDF：章節標題 + 多個段落 + 小字註解"""
+    doc = fitz.open()
+    for n in range(1, pages + 1):
+        page = doc.new_page()
+        page.insert_text((50, 60), f"Chapter {n} Linear Equations", fontsize=24)
+        y = 90
+        for k in range(12):
+            page.insert_textbox(fitz.Rect(50, y, 545, y + 50),
+                                f"Example {n}-{k}: solve 3x + {k} = {n + k} and check the answer. " * 2, fontsize=10)
+            page.insert_text((50, y + 52), f"note {k}", fontsize=7)
+            y += 58
+    doc.save(path)
+
+
+def _time(fn, pages, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for page in pages:
+            fn(page)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(pdf_path, max_pages, repeat):
+    doc = fitz.open(pdf_path)
+    pages = [doc[i] for i in range(min(doc.page_count, max_pages or doc.page_count))]
+    mismatches = [page.number + 1 for page in pages if legacy_page_text(page) != model_page_text(page)]
+    blocks = sum(len(page.get_text("blocks")) for page in pages)
+
+    legacy_s = _time(legacy_page_text, pages, repeat)
+    model_s = _time(model_page_text, pages, repeat)
+    n = len(pages)
+    return {
+        'pdf': pdf_path,
+        'pages': n,
+        'blocks_per_page': round(blocks / n, 1) if n else 0,
+        'legacy_ms_per_page': round(legacy_s / n * 1000, 3) if n else 0,
+        'model_ms_per_page': round(model_s / n * 1000, 3) if n else 0,
+        'speedup': round(legacy_s / model_s, 2) if model_s else None,
+        'mismatched_pages': mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PDF 文字擷取 (字型大小分析) 微基準測試')
+    parser.add_argument('pdf', nargs='?', default=None)
+    parser.add_argument('--pages', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    pdf_path = args.pdf
+    if pdf_path is None:
+        pdf_path = os.path.join(tempfile.mkdtemp(), 'sample_textbook.pdf')
+        make_sample_pdf(pdf_path)
+        print(f"ℹ️  未指定 PDF，使用自動產生的測試檔: {pdf_path}")
+
+    summary = run(pdf_path, args.pages, args.repeat)
+    print("=" * 70)
+    print(f"頁數: {summary['pages']} (平均每頁 {summary['blocks_per_page']} 個區塊)")
+    print(f"舊版逐區塊查詢:   {summary['legacy_ms_per_page']:>10.3f} ms/頁")
+    print(f"單次 PageModel:   {summary['model_ms_per_page']:>10.3f} ms/頁  (加速 {summary['speedup']}x)")
+    print(f"輸出不同的頁面: {summary['mismatched_pages'] or '無'}")
+
+    output = args.output or os.path.join(
+        REPORT_DIR, f"pdf_extraction_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(f"💾 報告已輸出: {output}")
+    return 1 if summary['mismatched_pages'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -60,7 +60,7 @@ if project_root not in sys.path:
 from app import create_app
 from models import db, SkillInfo, SkillCurriculum, TextbookExample, SkillGenCodePrompt
 # [Research] Import requested functions
-from core.code_generator import auto_generate_skill_code
+from core.generation_scheduler import GenerationScheduler
 from core.prompt_architect import generate_v15_spec
 from config import Config
 
@@ -214,94 +214,108 @@ def run_expert_pipeline(skill_ids, arch_model, current_model, ablation_id, model
     # 這裡才把真正負責寫 code 的模型身分傳下去，記錄在 experiment_log
     execute_coder_phase(skill_ids, current_model, ablation_id, model_size_class, prompt_level)
 
-def execute_coder_phase(skill_ids, current_model, ablation_id, model_size_class, prompt_level):
-    print("="*50)
-    print(f"💻 [Step 2] 啟動工程師批次實作 ({current_model})")
-    print(f"   🧬 Experiment Config: Ablation={ablation_id} | Size={model_size_class} | Prompt={prompt_level}")
-    print("="*50)
-    
-    success_count = 0
-    fail_count = 0
+def handle_coder_result(skill_id, is_ok, msg, metrics, ablation_id, model_size_class):
+    """
+    處理單一技能的生成結果 (AST 補丁、版本化儲存)，回傳是否成功。
+    [並行生成] 由排程器依輸入順序在主執行緒呼叫，輸出與檔案寫入順序固定。
+    """
+    if not is_ok:
+        tqdm.write(f"   ❌ {skill_id}: Failed ({msg})")
+        return False
+
+    # [Research] Check Syntax Score
+    is_valid = metrics.get('is_valid', False)
+    is_failed = not is_valid
     
-    pbar_code = tqdm(skill_ids, desc="Phase 2 (Coder)", unit="file", ncols=100)
+    if is_failed:
+        tqdm.write(f"   ⚠️ {skill_id}: Validation Failed | Score=0")
+    else:
+        fixes = metrics.get('fixes', 0)
+        repair_info = f"Fixes={fixes}" if fixes > 0 else "Clean Pass"
+        tqdm.write(f"   ✅ {skill_id}: Success | Score=100 | {repair_info}")
     
-    for skill_id in pbar_code:
-        pbar_code.set_description(f"Coding: {skill_id}")
-        
-        # [Research] Pass experiment params and unpack 3 return values
-        try:
-            is_ok, msg, metrics = auto_generate_skill_code(
-                skill_id, 
-                queue=None, 
-                ablation_id=ablation_id, 
-                model_size_class=model_size_class,
-                prompt_level=prompt_level
-            )
+    # Post-Validation Patching
+    try:
+        skill_path = os.path.join(project_root, 'skills', f"{skill_id}.py")
+        if os.path.exists(skill_path):
+            with open(skill_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            
+            # --- 確保實驗純淨度：只有 Ab3 能享受最後的 AST 補丁 ---
+            if ablation_id == 3:
+                patched_content = auto_patch_missing_functions(content, skill_id)
+            else:
+                patched_content = content # Ab1, Ab2 保持「原始慘狀」以利數據對比
+            
+            if patched_content != content:
+                with open(skill_path, 'w', encoding='utf-8') as f:
+                    f.write(patched_content)
+                tqdm.write(f"   🔧 {skill_id}: Patched missing functions.")
+            
+            # 2. [Versioned Storage Strategy] (Research Last Will)
+            if is_failed:
+                # 💥 [科研遺書機制]: 失敗也要存
+                file_name = f"{skill_id}_{model_size_class}_Ab{ablation_id}_FAILED.py"
+                tqdm.write(f"   💾 保存壞標本: {file_name}")
+            else:
+                file_name = f"{skill_id}_{model_size_class}_Ab{ablation_id}.py"
 
-            if is_ok:
-                # [Research] Check Syntax Score
-                is_valid = metrics.get('is_valid', False)
-                is_failed = not is_valid
-                
-                if is_failed:
-                    fail_count += 1
-                    tqdm.write(f"   ⚠️ {skill_id}: Validation Failed | Score=0")
-                else:
-                    success_count += 1
-                    fixes = metrics.get('fixes', 0)
-                    repair_info = f"Fixes={fixes}" if fixes > 0 else "Clean Pass"
-                    tqdm.write(f"   ✅ {skill_id}: Success | Score=100 | {repair_info}")
+            file_path = os.path.join(SKILLS_DIR, file_name)
+            
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(patched_content)
                 
-                # Post-Validation Patching
-                try:
-                    skill_path = os.path.join(project_root, 'skills', f"{skill_id}.py")
-                    if os.path.exists(skill_path):
-                        with open(skill_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                        
-                        # --- 確保實驗純淨度：只有 Ab3 能享受最後的 AST 補丁 ---
-                        if ablation_id == 3:
-                            patched_content = auto_patch_missing_functions(content, skill_id)
-                        else:
-                            patched_content = content # Ab1, Ab2 保持「原始慘狀」以利數據對比
-                        
-                        
-                        if patched_content != content:
-                            with open(skill_path, 'w', encoding='utf-8') as f:
-                                f.write(patched_content)
-                            tqdm.write(f"   🔧 {skill_id}: Patched missing functions.")
-                        
-                        # 2. [Versioned Storage Strategy] (Research Last Will)
-                        
-                        if is_failed:
-                            # 💥 [科研遺書機制]: 失敗也要存
-                            file_name = f"{skill_id}_{model_size_class}_Ab{ablation_id}_FAILED.py"
-                            tqdm.write(f"   💾 保存壞標本: {file_name}")
-                        else:
-                            file_name = f"{skill_id}_{model_size_class}_Ab{ablation_id}.py"
-
-                        file_path = os.path.join(SKILLS_DIR, file_name)
-                        
-                        with open(file_path, "w", encoding="utf-8") as f:
-                            f.write(patched_content)
-                            
-                        if not is_failed:
-                            tqdm.write(f"   📦 Isolated Save: {file_name}")
+            if not is_failed:
+                tqdm.write(f"   📦 Isolated Save: {file_name}")
 
-                except Exception as e:
-                     tqdm.write(f"   ❌ {skill_id} Patching/Saving Error: {e}")
+    except Exception as e:
+         tqdm.write(f"   ❌ {skill_id} Patching/Saving Error: {e}")
 
-            else:
-                fail_count += 1
-                tqdm.write(f"   ❌ {skill_id}: Failed ({msg})")
+    return not is_failed
 
-        except Exception as e:
-            fail_count += 1
-            tqdm.write(f"   ❌ {skill_id} Critical Error: {e}")
+def execute_coder_phase(skill_ids, current_model, ablation_id, model_size_class, prompt_level):
+    scheduler = GenerationScheduler()
+    concurrency = Config.GENERATION_CONCURRENCY.get(scheduler.provider, 1)
+
+    print("="*50)
+    print(f"💻 [Step 2] 啟動工程師批次實作 ({current_model})")
+    print(f"   🧬 Experiment Config: Ablation={ablation_id} | Size={model_size_class} | Prompt={prompt_level}")
+    print(f"   ⚡ Scheduler: Provider={scheduler.provider} | Concurrency={concurrency}")
+    print("="*50)
+    
+    counts = {'success': 0, 'fail': 0}
+    pbar_code = tqdm(total=len(skill_ids), desc="Phase 2 (Coder)", unit="file", ncols=100)
+
+    def on_progress(result, done):
+        # 依完成順序更新進度條
+        pbar_code.set_description(f"Coding: {result['skill_id']}")
+        pbar_code.update(1)
+
+    def on_result(result):
+        # 依輸入順序處理結果 (experiment_log 亦依此順序寫入)
+        skill_id = result['skill_id']
+        if result['error'] is not None:
+            counts['fail'] += 1
+            tqdm.write(f"   ❌ {skill_id} Critical Error: {result['error']}")
+            return
+        ok = handle_coder_result(skill_id, result['success'], result['message'], result['metrics'],
+                                 ablation_id, model_size_class)
+        counts['success' if ok else 'fail'] += 1
+
+    # [Research] Pass experiment params (並行生成，依供應商限制並行數與速率)
+    scheduler.run(
+        skill_ids,
+        on_result=on_result,
+        on_progress=on_progress,
+        ablation_id=ablation_id,
+        model_size_class=model_size_class,
+        prompt_level=prompt_level
+    )
+    pbar_code.close()
 
     print("\n" + "=" * 50)
     print(f"🎉 作業完成！")
-    print(f"   成功: {success_count} | 失敗: {fail_count}")
+    print(f"   成功: {counts['success']} | 失敗: {counts['fail']}")
     print("=" * 50)
 
 if __name__ == "__main__":
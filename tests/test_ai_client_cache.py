@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+測試 get_ai_client 快取：相同角色設定共用實例、設定變更後建立新實例、手動失效
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from config import Config
+from core.ai_wrapper import get_ai_client, invalidate_ai_clients, ai_client_stats, LocalAIClient
+
+
+def test_client_reused_per_role_config(monkeypatch):
+    roles = {
+        'coder': {'provider': 'local', 'model': 'm1', 'temperature': 0.1},
+        'tutor': {'provider': 'local', 'model': 'm1', 'temperature': 0.1},
+        'default': {'provider': 'local', 'model': 'm2'},
+    }
+    monkeypatch.setattr(Config, 'MODEL_ROLES', roles)
+    invalidate_ai_clients()
+
+    coder = get_ai_client('coder')
+    assert isinstance(coder, LocalAIClient)
+    assert get_ai_client('coder') is coder
+    # 設定完全相同的角色共用同一個 Client
+    assert get_ai_client('tutor') is coder
+    assert get_ai_client('unknown_role') is not coder
+
+    # 執行期修改設定 -> 新的 Client
+    roles['coder'] = dict(roles['coder'], temperature=0.5)
+    changed = get_ai_client('coder')
+    assert changed is not coder and changed.temperature == 0.5
+
+    invalidate_ai_clients()
+    assert ai_client_stats()['cached_clients'] == 0
+    assert get_ai_client('tutor') is not coder
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+測試答案比對引擎：精確分數比對、帶分數、次方、集合 / 有序組，以及與舊版 check() 的相容性
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from fractions import Fraction
+from types import SimpleNamespace
+
+from core import skill_runtime
+from core.answer_engine import grade_answer, parse_answer, uses_standard_check
+
+
+def test_exact_numeric_forms():
+    assert parse_answer(r'$\frac{3}{4}$') == ('num', Fraction(3, 4), False)
+    assert parse_answer(r'3\frac{1}{2}')[1] == Fraction(7, 2)
+    assert parse_answer('2^10')[1] == 1024
+    assert parse_answer(r'-6 \div 4')[1] == Fraction(-3, 2)
+    assert parse_answer('3(1/2)')[1] == Fraction(3, 2)
+
+
+def test_grade_matches_legacy_check():
+    cases = [('3/4', r'\frac{3}{4}'), ('0.75', r'\frac{3}{4}'), ('0.3333333', '1/3'),
+             ('5', '4'), ('', '1'), ('abc', 'abc'), (' 12 ', '12')]
+    for user, correct in cases:
+        assert grade_answer(user, correct) == skill_runtime.check(user, correct), (user, correct)
+
+
+def test_sets_tuples_and_exact_fractions():
+    assert grade_answer(r'\{2, 1\}', r'\{1, 2\}')['correct']
+    assert grade_answer('(1, -2)', '(1,-2)')['correct']
+    assert not grade_answer('(-2, 1)', '(1,-2)')['correct']
+    # 非小數輸入不套用 float 容差
+    assert not grade_answer('1/3', '333333333/1000000000')['correct']
+    assert grade_answer('2^9999', '1')['result'] == '正確答案: 1'
+
+
+def test_nested_powers_are_bounded():
+    """每層指數都在上限內的巢狀次方也不可耗盡 CPU"""
+    import time
+
+    started = time.perf_counter()
+    assert grade_answer('((((2^64)^64)^64)^64)^64', '1')['result'] == '正確答案: 1'
+    assert grade_answer('(((((2^64)^64)^64)^64)^64)^64', '1')['result'] == '正確答案: 1'
+    assert time.perf_counter() - started < 1
+    assert grade_answer('(2^8)^8', str(2 ** 64))['correct']
+    assert grade_answer('(1/3)^64', f"1/{3 ** 64}")['correct']
+
+
+def test_uses_standard_check():
+    assert uses_standard_check(SimpleNamespace(check=skill_runtime.check))
+    assert not uses_standard_check(SimpleNamespace(check=lambda u, c: {'correct': True}))
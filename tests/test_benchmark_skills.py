@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+測試技能基準測試的百分位數與基準比較 (變慢、成功率下降、載入失敗)
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from scripts.benchmark_skills import compare_to_baseline, percentile
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 0.50) == 50
+    assert percentile(values, 0.95) == 95
+    assert percentile(values, 0.99) == 99
+    assert percentile([7], 0.99) == 7
+    assert percentile([], 0.5) is None
+
+
+def test_compare_to_baseline_flags_regressions():
+    baseline = {'skills': {
+        'a': {'p95_ms': 1.0, 'robustness': 100.0, 'compliance': 100.0},
+        'b': {'p95_ms': 10.0, 'robustness': 100.0, 'compliance': 100.0},
+        'c': {'p95_ms': 1.0, 'robustness': 100.0, 'compliance': 100.0},
+    }}
+    results = [
+        {'id': 'a', 'p95_ms': 1.4, 'robustness': 98.0, 'compliance': 100.0},   # 雜訊範圍內
+        {'id': 'b', 'p95_ms': 30.0, 'robustness': 80.0, 'compliance': 100.0},
+        {'id': 'c', 'load_error': 'SyntaxError: invalid syntax'},
+        {'id': 'new', 'p95_ms': 99.0, 'robustness': 0.0, 'compliance': 0.0},  # 基準沒有的技能
+    ]
+    kinds = sorted((r['id'], r['kind']) for r in compare_to_baseline(results, baseline))
+    assert kinds == [('b', 'less_robust'), ('b', 'slower'), ('c', 'load_error')]
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+測試批次寫入：Excel 匯入的新增 / 更新 (以主鍵或唯一約束比對)、save_to_database 重複匯入不產生重複資料
+"""
+
+import os
+import queue
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import pandas as pd
+import pytest
+from flask import Flask
+
+from core.data_importer import import_excel_to_db
+from core.textbook_processor import save_to_database
+from models import SkillCurriculum, SkillInfo, TextbookExample, db
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 't.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def _skill(skill_id, name):
+    return {'skill_id': skill_id, 'skill_en_name': skill_id, 'skill_ch_name': name,
+            'description': name, 'gemini_prompt': '-', 'is_active': 'TRUE'}
+
+
+def _write_workbook(path, skills, curriculum):
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        pd.DataFrame(skills).to_excel(writer, sheet_name='skills_info', index=False)
+        pd.DataFrame(curriculum).to_excel(writer, sheet_name='skill_curriculum', index=False)
+
+
+def test_excel_import_upserts_in_one_pass(app, tmp_path):
+    path = str(tmp_path / 'book.xlsx')
+    curriculum = [{'curriculum': 'vocational', 'grade': 10, 'volume': 'B1', 'chapter': '第一章', 'section': '1-1',
+                   'paragraph': str(i), 'skill_id': f"s{i}", 'display_order': i, 'difficulty_level': 1} for i in range(3)]
+    _write_workbook(path, [_skill(f"s{i}", f"技能{i}") for i in range(3)], curriculum)
+    ok, message = import_excel_to_db(path)
+    assert ok, message
+    assert SkillInfo.query.count() == 3 and SkillCurriculum.query.count() == 3
+    assert db.session.get(SkillInfo, 's1').is_active is True
+
+    # 重新匯入：主鍵相同的技能更新名稱；沒有 id 的課綱列以唯一約束比對，只更新不重複新增
+    curriculum[0]['display_order'] = 99
+    _write_workbook(path, [_skill('s1', '新名稱'), _skill('s9', '技能9')], curriculum)
+    ok, message = import_excel_to_db(path)
+    assert ok, message
+    assert "新增 1、更新 1" in message and "筆/秒" in message
+    assert db.session.get(SkillInfo, 's1').skill_ch_name == '新名稱'
+    assert SkillCurriculum.query.count() == 3
+    assert SkillCurriculum.query.filter_by(skill_id='s0').one().display_order == 99
+
+
+def test_save_to_database_is_idempotent(app):
+    concept = {'concept_name': '負數', 'concept_en_id': 'NegativeNumbers', 'concept_paragraph': '甲.負數',
+               'examples': [{'source_description': '例題1', 'problem_text': '-3 + 5 = ?'},
+                            {'source_description': '例題1', 'problem_text': '重複'}]}
+    parsed = {'chapters': [{'chapter_title': '1 整數', 'sections': [
+        {'section_title': '1-1 負數', 'concepts': [concept, dict(concept, concept_name='負數 (重複)')]},
+    ]}]}
+    info = {'curriculum': 'general', 'grade': 10, 'volume': 1}
+
+    first = save_to_database(parsed, info, queue.Queue())
+    assert first['processed_skill_ids'] == ['gh_NegativeNumbers']
+    assert (first['curriculums_added'], first['examples_added']) == (1, 1)
+
+    second = save_to_database(parsed, info, queue.Queue())
+    assert (second['skills_processed'], second['curriculums_added'], second['examples_added']) == (0, 0, 0)
+    assert (SkillInfo.query.count(), SkillCurriculum.query.count(), TextbookExample.query.count()) == (1, 1, 1)
+    assert SkillCurriculum.query.one().display_order == 10001
+
+
+def test_upsert_updates_rows_with_null_and_coerced_keys(app):
+    """唯一約束含可為 NULL 的 paragraph、Excel 讀入的 101.0 對應 TEXT 欄位 '101'：回報的更新必須真的寫入"""
+    from core.bulk_loader import BulkLoader
+
+    db.session.add(SkillInfo(skill_id='s1', skill_en_name='s1', skill_ch_name='s1', description='-', gemini_prompt='-'))
+    base = {'curriculum': 'general', 'grade': 7, 'chapter': '1', 'section': '1-1', 'skill_id': 's1', 'difficulty_level': 1}
+    db.session.add_all([SkillCurriculum(volume='A', paragraph=None, display_order=1, **base),
+                        SkillCurriculum(volume='101', paragraph='甲', display_order=1, **base)])
+    db.session.commit()
+
+    loader = BulkLoader()
+    rows = [dict(base, volume='A', paragraph=None, display_order=7),
+            dict(base, volume=101.0, paragraph='甲', display_order=8)]
+    assert loader.upsert(SkillCurriculum.__table__, rows) == (0, 2)
+    db.session.commit()
+    db.session.expire_all()
+    assert SkillCurriculum.query.count() == 2
+    assert {c.volume: c.display_order for c in SkillCurriculum.query} == {'A': 7, '101': 8}
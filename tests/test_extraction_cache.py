@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+測試教科書擷取快取：內容雜湊為鍵、版本 / 參數變更失效、重新匯入未變更的 PDF 不再擷取
+"""
+
+import os
+import queue
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+
+import core.extraction_cache as extraction_cache
+import core.page_extractor as page_extractor
+from core.extraction_cache import ExtractionCache, file_hash
+from core.textbook_processor import extract_content_from_file
+from test_page_extractor import _make_pdf
+
+
+def test_key_covers_content_page_lang_and_version(tmp_path):
+    cache = ExtractionCache(str(tmp_path / 'cache'), max_bytes=1 << 20, mode='readwrite')
+    a, b = tmp_path / 'a.bin', tmp_path / 'b.bin'
+    a.write_bytes(b'same')
+    b.write_bytes(b'same')
+    assert file_hash(str(a)) == file_hash(str(b))  # 檔名不同、內容相同 -> 同一個鍵
+
+    h = file_hash(str(a))
+    cache.put_page(h, 1, 'chi_tra', ['pdf', 2, {'ocr_dpi': 150}], 'page one')
+    assert cache.get_page(h, 1, 'chi_tra', ['pdf', 2, {'ocr_dpi': 150}]) == 'page one'
+    assert cache.get_page(h, 2, 'chi_tra', ['pdf', 2, {'ocr_dpi': 150}]) is None
+    assert cache.get_page(h, 1, 'eng', ['pdf', 2, {'ocr_dpi': 150}]) is None
+    assert cache.get_page(h, 1, 'chi_tra', ['pdf', 3, {'ocr_dpi': 150}]) is None
+    assert cache.get_page(h, 1, 'chi_tra', ['pdf', 2, {'ocr_dpi': 300}]) is None
+
+    cache.mode = 'off'
+    assert cache.get_page(h, 1, 'chi_tra', ['pdf', 2, {'ocr_dpi': 150}]) is None
+
+
+def test_reimport_of_unchanged_pdf_skips_extraction(tmp_path, monkeypatch):
+    """第二次匯入全部命中快取；檔案內容改變後重新擷取"""
+    monkeypatch.setattr(extraction_cache, 'EXTRACTION_CACHE',
+                        ExtractionCache(str(tmp_path / 'cache'), max_bytes=1 << 20, mode='readwrite'))
+    extracted = []
+    real_extract_page = page_extractor.extract_page
+    monkeypatch.setattr(page_extractor, 'extract_page',
+                        lambda path, i, options=None, doc=None: extracted.append(i) or real_extract_page(path, i, options, doc))
+
+    app = Flask(__name__)
+    app.config['OCR_WORKERS'] = 1
+    pdf = _make_pdf(tmp_path / 'book.pdf', ['text', 'text', 'text'])
+    with app.app_context():
+        first = extract_content_from_file(pdf, queue.Queue())
+        assert extracted == [0, 1, 2]
+
+        second = extract_content_from_file(pdf, queue.Queue())
+        assert second == first
+        assert extracted == [0, 1, 2]
+
+        _make_pdf(tmp_path / 'book.pdf', ['text', 'text'])
+        third = extract_content_from_file(pdf, queue.Queue())
+        assert sorted(third) == [1, 2]
+        assert extracted == [0, 1, 2, 0, 1]
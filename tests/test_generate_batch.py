@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+測試批次出題合約：原生 generate_batch 與逐題退回路徑的重現性、題目池一次補足缺額
+"""
+
+import os
+import random
+import sys
+import types
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.question_pool import QuestionPool, generate_question
+from core.skill_runtime import has_native_batch, run_generate_batch
+
+
+def _module(name, batch=False):
+    mod = types.ModuleType(name)
+    mod.calls = {'generate': 0, 'batch': 0}
+
+    def generate(level=1):
+        mod.calls['generate'] += 1
+        a = random.randint(1, 10 ** 6)
+        return {'question_text': f'{a}+1=?', 'answer': str(a + 1)}
+
+    def generate_batch(level=1, n=10, seed=None):
+        mod.calls['batch'] += 1
+        rng = random.Random(seed)
+        return [{'question_text': f'{a}+1=?', 'answer': str(a + 1)} for a in (rng.randint(1, 10 ** 6) for _ in range(n))]
+
+    generate.__module__ = name
+    mod.generate = generate
+    if batch:
+        generate_batch.__module__ = name
+        mod.generate_batch = generate_batch
+    return mod
+
+
+def test_fallback_loops_with_reproducible_per_question_seeds():
+    mod = _module('batch_fallback')
+    assert not has_native_batch(mod)
+    items = run_generate_batch(mod, level=1, n=5, seed=42)
+    assert len(items) == 5 and mod.calls['generate'] == 5
+    assert items == run_generate_batch(mod, level=1, n=5, seed=42)
+    seed, data = items[3]
+    assert generate_question(mod, 1, seed)['question_text'] == data['question_text']
+    assert data['correct_answer'] == data['answer']
+
+
+def test_native_batch_is_used_and_deterministic():
+    mod = _module('batch_native', batch=True)
+    assert has_native_batch(mod)
+    items = run_generate_batch(mod, level=1, n=30, seed=7)
+    assert len(items) == 30 and mod.calls == {'generate': 0, 'batch': 1}
+    assert all(seed is None for seed, _ in items)
+    assert [d['question_text'] for _, d in items] == [d['question_text'] for _, d in run_generate_batch(mod, 1, 30, 7)]
+
+
+def test_pool_refills_with_one_batch_call():
+    mod = _module('batch_pool', batch=True)
+    pool = QuestionPool(target_size=6, low_watermark=3, max_workers=1)
+    pool._slot(('batch_pool', 1), mod)
+    pool._refill('batch_pool', 1, mod)
+    assert pool.stats()['pooled_questions'] == 6 and mod.calls['batch'] == 1
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+測試 GenerationScheduler：並行上限、結果與 experiment_log 依輸入順序、例外不中斷批次、Token Bucket 速率
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+
+from config import Config
+from core import generation_scheduler
+from core.code_generator import log_experiment
+from core.generation_scheduler import GenerationScheduler, TokenBucket
+
+
+def test_parallel_generation_keeps_input_order(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'log.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE experiment_log (id INTEGER PRIMARY KEY AUTOINCREMENT, " + ", ".join(
+        ['skill_id', 'start_time', 'duration_seconds', 'prompt_len', 'code_len', 'is_success', 'error_msg',
+         'repaired', 'model_name', 'model_size_class', 'prompt_level', 'raw_response', 'final_code',
+         'score_syntax', 'score_math', 'score_visual', 'healing_duration', 'is_executable', 'ablation_id',
+         'missing_imports_fixed', 'resource_cleanup_flag', 'prompt_tokens', 'completion_tokens', 'total_tokens',
+         'experiment_group', 'garbage_cleaner_count', 'eval_eliminator_count', 'sampling_success_count',
+         'sampling_total_count', 'spec_prompt_id', 'use_master_spec', 'ttft_seconds', 'tokens_per_second']) + ")")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(Config, 'db_path', db_path)
+    monkeypatch.setattr(Config, 'GENERATION_CONCURRENCY', {'fake': 3})
+    monkeypatch.setattr(generation_scheduler, '_PROVIDER_SEMAPHORES', {})
+    monkeypatch.setattr(generation_scheduler, '_PROVIDER_BUCKETS', {})
+
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def fake_generate(skill_id, queue=None, **kwargs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(random.uniform(0.01, 0.05))
+        with lock:
+            active[0] -= 1
+        if skill_id == 's3':
+            raise RuntimeError('boom')
+        log_experiment(skill_id, time.time(), 0, 0, True, '', False, 'fake', ablation_id=kwargs['ablation_id'])
+        return True, 'ok', {'is_valid': True}
+
+    skill_ids = [f's{i}' for i in range(10)]
+    ordered = []
+    scheduler = GenerationScheduler(app=Flask(__name__), provider='fake', generate_fn=fake_generate)
+    results = scheduler.run(skill_ids, on_result=lambda r: ordered.append(r['skill_id']), ablation_id=3)
+
+    assert [r['skill_id'] for r in results] == skill_ids == ordered
+    assert 1 < peak[0] <= 3
+    assert results[3]['success'] is False and isinstance(results[3]['error'], RuntimeError)
+    conn = sqlite3.connect(db_path)
+    logged = [r[0] for r in conn.execute("SELECT skill_id FROM experiment_log ORDER BY id")]
+    conn.close()
+    assert logged == [s for s in skill_ids if s != 's3']
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate_per_minute=600, capacity=2)  # 每秒 10 個
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    # 前 2 個為突發額度，其餘 3 個約需 0.3 秒
+    assert time.monotonic() - start >= 0.25
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+測試題目生成看門狗：時間預算內回傳結果、逾時中止無窮迴圈、連續逾時隔離與解除、
+無法中止的執行緒存活期間拒絕新的生成
+"""
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+from core.generation_watchdog import GenerationTimeout, GenerationWatchdog, SkillQuarantined
+from core.question_pool import generate_question
+
+
+class _RunawaySkill:
+    @staticmethod
+    def generate(level=1):
+        while True:  # 無窮拒絕取樣
+            pass
+
+
+class _FastSkill:
+    @staticmethod
+    def generate(level=1):
+        return {'question_text': '1+1=?', 'correct_answer': '2'}
+
+
+def test_returns_value_and_propagates_errors():
+    watchdog = GenerationWatchdog(budget=1.0)
+    assert watchdog.run('fast', generate_question, _FastSkill, 1, 7)['correct_answer'] == '2'
+    with pytest.raises(ZeroDivisionError):
+        watchdog.run('broken', lambda: 1 / 0)
+    assert watchdog.skill_stats()['fast']['slow'] == 0
+
+
+def test_timeout_interrupts_and_quarantines():
+    watchdog = GenerationWatchdog(budget=0.2, quarantine_after=2, quarantine_seconds=60)
+    for _ in range(2):
+        with pytest.raises(GenerationTimeout):
+            watchdog.run('runaway', generate_question, _RunawaySkill, 1, 7)
+
+    stats = watchdog.skill_stats()['runaway']
+    assert stats['slow'] == 2 and stats['quarantined']
+    assert watchdog.stats()['stuck'] == 0
+    with pytest.raises(SkillQuarantined):
+        watchdog.run('runaway', generate_question, _RunawaySkill, 1, 7)
+
+    # 背景補題與重新推導不受隔離限制；解除隔離後恢復即時生成
+    assert watchdog.run('runaway', generate_question, _FastSkill, 1, 7, enforce=False) is not None
+    watchdog.release('runaway')
+    assert not watchdog.is_quarantined('runaway')
+
+
+class _SlowSkill:
+    @staticmethod
+    def generate(level=1):
+        time.sleep(1.0)
+        return {'question_text': 'slow', 'correct_answer': '1'}
+
+
+def test_slow_skill_does_not_time_out_other_skills():
+    """慢速技能在背景補題時，同時出題的健康技能不會被算成逾時而隔離"""
+    import threading
+
+    watchdog = GenerationWatchdog(budget=0.3, quarantine_after=2, quarantine_seconds=60)
+    background = threading.Thread(target=watchdog.run, args=('slow', generate_question, _SlowSkill, 1, 7),
+                                  kwargs={'budget': 5.0, 'enforce': False})
+    background.start()
+    time.sleep(0.1)
+    for seed in range(3):
+        assert watchdog.run('healthy', generate_question, _FastSkill, 1, seed)['correct_answer'] == '2'
+    background.join()
+    assert watchdog.skill_stats()['healthy']['slow'] == 0
+    assert not watchdog.is_quarantined('healthy')
+
+
+def test_stuck_thread_refuses_new_runs():
+    """卡在 C 函式內 (注入例外無效) 的執行緒結束前，該技能不論 enforce 都不再開新執行緒"""
+    import threading
+
+    watchdog = GenerationWatchdog(budget=0.1, quarantine_after=5, quarantine_seconds=60)
+    release = threading.Event()
+    with pytest.raises(GenerationTimeout):
+        watchdog.run('blocked', release.wait, 10)
+    assert watchdog.stats()['stuck'] == 1 and watchdog.is_quarantined('blocked')
+    with pytest.raises(SkillQuarantined):
+        watchdog.run('blocked', generate_question, _FastSkill, 1, 7, enforce=False)
+    assert watchdog.run('other', generate_question, _FastSkill, 1, 7) is not None
+
+    release.set()
+    deadline = time.time() + 3
+    while watchdog.is_quarantined('blocked') and time.time() < deadline:
+        time.sleep(0.01)
+    assert watchdog.run('blocked', generate_question, _FastSkill, 1, 7)['correct_answer'] == '2'
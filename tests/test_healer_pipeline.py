@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+測試 Healer 流水線可脫離模型獨立執行：Markdown 擷取、各階段計時、語法驗證與動態採樣
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.code_generator import heal_raw_output, run_dynamic_sampling
+
+RAW_OUTPUT = '''以下是程式碼：
+```python
+import random
+
+def generate(level=1, **kwargs):
+    a = random.randint(1, 9)
+    b = random.randint(1, 9)
+    return {'question_text': f"計算 {a} + {b}", 'answer': str(a + b), 'correct_answer': str(a + b)}
+```
+'''
+
+
+def test_heal_raw_output_records_stages():
+    metrics = {}
+    healed = heal_raw_output(RAW_OUTPUT, 'test_skill', stage_metrics=metrics)
+
+    assert healed['is_valid'], healed['error_msg']
+    assert '```' not in healed['clean_code']
+    assert healed['regex_fixes'] >= 1  # Markdown 擷取
+    assert list(metrics) == ['basic_cleanup', 'refine_ai_code', 'regex_patches', 'fix_code_syntax',
+                             'generic_patches', 'ast_healer', 'validate']
+    assert sum(m['fixes'] for m in metrics.values()) == healed['regex_fixes'] + healed['ast_fixes']
+
+    sampling = run_dynamic_sampling(healed['final_code'], 'test_skill')
+    assert sampling['ok'] and sampling['success_count'] == 2
+
+
+def test_heal_raw_output_without_healer():
+    healed = heal_raw_output(RAW_OUTPUT, 'test_skill', use_regex_healer=False, use_ast_healer=False, ablation_id=1)
+    assert healed['regex_fixes'] == 0 and healed['ast_fixes'] == 0
+    assert not healed['is_valid']  # 未擷取 Markdown，原始輸出無法通過語法驗證
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+測試背景任務子系統：原子性領取、日誌追蹤串流、心跳逾時恢復並依 checkpoint 續做
+"""
+
+import os
+import sys
+import threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.jobs import END_OF_STREAM, FAILED, SUCCEEDED, JobRunner, JobStore
+
+
+def _runner(tmp_path, **kwargs):
+    return JobRunner(JobStore(str(tmp_path / 'jobs.db')), **kwargs)
+
+
+def test_claim_is_exclusive_and_stream_tails_log(tmp_path):
+    runner = _runner(tmp_path)
+    runner.register('echo', lambda ctx: [ctx.put(f"INFO: {x}") for x in ctx.payload['items']])
+    job_ids = [runner.submit('echo', {'items': [i, i + 1]}) for i in range(10)]
+
+    # 兩個 "worker" (不同 JobRunner 實例共用資料庫) 同時搶任務，每個任務只執行一次
+    other = JobRunner(runner.store)
+    other.register('echo', runner._handlers['echo'])
+    claimed = []
+    threads = [threading.Thread(target=lambda r=r: [claimed.append(j) for j in iter(r.run_one, None)])
+               for r in (runner, other)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(claimed) == sorted(job_ids)
+
+    messages = [m for _, m in other.stream(job_ids[3])]
+    assert messages == ['INFO: 3', 'INFO: 4', END_OF_STREAM]
+    # 從 Last-Event-ID 接續
+    first_id = runner.store.tail(job_ids[3])[0][0]
+    assert [m for _, m in runner.stream(job_ids[3], after_id=first_id)] == ['INFO: 4', END_OF_STREAM]
+    assert runner.store.get(job_ids[3])['status'] == SUCCEEDED
+
+
+def test_stale_job_resumes_from_checkpoint(tmp_path):
+    runner = _runner(tmp_path, stale_seconds=0, max_attempts=2)
+    processed = []
+
+    def handler(ctx):
+        for item in ctx.payload['items']:
+            if item in ctx.checkpoint.get('done', []):
+                continue
+            if item == 'b' and not ctx.resumed:
+                raise SystemExit  # 模擬 worker 在處理途中被終止 (不會標記完成)
+            processed.append(item)
+            ctx.save_checkpoint(done=ctx.checkpoint.get('done', []) + [item])
+
+    runner.register('import', handler)
+    job_id = runner.submit('import', {'items': ['a', 'b', 'c']})
+    try:
+        runner.run_one()
+    except SystemExit:
+        pass
+    assert runner.store.get(job_id)['status'] == 'running'
+
+    assert runner.store.requeue_stale(0, 2) == (1, 0)
+    runner.run_one()
+    assert processed == ['a', 'b', 'c']
+    assert runner.store.get(job_id)['status'] == SUCCEEDED
+
+
+def test_failed_handler_marks_job_failed(tmp_path):
+    runner = _runner(tmp_path)
+    runner.register('boom', lambda ctx: 1 / 0)
+    job_id = runner.submit('boom', {})
+    runner.run_one()
+    job = runner.store.get(job_id)
+    assert job['status'] == FAILED and 'division' in job['error']
+    assert [m for _, m in runner.stream(job_id)][-1] == END_OF_STREAM
+
+
+def test_init_app_does_not_start_workers(tmp_path):
+    """CLI 腳本呼叫 create_app() 只綁定 app，不領取佇列中的任務；伺服器行程呼叫 start() 才執行"""
+    import time
+
+    from flask import Flask
+
+    runner = _runner(tmp_path, poll_interval=0.05)
+    runner.register('echo', lambda ctx: ctx.put("INFO: done"))
+    job_id = runner.submit('echo', {})
+    runner.init_app(Flask(__name__))
+    time.sleep(0.2)
+    assert runner.store.get(job_id)['status'] == 'queued' and not runner._threads
+
+    disabled = _runner(tmp_path, workers=0)
+    disabled.start()
+    assert not disabled._threads
+
+    runner.start()
+    runner.start()
+    try:
+        deadline = time.monotonic() + 5
+        while runner.store.get(job_id)['status'] != SUCCEEDED and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert runner.store.get(job_id)['status'] == SUCCEEDED
+        assert len(runner._threads) == 2  # 1 個 worker + 心跳，重複 start() 不會多開
+    finally:
+        runner.shutdown()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+測試 LLM 回應快取：錄製與命中、replay 模式未命中、錯誤回應不錄製、容量上限 LRU 淘汰
+"""
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.ai_wrapper import LocalAIResponse
+from core.llm_cache import CachedAIClient, LLMCacheMiss, LLMResponseCache
+
+
+class _FakeClient:
+    def __init__(self):
+        self.calls = 0
+        self.temperature = 0.1
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        if prompt == 'fail':
+            return LocalAIResponse('Local AI (Ollama) Error', error=True)
+        if prompt == 'cut':
+            return LocalAIResponse('Local AI (Ollama) Error', error=True, truncated=True, partial_text='def gen')
+        return LocalAIResponse(f"code for {prompt}", prompt_tokens=5, completion_tokens=7)
+
+
+def _client(cache, inner, temperature=0.1):
+    return CachedAIClient(inner, cache, 'local', 'qwen', {'temperature': temperature})
+
+
+def test_record_then_replay(tmp_path):
+    cache = LLMResponseCache(str(tmp_path), max_bytes=1 << 20, mode='readwrite')
+    inner = _FakeClient()
+    client = _client(cache, inner)
+
+    first = client.generate_content('p1')
+    second = client.generate_content('p1')
+    assert inner.calls == 1
+    assert second.text == first.text and second.from_cache
+    assert second.usage.total_tokens == 12
+    assert client.temperature == 0.1  # 其餘屬性轉給原 Client
+
+    # options 不同視為不同的鍵
+    _client(cache, inner, temperature=0.7).generate_content('p1')
+    assert inner.calls == 2
+
+    # 錯誤回應與串流中斷的部分輸出不錄製
+    client.generate_content('fail')
+    client.generate_content('fail')
+    client.generate_content('cut')
+    client.generate_content('cut')
+    assert inner.calls == 6
+
+    cache.mode = 'replay'
+    assert client.generate_content('p1').text == 'code for p1'
+    try:
+        client.generate_content('never-recorded')
+        assert False, "應拋出 LLMCacheMiss"
+    except LLMCacheMiss:
+        pass
+    assert inner.calls == 6
+
+
+def test_lru_eviction(tmp_path):
+    cache = LLMResponseCache(str(tmp_path), max_bytes=700, mode='readwrite')
+    inner = _FakeClient()
+    client = _client(cache, inner)
+    for i in range(3):
+        client.generate_content(f"p{i}")
+        time.sleep(0.02)
+    client.generate_content('p0')  # 命中，p0 成為最近使用
+    time.sleep(0.02)
+    for i in range(3, 6):
+        client.generate_content(f"p{i}")
+        time.sleep(0.02)
+
+    assert cache.stats()['evictions'] > 0
+    assert cache.stats()['total_bytes'] <= 700
+    calls = inner.calls
+    client.generate_content('p5')
+    assert inner.calls == calls  # 最新的紀錄仍在
+    client.generate_content('p1')
+    assert inner.calls == calls + 1  # 最久未使用的已被淘汰
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+測試 LocalAIClient：以假的 Ollama NDJSON 串流服務驗證逐段輸出、usage、TTFT 與 tokens/sec
+"""
+
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from config import Config
+from core.ai_wrapper import LocalAIClient
+
+
+class _FakeOllama(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+
+    def do_POST(self):
+        _FakeOllama.connections.add(self.client_address)
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        assert payload['stream'] is True
+        events = [{'response': t, 'done': False} for t in ['def ', 'generate', '():']]
+        if payload['prompt'] != 'truncated':  # 模擬伺服器在送出 done 之前被終止
+            events.append({'response': '', 'done': True, 'prompt_eval_count': 7,
+                           'eval_count': 3, 'eval_duration': 500_000_000})
+        body = b''.join(json.dumps(e).encode() + b'\n' for e in events)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_streaming_and_metrics(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(Config, 'LOCAL_API_URL', f'http://127.0.0.1:{server.server_address[1]}/api/generate')
+    try:
+        client = LocalAIClient('fake-model', temperature=0.1)
+
+        stream = client.generate_content_stream('prompt')
+        assert list(stream) == ['def ', 'generate', '():']
+        assert stream.response.text == 'def generate():'
+
+        tokens = []
+        response = client.generate_content('prompt', on_token=tokens.append)
+        assert response.text == 'def generate():' and len(tokens) == 3
+        assert response.usage.prompt_tokens == 7 and response.usage.total_tokens == 10
+        assert response.ttft_seconds is not None and response.ttft_seconds >= 0
+        assert abs(response.tokens_per_second - 6.0) < 1e-6
+
+        # keep-alive：兩次請求共用同一條連線
+        assert len(_FakeOllama.connections) == 1
+
+        # 沒有 done 紀錄的串流視為中斷：回傳錯誤，不把部分輸出當成完整回應
+        truncated = client.generate_content('truncated')
+        assert truncated.error and truncated.truncated
+        assert truncated.text.startswith('Local AI (Ollama) Error') and truncated.partial_text == 'def generate():'
+    finally:
+        server.shutdown()
+
+
+def test_connection_error_returns_message(monkeypatch):
+    monkeypatch.setattr(Config, 'LOCAL_API_URL', 'http://127.0.0.1:9/api/generate')
+    response = LocalAIClient('fake-model').generate_content('prompt')
+    assert response.text.startswith('Local AI (Ollama) Error')
+    assert response.usage.completion_tokens == 0
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+測試錯題指紋：正規化規則，以及 upgrade_db.py 回填舊資料與建立唯一索引
+"""
+
+import json
+import os
+import sqlite3
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from models import make_question_fingerprint
+
+
+def test_fingerprint_normalization():
+    fp = make_question_fingerprint('s1', '計算 $(-21) \\div (-3)$ 的值')
+    assert fp == make_question_fingerprint('s1', '  計算  (-21) \\div (-3) 的值\n')
+    assert fp != make_question_fingerprint('s2', '計算 $(-21) \\div (-3)$ 的值')
+    assert make_question_fingerprint('s1', '') is None
+
+
+def test_upgrade_backfills_fingerprints(tmp_path, monkeypatch):
+    import upgrade_db
+
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('instance')
+    conn = sqlite3.connect('instance/kumon_math.db')
+    conn.execute('''
+        CREATE TABLE mistake_notebook_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER NOT NULL, exam_image_path TEXT,
+            question_data TEXT, notes TEXT, skill_id TEXT, created_at DATETIME
+        )
+    ''')
+    q = json.dumps({'type': 'system_question', 'text': '計算 $1+1$'})
+    rows = [(1, q, 's1'), (1, q, 's1'), (2, q, 's1'), (1, json.dumps({'type': 'exam'}), 's1')]
+    conn.executemany("INSERT INTO mistake_notebook_entries (student_id, question_data, skill_id) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+    upgrade_db.upgrade()
+    upgrade_db.upgrade()  # 重複執行不出錯
+
+    conn = sqlite3.connect('instance/kumon_math.db')
+    fps = [r[0] for r in conn.execute("SELECT question_fingerprint FROM mistake_notebook_entries ORDER BY id")]
+    expected = make_question_fingerprint('s1', '計算 $1+1$')
+    assert fps == [expected, None, expected, None]
+    try:
+        conn.execute("INSERT INTO mistake_notebook_entries (student_id, question_fingerprint) VALUES (1, ?)", (expected,))
+        assert False, "應違反唯一索引"
+    except sqlite3.IntegrityError:
+        pass
+    conn.close()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+測試 PDF 逐頁擷取：文字層足夠的頁面略過 OCR、掃描頁整頁 OCR、行程池輸出依頁碼排序
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import fitz
+import pytest
+
+from core.page_extractor import PageModel, extract_page, extract_pdf_pages
+
+TEXT = "The quick brown fox jumps over the lazy dog, page {n}. " * 2
+
+
+def _make_pdf(path, pages):
+    """pages: 'text' 為純文字頁、'scan' 為只有圖片的頁、'mixed' 為文字 + 大圖"""
+    doc = fitz.open()
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 200, 200), 0)
+    pix.clear_with(200)
+    for n, kind in enumerate(pages, start=1):
+        page = doc.new_page()
+        if kind in ('text', 'mixed'):
+            page.insert_textbox(fitz.Rect(50, 50, 550, 200), TEXT.format(n=n))
+        if kind in ('scan', 'mixed'):
+            page.insert_image(fitz.Rect(50, 300, 350, 600), pixmap=pix)
+    doc.save(str(path))
+    return str(path)
+
+
+def test_ocr_policy_per_page(tmp_path):
+    """文字頁不 OCR、掃描頁整頁 OCR、文字 + 圖片只 OCR 圖片區域"""
+    pdf = _make_pdf(tmp_path / 'book.pdf', ['text', 'scan', 'mixed'])
+
+    text_page = extract_page(pdf, 0)
+    assert text_page['page'] == 1
+    assert text_page['ocr'] == 'skipped' and text_page['ocr_error'] is None
+    assert 'page 1' in text_page['text'] and 'OCR Extracted' not in text_page['text']
+
+    assert extract_page(pdf, 1)['ocr'] == 'full'
+    assert extract_page(pdf, 2)['ocr'] == 'regions'
+    # 圖片面積比例低於門檻時視為裝飾，不做 OCR
+    assert extract_page(pdf, 2, {'min_image_area_ratio': 0.9})['ocr'] == 'skipped'
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_results_are_in_page_order(tmp_path, workers):
+    """serial 與行程池兩種路徑的輸出都依頁碼排序且內容一致"""
+    pdf = _make_pdf(tmp_path / 'book.pdf', ['text'] * 9)
+    results = list(extract_pdf_pages(pdf, workers=workers, chunk_size=2))
+    assert [r['page'] for r in results] == list(range(1, 10))
+    assert all(f"page {r['page']}" in r['text'] for r in results)
+    assert {r['ocr'] for r in results} == {'skipped'}
+
+
+def test_page_model_matches_per_block_font_queries(tmp_path):
+    """單次 get_text("dict") 的文字與大字體標題與舊版逐區塊查詢相同；標題依閱讀順序回傳"""
+    from scripts.pdf_extraction_benchmark import legacy_page_text, make_sample_pdf, model_page_text
+
+    path = str(tmp_path / 'sample.pdf')
+    make_sample_pdf(path, pages=3)
+    doc = fitz.open(path)
+    page = doc.new_page()
+    page.insert_text((50, 400), "Section 1-2", fontsize=22)
+    page.insert_text((50, 60), "Chapter 2", fontsize=26)
+    for p in doc:
+        assert model_page_text(p) == legacy_page_text(p)
+        assert PageModel.from_page(p).text == p.get_text("text")
+    assert PageModel.from_page(page).large_font_texts(20, reading_order=True) == ['Chapter 2', 'Section 1-2']
+    assert PageModel.from_page(page).large_font_texts(20) == ['Section 1-2', 'Chapter 2']
+
+
+def test_same_path_new_file_is_not_served_from_stale_handle(tmp_path):
+    """上傳檔以相同檔名覆寫 (例如中文檔名經 secure_filename 後都變成 pdf)，第二份不可讀到第一份的內容"""
+    path = tmp_path / 'pdf'
+    _make_pdf(path, ['text'] * 2)
+    assert 'page 2' in list(extract_pdf_pages(str(path), workers=1))[1]['text']
+
+    doc = fitz.open()
+    for n in range(2):
+        doc.new_page().insert_textbox(fitz.Rect(50, 50, 550, 200), f"Second upload, sheet {n}. " * 4)
+    doc.save(str(path))
+    results = list(extract_pdf_pages(str(path), workers=1))
+    assert all('Second upload' in r['text'] for r in results)
+    assert 'Second upload' in extract_page(str(path), 0)['text']
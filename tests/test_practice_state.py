@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+測試練習狀態伺服器端儲存：記憶體 LRU / TTL 淘汰統計、SQLite 跨 worker 共用、Cookie 只保留 Token
+"""
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask, session
+
+from core import practice_state
+from core import session as practice_session
+from core.practice_state import MemoryStateStore, SQLiteStateStore
+
+
+def test_memory_store_lru_and_ttl():
+    store = MemoryStateStore(max_entries=2, ttl_seconds=0.2)
+    store.put('a', {'n': 1})
+    store.put('b', {'n': 2})
+    assert store.get('a') == {'n': 1}  # a 成為最近使用
+    store.put('c', {'n': 3})
+    assert store.get('b') is None and store.get('a') == {'n': 1}
+    assert store.stats()['evicted_capacity'] == 1
+
+    time.sleep(0.25)
+    assert store.get('c') is None
+    assert store.stats()['evicted_expired'] == 1
+
+
+def test_sqlite_store_shared_between_workers(tmp_path):
+    db_path = str(tmp_path / 'state.db')
+    worker_a, worker_b = SQLiteStateStore(db_path), SQLiteStateStore(db_path)
+    worker_a.put('tok', {'skill': 's1', 'answer': '3'})
+    worker_a.put('tok', {'skill': 's1', 'answer': '4'})
+    assert worker_b.get('tok') == {'skill': 's1', 'answer': '4'}
+    assert worker_b.stats()['entries'] == 1
+
+    expired = SQLiteStateStore(db_path, ttl_seconds=0, purge_every=1)
+    time.sleep(0.01)
+    assert expired.get('tok') is None
+    expired.put('other', {})
+    assert expired.stats()['evicted_expired'] >= 1
+
+
+def test_session_holds_only_token(monkeypatch):
+    store = MemoryStateStore()
+    monkeypatch.setattr(practice_state, 'PRACTICE_STATE_STORE', store)
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    with app.test_request_context():
+        practice_session.set_current('s1', {'question_text': '1 + 2', 'answer': '3'})
+        assert set(session) == {'practice_token'}
+        current = practice_session.get_current()
+        assert current['skill'] == 's1' and current['question'] == '1 + 2'
+
+        practice_session.clear()
+        assert practice_session.get_current() == {}
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+測試 ProgressBuffer：增量合併結果與逐筆更新一致、讀取端疊加尚未寫回的增量
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.progress_buffer import ProgressBuffer, _PendingProgress
+
+
+def _sequential(correct, wrong, solved, answers):
+    """原本 update_progress 的逐筆更新邏輯"""
+    for ok in answers:
+        solved += 1
+        if ok:
+            correct, wrong = correct + 1, 0
+        else:
+            correct, wrong = 0, wrong + 1
+    return correct, wrong, solved
+
+
+def _pending(answers):
+    now = datetime.now()
+    entry = _PendingProgress(answers[0], now)
+    for ok in answers[1:]:
+        entry.add(ok, now)
+    return entry
+
+
+def test_pending_matches_sequential_updates():
+    cases = [[True], [False], [True, True, True], [False, True, True], [True, False], [True, True, False, False]]
+    for base in [(0, 0, 0), (3, 0, 10), (0, 2, 5)]:
+        for answers in cases:
+            assert _pending(answers).apply(*base) == _sequential(*base, answers), (base, answers)
+
+
+def test_merge_after_restores_order():
+    for first, second in [([True, True], [True]), ([False], [True, True]), ([True], [False, False]), ([True, False], [False])]:
+        later = _pending(second)
+        later.merge_after(_pending(first))
+        assert later.apply(2, 0, 7) == _sequential(2, 0, 7, first + second)
+
+
+def test_overlay_skips_inflight_already_written():
+    buf = ProgressBuffer()
+    t0 = datetime.now()
+    buf._inflight = {(1, 's'): _PendingProgress(True, t0)}
+    buf._pending = {(1, 's'): _PendingProgress(True, t0 + timedelta(seconds=1)), (2, 's'): _PendingProgress(False, t0)}
+
+    # 資料庫尚未反映寫回中的批次 -> 兩段增量都要疊加
+    assert buf.overlay(1, {'s': (1, 0, 4, t0 - timedelta(seconds=1))})['s'][:3] == (3, 0, 6)
+    # 資料庫已寫入寫回中的批次 -> 只疊加尚未寫回的部分
+    assert buf.overlay(1, {'s': (2, 0, 5, t0)})['s'][:3] == (3, 0, 6)
+    # 僅存在於緩衝區的技能也會回傳
+    assert buf.overlay(2, {})['s'][:3] == (0, 1, 1)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+測試 QuestionPool：未命中時背景補題、命中後 O(1) 取題、模組熱替換後丟棄舊題、
+補題失敗後退避與技能隔離期間不補題
+"""
+
+import os
+import sys
+import time
+import types
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core import question_pool
+from core.question_pool import QuestionPool, normalize_question_data
+
+
+def _fake_module(tag):
+    mod = types.ModuleType(f"fake_{tag}")
+    counter = {'n': 0}
+
+    def generate(level=1, **kwargs):
+        counter['n'] += 1
+        return {'question': f"{tag}-{level}-{counter['n']}", 'answer': counter['n']}
+
+    mod.generate = generate
+    return mod
+
+
+def _wait_for(predicate, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_normalize_question_data():
+    data = normalize_question_data({'question': 'q', 'answer': 3})
+    assert data['question_text'] == 'q' and data['correct_answer'] == 3
+    assert normalize_question_data({'question_text': 'q'}) is None
+    assert normalize_question_data(None) is None
+
+
+def test_pool_miss_then_hit():
+    pool = QuestionPool(target_size=4, low_watermark=2, max_workers=1)
+    mod = _fake_module('a')
+    assert pool.pop('s1', 1, mod) is None
+    assert _wait_for(lambda: pool.stats()['pooled_questions'] == 4)
+
+    seed, item = pool.pop('s1', 1, mod)
+    assert isinstance(seed, int) and item['question_text'].startswith('a-1-')
+    assert pool.stats()['hits'] == 1 and pool.stats()['misses'] == 1
+
+
+def test_pool_discards_stale_module():
+    pool = QuestionPool(target_size=3, low_watermark=1, max_workers=1)
+    old_mod, new_mod = _fake_module('old'), _fake_module('new')
+    pool.pop('s1', 1, old_mod)
+    assert _wait_for(lambda: pool.stats()['pooled_questions'] == 3)
+
+    # 模組被熱替換：舊題全部丟棄，本次視為未命中
+    assert pool.pop('s1', 1, new_mod) is None
+    assert pool.stats()['discarded'] == 3
+    assert _wait_for(lambda: pool.stats()['pooled_questions'] == 3)
+    assert pool.pop('s1', 1, new_mod)[1]['question_text'].startswith('new-')
+
+
+def test_failed_refill_backs_off_and_quarantine_skips(monkeypatch):
+    pool = QuestionPool(target_size=3, low_watermark=1, max_workers=1, max_attempts=2, retry_seconds=60)
+    broken = types.ModuleType('fake_broken')
+    calls = {'n': 0}
+
+    def generate(level=1, **kwargs):
+        calls['n'] += 1
+        raise ValueError('broken')
+
+    broken.generate = generate
+    pool.pop('s1', 1, broken)
+    assert _wait_for(lambda: pool.stats()['failures'] == 1)
+    # 退避期間反覆取題不再排入補題
+    for _ in range(5):
+        assert pool.pop('s1', 1, broken) is None
+    time.sleep(0.1)
+    assert calls['n'] == 2 and pool.stats()['skipped_refills'] == 5
+
+    # 技能隔離中 (或仍有卡住的生成執行緒) 時不補題
+    monkeypatch.setattr(question_pool.GENERATION_WATCHDOG, 'is_quarantined', lambda skill_id: skill_id == 's2')
+    mod = _fake_module('q')
+    assert pool.pop('s2', 1, mod) is None
+    time.sleep(0.1)
+    assert pool.stats()['pooled_questions'] == 0
+    monkeypatch.undo()
+    pool.pop('s2', 1, mod)
+    assert _wait_for(lambda: pool.stats()['pooled_questions'] == 3)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+測試沙箱行程池：採樣結果結構、print 不影響通訊、CPU / 記憶體超限終止並替換行程、執行 K 個工作後回收、
+工作行程層級錯誤仍回傳完整結果欄位
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.sandbox_pool import SandboxPool
+
+GOOD_CODE = '''
+import random
+def generate():
+    print("noise")
+    a = random.randint(1, 9)
+    return {'question_text': f"{a} + 1 = ?", 'answer': str(a + 1)}
+'''
+
+
+def _pool(**overrides):
+    options = dict(size=1, max_jobs_per_worker=3, cpu_seconds=1, wall_seconds=5, max_rss_mb=200)
+    options.update(overrides)
+    return SandboxPool(**options)
+
+
+def test_sampling_and_recycle():
+    pool = _pool()
+    try:
+        result = pool.run(GOOD_CODE, samples=3, early_pass=2)
+        assert result['ok'] and result['success_count'] == 2 and result['total_count'] == 2
+        assert len(result['sample_latencies']) == 2
+        first_pid = result['worker_pid']
+
+        bad = pool.run("def generate():\n    return 'not a dict'\n", samples=3)
+        assert not bad['ok'] and bad['stage'] == 'sample' and bad['failed_sample'] == 1
+        assert bad['error_class'] == 'AssertionError'
+
+        syntax = pool.run("def broken(:\n")
+        assert syntax['stage'] == 'exec' and syntax['error_class'] == 'SyntaxError'
+
+        # 第 3 個工作後回收，下一個工作由新行程執行
+        assert pool.run(GOOD_CODE)['worker_pid'] != first_pid
+        assert pool.stats()['recycled'] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_limits_kill_worker():
+    pool = _pool()
+    try:
+        spin = pool.run("def generate():\n    while True:\n        pass\n", samples=1)
+        assert spin['error_class'] == 'CPUTimeExceeded'
+
+        hog = pool.run("data = []\nwhile True:\n    data.append(bytearray(10 * 1024 * 1024))\n")
+        assert hog['error_class'] == 'MemoryLimitExceeded'
+
+        sleeper = _pool(wall_seconds=0.5)
+        try:
+            assert sleeper.run("import time\ntime.sleep(5)\n")['error_class'] == 'WallTimeExceeded'
+        finally:
+            sleeper.shutdown()
+
+        # 被終止的行程已替換，池仍可正常使用
+        assert pool.run(GOOD_CODE, samples=1)['ok']
+        assert pool.stats()['killed'] == 2 and pool.stats()['workers'] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_worker_level_error_keeps_result_shape(monkeypatch):
+    pool = _pool()
+    try:
+        # samples 非整數：exec 成功後在採樣迴圈外拋出例外，由工作行程的防禦分支回報
+        broken = pool.run(GOOD_CODE, samples='3')
+        assert not broken['ok'] and broken['stage'] == 'worker'
+        assert broken['success_count'] == 0 and broken['total_count'] == 0
+        assert broken['sample_latencies'] == []
+    finally:
+        pool.shutdown()
+
+    from config import Config
+    from core import code_generator, sandbox_pool
+    monkeypatch.setattr(Config, 'SANDBOX_ENABLED', True, raising=False)
+    monkeypatch.setattr(sandbox_pool.SANDBOX_POOL, 'run', lambda *a, **k: {
+        'ok': False, 'stage': 'worker', 'error_class': 'TypeError', 'error_msg': 'boom'})
+    result = code_generator.run_dynamic_sampling(GOOD_CODE, 'skill')
+    assert result['ok'] is False and result['total_count'] == 0 and result['sample_latencies'] == []
+    assert result['error_msg'] == 'Dynamic sampling error: TypeError: boom'
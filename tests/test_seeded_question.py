@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+測試種子定址出題：同種子必得同題、Session 只存題目位址與摘要、LRU 淘汰後由種子重新推導、
+技能更新或重新推導結果與摘要不符時視為失效
+"""
+
+import os
+import random
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask, session
+
+from core import session as practice_session
+from core import skill_cache
+from core.question_pool import generate_question
+from core.skill_registry import SKILL_REGISTRY
+
+SKILL_SOURCE = '''
+import random
+OFFSET = 0
+def generate(level=1, **kwargs):
+    a, b = random.randint(1, 10 ** 6) + OFFSET, random.randint(1, 10 ** 6)
+    return {'question_text': f"{a} + {b} = ?", 'answer': str(a + b)}
+'''
+
+
+def test_seed_addressed_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(SKILL_REGISTRY, 'skills_dir', str(tmp_path))
+    monkeypatch.setattr(skill_cache, 'get_cached_prerequisites', lambda skill_id: [])
+    skill_file = tmp_path / 'seeded_skill.py'
+    skill_file.write_text(SKILL_SOURCE, encoding='utf-8')
+    mod = SKILL_REGISTRY.get('seeded_skill')
+
+    first = generate_question(mod, 2, 42)
+    assert generate_question(mod, 2, 42) == first != generate_question(mod, 2, 43)
+    # 出題前後還原全域亂數狀態
+    random.seed(1)
+    expected_next = random.random()
+    random.seed(1)
+    generate_question(mod, 2, 42)
+    assert random.random() == expected_next
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    with app.test_request_context():
+        practice_session.set_current('seeded_skill', dict(first), level=2, seed=42)
+        assert set(session['current_data']) == {'skill', 'level', 'seed', 'version', 'digest'}
+
+        practice_session.QUESTION_CACHE.clear()
+        current = practice_session.get_current()
+        assert current['answer'] == first['answer'] and current['question'] == first['question_text']
+        assert practice_session.QUESTION_CACHE.stats()['rederived'] == 1
+
+        # generate() 依賴種子以外的狀態：重新推導出另一題時不拿來批改
+        practice_session.QUESTION_CACHE.clear()
+        mod.OFFSET = 1
+        assert practice_session.get_current() == {}
+        mod.OFFSET = 0
+
+        # 技能檔被重新生成：舊種子不再對應同一題
+        practice_session.QUESTION_CACHE.clear()
+        skill_file.write_text(SKILL_SOURCE + '\n# regenerated\n', encoding='utf-8')
+        SKILL_REGISTRY.get('seeded_skill')
+        assert practice_session.get_current() == {}
+    SKILL_REGISTRY.invalidate('seeded_skill')
+
+
+def test_non_reproducible_skill_keeps_full_data(tmp_path, monkeypatch):
+    monkeypatch.setattr(SKILL_REGISTRY, 'skills_dir', str(tmp_path))
+    (tmp_path / 'clock_skill.py').write_text(
+        "import itertools\n_n = itertools.count()\n"
+        "def generate(level=1):\n    n = next(_n)\n    return {'question_text': str(n), 'answer': str(n)}\n",
+        encoding='utf-8')
+    mod = SKILL_REGISTRY.get('clock_skill')
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    with app.test_request_context():
+        data = generate_question(mod, 1, 7)
+        practice_session.set_current('clock_skill', data, level=1, seed=7)
+        assert 'seed' not in session['current_data']
+        assert practice_session.get_current()['answer'] == data['answer']
+    SKILL_REGISTRY.invalidate('clock_skill')
+
+
+NUMPY_SKILL_SOURCE = '''
+import random
+import threading
+from random import randint
+import numpy as np
+
+gate = threading.Barrier(2, timeout=5)
+
+def generate(level=1, **kwargs):
+    a = random.randint(1, 10 ** 6)
+    if level == 2:
+        gate.wait()  # 兩個執行緒同時在 generate() 內
+    b, c = randint(1, 10 ** 6), int(np.random.randint(1, 10 ** 6))
+    return {'question_text': f"{a} + {b} + {c} = ?", 'answer': str(a + b + c)}
+'''
+
+
+def test_per_call_rng_runs_concurrently_and_matches_global_seeding(tmp_path, monkeypatch):
+    import threading
+
+    import numpy as np
+
+    monkeypatch.setattr(SKILL_REGISTRY, 'skills_dir', str(tmp_path))
+    (tmp_path / 'numpy_skill.py').write_text(NUMPY_SKILL_SOURCE, encoding='utf-8')
+    mod = SKILL_REGISTRY.get('numpy_skill')
+
+    first = generate_question(mod, 1, 42)
+    # 與舊版「鎖住並重設全域亂數」產生的題目相同 (既有 Session 中的種子仍對應同一題)
+    random.seed(42)
+    np.random.seed(42)
+    assert mod.generate(level=1)['question_text'] == first['question_text']
+
+    # 不再有全域種子鎖：兩個出題呼叫可以同時在 generate() 內，且各自的結果不互相干擾
+    results = {}
+    threads = [threading.Thread(target=lambda s=s: results.__setitem__(s, generate_question(mod, 2, s)))
+               for s in (42, 43)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert results[42] == generate_question(mod, 1, 42) and results[43] == generate_question(mod, 1, 43)
+    SKILL_REGISTRY.invalidate('numpy_skill')
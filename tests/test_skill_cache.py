@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+測試技能靜態資料快取：TTL 到期重新載入、invalidate 單一技能 / 全部、停用技能與停用前置技能的過濾、
+載入期間發生 invalidate 時不寫入舊資料
+"""
+
+import os
+import sys
+import threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+from flask import Flask
+
+from core import skill_cache
+from core.skill_cache import SkillMetadataCache
+from models import SkillCurriculum, SkillInfo, SkillPrerequisites, db
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 't.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        for skill_id, name, active in [('a', '甲', True), ('b', '乙', True), ('c', '丙', False)]:
+            db.session.add(SkillInfo(skill_id=skill_id, skill_en_name=skill_id, skill_ch_name=name,
+                                     description=name, gemini_prompt='-', is_active=active))
+        db.session.add(SkillCurriculum(skill_id='a', curriculum='general', grade=7, volume='1',
+                                       chapter='1', section='1-1', difficulty_level=2))
+        db.session.add_all([SkillPrerequisites(skill_id='a', prerequisite_id='b'),
+                            SkillPrerequisites(skill_id='a', prerequisite_id='c')])
+        db.session.commit()
+        yield app
+
+
+def _rename(skill_id, name):
+    db.session.get(SkillInfo, skill_id).skill_ch_name = name
+    db.session.commit()
+
+
+def test_ttl_and_invalidate(app, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(skill_cache.time, 'monotonic', lambda: clock[0])
+    cache = SkillMetadataCache(ttl_seconds=60)
+
+    assert cache.get('a')['skill']['skill_ch_name'] == '甲'
+    assert cache.get('a')['difficulty'] == {'general': 2}
+    _rename('a', '甲2')
+    assert cache.get('a')['skill']['skill_ch_name'] == '甲'  # TTL 內仍為快取值
+    clock[0] += 61
+    assert cache.get('a')['skill']['skill_ch_name'] == '甲2'
+
+    cache.get('b')
+    _rename('a', '甲3')
+    _rename('b', '乙2')
+    cache.invalidate('a')
+    assert cache.get('a')['skill']['skill_ch_name'] == '甲3'
+    assert cache.get('b')['skill']['skill_ch_name'] == '乙'
+    cache.invalidate()
+    assert cache.get('b')['skill']['skill_ch_name'] == '乙2'
+    assert cache.stats()['invalidations'] == 2
+
+
+def test_inactive_skills_are_filtered(app, monkeypatch):
+    monkeypatch.setattr(skill_cache, 'SKILL_METADATA_CACHE', SkillMetadataCache())
+    assert skill_cache.get_cached_skill_info('a')['skill_id'] == 'a'
+    assert skill_cache.get_cached_skill_info('c') is None
+    assert skill_cache.get_cached_skill_info('missing') is None
+    # 停用的前置技能不列出
+    assert skill_cache.get_cached_prerequisites('a') == [{'skill_id': 'b', 'skill_ch_name': '乙'}]
+    assert skill_cache.get_cached_difficulty('a', 'general') == 2
+    assert skill_cache.get_cached_difficulty('a', 'vocational') is None
+
+
+def test_invalidate_during_load_is_not_overwritten(app, monkeypatch):
+    cache = SkillMetadataCache()
+    loading, release = threading.Event(), threading.Event()
+    real_load = cache._load
+
+    def slow_load(skill_id):
+        data = real_load(skill_id)
+        loading.set()
+        release.wait(5)
+        return data
+
+    monkeypatch.setattr(cache, '_load', slow_load)
+    result = {}
+
+    def reader():
+        with app.app_context():
+            result['data'] = cache.get('a')
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    assert loading.wait(5)
+    # 載入已讀到舊名稱；此時後台編輯並失效
+    _rename('a', '新名稱')
+    cache.invalidate('a')
+    release.set()
+    thread.join(5)
+
+    assert result['data']['skill']['skill_ch_name'] == '甲'
+    monkeypatch.setattr(cache, '_load', real_load)
+    assert cache.get('a')['skill']['skill_ch_name'] == '新名稱'
+
+
+def test_missing_skills_are_not_cached_and_size_is_bounded(app):
+    cache = SkillMetadataCache(max_entries=2)
+    for i in range(50):
+        assert cache.get(f"missing-{i}")['skill'] is None
+    assert cache.stats()['cached_skills'] == 0
+
+    cache.get('a')
+    cache.get('b')
+    cache.get('a')
+    cache.get('c')  # 淘汰最久未使用的 b
+    assert cache.stats()['cached_skills'] == 2
+    hits = cache.stats()['hits']
+    cache.get('a')
+    assert cache.stats()['hits'] == hits + 1
+    cache.get('b')
+    assert cache.stats()['hits'] == hits + 1
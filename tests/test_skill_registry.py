@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+測試 SkillModuleRegistry：快取命中、內容未變不重載、內容變更熱替換、手動失效
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.skill_registry import SkillModuleRegistry
+
+
+def _write_skill(path, value):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"VALUE = {value}\n\ndef generate(level=1, **kwargs):\n    return {{'question_text': 'q', 'answer': VALUE}}\n")
+
+
+def test_registry_hit_miss_and_reload(tmp_path):
+    skill_file = tmp_path / "demo_skill.py"
+    _write_skill(skill_file, 1)
+    registry = SkillModuleRegistry(skills_dir=str(tmp_path), package='test_skills_pkg')
+
+    mod1 = registry.get('demo_skill')
+    mod2 = registry.get('demo_skill')
+    assert mod1 is mod2
+    assert registry.stats()['hits'] == 1
+    assert registry.stats()['misses'] == 1
+
+    # touch：mtime 改變但內容相同 -> 仍為同一模組
+    st = os.stat(skill_file)
+    os.utime(skill_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10_000_000))
+    assert registry.get('demo_skill') is mod1
+
+    # 內容變更 -> 熱替換為新模組
+    _write_skill(skill_file, 2)
+    st = os.stat(skill_file)
+    os.utime(skill_file, ns=(st.st_atime_ns, st.st_mtime_ns + 20_000_000))
+    mod3 = registry.get('demo_skill')
+    assert mod3 is not mod1
+    assert mod3.generate()['answer'] == 2
+    assert mod1.VALUE == 1  # 舊模組不被原地修改
+    assert registry.stats()['reloads'] == 1
+
+    # 手動失效 -> 強制重新載入
+    registry.invalidate('demo_skill')
+    assert registry.get('demo_skill') is not mod3
+    assert registry.stats()['invalidations'] == 1
+
+
+def test_registry_missing_skill(tmp_path):
+    registry = SkillModuleRegistry(skills_dir=str(tmp_path), package='test_skills_pkg')
+    try:
+        registry.get('no_such_skill')
+        assert False, "應拋出 ModuleNotFoundError"
+    except ModuleNotFoundError:
+        pass
+    assert registry.stats()['errors'] == 1
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+測試共用技能執行期：技能檔綁定同一份工具函式、版本標記、與內嵌骨架版本行為一致
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core import skill_runtime
+from core.code_generator import CALCULATION_SKELETON
+from core.skill_registry import SkillModuleRegistry
+from core.skill_runtime import SKILL_RUNTIME_PRELUDE, SKILL_RUNTIME_VERSION, runtime_version_of
+
+SKILL_BODY = '''
+def generate(level=1, **kwargs):
+    a = Fraction(-3, 4)
+    return {'question_text': f"計算 {fmt_num(a)} + {nCr(5, 2)}", 'answer': to_latex(a + nCr(5, 2))}
+'''
+
+
+def test_bound_skill_shares_runtime(tmp_path):
+    for name in ('skill_a', 'skill_b'):
+        (tmp_path / f'{name}.py').write_text(SKILL_RUNTIME_PRELUDE + SKILL_BODY, encoding='utf-8')
+    registry = SkillModuleRegistry(skills_dir=str(tmp_path), package='runtime_test_skills')
+    a, b = registry.get('skill_a'), registry.get('skill_b')
+
+    assert a.fmt_num is b.fmt_num is skill_runtime.fmt_num
+    assert 'PERFECT_UTILS' not in vars(a)  # 只匯出工具函式
+
+    inlined = {}
+    exec(CALCULATION_SKELETON + SKILL_BODY, inlined)
+    assert a.generate() == inlined['generate']()
+
+
+def test_runtime_version_marker():
+    assert runtime_version_of(SKILL_RUNTIME_PRELUDE) == SKILL_RUNTIME_VERSION
+    assert runtime_version_of(CALCULATION_SKELETON) is None
+
+
+def test_skills_overriding_runtime_names_stay_inlined():
+    """技能覆寫 to_latex 時，內嵌骨架的 fmt_num 會呼叫到技能版本；這類技能不可改綁執行期"""
+    from scripts.migrate_skill_runtime import convert_source
+
+    body = '''
+def to_latex(num):
+    return "X"
+
+def generate(level=1, **kwargs):
+    return {'question_text': fmt_num(-3), 'answer': '-3'}
+'''
+    inlined = {}
+    exec(CALCULATION_SKELETON + body, inlined)
+    assert inlined['generate']()['question_text'] == '(X)'
+
+    assert skill_runtime.overridden_runtime_names(body) == ['to_latex']
+    assert skill_runtime.overridden_runtime_names('import random\nfrom fractions import Fraction\n' + SKILL_BODY) == []
+    assert convert_source(CALCULATION_SKELETON + body) is None
+    assert convert_source(CALCULATION_SKELETON + SKILL_BODY) == SKILL_RUNTIME_PRELUDE + SKILL_BODY
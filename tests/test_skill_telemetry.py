@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+測試技能遙測：執行緒私有計數合併、直方圖百分位數、增量寫回資料表與排名
+"""
+
+import os
+import sys
+import threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+from flask import Flask
+
+from core.skill_telemetry import SkillTelemetry, percentile_ms
+from models import db
+
+
+def test_percentile_from_buckets():
+    buckets = [0] * 13
+    buckets[2] = 90   # <= 5 ms
+    buckets[6] = 10   # <= 100 ms
+    assert percentile_ms(buckets, 0.5) == 5.0
+    assert percentile_ms(buckets, 0.95) == 100.0
+    buckets[-1] = 100
+    assert percentile_ms(buckets, 0.95) is None
+
+
+def test_shards_merge_and_measure():
+    telemetry = SkillTelemetry()
+
+    def worker():
+        for _ in range(100):
+            telemetry.record('s1', 'generate', 0.003)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 呼叫端的重試迴圈：兩次失敗後成功，共 3 次呼叫、2 次重試
+    for attempt in range(3):
+        try:
+            with telemetry.measure('s1', 'generate', retries=1 if attempt else 0):
+                if attempt < 2:
+                    raise ValueError()
+        except ValueError:
+            continue
+    with pytest.raises(KeyError):
+        with telemetry.measure('s1', 'generate', ignore=KeyError):
+            raise KeyError()
+
+    series = telemetry.snapshot()[('s1', 'generate')]
+    assert series.calls == 403 and series.retries == 2
+    assert series.error_types == {'ValueError': 2}
+    assert telemetry.stats()['shards'] == 1  # 已結束執行緒的 shard 已併入
+
+
+def test_flush_deltas_and_ranking(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 't.db'}"
+    db.init_app(app)
+    telemetry = SkillTelemetry()
+    telemetry._app = app
+
+    for _ in range(20):
+        telemetry.record('fast', 'generate', 0.001)
+        telemetry.record('slow', 'generate', 0.4, retries=1)
+    assert telemetry.flush() == 2
+    assert telemetry.flush() == 0  # 沒有新增量
+    telemetry.record('fast', 'generate', 0.001, error=TimeoutError())
+    assert telemetry.flush() == 1
+
+    ranking = telemetry.ranking(op='generate')
+    assert [r['skill_id'] for r in ranking] == ['slow', 'fast']
+    assert ranking[0]['p95_ms'] == 500.0 and ranking[0]['retry_rate'] == 1.0
+    assert ranking[1]['calls'] == 21 and ranking[1]['error_types'] == {'TimeoutError': 1}
+    assert telemetry.ranking(op='generate', sort='retry_rate')[0]['skill_id'] == 'slow'
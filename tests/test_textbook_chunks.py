@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+測試教科書 AI 分析分段：章節優先切段、超長頁面拆分、與完成順序無關的合併、解析失敗只重問單一分段、
+配額 / 認證錯誤不拆分重試
+"""
+
+import json
+import os
+import queue
+import re
+import sys
+import threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+
+import core.textbook_processor as textbook_processor
+from core.textbook_chunks import chunk_pages, merge_analyses
+
+
+def test_chunks_prefer_chapter_boundaries_and_split_long_pages():
+    pages = {i: f"page {i} " + "x" * 100 for i in range(1, 11)}
+    pages[5] = "第二章 一元一次方程式\n" + pages[5]
+    chunks = chunk_pages(pages, max_chars=10_000, max_pages=6)
+    # 第 5 頁是新章節開頭且第一段已過半 -> 在第 5 頁前切開
+    assert [[label for label, _ in c.parts] for c in chunks] == [[1, 2, 3, 4], [5, 6, 7, 8, 9, 10]]
+    assert chunks[1].hint is None and chunks[1].label == "5–10"
+
+    # 整份 Word 檔 (單一頁面) 依行拆分，後段帶有前段最後的章節標題
+    doc = "第一章 整數\n" + "a\n" * 300 + "第二章 分數\n" + "b\n" * 300
+    chunks = chunk_pages({1: doc}, max_chars=400)
+    assert len(chunks) > 2
+    assert "".join(text for c in chunks for _, text in c.parts) == doc
+    assert chunks[-1].hint == "第二章 分數"
+
+
+def _analysis(chapter, section, concept_id, *examples, description=''):
+    return {'chapters': [{'chapter_title': chapter, 'sections': [{'section_title': section, 'concepts': [{
+        'concept_name': concept_id, 'concept_en_id': concept_id, 'concept_description': description,
+        'examples': [{'source_description': e, 'problem_text': f"{e} text"} for e in examples],
+    }]}]}]}
+
+
+def test_merge_is_deterministic_and_deduplicates():
+    parts = [
+        _analysis('1 整數', '1-1 負數', 'NegativeNumbers', '例題1'),
+        _analysis('單元1 整數', '1-1 負數', 'NegativeNumbers', '例題1', '例題2', description='負數的意義'),
+        _analysis('2 分數', '2-1 約分', 'Reduce', '例題1'),
+    ]
+    merged = merge_analyses(parts)
+    assert [c['chapter_title'] for c in merged['chapters']] == ['1 整數', '2 分數']
+    concept = merged['chapters'][0]['sections'][0]['concepts'][0]
+    assert [e['source_description'] for e in concept['examples']] == ['例題1', '例題2']
+    assert concept['concept_description'] == '負數的意義'
+    assert merge_analyses(parts) == merged
+
+    # 章節編號取自「第N章」，而非標題中的第一個數字 (冊別 7上)
+    volume = merge_analyses([_analysis('7上 第1章 整數', '1-1', 'A'), _analysis('7上 第2章 分數', '2-1', 'B'),
+                             _analysis('第一章 整數', '1-2', 'C')])
+    assert [c['chapter_title'] for c in volume['chapters']] == ['7上 第1章 整數', '7上 第2章 分數']
+    assert len(volume['chapters'][0]['sections']) == 2
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeModel:
+    """依提示中的頁碼回傳章節；含第 3 頁的段落第一次回傳壞掉的 JSON"""
+
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        pages = [int(p) for p in re.findall(r'--- Page (\d+) ---', prompt)]
+        if 3 in pages and sum('--- Page 3 ---' in p for p in self.prompts) == 1:
+            return _FakeResponse('{"chapters": [')
+        return _FakeResponse(json.dumps(_analysis('1 整數', '1-1', f"Concept{pages[0]}", f"例題{pages[0]}")))
+
+
+def test_failed_chunk_is_retried_alone(monkeypatch):
+    model = _FakeModel()
+    monkeypatch.setattr(textbook_processor, 'get_model', lambda: model)
+    # 不受真實 Gemini 速率限制 (Token Bucket) 影響
+    monkeypatch.setattr(textbook_processor, '_provider_limits', lambda provider: (3, threading.Semaphore(3), None))
+    app = Flask(__name__)
+    app.config.update(ANALYSIS_CHUNK_PAGES=2, ANALYSIS_CONCURRENCY=3)
+    pages = {i: f"內容 {i}" for i in range(1, 7)}
+
+    with app.app_context():
+        result = textbook_processor.call_gemini_for_analysis(pages, {'curriculum': 'general'}, queue.Queue())
+
+    assert len(model.prompts) == 4  # 3 段 + 含第 3 頁的段落重問一次
+    concepts = result['chapters'][0]['sections'][0]['concepts']
+    assert [c['concept_en_id'] for c in concepts] == ['Concept1', 'Concept3', 'Concept5']
+
+
+class _DeniedModel:
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        raise PermissionError("API key not valid")
+
+
+def test_transport_errors_are_not_split(monkeypatch):
+    """非解析錯誤不重試也不拆分，直接讓整次分析失敗"""
+    import pytest
+
+    model = _DeniedModel()
+    monkeypatch.setattr(textbook_processor, 'get_model', lambda: model)
+    monkeypatch.setattr(textbook_processor, '_provider_limits', lambda provider: (1, threading.Semaphore(1), None))
+    app = Flask(__name__)
+    app.config.update(ANALYSIS_CHUNK_PAGES=2, ANALYSIS_CONCURRENCY=1)
+    pages = {i: f"內容 {i}" for i in range(1, 9)}
+
+    with app.app_context(), pytest.raises(PermissionError):
+        textbook_processor.call_gemini_for_analysis(pages, {'curriculum': 'general'}, queue.Queue())
+    assert len(model.prompts) == 1  # 其餘分段被取消
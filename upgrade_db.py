@@ -4,7 +4,7 @@
 模組名稱 (Module Name): scripts/upgrade_db.py
 功能說明 (Description): 資料庫科研規格升級腳本 (Database Upgrade Script)，負責擴充 
                        experiment_log 欄位、初始化消融實驗設定，並建立題目採樣 
-                       execution_samples 表格。
+                       execution_samples 表格，並回填錯題本題目指紋 (question_fingerprint)。
 執行語法 (Usage): 
     python scripts/upgrade_db.py
 版本資訊 (Version): V1.1 (Full Research Schema Integration)
@@ -13,8 +13,11 @@
 =============================================================================
 """
 import sqlite3
+import json
 import os
 
+from models import make_question_fingerprint
+
 def upgrade():
     # 確保資料庫目錄存在
     db_path = 'instance/kumon_math.db'
@@ -24,7 +27,7 @@ def upgrade():
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
-    print("🚀 開始資料庫科研規格升級 (Total Phases: 5)...")
+    print("🚀 開始資料庫科研規格升級 (Total Phases: 6)...")
 
     # --------------------------------------------------------------------------
     # Phase 1: 擴充 experiment_log 欄位 (紀錄生成歷程用)
@@ -93,7 +96,51 @@ def upgrade():
     print("✅ [Phase 4] 已建立 'execution_samples' 表格 (科研採樣專用)")
 
     # --------------------------------------------------------------------------
-    # Phase 5: 存檔與關閉
+    # Phase 5: 錯題本題目指紋回填 (自動記錄錯題改以索引查重)
+    # --------------------------------------------------------------------------
+    try:
+        cursor.execute("ALTER TABLE mistake_notebook_entries ADD COLUMN question_fingerprint TEXT")
+        print("✅ [Phase 5.1] 已新增 'question_fingerprint' 欄位至 mistake_notebook_entries")
+    except sqlite3.OperationalError:
+        print("⚠️ [Phase 5.1] 'question_fingerprint' 欄位可能已存在 (或表格不存在)，跳過。")
+
+    try:
+        # 已有指紋的紀錄先登記，避免回填時違反唯一索引
+        cursor.execute("SELECT student_id, question_fingerprint FROM mistake_notebook_entries WHERE question_fingerprint IS NOT NULL")
+        seen = set(cursor.fetchall())
+        cursor.execute("""
+            SELECT id, student_id, skill_id, question_data FROM mistake_notebook_entries
+            WHERE question_fingerprint IS NULL ORDER BY id
+        """)
+        updates, duplicates = [], 0
+        for entry_id, student_id, skill_id, question_data in cursor.fetchall():
+            try:
+                data = json.loads(question_data) if question_data else None
+            except (TypeError, ValueError):
+                continue
+            # 只回填系統練習題 (手動/考卷錯題沒有可比對的題目文字)
+            if not isinstance(data, dict) or data.get('type') != 'system_question':
+                continue
+            fingerprint = make_question_fingerprint(skill_id, data.get('text'))
+            if not fingerprint:
+                continue
+            if (student_id, fingerprint) in seen:
+                # 舊版查重漏掉的重複錯題：保留最早一筆，其餘不設指紋 (不刪除學生資料)
+                duplicates += 1
+                continue
+            seen.add((student_id, fingerprint))
+            updates.append((fingerprint, entry_id))
+        cursor.executemany("UPDATE mistake_notebook_entries SET question_fingerprint = ? WHERE id = ?", updates)
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_mistake_student_fingerprint
+            ON mistake_notebook_entries (student_id, question_fingerprint)
+        """)
+        print(f"✅ [Phase 5.2] 已回填 {len(updates)} 筆錯題指紋並建立唯一索引 (重複錯題 {duplicates} 筆未設指紋)")
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ [Phase 5.2] 錯題指紋回填失敗，跳過: {e}")
+
+    # --------------------------------------------------------------------------
+    # Phase 6: 存檔與關閉
     # --------------------------------------------------------------------------
     conn.commit()
     conn.close()